@@ -43,6 +43,8 @@ class AppConfig:
         "data_dir": os.getenv("QMT_DATA_DIR", "G:\\Stock\\GJ_QMT\\bin.x64\\..\\userdata_mini\\datadir"),
         "connection_timeout": int(os.getenv("QMT_CONNECTION_TIMEOUT", "30")),
         "retry_attempts": int(os.getenv("QMT_RETRY_ATTEMPTS", "3")),
+        # qmt: 连接miniQMT；simulated: 使用 data_agent_service.xtdata_simulator 模拟后端
+        "backend": os.getenv("XTQUANT_BACKEND", "qmt"),
     }
     
     # 缓存配置
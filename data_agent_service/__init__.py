@@ -1 +1,9 @@
 # This file makes Python treat the `data_agent_service` directory as a package.
+
+import os
+
+# XTQUANT_BACKEND=simulated 时在任何模块导入 xtquant 之前注册模拟后端；
+# 模拟后端依赖 numpy/pandas，仅在启用时导入
+if os.getenv("XTQUANT_BACKEND", "qmt").lower() in ("simulated", "sim"):
+    from .xtdata_simulator import install_simulated_xtquant
+    install_simulated_xtquant()
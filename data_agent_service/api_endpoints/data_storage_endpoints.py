@@ -3,16 +3,27 @@
 包含所有数据存储相关的API端点
 """
 
+import io
+import json
 import logging
+from datetime import date
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Integer, Numeric
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
 
 from ..auth_middleware import get_current_user
 from ..auth_middleware import require_permissions
 from ..response_formatter import unified_response
 from ..exception_handler import exception_handler_decorator, get_global_exception_handler
-from ..data_storage_service import get_data_storage_service
+from ..data_storage_service import get_data_storage_service, StreamOptions
 from ..data_compression_service import get_compression_service
+from ..database_models import KlineData
 
 from ..memory_optimizer import GCMode, GCConfig, GarbageCollector
 
@@ -142,6 +153,85 @@ async def trigger_manual_archive(
         }
 
 
+@router.get("/storage/kline/stream")
+@exception_handler_decorator(get_global_exception_handler(), auto_recover=False)
+async def stream_kline_history(
+    symbols: Optional[str] = Query(None, description="股票代码，逗号分隔"),
+    period: Optional[str] = Query(None, description="K线周期"),
+    start_date: Optional[date] = Query(None, description="开始日期"),
+    end_date: Optional[date] = Query(None, description="结束日期"),
+    format: str = Query("ndjson", description="输出格式: ndjson 或 arrow"),
+    chunk_size: int = Query(10000, ge=100, le=100000, description="每页记录数"),
+    current_user: dict = Depends(get_current_user)
+):
+    """流式导出K线历史数据（分块NDJSON或Arrow IPC流）"""
+    if format not in ("ndjson", "arrow"):
+        raise HTTPException(status_code=400, detail=f"不支持的输出格式: {format}")
+    if format == "arrow" and pa is None:
+        raise HTTPException(status_code=400, detail="Arrow格式需要安装pyarrow")
+    
+    symbol_list = [s.strip() for s in symbols.split(",") if s.strip()] if symbols else None
+    storage_service = get_data_storage_service()
+    options = StreamOptions(chunk_size=chunk_size, columnar=(format == "arrow"))
+    chunks = storage_service.stream_kline_data(
+        symbols=symbol_list, period=period,
+        start_date=start_date, end_date=end_date, options=options
+    )
+    
+    if format == "arrow":
+        return StreamingResponse(
+            _report_stream_errors(_arrow_stream(chunks)),
+            media_type="application/vnd.apache.arrow.stream"
+        )
+    return StreamingResponse(_report_stream_errors(_ndjson_stream(chunks)), media_type="application/x-ndjson")
+
+
+async def _report_stream_errors(stream):
+    """响应开始发送后抛出的异常不经过端点装饰器，同样交给全局异常处理器记录"""
+    try:
+        async for data in stream:
+            yield data
+    except Exception as e:
+        get_global_exception_handler().handle_exception(
+            e, {"function": "stream_kline_history"}, auto_recover=False
+        )
+        raise
+
+
+async def _ndjson_stream(chunks):
+    """将行分块编码为NDJSON"""
+    async for rows in chunks:
+        yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+
+def _kline_arrow_schema():
+    """根据K线表结构生成Arrow schema（日期时间按ISO字符串，价格按float64）"""
+    fields = []
+    for column in KlineData.__table__.columns:
+        if isinstance(column.type, Integer):
+            arrow_type = pa.int64()
+        elif isinstance(column.type, Numeric):
+            arrow_type = pa.float64()
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+async def _arrow_stream(chunks):
+    """将列式分块编码为Arrow IPC流，每个分块对应一个RecordBatch"""
+    schema = _kline_arrow_schema()
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, schema)
+    async for columns in chunks:
+        writer.write_batch(pa.RecordBatch.from_pydict(columns, schema=schema))
+        yield sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+    writer.close()
+    yield sink.getvalue()
+
+
 # 内存优化相关端点
 @router.get("/memory_optimizer/status")
 @exception_handler_decorator(get_global_exception_handler(), auto_recover=False)
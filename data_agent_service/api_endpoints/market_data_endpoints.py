@@ -45,51 +45,53 @@ async def get_instrument_detail(
     """获取股票详细信息"""
     try:
         connection_pool = get_connection_pool()
-        with connection_pool.get_connection() as conn:
-            if not conn or conn.metrics.status != ConnectionStatus.HEALTHY:
-                raise HTTPException(status_code=503, detail="QMT连接不可用")
-            
-            upper_symbol = symbol.upper()
-            if not re.match(r'^[A-Z0-9]{6}\.[A-Z]{2}$', upper_symbol):
-                raise HTTPException(status_code=400, detail="Invalid symbol format. Expected format like '600519.SH' or '000001.SZ'.")
-            
-            detail = xtdata.get_instrument_detail(upper_symbol)
-            
-            if detail is None or detail == {}:
-                raise HTTPException(status_code=404, detail=f"Instrument not found: {symbol}")
-            
-            # 从xtdata.get_instrument_detail返回的detail中提取信息
-            last_price = detail.get("PreClose", 0.0)
-            pre_close = detail.get("PreClose", 0.0)
-            
-            change_percent = 0.0
-            if pre_close and last_price is not None:
-                if pre_close != 0:
-                    change_percent = ((last_price - pre_close) / pre_close) * 100
-                else:
-                    change_percent = 0.0
+        upper_symbol = symbol.upper()
+        if not re.match(r'^[A-Z0-9]{6}\.[A-Z]{2}$', upper_symbol):
+            raise HTTPException(status_code=400, detail="Invalid symbol format. Expected format like '600519.SH' or '000001.SZ'.")
+        
+        try:
+            # 幂等读请求，允许连接池对慢请求发起对冲
+            detail = await connection_pool.execute_async(
+                xtdata.get_instrument_detail, upper_symbol, idempotent=True
+            )
+        except (ConnectionError, TimeoutError):
+            raise HTTPException(status_code=503, detail="QMT连接不可用")
+        
+        if detail is None or detail == {}:
+            raise HTTPException(status_code=404, detail=f"Instrument not found: {symbol}")
+        
+        # 从xtdata.get_instrument_detail返回的detail中提取信息
+        last_price = detail.get("PreClose", 0.0)
+        pre_close = detail.get("PreClose", 0.0)
+        
+        change_percent = 0.0
+        if pre_close and last_price is not None:
+            if pre_close != 0:
+                change_percent = ((last_price - pre_close) / pre_close) * 100
+            else:
+                change_percent = 0.0
 
-            return {
-                "symbol": detail.get("InstrumentID", symbol),
-                "name": detail.get("InstrumentName", symbol),
-                "last_price": last_price,
-                "open_price": detail.get("OpenPrice", 0.0),
-                "high_price": detail.get("HighPrice", 0.0),
-                "low_price": detail.get("LowPrice", 0.0),
-                "close_price": last_price,
-                "volume": detail.get("TotalVolume", 0),
-                "amount": 0.0,
-                "timestamp": 0,
-                "change_percent": change_percent,
-                "ExchangeID": detail.get("ExchangeID"),
-                "PreClose": detail.get("PreClose"),
-                "TotalVolume": detail.get("TotalVolume"),
-                "FloatVolume": detail.get("FloatVolume"),
-                "IsTrading": detail.get("IsTrading"),
-                "UniCode": detail.get("UniCode"),
-                "OpenDate": detail.get("OpenDate"),
-                "PriceTick": detail.get("PriceTick")
-            }
+        return {
+            "symbol": detail.get("InstrumentID", symbol),
+            "name": detail.get("InstrumentName", symbol),
+            "last_price": last_price,
+            "open_price": detail.get("OpenPrice", 0.0),
+            "high_price": detail.get("HighPrice", 0.0),
+            "low_price": detail.get("LowPrice", 0.0),
+            "close_price": last_price,
+            "volume": detail.get("TotalVolume", 0),
+            "amount": 0.0,
+            "timestamp": 0,
+            "change_percent": change_percent,
+            "ExchangeID": detail.get("ExchangeID"),
+            "PreClose": detail.get("PreClose"),
+            "TotalVolume": detail.get("TotalVolume"),
+            "FloatVolume": detail.get("FloatVolume"),
+            "IsTrading": detail.get("IsTrading"),
+            "UniCode": detail.get("UniCode"),
+            "OpenDate": detail.get("OpenDate"),
+            "PriceTick": detail.get("PriceTick")
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -109,7 +111,7 @@ async def get_stock_list_in_sector(
     """获取板块内股票列表"""
     try:
         connection_pool = get_connection_pool()
-        with connection_pool.get_connection() as conn:
+        async with connection_pool.acquire() as conn:
             if not conn or conn.metrics.status != ConnectionStatus.HEALTHY:
                 raise HTTPException(status_code=503, detail="QMT连接不可用")
             
@@ -135,7 +137,7 @@ async def get_stock_list(
     """获取板块内股票列表（别名端点）"""
     try:
         connection_pool = get_connection_pool()
-        with connection_pool.get_connection() as conn:
+        async with connection_pool.acquire() as conn:
             if not conn or conn.metrics.status != ConnectionStatus.HEALTHY:
                 raise HTTPException(status_code=503, detail="QMT连接不可用")
             
@@ -164,44 +166,45 @@ async def get_latest_market_data(
     """获取最新市场数据"""
     try:
         connection_pool = get_connection_pool()
-        with connection_pool.get_connection() as conn:
-            if not conn or conn.metrics.status != ConnectionStatus.HEALTHY:
-                raise HTTPException(status_code=503, detail="QMT连接不可用")
-            
-            symbol_list = [s.strip().upper() for s in symbols.split(',') if s.strip()]
-            if not symbol_list:
-                raise HTTPException(status_code=400, detail="symbols query parameter cannot be empty")
-            
-            # 验证股票代码格式
-            invalid_symbols = [s for s in symbol_list if not re.match(r'^[A-Z0-9]{6}\.[A-Z]{2}$', s)]
-            if invalid_symbols:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid symbol format: {', '.join(invalid_symbols)}"
-                )
-            
-            # 获取最新市场数据
-            market_data = xtdata.get_market_data(
+        symbol_list = [s.strip().upper() for s in symbols.split(',') if s.strip()]
+        if not symbol_list:
+            raise HTTPException(status_code=400, detail="symbols query parameter cannot be empty")
+        
+        # 验证股票代码格式
+        invalid_symbols = [s for s in symbol_list if not re.match(r'^[A-Z0-9]{6}\.[A-Z]{2}$', s)]
+        if invalid_symbols:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid symbol format: {', '.join(invalid_symbols)}"
+            )
+        
+        # 获取最新市场数据
+        try:
+            market_data = await connection_pool.execute_async(
+                xtdata.get_market_data,
                 field_list=['lastPrice', 'open', 'high', 'low', 'volume', 'amount', 'time'],
                 stock_list=symbol_list,
                 period='tick',
-                count=1
+                count=1,
+                idempotent=True
             )
-            
-            # 构建响应对象
-            result = {}
-            for symbol in symbol_list:
-                result[symbol] = {
-                    "time": market_data.get('time', {}).get(symbol, [None])[0],
-                    "lastPrice": market_data.get('lastPrice', {}).get(symbol, [None])[0],
-                    "volume": market_data.get('volume', {}).get(symbol, [None])[0],
-                    "amount": market_data.get('amount', {}).get(symbol, [None])[0],
-                    "open": market_data.get('open', {}).get(symbol, [None])[0],
-                    "high": market_data.get('high', {}).get(symbol, [None])[0],
-                    "low": market_data.get('low', {}).get(symbol, [None])[0]
-                }
-            
-            return result
+        except (ConnectionError, TimeoutError):
+            raise HTTPException(status_code=503, detail="QMT连接不可用")
+        
+        # 构建响应对象
+        result = {}
+        for symbol in symbol_list:
+            result[symbol] = {
+                "time": market_data.get('time', {}).get(symbol, [None])[0],
+                "lastPrice": market_data.get('lastPrice', {}).get(symbol, [None])[0],
+                "volume": market_data.get('volume', {}).get(symbol, [None])[0],
+                "amount": market_data.get('amount', {}).get(symbol, [None])[0],
+                "open": market_data.get('open', {}).get(symbol, [None])[0],
+                "high": market_data.get('high', {}).get(symbol, [None])[0],
+                "low": market_data.get('low', {}).get(symbol, [None])[0]
+            }
+        
+        return result
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,426 @@
+"""流式备份文件格式
+
+按表分块写入备份数据，每个分块是独立的gzip成员，内存占用与数据库大小无关。
+
+文件布局::
+
+    [头部成员][分块成员 ...][索引成员][尾部: MAGIC + 索引偏移(8字节)]
+
+- 头部成员：备份元数据与各表的列结构（列名与类型）
+- 分块成员：NDJSON，每行是按列顺序排列的值数组
+- 索引成员：头部副本、每个分块的偏移/长度/行数、各表记录数，以及索引之前
+  全部字节的运行校验和（data_checksum）
+- 由于每个分块都可以单独定位和解压，恢复时可以并行处理
+"""
+
+import hashlib
+import json
+import logging
+import struct
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from functools import partial
+from datetime import datetime, date
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Table, Boolean, Date, DateTime, Float, Integer, JSON, Numeric, insert
+)
+from sqlalchemy.dialects import postgresql, sqlite
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = "argus-backup"
+FORMAT_VERSION = "2.0"
+FOOTER_MAGIC = b"ARGUSBK2"
+FOOTER_SIZE = len(FOOTER_MAGIC) + 8
+
+
+@dataclass
+class BackupChunk:
+    """备份分块索引项"""
+    table: str
+    seq: int
+    offset: int
+    length: int
+    rows: int
+
+
+@dataclass
+class BackupIndex:
+    """备份索引"""
+    header: Dict[str, Any]
+    chunks: List[BackupChunk] = field(default_factory=list)
+    table_counts: Dict[str, int] = field(default_factory=dict)
+    data_checksum: str = ""
+    checksum: str = ""
+    index_offset: int = 0
+
+    @property
+    def total_records(self) -> int:
+        """总记录数"""
+        return sum(self.table_counts.values())
+
+    def chunks_for(self, table_name: str) -> List[BackupChunk]:
+        """获取指定表的分块"""
+        return [chunk for chunk in self.chunks if chunk.table == table_name]
+
+
+def describe_table_schema(table: Table) -> List[Dict[str, str]]:
+    """生成表的列结构描述，写入备份头部供恢复时按类型解码"""
+    columns = []
+    for column in table.columns:
+        column_type = column.type
+        if isinstance(column_type, DateTime):
+            type_name = "datetime"
+        elif isinstance(column_type, Date):
+            type_name = "date"
+        elif isinstance(column_type, Boolean):
+            type_name = "boolean"
+        elif isinstance(column_type, Integer):
+            type_name = "integer"
+        elif isinstance(column_type, Float):
+            type_name = "float"
+        elif isinstance(column_type, Numeric):
+            type_name = "decimal"
+        elif isinstance(column_type, JSON):
+            type_name = "json"
+        else:
+            type_name = "string"
+        columns.append({"name": column.name, "type": type_name})
+    return columns
+
+
+def encode_value(value: Any) -> Any:
+    """将数据库值编码为JSON值"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def decode_value(value: Any, type_name: str) -> Any:
+    """按头部列类型将JSON值解码为数据库值"""
+    if value is None:
+        return None
+    if type_name == "datetime":
+        return datetime.fromisoformat(value)
+    if type_name == "date":
+        return date.fromisoformat(value)
+    if type_name == "decimal":
+        return Decimal(str(value))
+    return value
+
+
+def decode_rows(lines: List[List[Any]], columns: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+    """将分块中的值数组按列结构解码为字典行"""
+    names = [column["name"] for column in columns]
+    types = [column["type"] for column in columns]
+    return [
+        {name: decode_value(value, type_name) for name, type_name, value in zip(names, types, line)}
+        for line in lines
+    ]
+
+
+class StreamingBackupWriter:
+    """流式备份写入器
+
+    每个分块在写入时单独压缩为gzip成员并立即落盘，同时累计运行校验和（MD5，
+    与 ``DatabaseBackupManager._calculate_checksum`` 对整个文件的结果一致），
+    写入完成后无需再次读取文件。
+    """
+
+    def __init__(self, file_path: Path, header: Dict[str, Any], compression_level: int = 6):
+        self.file_path = Path(file_path)
+        self.header = dict(header, format=FORMAT_NAME, version=FORMAT_VERSION)
+        self.header.setdefault("tables", {})
+        self.compression_level = compression_level
+        self.index: Optional[BackupIndex] = None
+        self.raw_bytes = 0
+        self._file = None
+        self._hasher = hashlib.md5()
+        self._offset = 0
+        self._chunks: List[BackupChunk] = []
+        self._table_counts: Dict[str, int] = {}
+
+    def __enter__(self) -> "StreamingBackupWriter":
+        self._file = open(self.file_path, "wb")
+        self._write_member(json.dumps(self.header, ensure_ascii=False).encode("utf-8"))
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self._finish()
+        finally:
+            self._file.close()
+            self._file = None
+
+    @property
+    def checksum(self) -> str:
+        """整个文件的MD5校验和（写入完成后有效）"""
+        return self.index.checksum if self.index else ""
+
+    def write_chunk(self, table_name: str, rows: Sequence[Sequence[Any]]) -> BackupChunk:
+        """写入一个分块，rows 中每行的值顺序与头部列结构一致"""
+        lines = "".join(
+            json.dumps([encode_value(value) for value in row], ensure_ascii=False) + "\n"
+            for row in rows
+        ).encode("utf-8")
+        offset = self._offset
+        length = self._write_member(lines)
+
+        chunk = BackupChunk(
+            table=table_name,
+            seq=len(self._chunks),
+            offset=offset,
+            length=length,
+            rows=len(rows)
+        )
+        self._chunks.append(chunk)
+        self._table_counts[table_name] = self._table_counts.get(table_name, 0) + len(rows)
+        return chunk
+
+    def _write_member(self, payload: bytes) -> int:
+        """以独立gzip成员写入数据，返回写入的压缩字节数"""
+        compressor = zlib.compressobj(self.compression_level, zlib.DEFLATED, 31)
+        data = compressor.compress(payload) + compressor.flush()
+        self._write(data)
+        self.raw_bytes += len(payload)
+        return len(data)
+
+    def _write(self, data: bytes):
+        self._file.write(data)
+        self._hasher.update(data)
+        self._offset += len(data)
+
+    def _finish(self):
+        """写入索引与尾部"""
+        index_offset = self._offset
+        data_checksum = self._hasher.copy().hexdigest()
+        index_payload = {
+            "header": self.header,
+            "chunks": [asdict(chunk) for chunk in self._chunks],
+            "table_counts": self._table_counts,
+            "data_checksum": data_checksum,
+        }
+        self._write_member(json.dumps(index_payload, ensure_ascii=False).encode("utf-8"))
+        self._write(FOOTER_MAGIC + struct.pack(">Q", index_offset))
+        self.index = BackupIndex(
+            header=self.header,
+            index_offset=index_offset,
+            chunks=list(self._chunks),
+            table_counts=dict(self._table_counts),
+            data_checksum=data_checksum,
+            checksum=self._hasher.hexdigest()
+        )
+
+
+def is_streaming_backup(file_path: Path) -> bool:
+    """判断文件是否为流式备份格式"""
+    try:
+        with open(file_path, "rb") as f:
+            f.seek(0, 2)
+            if f.tell() < FOOTER_SIZE:
+                return False
+            f.seek(-FOOTER_SIZE, 2)
+            return f.read(len(FOOTER_MAGIC)) == FOOTER_MAGIC
+    except OSError:
+        return False
+
+
+class StreamingBackupReader:
+    """流式备份读取器"""
+
+    def __init__(self, file_path: Path):
+        self.file_path = Path(file_path)
+        self._index: Optional[BackupIndex] = None
+
+    def read_index(self) -> BackupIndex:
+        """读取尾部定位的索引"""
+        if self._index is not None:
+            return self._index
+
+        with open(self.file_path, "rb") as f:
+            f.seek(-FOOTER_SIZE, 2)
+            footer = f.read(FOOTER_SIZE)
+            if footer[:len(FOOTER_MAGIC)] != FOOTER_MAGIC:
+                raise ValueError(f"不是流式备份文件: {self.file_path}")
+            index_offset = struct.unpack(">Q", footer[len(FOOTER_MAGIC):])[0]
+            f.seek(index_offset)
+            index_bytes = f.read()[:-FOOTER_SIZE]
+
+        payload = json.loads(zlib.decompress(index_bytes, 31).decode("utf-8"))
+        self._index = BackupIndex(
+            header=payload["header"],
+            chunks=[BackupChunk(**chunk) for chunk in payload["chunks"]],
+            table_counts=payload.get("table_counts", {}),
+            data_checksum=payload.get("data_checksum", ""),
+            index_offset=index_offset
+        )
+        return self._index
+
+    def read_chunk_lines(self, chunk: BackupChunk) -> List[List[Any]]:
+        """读取并解压单个分块，返回原始值数组列表"""
+        with open(self.file_path, "rb") as f:
+            f.seek(chunk.offset)
+            data = f.read(chunk.length)
+        text = zlib.decompress(data, 31).decode("utf-8")
+        return [json.loads(line) for line in text.splitlines() if line]
+
+    def verify_data_checksum(self) -> bool:
+        """流式重新计算索引之前的字节校验和，并与索引中的记录比较"""
+        index = self.read_index()
+        hasher = hashlib.md5()
+        remaining = index.index_offset
+        with open(self.file_path, "rb") as f:
+            while remaining > 0:
+                block = f.read(min(1024 * 1024, remaining))
+                if not block:
+                    break
+                hasher.update(block)
+                remaining -= len(block)
+        return hasher.hexdigest() == index.data_checksum
+
+    def iter_chunks(self, table_name: Optional[str] = None) -> Iterator[BackupChunk]:
+        """按写入顺序遍历分块"""
+        for chunk in self.read_index().chunks:
+            if table_name is None or chunk.table == table_name:
+                yield chunk
+
+
+@dataclass
+class RestoreProgress:
+    """恢复进度"""
+    chunks_total: int = 0
+    chunks_done: int = 0
+    rows_restored: int = 0
+    elapsed_seconds: float = 0.0
+    table_rows: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def rows_per_second(self) -> float:
+        """恢复吞吐量（行/秒）"""
+        return self.rows_restored / self.elapsed_seconds if self.elapsed_seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "chunks_total": self.chunks_total,
+            "chunks_done": self.chunks_done,
+            "rows_restored": self.rows_restored,
+            "elapsed_seconds": round(self.elapsed_seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "table_rows": dict(self.table_rows),
+        }
+
+
+class ParallelChunkRestorer:
+    """并行分块恢复器
+
+    每个分块由工作线程独立读取、按头部列类型解码，并在各自的事务中以
+    executemany 批量写入。主键冲突时覆盖已有行，与原先 ``session.merge`` 的语义一致。
+    """
+
+    def __init__(self, engine, max_workers: int = 4, upsert: bool = True):
+        self.engine = engine
+        self.upsert = upsert
+        # SQLite 写入串行化，多线程只会增加锁竞争
+        self.max_workers = 1 if engine.dialect.name == "sqlite" else max(1, max_workers)
+
+    def restore(self, reader: StreamingBackupReader, tables: Dict[str, Table],
+                progress_callback: Optional[Callable[[RestoreProgress], Any]] = None) -> RestoreProgress:
+        """恢复备份中属于 tables 的所有分块（阻塞调用，应在线程池中执行）"""
+        index = reader.read_index()
+        jobs = [
+            (chunk.table, partial(self._restore_chunk, reader, chunk, tables[chunk.table],
+                                  index.header["tables"][chunk.table]["columns"]))
+            for chunk in index.chunks if chunk.table in tables
+        ]
+        return self._run(jobs, progress_callback)
+
+    def restore_records(self, table: Table, records: Sequence[Dict[str, Any]],
+                        columns: List[Dict[str, str]], chunk_size: int,
+                        progress_callback: Optional[Callable[[RestoreProgress], Any]] = None) -> RestoreProgress:
+        """并行写入已整体加载的字典记录（旧版JSON归档），每个分块在工作线程中解码"""
+        jobs = [
+            (table.name, partial(self._restore_records, table, records[i:i + chunk_size], columns))
+            for i in range(0, len(records), chunk_size)
+        ]
+        return self._run(jobs, progress_callback)
+
+    def _run(self, jobs: List[Tuple[str, Callable[[], int]]],
+             progress_callback: Optional[Callable[[RestoreProgress], Any]]) -> RestoreProgress:
+        """在线程池中执行恢复任务 [(表名, 返回写入行数的任务), ...] 并汇总进度"""
+        progress = RestoreProgress(chunks_total=len(jobs))
+        start = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix="BackupRestore") as pool:
+            futures = {pool.submit(job): table_name for table_name, job in jobs}
+            for future in as_completed(futures):
+                table_name = futures[future]
+                restored = future.result()
+                progress.chunks_done += 1
+                progress.rows_restored += restored
+                progress.table_rows[table_name] = progress.table_rows.get(table_name, 0) + restored
+                progress.elapsed_seconds = time.monotonic() - start
+                if progress_callback:
+                    try:
+                        progress_callback(progress)
+                    except Exception as e:
+                        logger.warning(f"恢复进度回调执行失败: {e}")
+
+        progress.elapsed_seconds = time.monotonic() - start
+        return progress
+
+    def insert_rows(self, table: Table, rows: List[Dict[str, Any]]) -> int:
+        """在单个事务中批量写入行"""
+        if not rows:
+            return 0
+        with self.engine.begin() as connection:
+            connection.execute(self._build_insert(table), rows)
+        return len(rows)
+
+    def _restore_chunk(self, reader: StreamingBackupReader, chunk: BackupChunk,
+                       table: Table, columns: List[Dict[str, str]]) -> int:
+        """读取、解码并写入单个分块"""
+        # 备份中存在但当前表结构已删除的列不参与写入
+        known_columns = [column for column in columns if column["name"] in table.c]
+        positions = [i for i, column in enumerate(columns) if column["name"] in table.c]
+        lines = reader.read_chunk_lines(chunk)
+        if len(known_columns) != len(columns):
+            lines = [[line[i] for i in positions] for line in lines]
+        return self.insert_rows(table, decode_rows(lines, known_columns))
+
+    def _restore_records(self, table: Table, records: Sequence[Dict[str, Any]],
+                         columns: List[Dict[str, str]]) -> int:
+        """按列结构解码并写入一批字典记录"""
+        lines = [[record.get(column["name"]) for column in columns] for record in records]
+        return self.insert_rows(table, decode_rows(lines, columns))
+
+    def _build_insert(self, table: Table):
+        """根据方言生成批量插入语句"""
+        dialect_name = self.engine.dialect.name
+        if dialect_name == "postgresql":
+            stmt = postgresql.insert(table)
+        elif dialect_name == "sqlite":
+            stmt = sqlite.insert(table)
+        else:
+            return insert(table)
+
+        primary_keys = [column.name for column in table.primary_key.columns]
+        if not self.upsert or not primary_keys:
+            return stmt
+        updates = {
+            column.name: stmt.excluded[column.name]
+            for column in table.columns if column.name not in primary_keys
+        }
+        if not updates:
+            return stmt.on_conflict_do_nothing(index_elements=primary_keys)
+        return stmt.on_conflict_do_update(index_elements=primary_keys, set_=updates)
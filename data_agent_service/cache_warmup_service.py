@@ -17,7 +17,7 @@ import threading
 
 from .cache_manager import get_cache_manager
 from .advanced_cache_strategy import get_advanced_cache_strategy, CachePriority
-from .xtquant_connection_pool import get_connection_pool
+from .xtquant_connection_pool import get_connection_pool, ConnectionPriority
 from .performance_optimizer import get_global_optimizer
 
 logger = logging.getLogger(__name__)
@@ -257,7 +257,7 @@ class CacheWarmupService:
                 '000725.SZ'   # 京东方A
             ]
             
-            with self.connection_pool.get_connection() as conn:
+            with self.connection_pool.get_connection(priority=ConnectionPriority.LOW) as conn:
                 if not conn or conn.status.name != 'CONNECTED':
                     logger.warning("QMT连接不可用，跳过预热")
                     return
@@ -329,7 +329,7 @@ class CacheWarmupService:
                 '000852.SH'   # 中证1000
             ]
             
-            with self.connection_pool.get_connection() as conn:
+            with self.connection_pool.get_connection(priority=ConnectionPriority.LOW) as conn:
                 if not conn or conn.status.name != 'CONNECTED':
                     logger.warning("QMT连接不可用，跳过预热")
                     return
@@ -371,7 +371,7 @@ class CacheWarmupService:
     def _warmup_trading_calendar(self):
         """预热交易日历"""
         try:
-            with self.connection_pool.get_connection() as conn:
+            with self.connection_pool.get_connection(priority=ConnectionPriority.LOW) as conn:
                 if not conn or conn.status.name != 'CONNECTED':
                     logger.warning("QMT连接不可用，跳过预热")
                     return
@@ -446,7 +446,7 @@ class CacheWarmupService:
                 '新能源'
             ]
             
-            with self.connection_pool.get_connection() as conn:
+            with self.connection_pool.get_connection(priority=ConnectionPriority.LOW) as conn:
                 if not conn or conn.status.name != 'CONNECTED':
                     logger.warning("QMT连接不可用，跳过预热")
                     return
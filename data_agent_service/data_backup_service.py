@@ -8,22 +8,27 @@ import shutil
 import hashlib
 import json
 import gzip
-from typing import Dict, Any, List, Optional, Tuple
+import time
+from typing import Dict, Any, List, Optional, Tuple, Callable
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from enum import Enum
 import asyncio
 from pathlib import Path
 import os
-from sqlalchemy import text, and_, or_, func
+from sqlalchemy import text, and_, or_, func, select
 from sqlalchemy.orm import Session
 import subprocess
 
 from .database_config import get_database_manager
 from .database_models import (
-    MarketData, KlineData, DataPartition, 
+    Base, MarketData, KlineData, DataPartition, 
     DataQualityMetrics, SystemMetrics, DataBackup
 )
+from .backup_stream import (
+    StreamingBackupWriter, StreamingBackupReader, ParallelChunkRestorer, RestoreProgress,
+    describe_table_schema, decode_rows, is_streaming_backup
+)
 from .exception_handler import safe_execute
 from .data_compression_service import DataCompressor, CompressionConfig
 
@@ -55,6 +60,8 @@ class BackupConfig:
     compression_enabled: bool = True
     verification_enabled: bool = True
     max_backup_size_gb: float = 10.0
+    chunk_size: int = 10000  # 流式备份每个分块的记录数
+    restore_workers: int = 4  # 并行恢复的工作线程数
     backup_types: List[BackupType] = None
     
     def __post_init__(self):
@@ -88,6 +95,7 @@ class RestoreInfo:
     status: str
     created_at: datetime
     error_message: Optional[str] = None
+    metrics: Optional[Dict[str, Any]] = None
 
 class DatabaseBackupManager:
     """数据库备份管理器"""
@@ -121,79 +129,22 @@ class DatabaseBackupManager:
         start_time = datetime.now()
         
         try:
-            backup_data = {
-                "backup_id": backup_id,
-                "backup_type": BackupType.FULL.value,
-                "created_at": start_time.isoformat(),
-                "tables": {},
-                "metadata": {
-                    "version": "1.0",
-                    "database_info": db_manager.get_connection_info()
-                }
-            }
-            
-            total_records = 0
             tables_to_backup = tables or ["market_data", "kline_data", "trading_calendar", "data_partitions"]
             
-            with db_manager.get_session() as session:
-                for table_name in tables_to_backup:
-                    logger.info(f"备份表: {table_name}")
-                    
-                    if table_name == "market_data":
-                        query = session.query(MarketData)
-                        records = query.all()
-                    elif table_name == "kline_data":
-                        query = session.query(KlineData)
-                        records = query.all()
-                    elif table_name == "trading_calendar":
-                        # 假设有交易日历表
-                        records = []
-                    elif table_name == "data_partitions":
-                        query = session.query(DataPartition)
-                        records = query.all()
-                    else:
-                        logger.warning(f"未知表名: {table_name}")
-                        continue
-                    
-                    # 序列化记录
-                    table_data = []
-                    for record in records:
-                        record_dict = {
-                            column.name: getattr(record, column.name)
-                            for column in record.__table__.columns
-                        }
-                        # 处理日期时间字段
-                        for key, value in record_dict.items():
-                            if isinstance(value, datetime):
-                                record_dict[key] = value.isoformat()
-                        table_data.append(record_dict)
-                    
-                    backup_data["tables"][table_name] = {
-                        "records": table_data,
-                        "count": len(table_data),
-                        "backup_time": datetime.now().isoformat()
-                    }
-                    
-                    total_records += len(table_data)
-                    logger.info(f"表 {table_name} 备份完成: {len(table_data)} 条记录")
-            
-            # 保存备份文件
-            backup_json = json.dumps(backup_data, ensure_ascii=False, indent=2)
-            
-            if self.compressor:
-                # 压缩备份数据
-                compressed_data = gzip.compress(backup_json.encode('utf-8'))
-                with open(backup_file_path, 'wb') as f:
-                    f.write(compressed_data)
-                compression_ratio = len(compressed_data) / len(backup_json.encode('utf-8'))
-            else:
-                with open(backup_file_path, 'w', encoding='utf-8') as f:
-                    f.write(backup_json)
-                compression_ratio = None
+            # 在线程池中流式读取并写入，避免阻塞事件循环
+            loop = asyncio.get_running_loop()
+            writer = await loop.run_in_executor(
+                None, self._write_streaming_backup,
+                backup_id, BackupType.FULL, backup_file_path, tables_to_backup, None
+            )
             
-            # 计算文件信息
+            total_records = writer.index.total_records
             file_size_mb = backup_file_path.stat().st_size / (1024 * 1024)
-            checksum = self._calculate_checksum(backup_file_path)
+            checksum = writer.checksum
+            compression_ratio = (
+                backup_file_path.stat().st_size / writer.raw_bytes
+                if self.compressor and writer.raw_bytes else None
+            )
             
             # 创建备份信息
             backup_info = BackupInfo(
@@ -247,77 +198,21 @@ class DatabaseBackupManager:
         start_time = datetime.now()
         
         try:
-            backup_data = {
-                "backup_id": backup_id,
-                "backup_type": BackupType.INCREMENTAL.value,
-                "created_at": start_time.isoformat(),
-                "since_datetime": since_datetime.isoformat(),
-                "tables": {},
-                "metadata": {
-                    "version": "1.0",
-                    "database_info": db_manager.get_connection_info()
-                }
-            }
-            
-            total_records = 0
             tables_to_backup = tables or ["market_data", "kline_data"]
             
-            with db_manager.get_session() as session:
-                for table_name in tables_to_backup:
-                    logger.info(f"增量备份表: {table_name}")
-                    
-                    if table_name == "market_data":
-                        query = session.query(MarketData).filter(
-                            MarketData.updated_at > since_datetime
-                        )
-                        records = query.all()
-                    elif table_name == "kline_data":
-                        query = session.query(KlineData).filter(
-                            KlineData.updated_at > since_datetime
-                        )
-                        records = query.all()
-                    else:
-                        logger.warning(f"增量备份不支持表: {table_name}")
-                        continue
-                    
-                    # 序列化记录
-                    table_data = []
-                    for record in records:
-                        record_dict = {
-                            column.name: getattr(record, column.name)
-                            for column in record.__table__.columns
-                        }
-                        # 处理日期时间字段
-                        for key, value in record_dict.items():
-                            if isinstance(value, datetime):
-                                record_dict[key] = value.isoformat()
-                        table_data.append(record_dict)
-                    
-                    backup_data["tables"][table_name] = {
-                        "records": table_data,
-                        "count": len(table_data),
-                        "backup_time": datetime.now().isoformat()
-                    }
-                    
-                    total_records += len(table_data)
-                    logger.info(f"表 {table_name} 增量备份完成: {len(table_data)} 条记录")
-            
-            # 保存备份文件
-            backup_json = json.dumps(backup_data, ensure_ascii=False, indent=2)
-            
-            if self.compressor:
-                compressed_data = gzip.compress(backup_json.encode('utf-8'))
-                with open(backup_file_path, 'wb') as f:
-                    f.write(compressed_data)
-                compression_ratio = len(compressed_data) / len(backup_json.encode('utf-8'))
-            else:
-                with open(backup_file_path, 'w', encoding='utf-8') as f:
-                    f.write(backup_json)
-                compression_ratio = None
+            loop = asyncio.get_running_loop()
+            writer = await loop.run_in_executor(
+                None, self._write_streaming_backup,
+                backup_id, BackupType.INCREMENTAL, backup_file_path, tables_to_backup, since_datetime
+            )
             
-            # 计算文件信息
+            total_records = writer.index.total_records
             file_size_mb = backup_file_path.stat().st_size / (1024 * 1024)
-            checksum = self._calculate_checksum(backup_file_path)
+            checksum = writer.checksum
+            compression_ratio = (
+                backup_file_path.stat().st_size / writer.raw_bytes
+                if self.compressor and writer.raw_bytes else None
+            )
             
             backup_info = BackupInfo(
                 backup_id=backup_id,
@@ -343,8 +238,69 @@ class DatabaseBackupManager:
                 backup_file_path.unlink()
             raise
     
-    async def restore_backup(self, backup_id: str, target_tables: Optional[List[str]] = None) -> RestoreInfo:
-        """恢复备份"""
+    def _write_streaming_backup(self, backup_id: str, backup_type: BackupType,
+                                backup_file_path: Path, tables: List[str],
+                                since_datetime: Optional[datetime] = None) -> StreamingBackupWriter:
+        """按表分块流式写入备份文件
+        
+        使用服务端游标（stream_results）逐块读取，每块写入后即释放，
+        峰值内存只与 chunk_size 相关，与数据库大小无关。
+        """
+        db_manager = get_database_manager()
+        
+        table_objects = {}
+        for table_name in tables:
+            table = Base.metadata.tables.get(table_name)
+            if table is None:
+                logger.warning(f"未知表名: {table_name}")
+                continue
+            if since_datetime is not None and 'updated_at' not in table.c:
+                logger.warning(f"增量备份不支持表: {table_name}")
+                continue
+            table_objects[table_name] = table
+        
+        header = {
+            "backup_id": backup_id,
+            "backup_type": backup_type.value,
+            "created_at": datetime.now().isoformat(),
+            "since_datetime": since_datetime.isoformat() if since_datetime else None,
+            "tables": {
+                table_name: {"columns": describe_table_schema(table)}
+                for table_name, table in table_objects.items()
+            },
+            "metadata": {
+                "database_info": db_manager.get_connection_info()
+            }
+        }
+        compression_level = 6 if self.compressor else 0
+        
+        with StreamingBackupWriter(backup_file_path, header, compression_level) as writer:
+            with db_manager.engine.connect() as connection:
+                connection = connection.execution_options(
+                    stream_results=True, max_row_buffer=self.config.chunk_size
+                )
+                for table_name, table in table_objects.items():
+                    logger.info(f"备份表: {table_name}")
+                    stmt = select(table)
+                    if since_datetime is not None:
+                        stmt = stmt.where(table.c.updated_at > since_datetime)
+                    
+                    table_count = 0
+                    result = connection.execute(stmt)
+                    for rows in result.partitions(self.config.chunk_size):
+                        writer.write_chunk(table_name, rows)
+                        table_count += len(rows)
+                    
+                    logger.info(f"表 {table_name} 备份完成: {table_count} 条记录")
+        
+        return writer
+    
+    async def restore_backup(self, backup_id: str, target_tables: Optional[List[str]] = None,
+                             progress_callback: Optional[Callable[[RestoreProgress], Any]] = None) -> RestoreInfo:
+        """恢复备份
+        
+        流式备份与旧版JSON备份都按分块并行恢复，progress_callback 在工作线程中每完成一个分块调用一次。
+        """
         restore_id = f"restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{hash(backup_id) % 1000:03d}"
         start_time = datetime.now()
         
@@ -356,60 +312,19 @@ class DatabaseBackupManager:
             
             backup_file_path = backup_files[0]
             
-            # 读取备份文件
-            if self.compressor and backup_file_path.suffix == '.backup':
-                with open(backup_file_path, 'rb') as f:
-                    compressed_data = f.read()
-                try:
-                    backup_json = gzip.decompress(compressed_data).decode('utf-8')
-                except:
-                    # 如果解压缩失败，可能是未压缩的文件
-                    backup_json = compressed_data.decode('utf-8')
+            loop = asyncio.get_running_loop()
+            if is_streaming_backup(backup_file_path):
+                progress = await loop.run_in_executor(
+                    None, self._restore_streaming_backup,
+                    backup_file_path, target_tables, progress_callback
+                )
             else:
-                with open(backup_file_path, 'r', encoding='utf-8') as f:
-                    backup_json = f.read()
-            
-            backup_data = json.loads(backup_json)
-            
-            # 恢复数据
-            db_manager = get_database_manager()
-            total_restored = 0
-            
-            tables_to_restore = target_tables or list(backup_data["tables"].keys())
-            
-            with db_manager.get_session() as session:
-                for table_name in tables_to_restore:
-                    if table_name not in backup_data["tables"]:
-                        logger.warning(f"备份中不包含表: {table_name}")
-                        continue
-                    
-                    table_data = backup_data["tables"][table_name]["records"]
-                    logger.info(f"恢复表 {table_name}: {len(table_data)} 条记录")
-                    
-                    for record_dict in table_data:
-                        # 处理日期时间字段
-                        for key, value in record_dict.items():
-                            if isinstance(value, str) and 'T' in value:
-                                try:
-                                    record_dict[key] = datetime.fromisoformat(value)
-                                except:
-                                    pass
-                        
-                        if table_name == "market_data":
-                            record = MarketData(**record_dict)
-                        elif table_name == "kline_data":
-                            record = KlineData(**record_dict)
-                        elif table_name == "data_partitions":
-                            record = DataPartition(**record_dict)
-                        else:
-                            logger.warning(f"不支持恢复表: {table_name}")
-                            continue
-                        
-                        session.merge(record)  # 使用merge避免主键冲突
-                        total_restored += 1
-                
-                session.commit()
+                progress = await loop.run_in_executor(
+                    None, self._restore_legacy_backup,
+                    backup_file_path, target_tables, progress_callback
+                )
             
+            total_restored = progress.rows_restored
             restore_time = (datetime.now() - start_time).total_seconds()
             
             restore_info = RestoreInfo(
@@ -419,10 +334,12 @@ class DatabaseBackupManager:
                 restored_records=total_restored,
                 restore_time=restore_time,
                 status="completed",
-                created_at=start_time
+                created_at=start_time,
+                metrics=progress.to_dict()
             )
             
-            logger.info(f"备份恢复成功: {backup_id}, 恢复 {total_restored} 条记录, 耗时 {restore_time:.2f} 秒")
+            logger.info(f"备份恢复成功: {backup_id}, 恢复 {total_restored} 条记录, 耗时 {restore_time:.2f} 秒, "
+                       f"速度 {progress.rows_per_second:.0f} 行/秒")
             return restore_info
             
         except Exception as e:
@@ -439,6 +356,80 @@ class DatabaseBackupManager:
             )
             return restore_info
     
+    def _get_restore_tables(self, available: List[str],
+                            target_tables: Optional[List[str]] = None) -> Dict[str, Any]:
+        """确定需要恢复的表"""
+        tables = {}
+        for table_name in target_tables or available:
+            if table_name not in available:
+                logger.warning(f"备份中不包含表: {table_name}")
+                continue
+            table = Base.metadata.tables.get(table_name)
+            if table is None:
+                logger.warning(f"不支持恢复表: {table_name}")
+                continue
+            tables[table_name] = table
+        return tables
+    
+    def _restore_streaming_backup(self, backup_file_path: Path,
+                                  target_tables: Optional[List[str]] = None,
+                                  progress_callback: Optional[Callable[[RestoreProgress], Any]] = None
+                                  ) -> RestoreProgress:
+        """按分块并行恢复流式备份"""
+        reader = StreamingBackupReader(backup_file_path)
+        index = reader.read_index()
+        tables = self._get_restore_tables(list(index.header["tables"].keys()), target_tables)
+        
+        for table_name in tables:
+            logger.info(f"恢复表 {table_name}: {index.table_counts.get(table_name, 0)} 条记录")
+        
+        restorer = ParallelChunkRestorer(
+            get_database_manager().engine, max_workers=self.config.restore_workers
+        )
+        return restorer.restore(reader, tables, progress_callback)
+    
+    def _restore_legacy_backup(self, backup_file_path: Path,
+                               target_tables: Optional[List[str]] = None,
+                               progress_callback: Optional[Callable[[RestoreProgress], Any]] = None
+                               ) -> RestoreProgress:
+        """恢复旧版单文件JSON备份：整体解析后逐表按分块并行写入
+        
+        progress_callback 收到的是当前表的恢复进度。
+        """
+        with open(backup_file_path, 'rb') as f:
+            raw_data = f.read()
+        try:
+            backup_json = gzip.decompress(raw_data).decode('utf-8')
+        except OSError:
+            # 如果解压缩失败，可能是未压缩的文件
+            backup_json = raw_data.decode('utf-8')
+        del raw_data
+        backup_data = json.loads(backup_json)
+        del backup_json
+        
+        tables = self._get_restore_tables(list(backup_data["tables"].keys()), target_tables)
+        restorer = ParallelChunkRestorer(
+            get_database_manager().engine, max_workers=self.config.restore_workers
+        )
+        progress = RestoreProgress()
+        start = time.monotonic()
+        
+        for table_name, table in tables.items():
+            records = backup_data["tables"][table_name]["records"]
+            logger.info(f"恢复表 {table_name}: {len(records)} 条记录")
+            
+            table_progress = restorer.restore_records(
+                table, records, describe_table_schema(table),
+                self.config.chunk_size, progress_callback
+            )
+            progress.chunks_total += table_progress.chunks_total
+            progress.chunks_done += table_progress.chunks_done
+            progress.rows_restored += table_progress.rows_restored
+            progress.table_rows[table_name] = table_progress.rows_restored
+        
+        progress.elapsed_seconds = time.monotonic() - start
+        return progress
+    
     async def verify_backup(self, backup_id: str) -> Dict[str, Any]:
         """验证备份完整性"""
         try:
@@ -467,6 +458,31 @@ class DatabaseBackupManager:
             # 校验和比较
             checksum_valid = current_checksum == original_checksum
             
+            # 流式备份：读取尾部索引并逐块重新计算数据校验和
+            if is_streaming_backup(backup_file_path):
+                reader = StreamingBackupReader(backup_file_path)
+                try:
+                    index = reader.read_index()
+                    structure_valid = reader.verify_data_checksum()
+                except Exception:
+                    index = None
+                    structure_valid = False
+
+                verification_result = {
+                    "status": "verified" if checksum_valid and structure_valid else "corrupted",
+                    "checksum_valid": checksum_valid,
+                    "structure_valid": structure_valid,
+                    "original_checksum": original_checksum,
+                    "current_checksum": current_checksum,
+                    "file_size_mb": backup_file_path.stat().st_size / (1024 * 1024),
+                    "verification_time": datetime.now().isoformat()
+                }
+                if index is not None:
+                    verification_result["tables_count"] = len(index.header.get("tables", {}))
+                    verification_result["total_records"] = index.total_records
+                    verification_result["chunk_count"] = len(index.chunks)
+                return verification_result
+
             # 尝试读取和解析备份文件
             try:
                 if self.compressor:
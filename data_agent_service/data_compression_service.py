@@ -9,19 +9,24 @@ import lzma
 import zlib
 import pickle
 import json
-from typing import Dict, Any, List, Optional, Union, Tuple
+from typing import Dict, Any, List, Optional, Union, Tuple, Callable
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 from enum import Enum
 import asyncio
+import time
 from pathlib import Path
 import os
-from sqlalchemy import text, and_, or_
+from sqlalchemy import text, and_, or_, select
 from sqlalchemy.orm import Session
 
 from .database_config import get_database_manager
 from .database_models import (
-    DataBackup, DataPartition, DataQualityMetrics, SystemMetrics
+    Base, DataBackup, DataPartition, DataQualityMetrics, SystemMetrics
+)
+from .backup_stream import (
+    StreamingBackupReader, StreamingBackupWriter, ParallelChunkRestorer, RestoreProgress,
+    describe_table_schema, is_streaming_backup
 )
 from .exception_handler import safe_execute
 
@@ -52,6 +57,9 @@ class CompressionConfig:
     archive_after_days: int = 30
     delete_after_days: int = 365
     max_compression_ratio: float = 0.8  # 最大压缩比
+    restore_workers: int = 4  # 归档并行恢复的工作线程数
+    restore_chunk_size: int = 10000  # 旧版归档恢复时每批写入的记录数
+    archive_chunk_size: int = 10000  # 归档时每个分块的记录数
 
 @dataclass
 class CompressionResult:
@@ -180,142 +188,170 @@ class DataArchiver:
         self.compressor = DataCompressor(config)
         
     async def archive_partition(self, table_name: str, partition_name: str) -> ArchiveInfo:
-        """归档分区数据"""
-        db_manager = get_database_manager()
+        """归档分区数据
+        
+        使用服务端游标分块读取分区数据，逐块写入流式归档文件（与流式备份格式相同），
+        峰值内存只与 archive_chunk_size 相关；恢复时可按分块并行写入。
+        """
+        if table_name not in ("market_data", "kline_data"):
+            raise ValueError(f"不支持的表名: {table_name}")
+        
+        table = Base.metadata.tables[table_name]
+        archive_filename = f"{table_name}_{partition_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.archive"
+        archive_file_path = self.archive_path / archive_filename
+        loop = asyncio.get_running_loop()
         
         try:
-            with db_manager.get_session() as session:
-                # 获取分区数据
-                if table_name == "market_data":
-                    query = session.query(MarketData).filter(
-                        MarketData.partition_key == partition_name
-                    )
-                elif table_name == "kline_data":
-                    query = session.query(KlineData).filter(
-                        KlineData.partition_key == partition_name
-                    )
-                else:
-                    raise ValueError(f"不支持的表名: {table_name}")
-                
-                # 获取记录数量
-                record_count = query.count()
-                
-                if record_count == 0:
-                    logger.warning(f"分区 {partition_name} 没有数据")
-                    return ArchiveInfo(
-                        table_name=table_name,
-                        partition_name=partition_name,
-                        record_count=0,
-                        original_size_mb=0.0,
-                        compressed_size_mb=0.0,
-                        compression_ratio=1.0,
-                        archive_date=datetime.now(),
-                        status=ArchiveStatus.ARCHIVED
-                    )
-                
-                # 导出数据
-                data_list = []
-                for record in query.all():
-                    data_dict = {
-                        column.name: getattr(record, column.name)
-                        for column in record.__table__.columns
-                    }
-                    # 处理日期时间字段
-                    for key, value in data_dict.items():
-                        if isinstance(value, datetime):
-                            data_dict[key] = value.isoformat()
-                    data_list.append(data_dict)
-                
-                # 序列化数据
-                json_data = json.dumps(data_list, ensure_ascii=False).encode('utf-8')
-                original_size = len(json_data)
-                
-                # 压缩数据
-                compression_result = self.compressor.compress_data(json_data)
-                
-                # 保存归档文件
-                archive_filename = f"{table_name}_{partition_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.archive"
-                archive_file_path = self.archive_path / archive_filename
-                
-                with open(archive_file_path, 'wb') as f:
-                    if compression_result.success:
-                        compressed_data = self.compressor._get_compressed_bytes(json_data)
-                        f.write(compressed_data)
-                    else:
-                        f.write(json_data)
-                
-                # 创建归档信息
-                archive_info = ArchiveInfo(
+            writer = await loop.run_in_executor(
+                None, self._write_partition_archive, table, partition_name, archive_file_path
+            )
+            record_count = writer.index.total_records
+            
+            if record_count == 0:
+                logger.warning(f"分区 {partition_name} 没有数据")
+                archive_file_path.unlink()
+                return ArchiveInfo(
                     table_name=table_name,
                     partition_name=partition_name,
-                    record_count=record_count,
-                    original_size_mb=original_size / (1024 * 1024),
-                    compressed_size_mb=compression_result.compressed_size / (1024 * 1024),
-                    compression_ratio=compression_result.compression_ratio,
+                    record_count=0,
+                    original_size_mb=0.0,
+                    compressed_size_mb=0.0,
+                    compression_ratio=1.0,
                     archive_date=datetime.now(),
-                    status=ArchiveStatus.ARCHIVED,
-                    file_path=str(archive_file_path)
+                    status=ArchiveStatus.ARCHIVED
                 )
-                
-                logger.info(f"分区 {partition_name} 归档完成: {record_count} 条记录, "
-                           f"压缩比 {compression_result.compression_ratio:.2%}")
-                
-                return archive_info
+            
+            original_size = writer.raw_bytes
+            compressed_size = archive_file_path.stat().st_size
+            compression_ratio = compressed_size / original_size if original_size else 1.0
+            
+            # 创建归档信息
+            archive_info = ArchiveInfo(
+                table_name=table_name,
+                partition_name=partition_name,
+                record_count=record_count,
+                original_size_mb=original_size / (1024 * 1024),
+                compressed_size_mb=compressed_size / (1024 * 1024),
+                compression_ratio=compression_ratio,
+                archive_date=datetime.now(),
+                status=ArchiveStatus.ARCHIVED,
+                file_path=str(archive_file_path)
+            )
+            
+            logger.info(f"分区 {partition_name} 归档完成: {record_count} 条记录, "
+                       f"压缩比 {compression_ratio:.2%}")
+            
+            return archive_info
                 
         except Exception as e:
             logger.error(f"归档分区 {partition_name} 失败: {e}")
+            if archive_file_path.exists():
+                archive_file_path.unlink()
             raise
     
-    async def restore_partition(self, archive_file_path: str, table_name: str) -> int:
-        """从归档文件恢复分区数据"""
+    def _partition_filter(self, table, partition_name: str):
+        """根据分区名构造查询条件
+        
+        分区名由 get_partition_name 生成: {表名}_p_{YYYYMMDD}[_{股票代码}]
+        """
+        prefix = f"{table.name}_p_"
+        if partition_name.startswith(prefix):
+            date_part, _, symbol = partition_name[len(prefix):].partition("_")
+            trade_date = datetime.strptime(date_part, "%Y%m%d").date()
+            conditions = [table.c.trade_date == trade_date]
+            if symbol:
+                conditions.append(table.c.symbol == symbol)
+            return and_(*conditions)
+        if "partition_key" in table.c:
+            return table.c.partition_key == partition_name
+        raise ValueError(f"无法识别的分区名: {partition_name}")
+    
+    def _write_partition_archive(self, table, partition_name: str,
+                                 archive_file_path: Path) -> StreamingBackupWriter:
+        """按分块流式写入分区归档文件"""
+        db_manager = get_database_manager()
+        chunk_size = self.config.archive_chunk_size
+        header = {
+            "archive_type": "partition",
+            "table_name": table.name,
+            "partition_name": partition_name,
+            "created_at": datetime.now().isoformat(),
+            "tables": {table.name: {"columns": describe_table_schema(table)}}
+        }
+        compression_level = (
+            self.config.compression_level
+            if self.config.enable_compression and self.config.algorithm != CompressionAlgorithm.NONE
+            else 0
+        )
+        
+        with StreamingBackupWriter(archive_file_path, header, compression_level) as writer:
+            with db_manager.engine.connect() as connection:
+                connection = connection.execution_options(
+                    stream_results=True, max_row_buffer=chunk_size
+                )
+                result = connection.execute(
+                    select(table).where(self._partition_filter(table, partition_name))
+                )
+                for rows in result.partitions(chunk_size):
+                    writer.write_chunk(table.name, rows)
+        return writer
+    
+    async def restore_partition(self, archive_file_path: str, table_name: str,
+                                progress_callback: Optional[Callable[[RestoreProgress], Any]] = None) -> int:
+        """从归档文件恢复分区数据
+        
+        流式格式的归档按分块并行写入；旧版JSON归档整体解析后同样按分块并行写入。
+        """
+        if table_name not in ("market_data", "kline_data"):
+            raise ValueError(f"不支持的表名: {table_name}")
+        
         db_manager = get_database_manager()
+        table = Base.metadata.tables[table_name]
+        restorer = ParallelChunkRestorer(db_manager.engine, max_workers=self.config.restore_workers)
+        loop = asyncio.get_running_loop()
         
         try:
-            # 读取归档文件
-            with open(archive_file_path, 'rb') as f:
-                compressed_data = f.read()
-            
-            # 解压缩数据
-            try:
-                json_data = self.compressor.decompress_data(compressed_data)
-            except:
-                # 如果解压缩失败，可能是未压缩的数据
-                json_data = compressed_data
-            
-            # 解析JSON数据
-            data_list = json.loads(json_data.decode('utf-8'))
+            if is_streaming_backup(Path(archive_file_path)):
+                progress = await loop.run_in_executor(
+                    None, restorer.restore,
+                    StreamingBackupReader(Path(archive_file_path)), {table_name: table}, progress_callback
+                )
+            else:
+                progress = await loop.run_in_executor(
+                    None, self._restore_legacy_archive, archive_file_path, table, restorer,
+                    progress_callback
+                )
             
-            # 恢复数据到数据库
-            with db_manager.get_session() as session:
-                restored_count = 0
-                
-                for data_dict in data_list:
-                    # 处理日期时间字段
-                    for key, value in data_dict.items():
-                        if isinstance(value, str) and 'T' in value:
-                            try:
-                                data_dict[key] = datetime.fromisoformat(value)
-                            except:
-                                pass
-                    
-                    if table_name == "market_data":
-                        record = MarketData(**data_dict)
-                    elif table_name == "kline_data":
-                        record = KlineData(**data_dict)
-                    else:
-                        raise ValueError(f"不支持的表名: {table_name}")
-                    
-                    session.add(record)
-                    restored_count += 1
-                
-                session.commit()
-                
-                logger.info(f"从归档文件恢复 {restored_count} 条记录")
-                return restored_count
+            logger.info(f"从归档文件恢复 {progress.rows_restored} 条记录, "
+                       f"耗时 {progress.elapsed_seconds:.2f} 秒, 速度 {progress.rows_per_second:.0f} 行/秒")
+            return progress.rows_restored
                 
         except Exception as e:
             logger.error(f"恢复归档文件 {archive_file_path} 失败: {e}")
             raise
+    
+    def _restore_legacy_archive(self, archive_file_path: str, table,
+                                restorer: ParallelChunkRestorer,
+                                progress_callback: Optional[Callable[[RestoreProgress], Any]] = None
+                                ) -> RestoreProgress:
+        """恢复旧版JSON数组归档（整体解压解析后按分块并行写入）"""
+        with open(archive_file_path, 'rb') as f:
+            compressed_data = f.read()
+        
+        # 解压缩数据
+        try:
+            json_data = self.compressor.decompress_data(compressed_data)
+        except Exception:
+            # 如果解压缩失败，可能是未压缩的数据
+            json_data = compressed_data
+        del compressed_data
+        
+        data_list = json.loads(json_data.decode('utf-8'))
+        del json_data
+        return restorer.restore_records(
+            table, data_list, describe_table_schema(table),
+            self.config.restore_chunk_size, progress_callback
+        )
 
 class DataCompressionService:
     """数据压缩和归档服务"""
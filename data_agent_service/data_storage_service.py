@@ -8,10 +8,10 @@
 import asyncio
 import logging
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Any, Optional, Union, Tuple
+from typing import List, Dict, Any, Optional, Union, Tuple, AsyncIterator
 from dataclasses import dataclass, asdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from sqlalchemy import and_, or_, func, text
+from sqlalchemy import and_, or_, func, text, select, tuple_, type_coerce, Float, Integer, Numeric, Date, DateTime
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 import pandas as pd
@@ -29,6 +29,10 @@ from .database_models import (
     DataStatus, DataQuality, validate_data_integrity
 )
 from .performance_optimizer import get_global_optimizer
+from .bulk_copy_loader import (
+    PostgresCopyLoader, CopyLoadConfig, CopyLoadProgress, ProgressCallback,
+    RowSource, iter_row_chunks, invoke_progress_callback
+)
 from .exception_handler import get_global_exception_handler, safe_execute
 
 logger = logging.getLogger(__name__)
@@ -62,6 +66,22 @@ class QueryOptions:
     include_deleted: bool = False
     cache_ttl: Optional[int] = 300  # 缓存TTL（秒）
 
+# 常用的OHLCV投影字段
+OHLCV_FIELDS = [
+    'symbol', 'timestamp', 'open_price', 'high_price',
+    'low_price', 'close_price', 'volume', 'amount'
+]
+
+# 投影查询支持的输出格式
+PROJECTION_OUTPUTS = ('records', 'dataframe', 'numpy')
+
+@dataclass
+class StreamOptions:
+    """流式查询选项"""
+    chunk_size: int = 10000         # 每页记录数
+    columnar: bool = False          # True时按列返回 {列名: [值, ...]}
+    include_deleted: bool = False
+
 class DataStorageService:
     """数据存储服务"""
     
@@ -77,6 +97,9 @@ class DataStorageService:
         self.max_retries = 3
         self.retry_delay = 1.0
         
+        # COPY高速加载配置
+        self.copy_config = CopyLoadConfig()
+        
         logger.info("数据存储服务已初始化")
     
     async def batch_insert_market_data(self, data_list: List[Dict[str, Any]]) -> BatchWriteResult:
@@ -87,6 +110,64 @@ class DataStorageService:
         """批量插入K线数据"""
         return await self._batch_insert_data(data_list, KlineData, "kline_data")
     
+    async def copy_load_kline_data(self, rows: RowSource,
+                                   progress_callback: Optional[ProgressCallback] = None,
+                                   config: Optional[CopyLoadConfig] = None) -> CopyLoadProgress:
+        """高速加载K线数据（PostgreSQL使用COPY，其他后端回退到批量插入）"""
+        return await self._copy_load_data(rows, KlineData, progress_callback, config)
+    
+    async def copy_load_market_data(self, rows: RowSource,
+                                    progress_callback: Optional[ProgressCallback] = None,
+                                    config: Optional[CopyLoadConfig] = None) -> CopyLoadProgress:
+        """高速加载市场数据（PostgreSQL使用COPY，其他后端回退到批量插入）"""
+        return await self._copy_load_data(rows, MarketData, progress_callback, config)
+    
+    async def _copy_load_data(self, rows: RowSource, model_class,
+                              progress_callback: Optional[ProgressCallback] = None,
+                              config: Optional[CopyLoadConfig] = None) -> CopyLoadProgress:
+        """通用高速加载方法"""
+        config = config or self.copy_config
+        table_name = model_class.__tablename__
+        
+        if PostgresCopyLoader.is_supported(self.db_manager.engine):
+            loader = PostgresCopyLoader(self.db_manager, self._preprocess_data, config)
+            progress = await loader.load(rows, model_class, progress_callback)
+        else:
+            progress = await self._fallback_bulk_load(rows, model_class, progress_callback, config)
+        
+        await self._record_performance_metrics(table_name, "copy_load", {
+            'record_count': progress.rows_merged,
+            'rejected_count': progress.rows_rejected,
+            'execution_time': progress.elapsed_seconds,
+            'rows_per_second': progress.rows_per_second
+        })
+        return progress
+    
+    async def _fallback_bulk_load(self, rows: RowSource, model_class,
+                                  progress_callback: Optional[ProgressCallback],
+                                  config: CopyLoadConfig) -> CopyLoadProgress:
+        """非PostgreSQL后端的分块批量插入回退路径"""
+        table_name = model_class.__tablename__
+        progress = CopyLoadProgress(table_name=table_name, method="bulk_insert")
+        start_time = datetime.now()
+        
+        logger.info(f"数据库不支持COPY，回退到批量插入 - 表: {table_name}")
+        
+        async for chunk in iter_row_chunks(rows, config.chunk_size):
+            batch_result = await self._batch_insert_data(chunk, model_class, table_name)
+            progress.chunks_loaded += 1
+            progress.rows_received += len(chunk)
+            progress.rows_copied += batch_result.success_count + batch_result.duplicate_count
+            progress.rows_merged += batch_result.success_count
+            progress.rows_rejected += batch_result.error_count
+            progress.elapsed_seconds = (datetime.now() - start_time).total_seconds()
+            if (progress_callback and config.progress_interval
+                    and progress.chunks_loaded % config.progress_interval == 0):
+                await invoke_progress_callback(progress_callback, progress)
+        
+        progress.elapsed_seconds = (datetime.now() - start_time).total_seconds()
+        return progress
+    
     async def _batch_insert_data(self, data_list: List[Dict[str, Any]], 
                                model_class, table_name: str) -> BatchWriteResult:
         """通用批量插入数据方法"""
@@ -269,8 +350,19 @@ class DataStorageService:
     @safe_execute
     async def query_kline_data(self, symbols: List[str] = None, 
                              period: str = None, start_date: date = None, 
-                             end_date: date = None, options: QueryOptions = None) -> List[Dict[str, Any]]:
-        """查询K线数据"""
+                             end_date: date = None, options: QueryOptions = None,
+                             fields: Optional[List[str]] = None,
+                             output: str = 'records') -> Union[List[Dict[str, Any]], pd.DataFrame, Dict[str, np.ndarray]]:
+        """查询K线数据
+        
+        指定 fields 或非 records 输出时走列投影路径：只查询所需列，不构建ORM实体，
+        output 可为 records（字典列表）、dataframe 或 numpy（列名到数组的字典）。
+        """
+        if fields is not None or output != 'records':
+            return await self._query_projection(
+                KlineData, fields or OHLCV_FIELDS, output,
+                symbols, start_date, end_date, options, period=period
+            )
         return await self._query_data(
             KlineData, symbols, start_date, end_date, options, period=period
         )
@@ -377,6 +469,148 @@ class DataStorageService:
             logger.error(f"查询数据错误: {e}")
             raise
     
+    async def _query_projection(self, model_class, fields: List[str], output: str,
+                                symbols: List[str] = None, start_date: date = None,
+                                end_date: date = None, options: QueryOptions = None,
+                                **kwargs) -> Union[List[Dict[str, Any]], pd.DataFrame, Dict[str, np.ndarray]]:
+        """列投影查询：使用Core select()仅读取指定列，直接由结果游标构建输出"""
+        if output not in PROJECTION_OUTPUTS:
+            raise ValueError(f"无效的输出格式: {output}，支持的格式: {list(PROJECTION_OUTPUTS)}")
+        
+        table = model_class.__table__
+        unknown = [name for name in fields if name not in table.c]
+        if unknown:
+            raise ValueError(f"未知的字段: {unknown}")
+        
+        if options is None:
+            options = QueryOptions()
+        
+        # 价格类Numeric列按float读取，避免逐值构造Decimal
+        selected = [
+            type_coerce(table.c[name], Float()).label(name)
+            if isinstance(table.c[name].type, Numeric) else table.c[name]
+            for name in fields
+        ]
+        stmt = select(*selected)
+        
+        if symbols:
+            stmt = stmt.where(table.c.symbol.in_(symbols))
+        if start_date:
+            stmt = stmt.where(table.c.trade_date >= start_date)
+        if end_date:
+            stmt = stmt.where(table.c.trade_date <= end_date)
+        if 'period' in table.c and kwargs.get('period'):
+            stmt = stmt.where(table.c.period == kwargs['period'])
+        if not options.include_deleted:
+            stmt = stmt.where(table.c.status != DataStatus.DELETED.value)
+        
+        if options.order_by and options.order_by in table.c:
+            order_column = table.c[options.order_by]
+            stmt = stmt.order_by(order_column.desc() if options.order_desc else order_column)
+        elif 'timestamp' in table.c:
+            stmt = stmt.order_by(table.c.symbol, table.c.timestamp)
+        
+        if options.limit:
+            stmt = stmt.limit(options.limit)
+        if options.offset:
+            stmt = stmt.offset(options.offset)
+        
+        start_time = datetime.now()
+        loop = asyncio.get_running_loop()
+        rows = await loop.run_in_executor(self.executor, self._fetch_rows, stmt)
+        
+        if output == 'dataframe':
+            data = pd.DataFrame.from_records(rows, columns=fields)
+        elif output == 'numpy':
+            columns = list(zip(*rows)) if rows else [()] * len(fields)
+            data = {
+                name: _to_numpy_column(values, table.c[name].type)
+                for name, values in zip(fields, columns)
+            }
+        else:
+            data = [
+                {name: _serialize_value(value) for name, value in zip(fields, row)}
+                for row in rows
+            ]
+        
+        execution_time = (datetime.now() - start_time).total_seconds()
+        logger.info(f"投影查询完成 - 表: {model_class.__tablename__}, 字段: {len(fields)}, "
+                   f"记录数: {len(rows)}, 耗时: {execution_time:.2f}s")
+        
+        return data
+    
+    async def stream_kline_data(self, symbols: List[str] = None, period: str = None,
+                                start_date: date = None, end_date: date = None,
+                                options: StreamOptions = None
+                                ) -> AsyncIterator[Union[List[Dict[str, Any]], Dict[str, List[Any]]]]:
+        """流式查询K线数据
+        
+        基于 (symbol, period, timestamp) 的键集分页（命中 idx_kline_symbol_period_time），
+        每次只取一页并立即产出，深分页不会随偏移量线性退化，内存占用与总行数无关。
+        """
+        if options is None:
+            options = StreamOptions()
+        
+        table = KlineData.__table__
+        key_columns = (table.c.symbol, table.c.period, table.c.timestamp)
+        
+        conditions = []
+        if symbols:
+            conditions.append(table.c.symbol.in_(symbols))
+        if period:
+            conditions.append(table.c.period == period)
+        if start_date:
+            conditions.append(table.c.trade_date >= start_date)
+        if end_date:
+            conditions.append(table.c.trade_date <= end_date)
+        if not options.include_deleted:
+            conditions.append(table.c.status != DataStatus.DELETED.value)
+        
+        column_names = [column.name for column in table.columns]
+        loop = asyncio.get_running_loop()
+        last_key: Optional[Tuple[Any, ...]] = None
+        start_time = datetime.now()
+        total_count = 0
+        
+        while True:
+            page_conditions = list(conditions)
+            if last_key is not None:
+                page_conditions.append(tuple_(*key_columns) > tuple_(*last_key))
+            
+            stmt = select(table).order_by(*key_columns).limit(options.chunk_size)
+            if page_conditions:
+                stmt = stmt.where(and_(*page_conditions))
+            
+            rows = await loop.run_in_executor(self.executor, self._fetch_rows, stmt)
+            if not rows:
+                break
+            
+            last = rows[-1]._mapping
+            last_key = (last['symbol'], last['period'], last['timestamp'])
+            total_count += len(rows)
+            
+            if options.columnar:
+                yield {
+                    name: [_serialize_value(value) for value in values]
+                    for name, values in zip(column_names, zip(*rows))
+                }
+            else:
+                yield [
+                    {name: _serialize_value(value) for name, value in zip(column_names, row)}
+                    for row in rows
+                ]
+            
+            if len(rows) < options.chunk_size:
+                break
+        
+        execution_time = (datetime.now() - start_time).total_seconds()
+        logger.info(f"流式查询完成 - 表: kline_data, 记录数: {total_count}, 耗时: {execution_time:.2f}s")
+    
+    def _fetch_rows(self, stmt) -> List[Any]:
+        """执行Core查询并返回行元组（在线程池中运行）"""
+        with self.db_manager.get_session() as session:
+            return session.execute(stmt).all()
+    
     def _build_cache_key(self, table_name: str, symbols: List[str] = None,
                         start_date: date = None, end_date: date = None,
                         options: QueryOptions = None, **kwargs) -> str:
@@ -637,6 +871,26 @@ class DataStorageService:
             self.executor.shutdown(wait=True)
         logger.info("数据存储服务已关闭")
 
+def _serialize_value(value: Any) -> Any:
+    """将数据库值转换为可JSON序列化的值"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _to_numpy_column(values: Tuple[Any, ...], column_type) -> np.ndarray:
+    """按列类型将查询结果列转换为NumPy数组"""
+    if isinstance(column_type, (Numeric, Float)):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if isinstance(column_type, Integer):
+        return np.array([0 if v is None else v for v in values], dtype=np.int64)
+    if isinstance(column_type, DateTime):
+        return np.array(values, dtype='datetime64[ns]')
+    if isinstance(column_type, Date):
+        return np.array(values, dtype='datetime64[D]')
+    return np.array(values, dtype=object)
+
 # 全局数据存储服务实例
 _storage_service: Optional[DataStorageService] = None
 
@@ -15,6 +15,16 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# WebSocket 传输压缩参数（permessage-deflate 由 uvicorn 在握手时协商），
+# src.argus_mcp 不可用时使用 uvicorn 默认值
+try:
+    from src.argus_mcp.websocket_compression import uvicorn_websocket_options
+    from src.argus_mcp.websocket_models import WebSocketConfig
+    websocket_options = uvicorn_websocket_options(WebSocketConfig())
+except ImportError as e:
+    logger.warning(f"无法加载WebSocket压缩配置，使用uvicorn默认值: {e}")
+    websocket_options = {}
+
 # 创建FastAPI应用实例
 app = FastAPI(
     title="Data Agent Service",
@@ -80,7 +90,8 @@ def main():
             port=8001,
             log_level="info",
             access_log=True,
-            reload=False
+            reload=False,
+            **websocket_options
         )
         
     except Exception as e:
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+xtquant连接池的对冲请求、自适应并发限制与优先级排队测试
+
+上游调用由模拟xtdata后端提供，延迟与卡顿通过 SimulationConfig 注入。
+"""
+
+import asyncio
+import itertools
+import time
+
+import pytest
+
+from .xtdata_simulator import SimulatedXtData, SimulationConfig, install_simulated_xtquant
+
+# 连接池模块导入时需要 xtquant.xtdata
+install_simulated_xtquant(SimulationConfig(symbol_count=50, latency_median_ms=0.0))
+
+from .xtquant_connection_pool import (  # noqa: E402
+    AdaptiveConcurrencyLimiter, ConnectionPriority, HedgingConfig, XtQuantConnectionPool
+)
+
+CODE = "600000.SH"
+STALL_MS = 500.0
+
+
+def _simulator(latency_ms: float, stall_probability: float = 0.0) -> SimulatedXtData:
+    return SimulatedXtData(SimulationConfig(
+        symbol_count=50, latency_median_ms=latency_ms, latency_sigma=0.05,
+        stall_probability=stall_probability, stall_ms=STALL_MS
+    ))
+
+
+def _scripted(*simulators: SimulatedXtData):
+    """第N次调用使用第N个模拟后端（超出后使用最后一个），并记录调用次数"""
+    calls = itertools.count()
+
+    def request(codes):
+        request.calls += 1
+        simulator = simulators[min(next(calls), len(simulators) - 1)]
+        return simulator.get_full_tick(codes)
+
+    request.calls = 0
+    return request
+
+
+@pytest.fixture
+def pool():
+    pool = XtQuantConnectionPool(
+        min_connections=2, max_connections=2,
+        hedging=HedgingConfig(enabled=True, min_samples=20, max_hedge_ratio=1.0, min_delay=0.001)
+    )
+    yield pool
+    pool.shutdown()
+
+
+async def _prime(pool: XtQuantConnectionPool, samples: int = 20):
+    """积累延迟样本，使对冲等待时间可用"""
+    fast = _simulator(5.0)
+    for _ in range(samples):
+        await pool.execute_async(fast.get_full_tick, [CODE], idempotent=True)
+
+
+def test_hedge_fires_after_p95_delay_and_takes_first_answer(pool):
+    async def run():
+        await _prime(pool)
+        assert pool._hedge_stats["hedged"] == 0
+        delay = pool._get_hedge_delay()
+        assert delay is not None and delay < STALL_MS / 1000
+
+        # 主请求卡顿，对冲请求正常返回
+        request = _scripted(_simulator(5.0, stall_probability=1.0), _simulator(5.0))
+        started = time.monotonic()
+        result = await pool.execute_async(request, [CODE], idempotent=True)
+        elapsed = time.monotonic() - started
+        return delay, elapsed, result, request.calls
+
+    delay, elapsed, result, calls = asyncio.run(run())
+
+    assert CODE in result
+    assert calls == 2
+    assert delay <= elapsed < STALL_MS / 1000
+    assert pool._hedge_stats["hedged"] == 1
+    assert pool._hedge_stats["hedge_wins"] == 1
+
+
+def test_non_idempotent_calls_are_never_hedged(pool):
+    async def run():
+        await _prime(pool)
+        request = _scripted(_simulator(5.0, stall_probability=1.0), _simulator(5.0))
+        started = time.monotonic()
+        result = await pool.execute_async(request, [CODE])
+        return time.monotonic() - started, result, request.calls
+
+    elapsed, result, calls = asyncio.run(run())
+
+    assert CODE in result
+    assert calls == 1
+    assert elapsed >= STALL_MS / 1000
+    assert pool._hedge_stats["hedged"] == 0
+
+
+def _drive(limiter: AdaptiveConcurrencyLimiter, simulator: SimulatedXtData, windows: int):
+    """每轮占满限额后逐个完成上游调用，按实测延迟归还名额"""
+    for _ in range(windows):
+        permits = limiter.limit
+        for _ in range(permits):
+            limiter.acquire(timeout=1.0)
+        for _ in range(permits):
+            started = time.monotonic()
+            simulator.get_full_tick([CODE])
+            limiter.release(time.monotonic() - started)
+
+
+def test_limiter_shrinks_under_rising_latency_and_recovers():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, max_limit=32)
+    simulator = _simulator(1.0)
+
+    _drive(limiter, simulator, 10)
+    steady = limiter.limit
+
+    simulator.config.latency_median_ms = 10.0
+    _drive(limiter, simulator, 10)
+    congested = limiter.limit
+
+    simulator.config.latency_median_ms = 1.0
+    _drive(limiter, simulator, 10)
+    recovered = limiter.limit
+
+    assert steady > 8
+    assert congested <= steady / 2
+    assert recovered > congested
+    assert limiter.in_flight == 0
+
+
+@pytest.fixture
+def saturated_pool():
+    pool = XtQuantConnectionPool(min_connections=2, max_connections=2, max_requests_per_connection=2)
+    yield pool
+    pool.shutdown()
+
+
+class _Contention:
+    """占满连接池全部名额，之后按需逐个交还"""
+
+    def __init__(self, pool: XtQuantConnectionPool):
+        self.pool = pool
+        self.served = []
+        self._holders = []
+        self._tasks = []
+
+    def capacity(self) -> int:
+        return self.pool.max_connections * self.pool.max_requests_per_connection
+
+    def leases(self) -> int:
+        return sum(self.pool._leases.values())
+
+    async def saturate(self):
+        for _ in range(self.capacity()):
+            self._tasks.append(asyncio.create_task(self._hold(None, ConnectionPriority.NORMAL, 1.0)))
+        await _until(lambda: self.leases() == self.capacity())
+
+    async def enqueue(self, name: str, priority: ConnectionPriority, timeout: float = 2.0) -> asyncio.Task:
+        """排队一个等待者，确认已进入对应优先级队列后返回"""
+        lane = self.pool._waiters[priority]
+        queued = len(lane)
+        task = asyncio.create_task(self._hold(name, priority, timeout))
+        self._tasks.append(task)
+        await _until(lambda: len(lane) == queued + 1)
+        return task
+
+    async def release_one(self):
+        served = len(self.served)
+        self._holders.pop(0).set()
+        await _until(lambda: len(self.served) > served or not any(self.pool._waiters.values()))
+
+    async def release_all(self):
+        while self._holders:
+            self._holders.pop(0).set()
+            await asyncio.sleep(0)
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _hold(self, name, priority, timeout):
+        release = asyncio.Event()
+        async with self.pool.acquire(timeout=timeout, priority=priority):
+            if name is not None:
+                self.served.append(name)
+            self._holders.append(release)
+            await release.wait()
+
+
+async def _until(condition, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "等待超时"
+        await asyncio.sleep(0.001)
+
+
+def test_high_priority_is_served_before_earlier_low(saturated_pool):
+    async def run():
+        contention = _Contention(saturated_pool)
+        await contention.saturate()
+        await contention.enqueue("low", ConnectionPriority.LOW)
+        await contention.enqueue("normal", ConnectionPriority.NORMAL)
+        await contention.enqueue("high", ConnectionPriority.HIGH)
+
+        for _ in range(3):
+            await contention.release_one()
+        assert contention.leases() == contention.capacity()
+        await contention.release_all()
+        return contention
+
+    contention = asyncio.run(run())
+
+    assert contention.served == ["high", "normal", "low"]
+    assert contention.leases() == 0
+
+
+def test_same_priority_waiters_are_served_fifo(saturated_pool):
+    async def run():
+        contention = _Contention(saturated_pool)
+        await contention.saturate()
+        names = [f"normal-{i}" for i in range(6)]
+        for name in names:
+            await contention.enqueue(name, ConnectionPriority.NORMAL)
+        # 后到的高优先级插到同级队列之前，但不打乱普通队列的顺序
+        await contention.enqueue("high", ConnectionPriority.HIGH)
+
+        for _ in range(len(names) + 1):
+            await contention.release_one()
+        await contention.release_all()
+        return contention, names
+
+    contention, names = asyncio.run(run())
+
+    assert contention.served == ["high"] + names
+    assert contention.leases() == 0
+
+
+def test_timed_out_waiter_leaves_its_lane_without_leaking_a_lease(saturated_pool):
+    async def run():
+        contention = _Contention(saturated_pool)
+        await contention.saturate()
+        survivor = await contention.enqueue("normal", ConnectionPriority.NORMAL)
+        expired = await contention.enqueue("low", ConnectionPriority.LOW, timeout=0.05)
+
+        with pytest.raises(TimeoutError):
+            await expired
+        assert list(saturated_pool._waiters[ConnectionPriority.LOW]) == []
+        assert len(saturated_pool._waiters[ConnectionPriority.NORMAL]) == 1
+        assert contention.leases() == contention.capacity()
+
+        # 交还的名额给仍在等待的请求，而不是已超时的请求
+        await contention.release_one()
+        assert contention.served == ["normal"]
+        assert contention.leases() == contention.capacity()
+        await contention.release_all()
+        assert survivor.done() and survivor.exception() is None
+        return contention
+
+    contention = asyncio.run(run())
+
+    assert contention.leases() == 0
+    assert not any(saturated_pool._waiters.values())
+    assert saturated_pool._wait_histograms[ConnectionPriority.LOW].timeouts == 1
@@ -0,0 +1,847 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模拟xtdata后端
+
+纯Python实现的 xtquant.xtdata 替身，用于在没有QMT客户端的环境（Linux、CI）
+中运行基准测试和负载测试。行情由种子确定性生成：同一配置下同一股票、同一
+周期、同一时间段的K线在任何进程中都完全一致，日线与分钟线相互对齐。
+
+支持按配置注入调用延迟（对数正态分布 + 偶发卡顿）和错误率，并通过后台
+线程驱动 subscribe_quote / subscribe_whole_quote 回调。
+
+通过环境变量 XTQUANT_BACKEND=simulated 选择，或直接调用
+install_simulated_xtquant() 将其注册为 xtquant.xtdata。
+"""
+
+import logging
+import math
+import os
+import random
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# A股交易时段：每日240根1分钟K线，按bar结束时间标注
+_SESSION_MINUTES = 240
+_MINUTE_LABELS = np.concatenate([
+    np.arange(9 * 60 + 31, 11 * 60 + 31),
+    np.arange(13 * 60 + 1, 15 * 60 + 1),
+])
+_SESSION_OPEN_SECONDS = 9 * 3600 + 30 * 60
+
+# 交易日历范围（仅排除周末）
+_CALENDAR_START = np.datetime64("2010-01-04")
+_CALENDAR_END = np.datetime64("2035-12-31")
+_TRADING_DAYS = np.arange(_CALENDAR_START, _CALENDAR_END + 1, dtype="datetime64[D]")
+_TRADING_DAYS = _TRADING_DAYS[np.is_busday(_TRADING_DAYS)]
+_FIRST_YEAR = int(str(_CALENDAR_START)[:4])
+_LAST_YEAR = int(str(_CALENDAR_END)[:4])
+
+# 北京时间相对UTC的偏移（毫秒），xtquant的time字段为北京时间对应的UTC毫秒
+_BEIJING_OFFSET_MS = 8 * 3600 * 1000
+
+_INTRADAY_SPANS = {"1m": 1, "5m": 5, "15m": 15, "30m": 30, "1h": 60, "2h": 120, "4h": 240}
+_KLINE_FIELDS = [
+    "time", "open", "high", "low", "close", "volume", "amount",
+    "settelementPrice", "openInterest", "preClose", "suspendFlag",
+]
+_TICK_DTYPE = np.dtype([
+    ("time", "i8"), ("lastPrice", "f8"), ("open", "f8"), ("high", "f8"), ("low", "f8"),
+    ("lastClose", "f8"), ("amount", "f8"), ("volume", "i8"), ("pvolume", "i8"),
+    ("stockStatus", "i4"), ("openInt", "i4"), ("lastSettlementPrice", "f8"),
+    ("askPrice", "f8", (5,)), ("bidPrice", "f8", (5,)),
+    ("askVol", "i8", (5,)), ("bidVol", "i8", (5,)), ("transactionNum", "i8"),
+])
+
+# 代码段：(交易所, 起始代码, 板块)
+_CODE_BLOCKS = (
+    ("SH", 600000, "上证A股"),
+    ("SZ", 1, "深证A股"),
+    ("SZ", 300001, "创业板"),
+    ("SH", 688001, "科创板"),
+    ("SZ", 2001, "深证A股"),
+    ("SH", 601000, "上证A股"),
+)
+_INDEX_CODES = {
+    "000001.SH": "上证指数",
+    "399001.SZ": "深证成指",
+    "399006.SZ": "创业板指",
+    "000300.SH": "沪深300",
+    "000905.SH": "中证500",
+}
+_NAME_PREFIXES = "华中东南西北新金海天长恒宏国信安远鑫盛泰"
+_NAME_SUFFIXES = ("科技", "银行", "证券", "医药", "电子", "能源", "地产", "汽车", "食品", "材料", "传媒", "电气")
+
+
+@dataclass
+class SimulationConfig:
+    """模拟后端配置"""
+    seed: int = 20240101
+    symbol_count: int = 5000            # 模拟的A股数量（不含指数）
+    latency_median_ms: float = 2.0      # 调用延迟中位数（对数正态）
+    latency_sigma: float = 0.5          # 对数正态分布的sigma
+    stall_probability: float = 0.0      # 偶发卡顿概率
+    stall_ms: float = 1000.0            # 卡顿时长
+    error_rate: float = 0.0             # 调用失败概率
+    push_interval: float = 3.0          # 订阅回调推送间隔（秒），与交易所快照频率一致
+    replay_when_closed: bool = True     # 非交易时段循环回放最近一个交易日
+
+    @classmethod
+    def from_env(cls) -> "SimulationConfig":
+        """从环境变量读取配置"""
+        defaults = cls()
+        return cls(
+            seed=int(os.getenv("XTQUANT_SIM_SEED", str(defaults.seed))),
+            symbol_count=int(os.getenv("XTQUANT_SIM_SYMBOLS", str(defaults.symbol_count))),
+            latency_median_ms=float(os.getenv("XTQUANT_SIM_LATENCY_MS", str(defaults.latency_median_ms))),
+            latency_sigma=float(os.getenv("XTQUANT_SIM_LATENCY_SIGMA", str(defaults.latency_sigma))),
+            stall_probability=float(os.getenv("XTQUANT_SIM_STALL_RATE", str(defaults.stall_probability))),
+            stall_ms=float(os.getenv("XTQUANT_SIM_STALL_MS", str(defaults.stall_ms))),
+            error_rate=float(os.getenv("XTQUANT_SIM_ERROR_RATE", str(defaults.error_rate))),
+            push_interval=float(os.getenv("XTQUANT_SIM_PUSH_INTERVAL", str(defaults.push_interval))),
+            replay_when_closed=os.getenv("XTQUANT_SIM_REPLAY", "true").lower() == "true",
+        )
+
+
+@dataclass
+class _Subscription:
+    """行情订阅"""
+    seq: int
+    codes: List[str]
+    period: str
+    callback: Optional[Callable[[Dict[str, Any]], None]]
+    whole_quote: bool = False
+
+
+def _parse_time(value: str, end_of_day: bool = False) -> Optional[datetime]:
+    """解析xtquant格式的时间参数（YYYYMMDD 或 YYYYMMDDHHMMSS）"""
+    if not value:
+        return None
+    value = str(value)
+    if len(value) >= 14:
+        return datetime.strptime(value[:14], "%Y%m%d%H%M%S")
+    parsed = datetime.strptime(value[:8], "%Y%m%d")
+    return parsed.replace(hour=23, minute=59, second=59) if end_of_day else parsed
+
+
+class SimulatedXtData:
+    """确定性的模拟xtdata实现"""
+
+    def __init__(self, config: Optional[SimulationConfig] = None):
+        self.config = config or SimulationConfig()
+        self._latency_rng = random.Random(self.config.seed)
+        self._latency_lock = threading.Lock()
+
+        self._symbols, self._sectors = self._build_universe()
+        self._symbol_index = {code: i for i, code in enumerate(self._symbols)}
+
+        self._subscriptions: Dict[int, _Subscription] = {}
+        self._subscription_lock = threading.Lock()
+        self._next_seq = 1
+        self._push_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+
+        self.stats = {"calls": 0, "errors": 0, "stalls": 0, "callbacks": 0}
+
+        # 按实例缓存生成结果
+        self._symbol_profile = lru_cache(maxsize=None)(self._symbol_profile_uncached)
+        self._year_anchors = lru_cache(maxsize=None)(self._year_anchors_uncached)
+        self._year_path = lru_cache(maxsize=20000)(self._year_path_uncached)
+        self._day_minutes = lru_cache(maxsize=8192)(self._day_minutes_uncached)
+        self._day_prefix = lru_cache(maxsize=8192)(self._day_prefix_uncached)
+
+    # ------------------------------------------------------------------
+    # 证券池
+    # ------------------------------------------------------------------
+
+    def _build_universe(self) -> Tuple[List[str], Dict[str, List[str]]]:
+        """生成股票代码与板块成分"""
+        symbols: List[str] = []
+        sectors: Dict[str, List[str]] = {"沪深A股": [], "上证A股": [], "深证A股": [], "创业板": [], "科创板": []}
+        per_block = math.ceil(self.config.symbol_count / len(_CODE_BLOCKS))
+        for exchange, start, sector in _CODE_BLOCKS:
+            for offset in range(per_block):
+                if len(symbols) >= self.config.symbol_count:
+                    break
+                code = f"{start + offset:06d}.{exchange}"
+                symbols.append(code)
+                sectors[sector].append(code)
+                sectors["沪深A股"].append(code)
+        sectors["沪深300"] = symbols[:300]
+        sectors["中证500"] = symbols[300:800]
+        sectors["指数"] = list(_INDEX_CODES)
+        return symbols + list(_INDEX_CODES), sectors
+
+    def _symbol_id(self, code: str) -> int:
+        index = self._symbol_index.get(code)
+        if index is None:
+            raise ValueError(f"未知的证券代码: {code}")
+        return index
+
+    def _symbol_profile_uncached(self, symbol_id: int) -> Tuple[float, float, float]:
+        """(基准价格, 日波动率, 日均成交量手数)"""
+        rng = np.random.default_rng([self.config.seed, symbol_id, 0])
+        base_price = float(np.exp(rng.uniform(math.log(3.0), math.log(300.0))))
+        daily_vol = float(rng.uniform(0.012, 0.035))
+        avg_volume = float(np.exp(rng.uniform(math.log(2e4), math.log(2e6))))
+        if self._symbols[symbol_id] in _INDEX_CODES:
+            base_price, daily_vol, avg_volume = 3000.0, 0.01, 3e8
+        return base_price, daily_vol, avg_volume
+
+    # ------------------------------------------------------------------
+    # 价格路径生成
+    # ------------------------------------------------------------------
+
+    def _year_anchors_uncached(self, symbol_id: int) -> np.ndarray:
+        """每年第一个交易日开盘前的对数价格"""
+        base_price, daily_vol, _ = self._symbol_profile(symbol_id)
+        years = _LAST_YEAR - _FIRST_YEAR + 2
+        rng = np.random.default_rng([self.config.seed, symbol_id, 1])
+        returns = rng.normal(0.0, daily_vol * math.sqrt(250) * 0.6, years)
+        anchors = np.empty(years)
+        anchors[0] = log_base = math.log(base_price)
+        for i in range(1, years):
+            # 年度收益带均值回归，避免长期漂移到不现实的价格
+            anchors[i] = anchors[i - 1] + returns[i] - 0.3 * (anchors[i - 1] - log_base)
+        return anchors
+
+    def _year_path_uncached(self, symbol_id: int, year: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """一年内每个交易日的 (开, 高, 低, 收, 成交量)，收盘价为布朗桥"""
+        anchors = self._year_anchors(symbol_id)
+        start_log = float(anchors[year - _FIRST_YEAR])
+        end_log = float(anchors[year - _FIRST_YEAR + 1])
+        _, daily_vol, avg_volume = self._symbol_profile(symbol_id)
+
+        year_days = self._year_days(year)
+        n = len(year_days)
+        rng = np.random.default_rng([self.config.seed, symbol_id, 2, year])
+        walk = np.cumsum(rng.normal(0.0, daily_vol, n))
+        steps = np.arange(1, n + 1) / n
+        closes = np.exp(start_log + walk - steps * walk[-1] + steps * (end_log - start_log))
+
+        previous = np.concatenate(([math.exp(start_log)], closes[:-1]))
+        opens = previous * np.exp(rng.normal(0.0, daily_vol * 0.3, n))
+        body_high = np.maximum(opens, closes)
+        body_low = np.minimum(opens, closes)
+        highs = body_high * np.exp(np.abs(rng.normal(0.0, daily_vol * 0.5, n)))
+        lows = body_low * np.exp(-np.abs(rng.normal(0.0, daily_vol * 0.5, n)))
+        volumes = np.round(avg_volume * np.exp(rng.normal(0.0, 0.35, n)))
+        return opens, highs, lows, closes, volumes
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _year_days(year: int) -> np.ndarray:
+        start = np.datetime64(f"{year}-01-01")
+        end = np.datetime64(f"{year + 1}-01-01")
+        return _TRADING_DAYS[(_TRADING_DAYS >= start) & (_TRADING_DAYS < end)]
+
+    def _daily_bars(self, symbol_id: int, day_indices: np.ndarray) -> Dict[str, np.ndarray]:
+        """指定交易日序号的日线数据"""
+        days = _TRADING_DAYS[day_indices]
+        years = days.astype("datetime64[Y]").astype(int) + 1970
+        columns = {name: np.empty(len(days)) for name in ("open", "high", "low", "close", "volume")}
+        for year in np.unique(years):
+            mask = years == year
+            year_days = self._year_days(int(year))
+            positions = np.searchsorted(year_days, days[mask])
+            opens, highs, lows, closes, volumes = self._year_path(symbol_id, int(year))
+            columns["open"][mask] = opens[positions]
+            columns["high"][mask] = highs[positions]
+            columns["low"][mask] = lows[positions]
+            columns["close"][mask] = closes[positions]
+            columns["volume"][mask] = volumes[positions]
+        columns["amount"] = columns["volume"] * 100 * (columns["open"] + columns["close"]) / 2
+        return columns
+
+    def _day_minutes_uncached(self, symbol_id: int, day_index: int) -> Dict[str, np.ndarray]:
+        """某交易日240根1分钟K线，与当日日线的开高低收量完全对齐"""
+        day = self._daily_bars(symbol_id, np.array([day_index]))
+        day_open, day_high, day_low, day_close, day_volume = (
+            float(day[k][0]) for k in ("open", "high", "low", "close", "volume")
+        )
+        _, daily_vol, _ = self._symbol_profile(symbol_id)
+        rng = np.random.default_rng([self.config.seed, symbol_id, 3, day_index])
+
+        minute_vol = daily_vol / math.sqrt(_SESSION_MINUTES)
+        walk = np.cumsum(rng.normal(0.0, minute_vol, _SESSION_MINUTES))
+        steps = np.arange(1, _SESSION_MINUTES + 1) / _SESSION_MINUTES
+        target = math.log(day_close / day_open)
+        closes = day_open * np.exp(walk - steps * walk[-1] + steps * target)
+        opens = np.concatenate(([day_open], closes[:-1]))
+
+        highs = np.maximum(opens, closes) * np.exp(np.abs(rng.normal(0.0, minute_vol * 0.5, _SESSION_MINUTES)))
+        lows = np.minimum(opens, closes) * np.exp(-np.abs(rng.normal(0.0, minute_vol * 0.5, _SESSION_MINUTES)))
+        # 将分钟价格限制在日内高低点之间，并保证高低点各被触及一次
+        closes = np.clip(closes, day_low, day_high)
+        opens = np.clip(opens, day_low, day_high)
+        highs = np.clip(highs, day_low, day_high)
+        lows = np.clip(lows, day_low, day_high)
+        highs[int(rng.integers(_SESSION_MINUTES))] = day_high
+        lows[int(rng.integers(_SESSION_MINUTES))] = day_low
+        highs = np.maximum.reduce([highs, opens, closes])
+        lows = np.minimum.reduce([lows, opens, closes])
+
+        # 成交量呈U型分布，总量与日线一致
+        t = np.linspace(-1.0, 1.0, _SESSION_MINUTES)
+        profile = (1.0 + 2.0 * t ** 2) * np.exp(rng.normal(0.0, 0.3, _SESSION_MINUTES))
+        volumes = np.floor(day_volume * profile / profile.sum())
+        volumes[-1] += day_volume - volumes.sum()
+        amounts = volumes * 100 * (opens + closes) / 2
+
+        return {"open": opens, "high": highs, "low": lows, "close": closes, "volume": volumes, "amount": amounts}
+
+    # ------------------------------------------------------------------
+    # 时间与周期
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _day_index(day: np.datetime64, side: str = "right") -> int:
+        """日期对应的交易日序号（side=right时返回不晚于该日的最后一个交易日）"""
+        position = int(np.searchsorted(_TRADING_DAYS, day, side=side))
+        return position - 1 if side == "right" else position
+
+    def _session_clock(self) -> Tuple[int, int]:
+        """当前模拟时钟：(交易日序号, 已开盘分钟数 0..240)"""
+        now = datetime.now()
+        today = np.datetime64(now.date())
+        day_index = self._day_index(today)
+        seconds = now.hour * 3600 + now.minute * 60 + now.second
+        in_session = bool(np.is_busday(today)) and (
+            9 * 3600 + 30 * 60 <= seconds < 11 * 3600 + 30 * 60 or 13 * 3600 <= seconds < 15 * 3600
+        )
+        if in_session:
+            elapsed = seconds - _SESSION_OPEN_SECONDS
+            if seconds >= 13 * 3600:
+                elapsed -= 90 * 60
+            return day_index, elapsed // 60
+        if self.config.replay_when_closed:
+            return day_index, int(time.time() // 60) % _SESSION_MINUTES
+        return day_index, _SESSION_MINUTES
+
+    def _day_window(self, start_time: str, end_time: str, count: int, bars_per_day: float) -> np.ndarray:
+        """解析请求覆盖的交易日序号"""
+        end = _parse_time(end_time, end_of_day=True)
+        end_index = self._day_index(np.datetime64(end.date())) if end else self._session_clock()[0]
+        start = _parse_time(start_time)
+        if start is not None:
+            start_index = self._day_index(np.datetime64(start.date()), side="left")
+        elif count and count > 0:
+            start_index = end_index - int(math.ceil(count / bars_per_day)) + 1
+        else:
+            start_index = end_index - 249
+        start_index = max(start_index, 0)
+        if end_index < start_index:
+            return np.empty(0, dtype=np.int64)
+        return np.arange(start_index, end_index + 1)
+
+    def _kline_frame(self, code: str, period: str, start_time: str, end_time: str, count: int) -> pd.DataFrame:
+        """生成单只股票的K线（index为xtquant格式的时间字符串）"""
+        labels, columns = self._kline_arrays(code, period, start_time, end_time, count)
+        return pd.DataFrame(columns, index=self._format_labels(labels, period))
+
+    @staticmethod
+    def _format_labels(labels: np.ndarray, period: str) -> pd.Index:
+        fmt = "%Y%m%d" if period in ("1d", "1w", "1M", "1mon") else "%Y%m%d%H%M%S"
+        return pd.DatetimeIndex(labels.astype("datetime64[ns]")).strftime(fmt)
+
+    def _kline_arrays(self, code: str, period: str, start_time: str, end_time: str,
+                      count: int) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        """生成单只股票的K线列数组：(bar结束时间, {字段: 数组})"""
+        symbol_id = self._symbol_id(code)
+        period = {"1mon": "1M", "1month": "1M"}.get(period, period)
+
+        if period in _INTRADAY_SPANS:
+            span = _INTRADAY_SPANS[period]
+            day_indices = self._day_window(start_time, end_time, count, _SESSION_MINUTES / span)
+            bars = self._intraday_bars(symbol_id, day_indices, span)
+        elif period in ("1d", "1w", "1M"):
+            bars_per_day = {"1d": 1.0, "1w": 0.2, "1M": 1 / 21}[period]
+            day_indices = self._day_window(start_time, end_time, count, bars_per_day)
+            bars = self._daily_bars(symbol_id, day_indices)
+            bars["label"] = _TRADING_DAYS[day_indices].astype("datetime64[m]")
+            if period != "1d":
+                bars = self._calendar_bars(bars, period)
+        else:
+            raise ValueError(f"模拟后端不支持的周期: {period}")
+
+        labels = bars.pop("label")
+        start = _parse_time(start_time)
+        end = _parse_time(end_time, end_of_day=True)
+        mask = np.ones(len(labels), dtype=bool)
+        if start is not None:
+            mask &= labels >= np.datetime64(start, "m")
+        if end is not None:
+            mask &= labels <= np.datetime64(end, "m")
+        if period in _INTRADAY_SPANS and not self.config.replay_when_closed:
+            # 当日尚未走完的分钟K线不返回
+            mask &= labels <= np.datetime64(datetime.now(), "m")
+        labels = labels[mask]
+        bars = {k: v[mask] for k, v in bars.items()}
+        if count and count > 0:
+            labels = labels[-count:]
+            bars = {k: v[-count:] for k, v in bars.items()}
+
+        closes = bars["close"]
+        previous_close = np.concatenate(([closes[0]], closes[:-1])) if len(closes) else closes
+        time_ms = labels.astype("datetime64[ms]").astype(np.int64) - _BEIJING_OFFSET_MS
+        size = len(labels)
+        return labels, {
+            "time": time_ms,
+            "open": np.round(bars["open"], 2),
+            "high": np.round(bars["high"], 2),
+            "low": np.round(bars["low"], 2),
+            "close": np.round(closes, 2),
+            "volume": bars["volume"].astype(np.int64),
+            "amount": np.round(bars["amount"], 2),
+            "settelementPrice": np.zeros(size),
+            "openInterest": np.zeros(size, dtype=np.int64),
+            "preClose": np.round(previous_close, 2),
+            "suspendFlag": np.zeros(size, dtype=np.int64),
+        }
+
+    def _intraday_bars(self, symbol_id: int, day_indices: np.ndarray, span: int) -> Dict[str, np.ndarray]:
+        """按交易时段聚合分钟K线"""
+        groups = _SESSION_MINUTES // span if _SESSION_MINUTES % span == 0 else math.ceil(_SESSION_MINUTES / span)
+        starts = np.arange(groups) * span
+        ends = np.minimum(starts + span, _SESSION_MINUTES) - 1
+        columns: Dict[str, List[np.ndarray]] = {k: [] for k in ("open", "high", "low", "close", "volume", "amount", "label")}
+        for day_index in day_indices:
+            minutes = self._day_minutes(symbol_id, int(day_index))
+            columns["open"].append(minutes["open"][starts])
+            columns["high"].append(np.maximum.reduceat(minutes["high"], starts))
+            columns["low"].append(np.minimum.reduceat(minutes["low"], starts))
+            columns["close"].append(minutes["close"][ends])
+            columns["volume"].append(np.add.reduceat(minutes["volume"], starts))
+            columns["amount"].append(np.add.reduceat(minutes["amount"], starts))
+            day = _TRADING_DAYS[int(day_index)].astype("datetime64[m]")
+            columns["label"].append(day + _MINUTE_LABELS[ends].astype("timedelta64[m]"))
+        if not len(day_indices):
+            return {k: np.empty(0, dtype="datetime64[m]" if k == "label" else np.float64) for k in columns}
+        return {k: np.concatenate(v) for k, v in columns.items()}
+
+    @staticmethod
+    def _calendar_bars(daily: Dict[str, np.ndarray], period: str) -> Dict[str, np.ndarray]:
+        """日线聚合为周线/月线（以桶内最后一个交易日标注）"""
+        days = daily["label"].astype("datetime64[D]")
+        if period == "1w":
+            keys = (days.astype(np.int64) + 3) // 7
+        else:
+            keys = days.astype("datetime64[M]").astype(np.int64)
+        if not len(keys):
+            return daily
+        starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+        ends = np.concatenate((starts[1:], [len(keys)])) - 1
+        return {
+            "open": daily["open"][starts],
+            "high": np.maximum.reduceat(daily["high"], starts),
+            "low": np.minimum.reduceat(daily["low"], starts),
+            "close": daily["close"][ends],
+            "volume": np.add.reduceat(daily["volume"], starts),
+            "amount": np.add.reduceat(daily["amount"], starts),
+            "label": daily["label"][ends],
+        }
+
+    # ------------------------------------------------------------------
+    # 快照
+    # ------------------------------------------------------------------
+
+    def _day_prefix_uncached(self, symbol_id: int, day_index: int) -> Dict[str, Any]:
+        """当日分钟K线的前缀聚合（Python列表，供逐tick快照查表）"""
+        minutes = self._day_minutes(symbol_id, day_index)
+        previous = self._daily_bars(symbol_id, np.array([max(day_index - 1, 0)]))
+        return {
+            "open": float(minutes["open"][0]),
+            "last_close": round(float(previous["close"][0]), 2),
+            "close": minutes["close"].tolist(),
+            "high": np.maximum.accumulate(minutes["high"]).tolist(),
+            "low": np.minimum.accumulate(minutes["low"]).tolist(),
+            "volume": np.cumsum(minutes["volume"]).tolist(),
+            "amount": np.cumsum(minutes["amount"]).tolist(),
+        }
+
+    def _snapshot(self, code: str, day_index: int, elapsed: int, tick_index: int) -> Dict[str, Any]:
+        """生成某一时刻的tick快照（与1分钟K线一致）"""
+        symbol_id = self._symbol_id(code)
+        prefix = self._day_prefix(symbol_id, day_index)
+        # 整数元组的hash不受PYTHONHASHSEED影响，可作为跨进程确定的廉价随机源
+        noise = hash((self.config.seed, symbol_id, tick_index)) & 0xFFFFFFFF
+
+        if elapsed <= 0:
+            price = high = low = prefix["open"]
+            volume = amount = 0.0
+        else:
+            upto = min(elapsed, _SESSION_MINUTES) - 1
+            price = prefix["close"][upto]
+            if upto < _SESSION_MINUTES - 1:
+                price *= 1 + ((noise & 0xFFFF) / 0xFFFF - 0.5) * 0.001
+            high = max(prefix["high"][upto], price)
+            low = min(prefix["low"][upto], price)
+            volume = prefix["volume"][upto]
+            amount = prefix["amount"][upto]
+
+        price = round(price, 2)
+        tick = 0.01
+        seconds = _SESSION_OPEN_SECONDS + (elapsed + (90 if elapsed > 120 else 0)) * 60
+        time_ms = (int(_TRADING_DAYS[day_index].astype(np.int64)) * 86400 + seconds) * 1000 - _BEIJING_OFFSET_MS
+        book = [1 + (noise >> shift) % 500 for shift in range(0, 20, 2)]
+        return {
+            "time": time_ms,
+            "timetag": time.strftime("%Y%m%d %H:%M:%S", time.gmtime((time_ms + _BEIJING_OFFSET_MS) // 1000)),
+            "lastPrice": price,
+            "open": round(prefix["open"], 2),
+            "high": round(high, 2),
+            "low": round(low, 2),
+            "lastClose": prefix["last_close"],
+            "amount": round(amount, 2),
+            "volume": int(volume),
+            "pvolume": int(volume) * 100,
+            "stockStatus": 0,
+            "openInt": 13,
+            "lastSettlementPrice": 0.0,
+            "askPrice": [round(price + tick * (i + 1), 2) for i in range(5)],
+            "bidPrice": [round(price - tick * i, 2) for i in range(5)],
+            "askVol": book[:5],
+            "bidVol": book[5:],
+            "transactionNum": int(volume // 7),
+        }
+
+    def _current_snapshots(self, codes: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        day_index, elapsed = self._session_clock()
+        tick_index = int(time.time() // max(self.config.push_interval, 0.001))
+        return {code: self._snapshot(code, day_index, elapsed, tick_index) for code in codes if code in self._symbol_index}
+
+    # ------------------------------------------------------------------
+    # 延迟与错误注入
+    # ------------------------------------------------------------------
+
+    def _simulate_call(self, name: str):
+        """按配置注入调用延迟和错误"""
+        config = self.config
+        with self._latency_lock:
+            self.stats["calls"] += 1
+            stalled = config.stall_probability > 0 and self._latency_rng.random() < config.stall_probability
+            failed = config.error_rate > 0 and self._latency_rng.random() < config.error_rate
+            latency_ms = config.latency_median_ms * math.exp(self._latency_rng.gauss(0.0, config.latency_sigma)) \
+                if config.latency_median_ms > 0 else 0.0
+            if stalled:
+                self.stats["stalls"] += 1
+                latency_ms += config.stall_ms
+            if failed:
+                self.stats["errors"] += 1
+
+        if latency_ms > 0:
+            time.sleep(latency_ms / 1000)
+        if failed:
+            raise ConnectionError(f"模拟xtdata调用失败: {name}")
+
+    # ------------------------------------------------------------------
+    # xtdata 接口
+    # ------------------------------------------------------------------
+
+    def connect(self, ip: str = "", port: Optional[int] = None, remember_if_success: bool = True) -> bool:
+        self._simulate_call("connect")
+        return True
+
+    def disconnect(self) -> None:
+        return None
+
+    def get_stock_list_in_sector(self, sector_name: str) -> List[str]:
+        self._simulate_call("get_stock_list_in_sector")
+        return list(self._sectors.get(sector_name, []))
+
+    def get_sector_list(self) -> List[str]:
+        self._simulate_call("get_sector_list")
+        return list(self._sectors)
+
+    def get_trading_dates(self, market: str, start_time: str = "", end_time: str = "", count: int = -1) -> List[int]:
+        self._simulate_call("get_trading_dates")
+        days = _TRADING_DAYS
+        start = _parse_time(start_time)
+        end = _parse_time(end_time, end_of_day=True) or datetime.now()
+        if start is not None:
+            days = days[days >= np.datetime64(start.date())]
+        days = days[days <= np.datetime64(end.date())]
+        if count and count > 0:
+            days = days[-count:]
+        return (days.astype("datetime64[ms]").astype(np.int64) - _BEIJING_OFFSET_MS).tolist()
+
+    def get_instrument_detail(self, stock_code: str, iscomplete: bool = False) -> Optional[Dict[str, Any]]:
+        self._simulate_call("get_instrument_detail")
+        symbol_id = self._symbol_index.get(stock_code)
+        if symbol_id is None:
+            return None
+
+        code, exchange = stock_code.split(".")
+        day_index, _ = self._session_clock()
+        previous = self._daily_bars(symbol_id, np.array([max(day_index - 1, 0)]))
+        pre_close = round(float(previous["close"][0]), 2)
+        limit = 0.2 if code.startswith(("300", "688")) else 0.1
+        rng = np.random.default_rng([self.config.seed, symbol_id, 6])
+        total_volume = int(rng.uniform(1e8, 5e9))
+        name = _INDEX_CODES.get(stock_code) or (
+            _NAME_PREFIXES[symbol_id % len(_NAME_PREFIXES)]
+            + _NAME_PREFIXES[(symbol_id // len(_NAME_PREFIXES)) % len(_NAME_PREFIXES)]
+            + _NAME_SUFFIXES[symbol_id % len(_NAME_SUFFIXES)]
+        )
+        open_date = _TRADING_DAYS[int(rng.integers(0, 1500))]
+        return {
+            "ExchangeID": exchange,
+            "InstrumentID": code,
+            "InstrumentName": name,
+            "ProductID": "",
+            "ProductName": "",
+            "ExchangeCode": code,
+            "UniCode": code,
+            "CreateDate": "0",
+            "OpenDate": str(open_date).replace("-", ""),
+            "ExpireDate": 99999999,
+            "PreClose": pre_close,
+            "SettlementPrice": pre_close,
+            "UpStopPrice": round(pre_close * (1 + limit), 2),
+            "DownStopPrice": round(pre_close * (1 - limit), 2),
+            "FloatVolume": float(int(total_volume * rng.uniform(0.5, 1.0))),
+            "TotalVolume": float(total_volume),
+            "LongMarginRatio": 0.0,
+            "ShortMarginRatio": 0.0,
+            "PriceTick": 0.01,
+            "VolumeMultiple": 1,
+            "MainContract": 0,
+            "LastVolume": 0,
+            "InstrumentStatus": 0,
+            "IsTrading": True,
+            "IsRecent": False,
+        }
+
+    def get_full_tick(self, code_list: Sequence[str]) -> Dict[str, Dict[str, Any]]:
+        self._simulate_call("get_full_tick")
+        return self._current_snapshots(self._expand_codes(code_list))
+
+    def get_market_data(self, field_list: Sequence[str] = (), stock_list: Sequence[str] = (),
+                        period: str = "1d", start_time: str = "", end_time: str = "",
+                        count: int = -1, dividend_type: str = "none", fill_data: bool = True) -> Dict[str, Any]:
+        """K线返回 {字段: DataFrame(index=股票, columns=时间)}，tick返回 {股票: 结构化数组}"""
+        self._simulate_call("get_market_data")
+        if period == "tick":
+            return {code: self._tick_array(code, count) for code in stock_list if code in self._symbol_index}
+
+        fields = list(field_list) or _KLINE_FIELDS
+        series = {code: self._kline_arrays(code, period, start_time, end_time, count)
+                  for code in stock_list if code in self._symbol_index}
+        if not series:
+            return {field: pd.DataFrame() for field in fields}
+
+        codes = list(series)
+        first_labels = series[codes[0]][0]
+        if all(np.array_equal(labels, first_labels) for labels, _ in series.values()):
+            # 同一日历下所有股票的时间轴一致，直接堆叠为二维数组
+            columns = self._format_labels(first_labels, period)
+            return {
+                field: pd.DataFrame(np.vstack([series[code][1][field] for code in codes]),
+                                    index=codes, columns=columns)
+                for field in fields
+            }
+        frames = {code: pd.DataFrame(data, index=self._format_labels(labels, period))
+                  for code, (labels, data) in series.items()}
+        return {
+            field: pd.DataFrame({code: frame[field] for code, frame in frames.items()}).T
+            for field in fields
+        }
+
+    def get_market_data_ex(self, field_list: Sequence[str] = (), stock_list: Sequence[str] = (),
+                           period: str = "1d", start_time: str = "", end_time: str = "",
+                           count: int = -1, dividend_type: str = "none", fill_data: bool = True) -> Dict[str, Any]:
+        """返回 {股票: DataFrame(index=时间, columns=字段)}"""
+        self._simulate_call("get_market_data_ex")
+        result = {}
+        for code in stock_list:
+            if code not in self._symbol_index:
+                continue
+            if period == "tick":
+                result[code] = pd.DataFrame(self._tick_array(code, count).tolist(), columns=_TICK_DTYPE.names)
+                continue
+            frame = self._kline_frame(code, period, start_time, end_time, count)
+            result[code] = frame[list(field_list)] if field_list else frame
+        return result
+
+    def get_local_data(self, *args, **kwargs) -> Dict[str, Any]:
+        return self.get_market_data_ex(*args, **kwargs)
+
+    def download_history_data(self, stock_code: str, period: str, start_time: str = "",
+                              end_time: str = "", incrementally: Optional[bool] = None) -> None:
+        self._simulate_call("download_history_data")
+
+    def download_history_data2(self, stock_list: Sequence[str], period: str, start_time: str = "",
+                               end_time: str = "", callback: Optional[Callable] = None,
+                               incrementally: Optional[bool] = None) -> None:
+        self._simulate_call("download_history_data2")
+        if callback:
+            for i, code in enumerate(stock_list, 1):
+                callback({"total": len(stock_list), "finished": i, "stockcode": code, "message": ""})
+
+    def _tick_array(self, code: str, count: int) -> np.ndarray:
+        """最近 count 个tick快照（结构化数组）"""
+        day_index, elapsed = self._session_clock()
+        tick_index = int(time.time() // max(self.config.push_interval, 0.001))
+        count = max(1, min(count if count and count > 0 else 1, 4800))
+        ticks = []
+        for back in range(count - 1, -1, -1):
+            snapshot = self._snapshot(code, day_index, max(elapsed - back // 20, 0), tick_index - back)
+            snapshot["time"] -= back * 3000
+            ticks.append(tuple(snapshot[name] for name in _TICK_DTYPE.names))
+        return np.array(ticks, dtype=_TICK_DTYPE)
+
+    def _expand_codes(self, code_list: Sequence[str]) -> List[str]:
+        """展开市场代码（SH/SZ）为个股列表"""
+        codes: List[str] = []
+        for code in code_list:
+            if code in ("SH", "SZ"):
+                codes.extend(c for c in self._symbols if c.endswith("." + code))
+            else:
+                codes.append(code)
+        return codes
+
+    # ------------------------------------------------------------------
+    # 订阅
+    # ------------------------------------------------------------------
+
+    def subscribe_quote(self, stock_code: str, period: str = "1d", start_time: str = "",
+                        end_time: str = "", count: int = 0, callback: Optional[Callable] = None) -> int:
+        self._simulate_call("subscribe_quote")
+        return self._add_subscription([stock_code], period, callback, whole_quote=False)
+
+    def subscribe_whole_quote(self, code_list: Sequence[str], callback: Optional[Callable] = None) -> int:
+        self._simulate_call("subscribe_whole_quote")
+        return self._add_subscription(self._expand_codes(code_list), "tick", callback, whole_quote=True)
+
+    def unsubscribe_quote(self, seq: int) -> None:
+        with self._subscription_lock:
+            self._subscriptions.pop(seq, None)
+
+    def run(self) -> None:
+        """阻塞当前线程，持续推送订阅数据（与xtdata.run一致）"""
+        while not self._stop_event.is_set():
+            self._stop_event.wait(1.0)
+
+    def _add_subscription(self, codes: List[str], period: str, callback: Optional[Callable], whole_quote: bool) -> int:
+        with self._subscription_lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            self._subscriptions[seq] = _Subscription(seq, codes, period, callback, whole_quote)
+            if self._push_thread is None or not self._push_thread.is_alive():
+                self._stop_event.clear()
+                self._push_thread = threading.Thread(
+                    target=self._push_loop, name="xtdata-sim-push", daemon=True
+                )
+                self._push_thread.start()
+        return seq
+
+    def _push_loop(self):
+        """按推送间隔触发订阅回调"""
+        while not self._stop_event.wait(self.config.push_interval):
+            with self._subscription_lock:
+                subscriptions = list(self._subscriptions.values())
+            if not subscriptions:
+                continue
+            for subscription in subscriptions:
+                if subscription.callback is None:
+                    continue
+                try:
+                    subscription.callback(self._subscription_payload(subscription))
+                    self.stats["callbacks"] += 1
+                except Exception as e:
+                    logger.warning(f"模拟行情回调异常 [{subscription.seq}]: {e}")
+
+    def _subscription_payload(self, subscription: _Subscription) -> Dict[str, Any]:
+        snapshots = self._current_snapshots(subscription.codes)
+        if subscription.whole_quote:
+            return snapshots
+        if subscription.period == "tick":
+            return {code: [tick] for code, tick in snapshots.items()}
+        result = {}
+        for code in subscription.codes:
+            frame = self._kline_frame(code, subscription.period, "", "", 1)
+            result[code] = frame.reset_index(drop=True).to_dict("records")
+        return result
+
+    def shutdown(self):
+        """停止推送线程并清空订阅"""
+        self._stop_event.set()
+        with self._subscription_lock:
+            self._subscriptions.clear()
+
+    # ------------------------------------------------------------------
+    # 模块注册
+    # ------------------------------------------------------------------
+
+    _EXPORTED = (
+        "connect", "disconnect", "get_stock_list_in_sector", "get_sector_list", "get_trading_dates",
+        "get_instrument_detail", "get_full_tick", "get_market_data", "get_market_data_ex",
+        "get_local_data", "download_history_data", "download_history_data2", "subscribe_quote",
+        "subscribe_whole_quote", "unsubscribe_quote", "run",
+    )
+
+    def as_module(self) -> types.ModuleType:
+        """包装为与 xtquant.xtdata 同名函数的模块对象"""
+        module = types.ModuleType("xtquant.xtdata", "模拟xtdata后端")
+        for name in self._EXPORTED:
+            setattr(module, name, getattr(self, name))
+        module.simulator = self
+        return module
+
+
+_simulator: Optional[SimulatedXtData] = None
+_install_lock = threading.Lock()
+
+
+def install_simulated_xtquant(config: Optional[SimulationConfig] = None) -> SimulatedXtData:
+    """
+    将模拟后端注册为 xtquant / xtquant.xtdata 模块
+
+    需要在业务模块导入 xtquant 之前调用，已注册时返回现有实例。
+    """
+    global _simulator
+    with _install_lock:
+        if _simulator is not None:
+            return _simulator
+
+        simulator = SimulatedXtData(config or SimulationConfig.from_env())
+        package = types.ModuleType("xtquant", "模拟xtquant包")
+        package.__path__ = []
+        package.xtdata = simulator.as_module()
+        # 交易接口不做模拟，仅保证导入不失败
+        package.xttrader = types.ModuleType("xtquant.xttrader", "模拟后端不提供交易接口")
+        package.xtconstant = types.ModuleType("xtquant.xtconstant")
+        sys.modules["xtquant"] = package
+        sys.modules["xtquant.xtdata"] = package.xtdata
+        sys.modules["xtquant.xttrader"] = package.xttrader
+        sys.modules["xtquant.xtconstant"] = package.xtconstant
+
+        _simulator = simulator
+        logger.warning(
+            f"已启用模拟xtdata后端: {simulator.config.symbol_count}只股票, "
+            f"延迟中位数 {simulator.config.latency_median_ms}ms, 错误率 {simulator.config.error_rate}"
+        )
+        return simulator
+
+
+def install_simulated_xtquant_if_configured() -> Optional[SimulatedXtData]:
+    """XTQUANT_BACKEND=simulated 时注册模拟后端"""
+    if os.getenv("XTQUANT_BACKEND", "qmt").lower() not in ("simulated", "sim"):
+        return None
+    return install_simulated_xtquant()
+
+
+def get_simulator() -> Optional[SimulatedXtData]:
+    """获取已注册的模拟后端实例"""
+    return _simulator
@@ -6,18 +6,23 @@ xtquant连接池管理模块
 """
 
 import asyncio
+import bisect
+import functools
+import itertools
 import logging
+import math
+import os
 import threading
 import time
 import random
 from concurrent.futures import ThreadPoolExecutor
-from contextlib import contextmanager
+from contextlib import asynccontextmanager, contextmanager
 from dataclasses import dataclass, field
 from enum import Enum
 from queue import Queue, Empty, PriorityQueue
 from typing import Optional, Dict, Any, List, Callable
 from datetime import datetime, timedelta
-from collections import defaultdict
+from collections import defaultdict, deque
 
 # 强制导入xtdata，如果失败则抛出错误
 try:
@@ -315,13 +320,8 @@ class XtQuantConnection:
             start_time = time.time()
             
             # 轻量级健康检查 - 只检查xtdata模块是否可用
-            try:
-                # 尝试导入xtdata模块，这比实际调用API更轻量
-                import xtdata
-                # 简单检查模块是否正常
-                result = hasattr(xtdata, 'get_market_data')
-            except ImportError:
-                result = False
+            # xtdata 是 xtquant 包的子模块（模块顶部已导入），不能按顶层模块 import
+            result = hasattr(xtdata, 'get_market_data')
             
             response_time = time.time() - start_time
             
@@ -437,12 +437,285 @@ class XtQuantConnection:
         return False
 
 
+class WaitTimeHistogram:
+    """连接获取等待时间直方图（按毫秒分桶）"""
+    
+    BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+    
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS_MS) + 1)
+        self.total = 0
+        self.timeouts = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+    
+    def record(self, wait_seconds: float):
+        """记录一次成功获取的等待时间"""
+        wait_ms = wait_seconds * 1000
+        self.counts[bisect.bisect_left(self.BUCKETS_MS, wait_ms)] += 1
+        self.total += 1
+        self.sum_ms += wait_ms
+        self.max_ms = max(self.max_ms, wait_ms)
+    
+    def record_timeout(self):
+        """记录一次获取超时"""
+        self.timeouts += 1
+    
+    def percentile(self, p: float) -> float:
+        """按分桶上界估算分位数（毫秒）"""
+        if self.total == 0:
+            return 0.0
+        
+        rank = p / 100 * self.total
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count > 0:
+                if i < len(self.BUCKETS_MS):
+                    return min(float(self.BUCKETS_MS[i]), self.max_ms)
+                break
+        return self.max_ms
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为状态字典"""
+        labels = [f"<={bound}ms" for bound in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.total,
+            "timeouts": self.timeouts,
+            "avg_ms": round(self.sum_ms / self.total, 3) if self.total else 0.0,
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_ms, 3),
+            "buckets": dict(zip(labels, self.counts))
+        }
+
+
+class _WaiterWakeup:
+    """等待者唤醒逻辑：同步请求使用Event，异步请求使用Future"""
+    
+    def wake(self):
+        """通知等待者（可在任意线程调用）"""
+        if self.event is not None:
+            self.event.set()
+        elif self.future is not None:
+            try:
+                self.future.get_loop().call_soon_threadsafe(self._resolve)
+            except RuntimeError:
+                # 事件循环已关闭，等待者不会再被调度
+                pass
+    
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+@dataclass
+class _ConnectionWaiter(_WaiterWakeup):
+    """排队等待连接的请求"""
+    priority: ConnectionPriority
+    enqueued_at: float
+    event: Optional[threading.Event] = None
+    future: Optional[asyncio.Future] = None
+    connection: Optional["XtQuantConnection"] = None
+    avoid: Optional["XtQuantConnection"] = None
+
+
+@dataclass
+class _PermitWaiter(_WaiterWakeup):
+    """排队等待并发名额的请求"""
+    event: Optional[threading.Event] = None
+    future: Optional[asyncio.Future] = None
+    granted: bool = False
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    自适应并发限制器（gradient + AIMD）
+    
+    以短期/长期延迟EWMA之比作为梯度：延迟接近基线时限额按 sqrt(limit)
+    增长，延迟升高时按梯度成比例收缩；上游报错或超时时按 backoff_ratio
+    乘性减小。超出限额的调用按先来后到排队。
+    """
+    
+    def __init__(self, initial_limit: int = 8, min_limit: int = 1, max_limit: int = 64,
+                 tolerance: float = 1.5, smoothing: float = 0.2, backoff_ratio: float = 0.9):
+        """
+        Args:
+            initial_limit: 初始并发限额
+            min_limit: 最小并发限额
+            max_limit: 最大并发限额
+            tolerance: 可容忍的短期/长期延迟比，超过后开始收缩
+            smoothing: 限额调整的平滑系数
+            backoff_ratio: 调用失败时的乘性收缩系数
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.backoff_ratio = backoff_ratio
+        
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._in_flight = 0
+        self._short_latency = 0.0
+        self._long_latency = 0.0
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "timeouts": 0, "drops": 0, "peak_in_flight": 0}
+    
+    @property
+    def limit(self) -> int:
+        """当前并发限额"""
+        return max(self.min_limit, int(self._limit))
+    
+    @property
+    def in_flight(self) -> int:
+        """当前在途调用数"""
+        return self._in_flight
+    
+    def try_acquire(self) -> bool:
+        """不等待地获取一个名额"""
+        with self._lock:
+            if self._waiters or self._in_flight >= self.limit:
+                return False
+            self._grant()
+            return True
+    
+    def acquire(self, timeout: float) -> None:
+        """获取一个名额（同步等待）"""
+        waiter = _PermitWaiter(event=threading.Event())
+        if self._enqueue(waiter):
+            return
+        waiter.event.wait(timeout)
+        self._finish_wait(waiter, timeout)
+    
+    async def acquire_async(self, timeout: float) -> None:
+        """获取一个名额（异步等待，不阻塞事件循环）"""
+        waiter = _PermitWaiter(future=asyncio.get_running_loop().create_future())
+        if self._enqueue(waiter):
+            return
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if not waiter.granted:
+                    self._waiters.remove(waiter)
+                    raise
+            self.release()
+            raise
+        self._finish_wait(waiter, timeout)
+    
+    def release(self, latency: Optional[float] = None, dropped: bool = False):
+        """
+        归还名额并根据本次调用结果调整限额
+        
+        Args:
+            latency: 调用耗时（秒），None表示调用未完成不参与调整
+            dropped: 调用是否因上游错误或超时失败
+        """
+        with self._lock:
+            in_flight = self._in_flight
+            self._in_flight = max(0, self._in_flight - 1)
+            
+            if dropped:
+                self._stats["drops"] += 1
+                self._limit = max(self.min_limit, self._limit * self.backoff_ratio)
+            elif latency is not None:
+                self._adjust(latency, in_flight)
+            
+            while self._waiters and self._in_flight < self.limit:
+                waiter = self._waiters.popleft()
+                self._grant()
+                waiter.granted = True
+                waiter.wake()
+    
+    def _enqueue(self, waiter: _PermitWaiter) -> bool:
+        """有空闲名额时直接获取，否则排队"""
+        with self._lock:
+            if not self._waiters and self._in_flight < self.limit:
+                self._grant()
+                return True
+            self._waiters.append(waiter)
+            return False
+    
+    def _finish_wait(self, waiter: _PermitWaiter, timeout: float):
+        with self._lock:
+            if waiter.granted:
+                return
+            self._waiters.remove(waiter)
+            self._stats["timeouts"] += 1
+        raise TimeoutError(f"等待上游并发名额超时 ({timeout}秒)")
+    
+    def _grant(self):
+        """占用一个名额（需持有锁）"""
+        self._in_flight += 1
+        self._stats["acquired"] += 1
+        self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._in_flight)
+    
+    def _adjust(self, latency: float, in_flight: int):
+        """按延迟梯度调整限额（需持有锁）"""
+        if self._long_latency == 0.0:
+            self._short_latency = self._long_latency = latency
+        else:
+            self._short_latency += (latency - self._short_latency) * 0.2
+            # 基线快速跟随延迟下降、缓慢跟随延迟上升，持续拥塞时不会很快被当作新常态
+            baseline_alpha = 0.05 if latency < self._long_latency else 0.002
+            self._long_latency += (latency - self._long_latency) * baseline_alpha
+        
+        # 在途调用远低于限额时延迟不反映上游容量，不做调整
+        if in_flight < self._limit / 2:
+            return
+        
+        gradient = max(0.5, min(1.0, self.tolerance * self._long_latency / max(self._short_latency, 1e-9)))
+        new_limit = self._limit * gradient + math.sqrt(self._limit)
+        self._limit = self._limit * (1 - self.smoothing) + new_limit * self.smoothing
+        self._limit = max(float(self.min_limit), min(float(self.max_limit), self._limit))
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限制器状态"""
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiters),
+                "short_latency_ms": round(self._short_latency * 1000, 3),
+                "long_latency_ms": round(self._long_latency * 1000, 3),
+                **self._stats
+            }
+
+
+@dataclass
+class HedgingConfig:
+    """对冲请求配置"""
+    enabled: bool = False
+    percentile: float = 95.0            # 以该分位延迟作为对冲等待时间
+    min_delay: float = 0.05             # 对冲等待时间下限（秒）
+    max_delay: float = 2.0              # 对冲等待时间上限（秒）
+    min_samples: int = 20               # 延迟样本不足时不对冲
+    max_hedge_ratio: float = 0.1        # 对冲请求占比上限
+    acquire_timeout: float = 0.5        # 对冲请求获取连接的等待上限（秒）
+
+
 class XtQuantConnectionPool:
-    """xtquant连接池管理器"""
+    """
+    xtquant连接池管理器
+    
+    每个连接最多同时出借 max_requests_per_connection 个名额。名额不足时请求
+    按优先级分道排队（同一优先级内先来先服务），释放名额时直接移交给队首
+    等待者，同步与异步调用方都不再轮询。
+    
+    通过 execute_async 发起的上游调用受自适应并发限制器约束，幂等读请求
+    可选地启用对冲（hedging）以削减长尾延迟。
+    """
     
     def __init__(self, min_connections: int = 2, max_connections: int = 10, 
                  health_check_interval: int = 30, connection_timeout: int = 10,
-                 max_idle_time: int = 300, load_balance_strategy: LoadBalanceStrategy = LoadBalanceStrategy.LEAST_CONNECTIONS):
+                 max_idle_time: int = 300, load_balance_strategy: LoadBalanceStrategy = LoadBalanceStrategy.LEAST_CONNECTIONS,
+                 max_requests_per_connection: int = 10,
+                 hedging: Optional[HedgingConfig] = None,
+                 concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None):
         """
         初始化连接池
         
@@ -453,6 +726,9 @@ class XtQuantConnectionPool:
             connection_timeout: 连接超时时间(秒)
             max_idle_time: 最大空闲时间(秒)
             load_balance_strategy: 负载均衡策略
+            max_requests_per_connection: 单个连接可同时出借的名额数
+            hedging: 对冲请求配置，默认关闭
+            concurrency_limiter: 上游调用的自适应并发限制器，默认按连接容量创建
         """
         self.min_connections = min_connections
         self.max_connections = max_connections
@@ -460,11 +736,31 @@ class XtQuantConnectionPool:
         self.connection_timeout = connection_timeout
         self.max_idle_time = max_idle_time
         self.load_balance_strategy = load_balance_strategy
+        self.max_requests_per_connection = max_requests_per_connection
         
         self._connections: Dict[str, XtQuantConnection] = {}
-        self._available_connections = Queue(maxsize=max_connections)
         self._lock = threading.RLock()
         self._shutdown = False
+        self._stop_event = threading.Event()  # 唤醒后台循环，关闭时不必等待休眠结束
+        self._connection_seq = itertools.count()
+        
+        # 名额出借计数与分优先级的FIFO等待队列
+        self._leases: Dict[str, int] = defaultdict(int)
+        self._waiters: Dict[ConnectionPriority, deque] = {
+            priority: deque() for priority in ConnectionPriority
+        }
+        self._wait_histograms: Dict[ConnectionPriority, WaitTimeHistogram] = {
+            priority: WaitTimeHistogram() for priority in ConnectionPriority
+        }
+        
+        # 上游调用的并发控制与对冲
+        self.hedging = hedging or HedgingConfig()
+        self.concurrency_limiter = concurrency_limiter or AdaptiveConcurrencyLimiter(
+            initial_limit=max(1, max_connections) * 2,
+            max_limit=max(1, max_connections) * max_requests_per_connection
+        )
+        self._call_latencies: deque = deque(maxlen=200)
+        self._hedge_stats = {"requests": 0, "hedged": 0, "hedge_wins": 0}
         
         # 负载均衡相关
         self._round_robin_index = 0
@@ -484,12 +780,9 @@ class XtQuantConnectionPool:
     def _initialize_connections(self):
         """初始化最小连接数"""
         for i in range(self.min_connections):
-            connection = self._create_connection(f"conn_{i}")
-            if connection.connect():
-                self._available_connections.put(connection)
+            connection = self._create_new_connection()
+            if connection:
                 self.logger.info(f"初始化连接成功: {connection.connection_id}")
-            else:
-                self.logger.error(f"初始化连接失败: {connection.connection_id}")
     
     def _create_connection(self, connection_id: str, config: dict = None) -> XtQuantConnection:
         """创建新的连接实例"""
@@ -520,63 +813,291 @@ class XtQuantConnectionPool:
         return connection
     
     @contextmanager
-    def get_connection(self, timeout: float = 10.0):
-        """获取连接的上下文管理器"""
+    def get_connection(self, timeout: float = 10.0,
+                       priority: ConnectionPriority = ConnectionPriority.NORMAL):
+        """获取连接的上下文管理器（同步调用方，在当前线程内等待）"""
         connection = None
         try:
-            connection = self._acquire_connection(timeout)
+            connection = self._acquire_connection(timeout, priority)
             yield connection
         finally:
             if connection:
                 self._release_connection(connection)
     
-    def _acquire_connection(self, timeout: float) -> XtQuantConnection:
+    @asynccontextmanager
+    async def acquire(self, timeout: float = 10.0,
+                      priority: ConnectionPriority = ConnectionPriority.NORMAL):
+        """
+        异步获取连接：``async with pool.acquire() as conn:``
+        
+        排队等待期间只挂起当前协程，不阻塞事件循环。
+        """
+        connection = await self._acquire_connection_async(timeout, priority)
+        try:
+            yield connection
+        finally:
+            self._release_connection(connection)
+    
+    def _acquire_connection(self, timeout: float,
+                            priority: ConnectionPriority = ConnectionPriority.NORMAL) -> XtQuantConnection:
         """获取可用连接"""
-        start_time = time.time()
+        deadline = time.monotonic() + timeout
         
-        while time.time() - start_time < timeout:
-            # 使用负载均衡策略选择连接
-            connection = self._select_connection_by_strategy()
+        while True:
+            waiter = _ConnectionWaiter(
+                priority=priority,
+                enqueued_at=time.monotonic(),
+                event=threading.Event()
+            )
+            try:
+                if not self._enqueue_waiter(waiter):
+                    self._try_grow_pool()
+                
+                remaining = deadline - time.monotonic()
+                if waiter.connection is None and remaining > 0:
+                    waiter.event.wait(remaining)
+            except BaseException:
+                self._abandon_waiter(waiter)
+                raise
             
-            if connection:
-                # 检查连接健康状态
-                if connection.is_healthy():
-                    self._update_connection_stats(connection.connection_id)
-                    return connection
-                else:
-                    # 连接不健康，尝试重连
-                    if connection.connect():
-                        self._update_connection_stats(connection.connection_id)
-                        return connection
-                    else:
-                        # 重连失败，移除连接
-                        self.logger.warning(f"连接 {connection.connection_id} 重连失败，移除连接")
-                        self._remove_connection(connection)
-                        continue
+            connection = self._finish_wait(waiter, timeout)
+            if self._ensure_connection_healthy(connection):
+                return connection
+    
+    async def _acquire_connection_async(self, timeout: float,
+                                        priority: ConnectionPriority = ConnectionPriority.NORMAL,
+                                        avoid: Optional[XtQuantConnection] = None) -> XtQuantConnection:
+        """异步获取可用连接，avoid 为尽量避开的连接（对冲请求使用）"""
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        
+        while True:
+            waiter = _ConnectionWaiter(
+                priority=priority,
+                enqueued_at=time.monotonic(),
+                future=loop.create_future(),
+                avoid=avoid
+            )
+            try:
+                if not self._enqueue_waiter(waiter):
+                    # 建立连接包含阻塞的网络调用，放到线程池执行
+                    await loop.run_in_executor(None, self._try_grow_pool)
+                
+                remaining = deadline - time.monotonic()
+                if waiter.connection is None and remaining > 0:
+                    try:
+                        await asyncio.wait_for(waiter.future, remaining)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._abandon_waiter(waiter)
+                raise
             
-            # 没有可用连接，尝试创建新连接
-            if len(self._connections) < self.max_connections:
-                connection = self._create_new_connection()
-                if connection:
-                    self._update_connection_stats(connection.connection_id)
-                    return connection
+            connection = self._finish_wait(waiter, timeout)
+            if connection.is_healthy():
+                return connection
+            if await loop.run_in_executor(None, self._ensure_connection_healthy, connection):
+                return connection
+    
+    async def execute_async(self, request_func: Callable, *args,
+                            idempotent: bool = False,
+                            timeout: float = 10.0,
+                            priority: ConnectionPriority = ConnectionPriority.NORMAL,
+                            **kwargs) -> Any:
+        """
+        在池中连接上异步执行一次上游调用
+        
+        调用先获取并发限制器名额，再获取连接，最后在线程池中执行。
+        idempotent=True 且启用对冲时，主请求超过历史延迟分位仍未返回，
+        会在另一个连接上发起一次重复请求，取先成功返回的结果。
+        
+        Args:
+            request_func: 上游调用，如 xtdata.get_market_data
+            idempotent: 是否为可重复执行的只读请求
+            timeout: 等待名额和连接的超时时间(秒)
+            priority: 连接获取优先级
+        """
+        call = functools.partial(request_func, *args, **kwargs)
+        with self._lock:
+            self._hedge_stats["requests"] += 1
+        
+        primary_state: Dict[str, Any] = {}
+        primary = asyncio.ensure_future(
+            self._execute_attempt_async(call, timeout, priority, primary_state)
+        )
+        hedge_delay = self._get_hedge_delay() if idempotent else None
+        if hedge_delay is None:
+            return await primary
+        
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done or not self.concurrency_limiter.try_acquire():
+            return await primary
+        
+        with self._lock:
+            self._hedge_stats["hedged"] += 1
+        hedge = asyncio.ensure_future(self._execute_attempt_async(
+            call, self.hedging.acquire_timeout, priority,
+            {"avoid": primary_state.get("connection")}, permit_acquired=True
+        ))
+        
+        # 取先成功的结果，落后的请求继续在后台完成以正确归还名额
+        pending = {primary, hedge}
+        first_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        with self._lock:
+                            self._hedge_stats["hedge_wins"] += 1
+                    for straggler in pending:
+                        straggler.add_done_callback(self._discard_attempt_result)
+                    return task.result()
+                if task is primary or first_error is None:
+                    first_error = task.exception()
+        
+        raise first_error
+    
+    async def _execute_attempt_async(self, call: Callable, timeout: float,
+                                     priority: ConnectionPriority, state: Dict[str, Any],
+                                     permit_acquired: bool = False) -> Any:
+        """执行一次上游调用尝试（持有并发名额和连接）"""
+        loop = asyncio.get_running_loop()
+        if not permit_acquired:
+            await self.concurrency_limiter.acquire_async(timeout)
+        
+        latency = None
+        dropped = False
+        try:
+            connection = await self._acquire_connection_async(timeout, priority, avoid=state.get("avoid"))
+            state["connection"] = connection
+            try:
+                started = time.monotonic()
+                result = await loop.run_in_executor(None, connection.execute_request, call)
+                latency = time.monotonic() - started
+                with self._lock:
+                    self._call_latencies.append(latency)
+                return result
+            except (ConnectionError, TimeoutError, OSError):
+                dropped = True
+                raise
+            finally:
+                self._release_connection(connection)
+        finally:
+            self.concurrency_limiter.release(latency, dropped)
+    
+    @staticmethod
+    def _discard_attempt_result(task: asyncio.Future):
+        """读取被放弃请求的结果，避免未处理异常告警"""
+        if not task.cancelled():
+            task.exception()
+    
+    def _get_hedge_delay(self) -> Optional[float]:
+        """按近期调用延迟分位计算对冲等待时间，不满足对冲条件时返回None"""
+        config = self.hedging
+        if not config.enabled:
+            return None
+        
+        with self._lock:
+            if len(self._call_latencies) < config.min_samples:
+                return None
+            if self._hedge_stats["hedged"] >= config.max_hedge_ratio * self._hedge_stats["requests"]:
+                return None
+            latencies = sorted(self._call_latencies)
+        
+        index = min(len(latencies) - 1, int(len(latencies) * config.percentile / 100))
+        return max(config.min_delay, min(config.max_delay, latencies[index]))
+    
+    def _enqueue_waiter(self, waiter: _ConnectionWaiter) -> bool:
+        """加入等待队列并尝试立即分配，返回是否已分配到连接"""
+        with self._lock:
+            if self._shutdown:
+                raise ConnectionError("连接池已关闭")
+            self._waiters[waiter.priority].append(waiter)
+            self._dispatch_waiters()
+            return waiter.connection is not None
+    
+    def _finish_wait(self, waiter: _ConnectionWaiter, timeout: float) -> XtQuantConnection:
+        """结束等待：返回分配到的连接，否则移出队列并抛出超时"""
+        with self._lock:
+            histogram = self._wait_histograms[waiter.priority]
+            if waiter.connection is not None:
+                histogram.record(time.monotonic() - waiter.enqueued_at)
+                return waiter.connection
             
-            # 等待一段时间后重试
-            time.sleep(0.1)
+            self._discard_waiter(waiter)
+            if self._shutdown:
+                raise ConnectionError("连接池已关闭")
+            histogram.record_timeout()
         
         raise TimeoutError(f"获取连接超时 ({timeout}秒)")
     
-    def _select_connection_by_strategy(self) -> Optional[XtQuantConnection]:
-        """根据负载均衡策略选择连接"""
+    def _abandon_waiter(self, waiter: _ConnectionWaiter):
+        """等待被取消：移出队列，已分配的名额交还给下一个等待者"""
+        with self._lock:
+            if waiter.connection is None:
+                self._discard_waiter(waiter)
+                return
+        self._release_connection(waiter.connection)
+    
+    def _discard_waiter(self, waiter: _ConnectionWaiter):
+        """从等待队列中移除（需持有锁）"""
+        try:
+            self._waiters[waiter.priority].remove(waiter)
+        except ValueError:
+            pass
+    
+    def _dispatch_waiters(self):
+        """按优先级、同级先来后到把空闲名额移交给等待者（需持有锁）"""
+        for priority in ConnectionPriority:
+            lane = self._waiters[priority]
+            while lane:
+                connection = self._select_connection_by_strategy(avoid=lane[0].avoid)
+                if connection is None:
+                    return
+                
+                waiter = lane.popleft()
+                self._leases[connection.connection_id] += 1
+                self._update_connection_stats(connection.connection_id)
+                waiter.connection = connection
+                waiter.wake()
+    
+    def _try_grow_pool(self) -> bool:
+        """名额不足且未达上限时新建连接，并把新名额分配给等待者"""
+        with self._lock:
+            if self._shutdown or len(self._connections) >= self.max_connections:
+                return False
+            if not any(self._waiters.values()):
+                return False
+        
+        return self._create_new_connection() is not None
+    
+    def _ensure_connection_healthy(self, connection: XtQuantConnection) -> bool:
+        """检查分配到的连接，不健康时尝试重连，失败则移除并交还名额"""
+        if connection.is_healthy() or connection.connect():
+            return True
+        
+        self.logger.warning(f"连接 {connection.connection_id} 重连失败，移除连接")
+        self._remove_connection(connection)
+        with self._lock:
+            self._dispatch_waiters()
+        return False
+    
+    def _select_connection_by_strategy(self, avoid: Optional[XtQuantConnection] = None) -> Optional[XtQuantConnection]:
+        """根据负载均衡策略选择连接，有其他可选连接时避开 avoid"""
         with self._lock:
             healthy_connections = [
                 conn for conn in self._connections.values() 
-                if conn.metrics.is_healthy and conn.metrics.active_requests < 10  # 限制并发请求数
+                if conn.metrics.is_healthy
+                and self._leases.get(conn.connection_id, 0) < self.max_requests_per_connection
             ]
             
             if not healthy_connections:
                 return None
             
+            if avoid is not None and len(healthy_connections) > 1:
+                healthy_connections = [conn for conn in healthy_connections if conn is not avoid] or healthy_connections
+            
             if self.load_balance_strategy == LoadBalanceStrategy.ROUND_ROBIN:
                 return self._select_round_robin(healthy_connections)
             elif self.load_balance_strategy == LoadBalanceStrategy.LEAST_CONNECTIONS:
@@ -602,7 +1123,7 @@ class XtQuantConnectionPool:
         if not connections:
             return None
         
-        return min(connections, key=lambda conn: conn.metrics.active_requests)
+        return min(connections, key=lambda conn: self._leases.get(conn.connection_id, 0))
     
     def _select_fastest_response(self, connections: List[XtQuantConnection]) -> XtQuantConnection:
         """最快响应策略"""
@@ -625,8 +1146,8 @@ class XtQuantConnectionPool:
         self._connection_stats[connection_id]['last_used'] = time.time()
     
     def _create_new_connection(self) -> Optional[XtQuantConnection]:
-        """创建新连接"""
-        connection_id = f"conn_{len(self._connections)}_{int(time.time())}"
+        """创建新连接，成功后唤醒等待者"""
+        connection_id = f"conn_{next(self._connection_seq)}_{int(time.time())}"
         
         config = {
             "timeout": self.connection_timeout,
@@ -637,12 +1158,20 @@ class XtQuantConnectionPool:
             "warmup_timeout": 15.0
         }
         
-        connection = self._create_connection(connection_id, config)
+        with self._lock:
+            # 先登记再连接，并发扩容时不会超过最大连接数
+            if len(self._connections) >= self.max_connections:
+                return None
+            connection = self._create_connection(connection_id, config)
+        
         if connection.connect():
             self.logger.info(f"创建新连接成功: {connection_id}")
+            with self._lock:
+                self._dispatch_waiters()
             return connection
         else:
             self.logger.error(f"创建新连接失败: {connection_id}")
+            self._remove_connection(connection)
             return None
     
     def _remove_connection(self, connection: XtQuantConnection):
@@ -653,18 +1182,24 @@ class XtQuantConnectionPool:
                 del self._connections[connection.connection_id]
             if connection.connection_id in self._connection_stats:
                 del self._connection_stats[connection.connection_id]
+            self._leases.pop(connection.connection_id, None)
     
     def _release_connection(self, connection: XtQuantConnection):
-        """释放连接回池中"""
+        """交还连接名额，并移交给排在最前面的等待者"""
         try:
-            if not self._shutdown and connection.is_healthy():
-                self._available_connections.put(connection, timeout=1.0)
-            else:
+            healthy = not self._shutdown and connection.is_healthy()
+            if not healthy:
                 # 连接不健康或池已关闭，断开连接
                 connection.disconnect()
-                with self._lock:
-                    if connection.connection_id in self._connections:
-                        del self._connections[connection.connection_id]
+            
+            with self._lock:
+                connection_id = connection.connection_id
+                if self._leases.get(connection_id, 0) > 0:
+                    self._leases[connection_id] -= 1
+                if not healthy:
+                    self._connections.pop(connection_id, None)
+                    self._leases.pop(connection_id, None)
+                self._dispatch_waiters()
         except Exception as e:
             self.logger.error(f"释放连接异常: {e}")
     
@@ -672,7 +1207,8 @@ class XtQuantConnectionPool:
         """健康检查循环"""
         while not self._shutdown:
             try:
-                time.sleep(self.health_check_interval)
+                if self._stop_event.wait(self.health_check_interval):
+                    break
                 self._perform_health_checks()
             except Exception as e:
                 self.logger.error(f"健康检查异常: {e}")
@@ -692,31 +1228,22 @@ class XtQuantConnectionPool:
                 connection.disconnect()
                 if connection.connection_id in self._connections:
                     del self._connections[connection.connection_id]
+                self._leases.pop(connection.connection_id, None)
             
-            # 确保最小连接数
-            current_healthy = len(self._connections) - len(unhealthy_connections)
-            if current_healthy < self.min_connections:
-                needed = self.min_connections - current_healthy
-                for i in range(needed):
-                    connection_id = f"conn_{len(self._connections) + i}"
-                    config = {
-                        "timeout": self.connection_timeout,
-                        "max_retries": 3,
-                        "retry_delay_base": 1.0,
-                        "retry_delay_max": 30.0,
-                        "warmup_requests": 3,
-                        "warmup_timeout": 15.0
-                    }
-                    connection = self._create_connection(connection_id, config)
-                    if connection.connect():
-                        self._available_connections.put(connection)
-                        self.logger.info(f"补充连接: {connection_id}")
+            needed = self.min_connections - len(self._connections)
+        
+        # 确保最小连接数（建立连接较慢，不持有锁，避免阻塞获取连接的请求）
+        for i in range(needed):
+            connection = self._create_new_connection()
+            if connection:
+                self.logger.info(f"补充连接: {connection.connection_id}")
     
     def _cleanup_loop(self):
         """清理循环 - 移除空闲连接"""
         while not self._shutdown:
             try:
-                time.sleep(60)  # 每分钟检查一次
+                if self._stop_event.wait(60):  # 每分钟检查一次
+                    break
                 self._cleanup_idle_connections()
             except Exception as e:
                 self.logger.error(f"清理异常: {e}")
@@ -746,16 +1273,16 @@ class XtQuantConnectionPool:
                         f"平均响应时间: {avg_response_time:.3f}s"
                     )
                     
-                    # 检查是否需要预创建连接
-                    if healthy_connections < self.min_connections:
-                        self._ensure_min_connections()
+                # 检查是否需要预创建连接（不持有锁）
+                if healthy_connections < self.min_connections:
+                    self._ensure_min_connections()
                 
                 # 等待下次收集
-                time.sleep(60)  # 每60秒收集一次统计信息
+                self._stop_event.wait(60)  # 每60秒收集一次统计信息
                 
             except Exception as e:
                 self.logger.error(f"统计收集循环异常: {e}")
-                time.sleep(10)
+                self._stop_event.wait(10)
     
     def _ensure_min_connections(self):
         """确保最小连接数"""
@@ -815,6 +1342,7 @@ class XtQuantConnectionPool:
                     "id": conn_id,
                     "status": conn.metrics.status.value,
                     "is_healthy": conn.metrics.is_healthy,
+                    "leases": self._leases.get(conn_id, 0),
                     "active_requests": conn.metrics.active_requests,
                     "total_requests": conn.metrics.total_requests,
                     "success_rate": conn.metrics.success_rate,
@@ -836,12 +1364,27 @@ class XtQuantConnectionPool:
                 "performance_metrics": {
                     "total_requests": total_requests,
                     "avg_response_time": round(avg_response_time, 3),
-                    "pool_utilization": round(total_connections / self.max_connections * 100, 2)
+                    "pool_utilization": round(total_connections / self.max_connections * 100, 2),
+                    "leased_slots": sum(self._leases.values())
+                },
+                "waiting_requests": {
+                    priority.name.lower(): len(lane) for priority, lane in self._waiters.items()
+                },
+                "wait_time_histograms": {
+                    priority.name.lower(): histogram.to_dict()
+                    for priority, histogram in self._wait_histograms.items()
+                },
+                "concurrency_limiter": self.concurrency_limiter.get_stats(),
+                "hedging": {
+                    "enabled": self.hedging.enabled,
+                    "current_delay": self._get_hedge_delay(),
+                    **self._hedge_stats
                 },
                 "configuration": {
                     "connection_timeout": self.connection_timeout,
                     "max_idle_time": self.max_idle_time,
-                    "health_check_interval": self.health_check_interval
+                    "health_check_interval": self.health_check_interval,
+                    "max_requests_per_connection": self.max_requests_per_connection
                 },
                 "connections": connection_details
             }
@@ -850,12 +1393,17 @@ class XtQuantConnectionPool:
         """关闭连接池"""
         self.logger.info("正在关闭连接池...")
         self._shutdown = True
+        self._stop_event.set()
         
-        # 关闭所有连接
+        # 关闭所有连接，唤醒仍在排队的请求
         with self._lock:
+            for lane in self._waiters.values():
+                while lane:
+                    lane.popleft().wake()
             for connection in self._connections.values():
                 connection.disconnect()
             self._connections.clear()
+            self._leases.clear()
         
         # 关闭线程池
         self._executor.shutdown(wait=True)
@@ -879,7 +1427,10 @@ def get_connection_pool() -> XtQuantConnectionPool:
                     max_connections=8,
                     health_check_interval=120,  # 增加健康检查间隔到120秒
                     connection_timeout=10,
-                    max_idle_time=300
+                    max_idle_time=300,
+                    hedging=HedgingConfig(
+                        enabled=os.getenv('XTQUANT_HEDGING_ENABLED', 'false').lower() == 'true'
+                    )
                 )
     
     return _connection_pool
@@ -11,10 +11,18 @@ import time
 import statistics
 import argparse
 import sys
+import os
 from typing import List, Dict, Any, Optional
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
+from urllib.parse import urlparse
 import logging
+import uuid
+
+from aiohttp import web
+
+# 项目根目录，--simulated 模式需要导入服务端模块
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 # 配置日志
 logging.basicConfig(
@@ -47,6 +55,8 @@ class ConnectionStats:
     messages_received: int = 0
     errors: List[str] = field(default_factory=list)
     response_times: List[float] = field(default_factory=list)
+    pending_pings: Dict[str, float] = field(default_factory=dict)  # message_id -> 发送时间
+    market_data_received: int = 0
 
 
 @dataclass
@@ -57,6 +67,7 @@ class TestResults:
     failed_connections: int = 0
     total_messages_sent: int = 0
     total_messages_received: int = 0
+    total_market_data_received: int = 0
     total_errors: int = 0
     test_duration: float = 0
     connection_stats: List[ConnectionStats] = field(default_factory=list)
@@ -150,8 +161,11 @@ class WebSocketLoadTester:
             # 发送订阅消息
             subscribe_message = {
                 "type": "subscribe",
-                "symbol": "000001.SZ",
-                "data_type": "quote"
+                "timestamp": datetime.now().isoformat(),
+                "data": {
+                    "symbol": "000001.SZ",
+                    "data_type": "quote"
+                }
             }
             await websocket.send_str(json.dumps(subscribe_message))
             stats.messages_sent += 1
@@ -193,13 +207,16 @@ class WebSocketLoadTester:
         
         try:
             while not self._stop_event.is_set() and not websocket.closed:
-                # 发送ping消息
+                # 发送ping消息，按message_id匹配服务端的pong计算响应时间
+                message_id = str(uuid.uuid4())
                 ping_message = {
                     "type": "ping",
-                    "timestamp": time.time()
+                    "timestamp": datetime.now().isoformat(),
+                    "message_id": message_id,
+                    "data": {"client_time": time.time()}
                 }
                 
-                send_time = time.time()
+                stats.pending_pings[message_id] = time.time()
                 await websocket.send_str(json.dumps(ping_message))
                 stats.messages_sent += 1
                 
@@ -219,9 +236,13 @@ class WebSocketLoadTester:
                         stats.messages_received += 1
                         
                         # 计算响应时间
-                        if data.get("type") == "pong" and "timestamp" in data:
-                            response_time = (time.time() - data["timestamp"]) * 1000  # 毫秒
+                        payload = data.get("data") or {}
+                        send_time = stats.pending_pings.pop(payload.get("original_message_id"), None)
+                        if payload.get("type") == "pong" and send_time is not None:
+                            response_time = (time.time() - send_time) * 1000  # 毫秒
                             stats.response_times.append(response_time)
+                        elif data.get("type") == "market_data":
+                            stats.market_data_received += 1
                         
                     except json.JSONDecodeError:
                         stats.errors.append("JSON解析错误")
@@ -246,6 +267,7 @@ class WebSocketLoadTester:
             
             self.results.total_messages_sent += stats.messages_sent
             self.results.total_messages_received += stats.messages_received
+            self.results.total_market_data_received += stats.market_data_received
             self.results.total_errors += len(stats.errors)
         
         if self.test_start_time and self.test_end_time:
@@ -303,6 +325,7 @@ class SystemLoadTester:
                 "connection_success_rate": round(results.connection_success_rate, 2),
                 "total_messages_sent": results.total_messages_sent,
                 "total_messages_received": results.total_messages_received,
+                "market_data_received": results.total_market_data_received,
                 "message_success_rate": round(results.message_success_rate, 2),
                 "messages_per_second": round(results.messages_per_second, 2),
                 "average_response_time_ms": round(results.average_response_time, 2),
@@ -439,6 +462,72 @@ class SystemLoadTester:
         return metrics
 
 
+class SimulatedEnvironment:
+    """
+    进程内的模拟测试环境
+    
+    使用模拟xtdata后端启动WebSocket服务器，并提供 /health、/stats 接口，
+    无需miniQMT客户端即可在CI环境中端到端运行负载测试。
+    """
+    
+    def __init__(self, config: LoadTestConfig):
+        self.config = config
+        self.server = None
+        self._server_task: Optional[asyncio.Task] = None
+        self._api_runner: Optional[web.AppRunner] = None
+    
+    async def start(self):
+        """启动模拟后端、WebSocket服务器和API服务"""
+        if PROJECT_ROOT not in sys.path:
+            sys.path.insert(0, PROJECT_ROOT)
+        
+        from data_agent_service.xtdata_simulator import install_simulated_xtquant
+        from src.argus_mcp.websocket_server import WebSocketServer
+        from src.argus_mcp.data_publisher import DataSourceConfig
+        
+        install_simulated_xtquant()
+        
+        ws_url = urlparse(self.config.websocket_url)
+        self.server = WebSocketServer(
+            host=ws_url.hostname or "localhost",
+            port=ws_url.port or 8765,
+            max_connections=max(self.config.concurrent_connections * 2, 100),
+            data_source_config=DataSourceConfig(source_type="qmt", update_interval=1.0)
+        )
+        self._server_task = asyncio.create_task(self.server.start())
+        while not self.server.is_running:
+            if self._server_task.done():
+                # 启动失败时抛出原始异常
+                self._server_task.result()
+            await asyncio.sleep(0.05)
+        
+        api_url = urlparse(self.config.api_url)
+        app = web.Application()
+        app.router.add_get("/health", self._handle_health)
+        app.router.add_get("/stats", self._handle_stats)
+        self._api_runner = web.AppRunner(app)
+        await self._api_runner.setup()
+        await web.TCPSite(self._api_runner, api_url.hostname or "localhost", api_url.port or 8080).start()
+        
+        logger.info(f"模拟环境已启动: {self.config.websocket_url}, {self.config.api_url}")
+    
+    async def stop(self):
+        """停止模拟环境"""
+        if self._api_runner:
+            await self._api_runner.cleanup()
+        if self.server:
+            await self.server.stop()
+        if self._server_task:
+            await asyncio.gather(self._server_task, return_exceptions=True)
+    
+    async def _handle_health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "healthy", "backend": "simulated"})
+    
+    async def _handle_stats(self, request: web.Request) -> web.Response:
+        stats = await self.server.get_server_stats()
+        return web.json_response(json.loads(json.dumps(stats, default=str)))
+
+
 def print_test_results(results: Dict[str, Any]):
     """打印测试结果"""
     print("\n" + "="*80)
@@ -507,6 +596,8 @@ async def main():
     parser.add_argument("--ramp-up", type=int, default=10, help="连接建立时间（秒）")
     parser.add_argument("--output", help="结果输出文件（JSON格式）")
     parser.add_argument("--verbose", action="store_true", help="详细输出")
+    parser.add_argument("--simulated", action="store_true",
+                        help="在进程内启动基于模拟xtdata后端的服务器（无需miniQMT，适用于CI）")
     
     args = parser.parse_args()
     
@@ -525,8 +616,12 @@ async def main():
     
     # 运行负载测试
     tester = SystemLoadTester(config)
+    environment = SimulatedEnvironment(config) if args.simulated else None
     
     try:
+        if environment:
+            await environment.start()
+        
         results = await tester.run_comprehensive_test()
         
         # 输出结果
@@ -551,6 +646,9 @@ async def main():
     except Exception as e:
         logger.error(f"测试执行错误: {e}")
         sys.exit(1)
+    finally:
+        if environment:
+            await environment.stop()
 
 
 if __name__ == "__main__":
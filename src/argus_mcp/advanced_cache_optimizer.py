@@ -1,9 +1,13 @@
 """
 高级缓存优化器
 实现智能缓存策略、自适应TTL和缓存预热
+
+Redis 访问走 redis_cache_tier.AsyncRedisTier（redis.asyncio 原生异步客户端，
+批量读写一次流水线往返，按模式清除使用 SCAN）。
 """
 
 import asyncio
+import fnmatch
 import time
 import json
 import logging
@@ -11,10 +15,11 @@ from typing import Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
-import redis
 import hashlib
 from enum import Enum
 
+from .redis_cache_tier import AsyncRedisTier, RedisTierConfig, create_async_redis
+
 logger = logging.getLogger(__name__)
 
 class CacheStrategy(Enum):
@@ -178,8 +183,14 @@ class PredictiveCacheManager:
 class AdvancedCacheOptimizer:
     """高级缓存优化器"""
     
-    def __init__(self, redis_client: redis.Redis):
+    def __init__(self, redis_client: Any, tier_config: Optional[RedisTierConfig] = None):
+        """
+        Args:
+            redis_client: redis.asyncio 客户端（decode_responses=True）
+            tier_config: Redis 层配置（批量大小、SCAN、客户端缓存）
+        """
         self.redis_client = redis_client
+        self.tier = AsyncRedisTier(redis_client, tier_config)
         self.metrics = CacheMetrics()
         self.ttl_calculator = AdaptiveTTLCalculator()
         self.predictive_manager = PredictiveCacheManager()
@@ -192,13 +203,36 @@ class AdvancedCacheOptimizer:
         self.preload_interval = 60  # 1分钟
         
         # 启动后台任务
+        self._tasks: List[asyncio.Task] = []
         self._start_background_tasks()
     
     def _start_background_tasks(self):
-        """启动后台任务"""
-        asyncio.create_task(self._cleanup_loop())
-        asyncio.create_task(self._preload_loop())
-        asyncio.create_task(self._metrics_update_loop())
+        """启动后台任务（已启动时不重复创建）"""
+        if self._tasks:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环，由 initialize() 启动
+            return
+        self._tasks = [
+            asyncio.create_task(self._cleanup_loop()),
+            asyncio.create_task(self._preload_loop()),
+            asyncio.create_task(self._metrics_update_loop()),
+        ]
+    
+    async def initialize(self):
+        """启动后台任务和缓存失效订阅"""
+        self._start_background_tasks()
+        await self.tier.start()
+    
+    async def shutdown(self):
+        """停止后台任务并关闭 Redis 连接"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        await self.tier.close()
     
     async def get(self, key: str, data_type: DataType = DataType.MARKET_DATA) -> Optional[Any]:
         """获取缓存数据"""
@@ -278,6 +312,96 @@ class AdvancedCacheOptimizer:
             logger.error(f"Error setting cache for key {key}: {e}")
             return False
     
+    async def get_many(self, keys: List[str],
+                       data_type: DataType = DataType.MARKET_DATA) -> Dict[str, Any]:
+        """
+        批量获取缓存数据（一次 Redis 往返）
+        
+        Returns:
+            命中的 {key: value}，未命中的键不出现
+        """
+        start_time = time.time()
+        
+        try:
+            now = time.time()
+            for key in keys:
+                self.predictive_manager.record_access(key, now)
+            self.metrics.total_requests += len(keys)
+            
+            try:
+                raw_values = await self.tier.mget(keys)
+            except Exception as e:
+                logger.error(f"Redis MGET error for {len(keys)} keys: {e}")
+                raw_values = [None] * len(keys)
+            
+            results = {}
+            for key, cached_data in zip(keys, raw_values):
+                if cached_data is None:
+                    self.metrics.miss_count += 1
+                    continue
+                self.metrics.hit_count += 1
+                entry = self.cache_entries.get(key)
+                if entry is not None:
+                    entry.last_accessed = now
+                    entry.access_count += 1
+                results[key] = json.loads(cached_data)
+            return results
+                
+        finally:
+            self._update_avg_response_time(time.time() - start_time)
+    
+    async def set_many(self, items: Dict[str, Any], data_type: DataType = DataType.MARKET_DATA,
+                       custom_ttl: Optional[int] = None) -> int:
+        """
+        批量设置缓存数据（一次 Redis 往返）
+        
+        Returns:
+            写入成功的键数
+        """
+        try:
+            prepared = []
+            total_size = 0
+            for key, value in items.items():
+                if custom_ttl is not None:
+                    ttl = custom_ttl
+                else:
+                    access_freq = self._get_access_frequency(key)
+                    volatility = self._estimate_data_volatility(key, data_type)
+                    ttl = self.ttl_calculator.calculate_ttl(key, data_type, access_freq, volatility)
+                serialized_value = json.dumps(value, default=str)
+                data_size = len(serialized_value.encode('utf-8'))
+                total_size += data_size
+                prepared.append((key, value, serialized_value, ttl, data_size))
+            
+            if not prepared:
+                return 0
+            
+            # 检查内存使用
+            if await self._check_memory_usage(total_size):
+                await self._evict_entries()
+            
+            written = await self.tier.set_many(
+                [(key, serialized_value, ttl) for key, _, serialized_value, ttl, _ in prepared]
+            )
+            
+            now = time.time()
+            for key, value, _, ttl, data_size in prepared:
+                self.cache_entries[key] = CacheEntry(
+                    key=key,
+                    value=value,
+                    created_at=now,
+                    last_accessed=now,
+                    access_count=1,
+                    ttl=ttl,
+                    data_type=data_type,
+                    size=data_size
+                )
+            return written
+            
+        except Exception as e:
+            logger.error(f"Error setting cache for {len(items)} keys: {e}")
+            return 0
+    
     async def delete(self, key: str) -> bool:
         """删除缓存数据"""
         try:
@@ -289,20 +413,27 @@ class AdvancedCacheOptimizer:
             logger.error(f"Error deleting cache for key {key}: {e}")
             return False
     
-    async def clear_by_pattern(self, pattern: str) -> int:
-        """按模式清除缓存"""
+    async def delete_many(self, keys: List[str]) -> int:
+        """批量删除缓存数据（一次 Redis 往返）"""
         try:
-            keys = await self._redis_keys(pattern)
-            if keys:
-                deleted_count = await self._redis_delete_multiple(keys)
-                
-                # 更新本地缓存条目
-                for key in keys:
-                    if key in self.cache_entries:
-                        del self.cache_entries[key]
-                
-                return deleted_count
+            deleted_count = await self._redis_delete_multiple(keys)
+            for key in keys:
+                self.cache_entries.pop(key, None)
+            return deleted_count
+        except Exception as e:
+            logger.error(f"Error deleting {len(keys)} cache keys: {e}")
             return 0
+    
+    async def clear_by_pattern(self, pattern: str) -> int:
+        """按模式清除缓存（SCAN 分批删除，不阻塞 Redis）"""
+        try:
+            deleted_count = await self.tier.delete_pattern(pattern)
+            
+            # 更新本地缓存条目
+            for key in [k for k in self.cache_entries if fnmatch.fnmatchcase(k, pattern)]:
+                del self.cache_entries[key]
+            
+            return deleted_count
         except Exception as e:
             logger.error(f"Error clearing cache by pattern {pattern}: {e}")
             return 0
@@ -314,7 +445,8 @@ class AdvancedCacheOptimizer:
             "cache_entries_count": len(self.cache_entries),
             "strategy": self.strategy.value,
             "memory_usage_mb": self.metrics.memory_usage / (1024 * 1024),
-            "top_accessed_keys": self._get_top_accessed_keys(10)
+            "top_accessed_keys": self._get_top_accessed_keys(10),
+            "redis_tier": self.tier.get_stats()
         }
     
     async def optimize_cache(self) -> Dict[str, Any]:
@@ -348,7 +480,7 @@ class AdvancedCacheOptimizer:
     async def _redis_get(self, key: str) -> Optional[str]:
         """Redis GET操作"""
         try:
-            return await asyncio.to_thread(self.redis_client.get, key)
+            return await self.tier.get(key)
         except Exception as e:
             logger.error(f"Redis GET error for key {key}: {e}")
             return None
@@ -356,7 +488,7 @@ class AdvancedCacheOptimizer:
     async def _redis_set(self, key: str, value: str, ttl: int) -> bool:
         """Redis SET操作"""
         try:
-            return await asyncio.to_thread(self.redis_client.setex, key, ttl, value)
+            return await self.tier.set(key, value, ttl)
         except Exception as e:
             logger.error(f"Redis SET error for key {key}: {e}")
             return False
@@ -364,26 +496,16 @@ class AdvancedCacheOptimizer:
     async def _redis_delete(self, key: str) -> bool:
         """Redis DELETE操作"""
         try:
-            result = await asyncio.to_thread(self.redis_client.delete, key)
-            return result > 0
+            return await self.tier.delete([key]) > 0
         except Exception as e:
             logger.error(f"Redis DELETE error for key {key}: {e}")
             return False
     
-    async def _redis_keys(self, pattern: str) -> List[str]:
-        """Redis KEYS操作"""
-        try:
-            keys = await asyncio.to_thread(self.redis_client.keys, pattern)
-            return [key.decode('utf-8') if isinstance(key, bytes) else key for key in keys]
-        except Exception as e:
-            logger.error(f"Redis KEYS error for pattern {pattern}: {e}")
-            return []
-    
     async def _redis_delete_multiple(self, keys: List[str]) -> int:
         """Redis批量删除"""
         try:
             if keys:
-                return await asyncio.to_thread(self.redis_client.delete, *keys)
+                return await self.tier.delete(keys)
             return 0
         except Exception as e:
             logger.error(f"Redis batch DELETE error: {e}")
@@ -440,9 +562,7 @@ class AdvancedCacheOptimizer:
         )
         
         # 驱逐最旧的条目
-        for entry in sorted_entries[:len(sorted_entries)//4]:  # 驱逐25%
-            await self.delete(entry.key)
-            self.metrics.eviction_count += 1
+        await self._evict_keys([entry.key for entry in sorted_entries[:len(sorted_entries)//4]])  # 驱逐25%
     
     async def _evict_lfu(self):
         """LFU驱逐策略"""
@@ -456,9 +576,7 @@ class AdvancedCacheOptimizer:
         )
         
         # 驱逐访问次数最少的条目
-        for entry in sorted_entries[:len(sorted_entries)//4]:  # 驱逐25%
-            await self.delete(entry.key)
-            self.metrics.eviction_count += 1
+        await self._evict_keys([entry.key for entry in sorted_entries[:len(sorted_entries)//4]])  # 驱逐25%
     
     async def _evict_adaptive(self):
         """自适应驱逐策略"""
@@ -478,9 +596,13 @@ class AdvancedCacheOptimizer:
         # 按分数排序，驱逐分数最低的条目
         scored_entries.sort(key=lambda x: x[1])
         
-        for entry, _ in scored_entries[:len(scored_entries)//4]:  # 驱逐25%
-            await self.delete(entry.key)
-            self.metrics.eviction_count += 1
+        await self._evict_keys([entry.key for entry, _ in scored_entries[:len(scored_entries)//4]])  # 驱逐25%
+    
+    async def _evict_keys(self, keys: List[str]):
+        """批量驱逐（一次 Redis 往返）"""
+        if keys:
+            await self.delete_many(keys)
+            self.metrics.eviction_count += len(keys)
     
     def _update_avg_response_time(self, response_time: float):
         """更新平均响应时间"""
@@ -519,8 +641,8 @@ class AdvancedCacheOptimizer:
             if entry.is_expired
         ]
         
-        for key in expired_keys:
-            await self.delete(key)
+        if expired_keys:
+            await self.delete_many(expired_keys)
         
         return len(expired_keys)
     
@@ -610,17 +732,17 @@ def get_cache_optimizer() -> AdvancedCacheOptimizer:
     """获取缓存优化器实例"""
     global _cache_optimizer
     if _cache_optimizer is None:
-        import redis
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        redis_client = create_async_redis(host='localhost', port=6379, db=0)
         _cache_optimizer = AdvancedCacheOptimizer(redis_client)
     return _cache_optimizer
 
-async def init_cache_optimizer(redis_client: redis.Redis = None) -> AdvancedCacheOptimizer:
-    """初始化缓存优化器"""
+async def init_cache_optimizer(redis_client: Any = None,
+                               tier_config: Optional[RedisTierConfig] = None) -> AdvancedCacheOptimizer:
+    """初始化缓存优化器（redis_client 为 redis.asyncio 客户端）"""
     global _cache_optimizer
     if redis_client is None:
-        import redis
-        redis_client = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True)
+        redis_client = create_async_redis(host='localhost', port=6379, db=0)
     
-    _cache_optimizer = AdvancedCacheOptimizer(redis_client)
+    _cache_optimizer = AdvancedCacheOptimizer(redis_client, tier_config)
+    await _cache_optimizer.initialize()
     return _cache_optimizer
\ No newline at end of file
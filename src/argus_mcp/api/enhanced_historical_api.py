@@ -5,9 +5,11 @@
 """
 
 import asyncio
+import functools
 import logging
-from typing import Dict, List, Optional, Any, Union
-from datetime import datetime, timedelta, timezone
+import time
+from typing import Dict, List, Optional, Any, Tuple, Union
+from datetime import datetime, timedelta
 from dataclasses import asdict
 from decimal import Decimal
 from fastapi import FastAPI, HTTPException, Query, BackgroundTasks
@@ -18,9 +20,23 @@ from ..data_models.historical_data import (
     StandardKLineData, DataQualityMetrics, ValidationResult, SupportedPeriod
 )
 from ..processors.data_normalizer import DataNormalizer
-from ..processors.multi_period_processor import MultiPeriodProcessor
+from ..processors.multi_period_processor import MultiPeriodProcessor, PeriodType
 from ..monitoring.data_quality_monitor import DataQualityMonitor, QualityReport
 from ..cache.historical_data_cache import HistoricalDataCache, get_historical_cache
+from ..streaming_bar_builder import EXCHANGE_TZ
+
+
+# 可由更细粒度周期聚合得到的周期及其基础周期
+DERIVABLE_PERIODS: Dict[SupportedPeriod, SupportedPeriod] = {
+    SupportedPeriod.MINUTE_5: SupportedPeriod.MINUTE_1,
+    SupportedPeriod.MINUTE_15: SupportedPeriod.MINUTE_1,
+    SupportedPeriod.MINUTE_30: SupportedPeriod.MINUTE_1,
+    SupportedPeriod.HOUR_1: SupportedPeriod.MINUTE_1,
+    SupportedPeriod.HOUR_2: SupportedPeriod.MINUTE_1,
+    SupportedPeriod.HOUR_4: SupportedPeriod.MINUTE_1,
+    SupportedPeriod.WEEK_1: SupportedPeriod.DAY_1,
+    SupportedPeriod.MONTH_1: SupportedPeriod.DAY_1,
+}
 
 
 # Pydantic模型定义
@@ -133,150 +149,22 @@ class EnhancedHistoricalDataAPI:
             self._validate_request(request)
             
             # 检查缓存
-            cache_key = self._generate_cache_key(request)
             if request.use_cache:
-                cached_data = await self._get_from_cache(cache_key)
+                cached_data = await self._get_from_cache(request)
                 if cached_data:
                     return cached_data
             
-            # 获取基础数据（这里应该从实际数据源获取）
-            raw_data = await self._fetch_raw_data(
-                request.symbol, 
-                request.start_date, 
-                request.end_date, 
-                request.period
-            )
-            
-            if not raw_data:
-                return HistoricalDataResponse(
-                    success=False,
-                    symbol=request.symbol,
-                    period=request.period.value,
-                    start_date=request.start_date,
-                    end_date=request.end_date,
-                    total_records=0,
-                    data=[],
-                    metadata={"error": "No data available"}
-                )
-            
-            # 数据标准化和模型转换
-            if request.normalize_data:
-                normalized_data = self.data_normalizer.normalize_kline_data(
-                    raw_data, 
-                    symbol=request.symbol,
-                    period=request.period.value
-                )
-            else:
-                # 将原始数据转换为StandardKLineData格式
-                normalized_data = []
-                for item in raw_data:
-                    try:
-                        # 处理时间戳
-                        timestamp = item.get('datetime') or item.get('timestamp')
-                        if isinstance(timestamp, str):
-                            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                        elif not isinstance(timestamp, datetime):
-                            timestamp = datetime.now()
-                        
-                        # 确保时间戳有时区信息
-                        if timestamp.tzinfo is None:
-                            timestamp = timestamp.replace(tzinfo=timezone.utc)
-                        
-                        kline_data = StandardKLineData(
-                            timestamp=timestamp,
-                            open=Decimal(str(item.get('open', 0))),
-                            high=Decimal(str(item.get('high', 0))),
-                            low=Decimal(str(item.get('low', 0))),
-                            close=Decimal(str(item.get('close', 0))),
-                            volume=int(item.get('volume', 0)),
-                            amount=Decimal(str(item.get('amount', 0))),
-                            quality_score=1.0,
-                            code=item.get('code', request.symbol)
-                        )
-                        normalized_data.append(kline_data)
-                    except (ValueError, TypeError) as e:
-                        self.logger.warning(f"Skipping invalid data item: {e}")
-                        continue
+            # 获取基础数据，并补上数据源尚未包含的实时合成K线
+            normalized_data = await self._load_normalized_data(request)
             
-            # 质量检查
-            quality_report = None
-            if request.include_quality_metrics:
-                quality_report = self.quality_monitor.check_data_quality(
-                    normalized_data, 
-                    request.symbol, 
-                    request.period.value
-                )
+            if not normalized_data:
+                return self._empty_response(request)
             
-            # 应用记录数限制
-            final_data = normalized_data
-            if request.max_records and len(normalized_data) > request.max_records:
-                final_data = normalized_data[-request.max_records:]
-            
-            # 转换为字典格式，确保字段名称一致性
-            data_dicts = []
-            for item in final_data:
-                data_dict = {
-                    'timestamp': item.timestamp.isoformat() if hasattr(item.timestamp, 'isoformat') else str(item.timestamp),
-                    'open': float(item.open),
-                    'high': float(item.high),
-                    'low': float(item.low),
-                    'close': float(item.close),
-                    'volume': int(item.volume),
-                    'amount': float(item.amount),
-                    'quality_score': float(item.quality_score)
-                }
-                data_dicts.append(data_dict)
-            
-            # 构建响应
-            quality_report_dict = None
-            if quality_report:
-                try:
-                    # Try to convert to dict if it's a dataclass
-                    if hasattr(quality_report, '__dataclass_fields__'):
-                        quality_report_dict = asdict(quality_report)
-                    elif hasattr(quality_report, '__dict__'):
-                        # If it's a regular object with attributes
-                        quality_report_dict = {
-                            'quality_score': getattr(quality_report, 'quality_score', 0.0),
-                            'issues': getattr(quality_report, 'issues', []),
-                            'metrics': getattr(quality_report, 'metrics', {})
-                        }
-                    else:
-                        # If it's already a dict or other type
-                        quality_report_dict = quality_report
-                except Exception as e:
-                    self.logger.warning(f"Failed to convert quality report: {e}")
-                    quality_report_dict = {"error": "Failed to process quality report"}
-            
-            response = HistoricalDataResponse(
-                success=True,
-                symbol=request.symbol,
-                period=request.period.value,
-                start_date=request.start_date,
-                end_date=request.end_date,
-                total_records=len(final_data),
-                data=data_dicts,
-                quality_report=quality_report_dict,
-                metadata={
-                    "source": "enhanced_api",
-                    "cached": False,
-                    "normalized": request.normalize_data,
-                    "quality_checked": request.include_quality_metrics
-                }
-            )
+            response = self._build_response(request, normalized_data, background_tasks)
             
             # 缓存结果
             if request.use_cache:
-                await self._cache_result(cache_key, response)
-            
-            # 后台质量分析（可选）
-            if background_tasks and quality_report and quality_report.quality_score < 80:
-                background_tasks.add_task(
-                    self._log_quality_issue, 
-                    request.symbol, 
-                    request.period.value, 
-                    quality_report
-                )
+                await self._cache_result(request, response)
             
             return response
             
@@ -302,35 +190,66 @@ class EnhancedHistoricalDataAPI:
         try:
             self._validate_multi_period_request(request)
             
-            results = {}
-            quality_reports = {}
+            periods = list(dict.fromkeys(request.periods))
+            period_requests = {
+                period: self._build_period_request(request, period) for period in periods
+            }
+            responses: Dict[SupportedPeriod, HistoricalDataResponse] = {}
             
-            # 并行获取不同周期的数据
-            tasks = []
-            for period in request.periods:
-                task = self.get_historical_data(
-                    HistoricalDataRequest(
-                        symbol=request.symbol,
-                        start_date=request.start_date,
-                        end_date=request.end_date,
-                        period=period,
-                        include_quality_metrics=request.include_quality_metrics,
-                        normalize_data=True,
-                        use_cache=True
-                    ),
-                    background_tasks
+            # 先命中缓存，只为缺失的周期规划数据源请求
+            for period, period_request in period_requests.items():
+                cached = await self._get_from_cache(period_request)
+                if cached:
+                    responses[period] = cached
+            
+            missing = [period for period in periods if period not in responses]
+            base_periods, derived_periods = self._plan_period_fetches(missing)
+            
+            # 并发获取基础周期数据
+            base_data: Dict[SupportedPeriod, List[StandardKLineData]] = {}
+            if base_periods:
+                fetched = await asyncio.gather(*(
+                    self._load_normalized_data(
+                        period_requests.get(base) or self._build_period_request(request, base)
+                    )
+                    for base in base_periods
+                ))
+                base_data = dict(zip(base_periods, fetched))
+            
+            # 基础周期直接构建响应，其余周期由基础周期聚合得到
+            for base in base_periods:
+                base_request = period_requests.get(base) or self._build_period_request(request, base)
+                if not base_data[base]:
+                    response = self._empty_response(base_request)
+                else:
+                    response = self._build_response(base_request, base_data[base], background_tasks)
+                if response.success:
+                    await self._cache_result(base_request, response)
+                if base in period_requests:
+                    responses[base] = response
+            
+            for period, base in derived_periods.items():
+                derived_data = self.period_processor.resample_data(
+                    base_data[base], PeriodType(period.value), request.symbol
+                )
+                if not derived_data:
+                    responses[period] = self._empty_response(period_requests[period])
+                    continue
+                response = self._build_response(
+                    period_requests[period], derived_data, background_tasks,
+                    derived_from=base.value
                 )
-                tasks.append((period, task))
+                if response.success:
+                    await self._cache_result(period_requests[period], response)
+                responses[period] = response
             
-            # 等待所有任务完成
-            for period, task in tasks:
-                response = await task
+            results = {}
+            quality_reports = {}
+            for period in periods:
+                response = responses[period]
                 if response.success:
                     results[period.value] = response.data
-                    if response.quality_report:
-                        quality_reports[period.value] = response.quality_report
-                    else:
-                        quality_reports[period.value] = None
+                    quality_reports[period.value] = response.quality_report or None
                 else:
                     results[period.value] = []
                     quality_reports[period.value] = None
@@ -343,8 +262,17 @@ class EnhancedHistoricalDataAPI:
                 data=results,
                 quality_reports=quality_reports,
                 metadata={
-                    "total_periods": len(request.periods),
-                    "source": "enhanced_api"
+                    "total_periods": len(periods),
+                    "source": "enhanced_api",
+                    "upstream_calls": len(base_periods),
+                    "fetched_periods": [base.value for base in base_periods],
+                    "derived_periods": {
+                        period.value: base.value for period, base in derived_periods.items()
+                    },
+                    "cached_periods": [
+                        period.value for period in periods
+                        if period not in missing
+                    ]
                 }
             )
             
@@ -352,6 +280,104 @@ class EnhancedHistoricalDataAPI:
             self.logger.error(f"Error getting multi-period data: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
     
+    def _plan_period_fetches(
+        self,
+        periods: List[SupportedPeriod]
+    ) -> Tuple[List[SupportedPeriod], Dict[SupportedPeriod, SupportedPeriod]]:
+        """
+        规划多周期请求的最小数据源调用集合
+        
+        分钟/小时周期可由1分钟线聚合，周线/月线可由日线聚合。只有当基础周期
+        本身被请求，或至少两个周期共享同一基础周期时才走聚合，否则直接获取，
+        避免为单个粗周期拉取成倍的细粒度数据。
+        
+        Args:
+            periods: 需要获取的周期列表
+            
+        Returns:
+            (基础周期列表, 派生周期到其基础周期的映射)
+        """
+        requested = set(periods)
+        dependents: Dict[SupportedPeriod, List[SupportedPeriod]] = {}
+        for period in periods:
+            base = DERIVABLE_PERIODS.get(period)
+            if base is not None:
+                dependents.setdefault(base, []).append(period)
+        
+        base_periods: List[SupportedPeriod] = []
+        derived_periods: Dict[SupportedPeriod, SupportedPeriod] = {}
+        for period in periods:
+            base = DERIVABLE_PERIODS.get(period)
+            if base is not None and (base in requested or len(dependents[base]) > 1):
+                derived_periods[period] = base
+                if base not in base_periods:
+                    base_periods.append(base)
+            elif period not in base_periods:
+                base_periods.append(period)
+        
+        return base_periods, derived_periods
+    
+    def _build_period_request(
+        self,
+        request: MultiPeriodRequest,
+        period: SupportedPeriod
+    ) -> HistoricalDataRequest:
+        """为多周期请求中的单个周期构建请求"""
+        return HistoricalDataRequest(
+            symbol=request.symbol,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            period=period,
+            include_quality_metrics=request.include_quality_metrics,
+            normalize_data=True,
+            use_cache=True
+        )
+    
+    async def _load_normalized_data(
+        self,
+        request: HistoricalDataRequest
+    ) -> List[StandardKLineData]:
+        """获取并标准化单个周期的数据（含实时合成的已收盘K线）"""
+        raw_data = await self._fetch_raw_data(
+            request.symbol,
+            request.start_date,
+            request.end_date,
+            request.period
+        )
+        normalized_data = self._normalize_raw_data(raw_data, request) if raw_data else []
+        return await self._merge_live_bars(request, normalized_data)
+    
+    async def _get_live_bars(
+        self,
+        request: HistoricalDataRequest,
+        since: Optional[datetime]
+    ) -> List[StandardKLineData]:
+        """
+        请求时间范围内、晚于 since 的实时合成已收盘K线
+
+        实时K线以交易所本地时间（无时区）保存，筛选后标注为交易所时区，
+        与数据源返回的历史K线一致。
+        """
+        start_time, end_time = self._get_cache_window(request)
+        end_time += timedelta(days=1)
+        if since is not None and since.tzinfo is not None:
+            since = since.astimezone(EXCHANGE_TZ).replace(tzinfo=None)
+        bars = await self.cache.get_live_bars(request.symbol, request.period.value, since=since)
+        return [
+            bar.model_copy(update={"timestamp": bar.timestamp.replace(tzinfo=EXCHANGE_TZ)})
+            for bar in bars if start_time <= bar.timestamp < end_time
+        ]
+    
+    async def _merge_live_bars(
+        self,
+        request: HistoricalDataRequest,
+        normalized_data: List[StandardKLineData]
+    ) -> List[StandardKLineData]:
+        """追加数据源尚未包含的实时合成K线（数据源通常落后于实时行情）"""
+        since = normalized_data[-1].timestamp if normalized_data else None
+        live_bars = await self._get_live_bars(request, since)
+        return normalized_data + live_bars if live_bars else normalized_data
+    
     async def check_data_quality(
         self, 
         request: QualityCheckRequest
@@ -542,36 +568,212 @@ class EnhancedHistoricalDataAPI:
         except ValueError:
             raise ValueError("Invalid date format, use YYYY-MM-DD")
     
-    def _generate_cache_key(self, request: HistoricalDataRequest) -> str:
-        """生成缓存键"""
-        return f"enhanced_{request.symbol}_{request.period.value}_{request.start_date}_{request.end_date}"
+    def _normalize_raw_data(
+        self,
+        raw_data: List[Dict[str, Any]],
+        request: HistoricalDataRequest
+    ) -> List[StandardKLineData]:
+        """将原始数据标准化为StandardKLineData列表"""
+        if request.normalize_data:
+            normalized_data = self.data_normalizer.normalize_kline_data(
+                raw_data, 
+                symbol=request.symbol,
+                period=request.period.value
+            )
+        else:
+            # 将原始数据转换为StandardKLineData格式
+            normalized_data = []
+            for item in raw_data:
+                try:
+                    # 处理时间戳
+                    timestamp = item.get('datetime') or item.get('timestamp')
+                    if isinstance(timestamp, str):
+                        timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+                    elif not isinstance(timestamp, datetime):
+                        timestamp = datetime.now()
+                    
+                    # 确保时间戳有时区信息（数据源时间为交易所本地时间）
+                    if timestamp.tzinfo is None:
+                        timestamp = timestamp.replace(tzinfo=EXCHANGE_TZ)
+                    
+                    kline_data = StandardKLineData(
+                        timestamp=timestamp,
+                        open=Decimal(str(item.get('open', 0))),
+                        high=Decimal(str(item.get('high', 0))),
+                        low=Decimal(str(item.get('low', 0))),
+                        close=Decimal(str(item.get('close', 0))),
+                        volume=int(item.get('volume', 0)),
+                        amount=Decimal(str(item.get('amount', 0))),
+                        quality_score=1.0,
+                        code=item.get('code', request.symbol)
+                    )
+                    normalized_data.append(kline_data)
+                except (ValueError, TypeError) as e:
+                    self.logger.warning(f"Skipping invalid data item: {e}")
+                    continue
+        
+        return normalized_data
     
-    async def _get_from_cache(self, cache_key: str) -> Optional[HistoricalDataResponse]:
+    def _empty_response(self, request: HistoricalDataRequest) -> HistoricalDataResponse:
+        """构建无数据响应"""
+        return HistoricalDataResponse(
+            success=False,
+            symbol=request.symbol,
+            period=request.period.value,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            total_records=0,
+            data=[],
+            metadata={"error": "No data available"}
+        )
+    
+    def _build_response(
+        self,
+        request: HistoricalDataRequest,
+        normalized_data: List[StandardKLineData],
+        background_tasks: Optional[BackgroundTasks] = None,
+        derived_from: Optional[str] = None
+    ) -> HistoricalDataResponse:
+        """
+        基于标准化数据构建响应（质量检查、记录数限制、格式转换）
+        
+        Args:
+            request: 历史数据请求
+            normalized_data: 标准化后的K线数据
+            background_tasks: 后台任务（可选）
+            derived_from: 聚合来源周期，直接获取的数据为None
+            
+        Returns:
+            HistoricalDataResponse: 历史数据响应
+        """
+        # 质量检查
+        quality_report = None
+        if request.include_quality_metrics:
+            quality_report = self.quality_monitor.check_data_quality(
+                normalized_data, 
+                request.symbol, 
+                request.period.value
+            )
+        
+        # 应用记录数限制
+        final_data = normalized_data
+        if request.max_records and len(normalized_data) > request.max_records:
+            final_data = normalized_data[-request.max_records:]
+        
+        # 转换为字典格式，确保字段名称一致性
+        data_dicts = [self._kline_to_dict(item) for item in final_data]
+        
+        # 构建响应
+        metadata = {
+            "source": "enhanced_api",
+            "cached": False,
+            "normalized": request.normalize_data,
+            "quality_checked": request.include_quality_metrics
+        }
+        if derived_from:
+            metadata["derived_from"] = derived_from
+        
+        quality_report_dict = None
+        if quality_report:
+            try:
+                # Try to convert to dict if it's a dataclass
+                if hasattr(quality_report, '__dataclass_fields__'):
+                    quality_report_dict = asdict(quality_report)
+                elif hasattr(quality_report, '__dict__'):
+                    # If it's a regular object with attributes
+                    quality_report_dict = {
+                        'quality_score': getattr(quality_report, 'quality_score', 0.0),
+                        'issues': getattr(quality_report, 'issues', []),
+                        'metrics': getattr(quality_report, 'metrics', {})
+                    }
+                else:
+                    # If it's already a dict or other type
+                    quality_report_dict = quality_report
+            except Exception as e:
+                self.logger.warning(f"Failed to convert quality report: {e}")
+                quality_report_dict = {"error": "Failed to process quality report"}
+        
+        response = HistoricalDataResponse(
+            success=True,
+            symbol=request.symbol,
+            period=request.period.value,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            total_records=len(final_data),
+            data=data_dicts,
+            quality_report=quality_report_dict,
+            metadata=metadata
+        )
+        
+        # 后台质量分析（可选）
+        if background_tasks and quality_report and quality_report.quality_score < 80:
+            background_tasks.add_task(
+                self._log_quality_issue, 
+                request.symbol, 
+                request.period.value, 
+                quality_report
+            )
+        
+        return response
+    
+    @staticmethod
+    def _kline_to_dict(item: StandardKLineData) -> Dict[str, Any]:
+        """K线转换为响应字典，确保字段名称一致性"""
+        return {
+            'timestamp': item.timestamp.isoformat() if hasattr(item.timestamp, 'isoformat') else str(item.timestamp),
+            'open': float(item.open),
+            'high': float(item.high),
+            'low': float(item.low),
+            'close': float(item.close),
+            'volume': int(item.volume),
+            'amount': float(item.amount),
+            'quality_score': float(item.quality_score)
+        }
+    
+    def _get_cache_window(self, request: HistoricalDataRequest) -> Tuple[datetime, datetime]:
+        """获取请求对应的缓存时间范围"""
+        return (
+            datetime.strptime(request.start_date, "%Y-%m-%d"),
+            datetime.strptime(request.end_date, "%Y-%m-%d")
+        )
+    
+    async def _get_from_cache(self, request: HistoricalDataRequest) -> Optional[HistoricalDataResponse]:
         """从缓存获取数据"""
         try:
-            cached_data = await self.cache.get_kline_data(cache_key)
+            start_time, end_time = self._get_cache_window(request)
+            cached_data = await self.cache.get_kline_data(
+                request.symbol, request.period, start_time, end_time
+            )
             if cached_data:
                 # 将缓存数据转换为响应格式
                 if isinstance(cached_data, list):
                     # 假设缓存的是数据列表
                     return HistoricalDataResponse(
                         success=True,
-                        symbol="",  # 从cache_key中提取
-                        period="",  # 从cache_key中提取
-                        start_date="",
-                        end_date="",
+                        symbol=request.symbol,
+                        period=request.period.value,
+                        start_date=request.start_date,
+                        end_date=request.end_date,
                         total_records=len(cached_data),
                         data=cached_data,
                         metadata={"source": "cache", "cached": True}
                     )
                 elif isinstance(cached_data, dict) and 'data' in cached_data:
-                    # 假设缓存的是完整响应
-                    return HistoricalDataResponse(**cached_data)
+                    # 假设缓存的是完整响应，补上缓存之后收盘的实时K线
+                    data = list(cached_data['data'])
+                    since = datetime.fromisoformat(data[-1]['timestamp']) if data else None
+                    data.extend(self._kline_to_dict(bar) for bar in await self._get_live_bars(request, since))
+                    return HistoricalDataResponse(**{
+                        **cached_data,
+                        "data": data,
+                        "total_records": len(data),
+                        "metadata": {**cached_data.get("metadata", {}), "cached": True}
+                    })
         except Exception as e:
             self.logger.warning(f"Cache retrieval error: {str(e)}")
         return None
     
-    async def _cache_result(self, cache_key: str, response: HistoricalDataResponse) -> None:
+    async def _cache_result(self, request: HistoricalDataRequest, response: HistoricalDataResponse) -> None:
         """缓存结果"""
         try:
             # 缓存响应数据，设置适当的TTL
@@ -583,6 +785,7 @@ class EnhancedHistoricalDataAPI:
                 "end_date": response.end_date,
                 "total_records": response.total_records,
                 "data": response.data,
+                "quality_report": response.quality_report,
                 "metadata": response.metadata
             }
             
@@ -593,13 +796,19 @@ class EnhancedHistoricalDataAPI:
                 "15m": 1800,  # 30分钟
                 "30m": 3600,  # 1小时
                 "1h": 7200,   # 2小时
+                "2h": 7200,   # 2小时
+                "4h": 14400,  # 4小时
                 "1d": 86400,  # 24小时
                 "1w": 604800, # 7天
                 "1M": 2592000 # 30天
             }
             
             ttl = ttl_mapping.get(response.period, 3600)  # 默认1小时
-            await self.cache.cache_kline_data(cache_key, cache_data, ttl=ttl)
+            start_time, end_time = self._get_cache_window(request)
+            await self.cache.set_kline_data(
+                request.symbol, request.period, start_time, end_time,
+                cache_data, custom_ttl=ttl
+            )
             
         except Exception as e:
             self.logger.warning(f"Cache storage error: {str(e)}")
@@ -655,15 +864,17 @@ class EnhancedHistoricalDataAPI:
             
             self.logger.info(f"从xtquant获取数据: {symbol}, {xt_period}, {start_date_xt}-{end_date_xt}")
             
-            # 调用xtquant API获取历史数据
-            df = xtdata.get_market_data_ex(
+            # 调用xtquant API获取历史数据（阻塞调用放入线程池，便于多周期并发获取）
+            loop = asyncio.get_running_loop()
+            df = await loop.run_in_executor(None, functools.partial(
+                xtdata.get_market_data_ex,
                 stock_list=[symbol],
                 period=xt_period,
                 start_time=start_date_xt,
                 end_time=end_date_xt,
                 fill_data=True,
                 dividend_type='none'
-            )
+            ))
             
             if df is None:
                 self.logger.warning(f"未获取到数据: {symbol}, {xt_period}, {start_date_xt}-{end_date_xt}")
@@ -706,13 +917,13 @@ class EnhancedHistoricalDataAPI:
                     if hasattr(timestamp, 'to_pydatetime'):
                         dt = timestamp.to_pydatetime()
                     elif isinstance(timestamp, str):
-                        dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+                        dt = self._parse_xt_timestamp(timestamp)
                     else:
                         dt = timestamp
                     
-                    # 确保时间戳有时区信息
+                    # xtquant 返回交易所本地时间（北京时间），标注为交易所时区
                     if hasattr(dt, 'tzinfo') and dt.tzinfo is None:
-                        dt = dt.replace(tzinfo=timezone.utc)
+                        dt = dt.replace(tzinfo=EXCHANGE_TZ)
                     
                     # 安全获取数据，处理不同的列名格式
                     open_val = row.get('open') or row.get('Open') or 0
@@ -816,13 +1027,13 @@ class EnhancedHistoricalDataAPI:
                     if hasattr(timestamp, 'to_pydatetime'):
                         dt = timestamp.to_pydatetime()
                     elif isinstance(timestamp, str):
-                        dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+                        dt = self._parse_xt_timestamp(timestamp)
                     else:
                         dt = timestamp
                     
-                    # 确保时间戳有时区信息
+                    # xtquant 返回交易所本地时间（北京时间），标注为交易所时区
                     if hasattr(dt, 'tzinfo') and dt.tzinfo is None:
-                        dt = dt.replace(tzinfo=timezone.utc)
+                        dt = dt.replace(tzinfo=EXCHANGE_TZ)
                     
                     # 安全获取数据
                     open_val = row.get('open') or row.get('Open') or 0
@@ -863,8 +1074,22 @@ class EnhancedHistoricalDataAPI:
             self.logger.error(f"备用数据获取方法也失败: {str(e)}")
             raise ValueError(f"无法从任何数据源获取数据: {str(e)}")
     
+    @staticmethod
+    def _parse_xt_timestamp(value: str) -> datetime:
+        """解析xtquant返回的时间索引（YYYYMMDD / YYYYMMDDHHMMSS / ISO格式）"""
+        if value.isdigit() and len(value) == 14:
+            return datetime.strptime(value, '%Y%m%d%H%M%S')
+        if value.isdigit() and len(value) == 8:
+            return datetime.strptime(value, '%Y%m%d')
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    
     def _import_xtdata(self):
-        """导入xtquant库，便于测试时mock"""
+        """导入xtquant库，便于测试时mock；配置 XTQUANT_BACKEND=simulated 时使用模拟后端"""
+        try:
+            from data_agent_service.xtdata_simulator import install_simulated_xtquant_if_configured
+            install_simulated_xtquant_if_configured()
+        except ImportError:
+            pass
         try:
             from xtquant import xtdata
             return xtdata
@@ -974,11 +1199,27 @@ def create_enhanced_api_router(api: EnhancedHistoricalDataAPI) -> FastAPI:
 
 # 全局API实例
 _enhanced_api: Optional[EnhancedHistoricalDataAPI] = None
+_enhanced_api_startup: Dict[str, Any] = {}
 
 
 def get_enhanced_api() -> EnhancedHistoricalDataAPI:
-    """获取增强API实例"""
+    """获取增强API实例（首次调用时创建并记录初始化耗时）"""
     global _enhanced_api
     if _enhanced_api is None:
+        started = time.perf_counter()
         _enhanced_api = EnhancedHistoricalDataAPI()
-    return _enhanced_api
\ No newline at end of file
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _enhanced_api_startup.update({
+            "initialized_at": datetime.now().isoformat(),
+            "init_time_ms": round(elapsed_ms, 3),
+        })
+        logging.getLogger(__name__).info(f"增强历史数据API初始化完成，耗时 {elapsed_ms:.1f}ms")
+    return _enhanced_api
+
+
+def get_enhanced_api_startup_info() -> Dict[str, Any]:
+    """获取共享API实例的初始化信息"""
+    return {
+        "initialized": _enhanced_api is not None,
+        **_enhanced_api_startup,
+    }
\ No newline at end of file
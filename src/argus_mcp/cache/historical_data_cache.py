@@ -15,6 +15,7 @@ from datetime import datetime, timedelta
 from dataclasses import dataclass
 from enum import Enum
 import threading
+from collections import deque
 from cachetools import TTLCache, LRUCache
 
 from src.argus_mcp.data_models.historical_data import (
@@ -68,6 +69,7 @@ class HistoricalDataCache:
         default_ttl_hours: int = 24,
         market_hours_ttl: int = 3600,  # 交易时间内TTL（秒）
         after_hours_ttl: int = 86400,  # 非交易时间TTL（秒）
+        live_bars_per_series: int = 2000,  # 每个 (股票, 周期) 保留的实时收盘K线数
     ):
         self.max_memory_bytes = max_memory_mb * 1024 * 1024
         self.default_ttl = default_ttl_hours * 3600
@@ -92,6 +94,10 @@ class HistoricalDataCache:
         self.period_index: Dict[str, List[str]] = {}
         self.data_type_index: Dict[str, List[str]] = {}
         
+        # 实时合成的已收盘K线: (symbol, period) -> deque[StandardKLineData]
+        self.live_bars_per_series = live_bars_per_series
+        self.live_bars: Dict[Tuple[str, str], deque] = {}
+        
         # 线程安全
         self._lock = threading.RLock()
         
@@ -208,6 +214,27 @@ class HistoricalDataCache:
             logger.debug(f"缓存质量指标: {symbol} {period.value}")
             return True
     
+    async def append_live_bar(self, symbol: str, period: str, bar: StandardKLineData) -> None:
+        """追加一根实时合成的已收盘K线"""
+        with self._lock:
+            series = self.live_bars.get((symbol, period))
+            if series is None:
+                series = self.live_bars[(symbol, period)] = deque(maxlen=self.live_bars_per_series)
+            series.append(bar)
+    
+    async def get_live_bars(
+        self,
+        symbol: str,
+        period: str,
+        since: Optional[datetime] = None
+    ) -> List[StandardKLineData]:
+        """获取实时合成的已收盘K线"""
+        with self._lock:
+            bars = list(self.live_bars.get((symbol, period), ()))
+        if since is not None:
+            bars = [bar for bar in bars if bar.timestamp > since]
+        return bars
+    
     async def invalidate_symbol(self, symbol: str) -> None:
         """使特定股票的所有缓存失效"""
         with self._lock:
@@ -250,7 +277,8 @@ class HistoricalDataCache:
                 'l1_cache_size': len(self.l1_cache),
                 'l2_cache_size': len(self.l2_cache),
                 'symbols_cached': len(self.symbol_index),
-                'periods_cached': len(self.period_index)
+                'periods_cached': len(self.period_index),
+                'live_bar_series': len(self.live_bars)
             }
     
     async def cleanup_expired(self) -> None:
@@ -0,0 +1,14 @@
+#!/usr/bin/env python3
+"""
+argus_mcp 测试共用的夹具
+"""
+
+import pytest
+
+from .testing.inprocess_redis import InProcessRedis
+
+
+@pytest.fixture
+def fake_redis() -> InProcessRedis:
+    """无延迟的进程内 Redis"""
+    return InProcessRedis()
@@ -5,18 +5,27 @@ WebSocket 实时数据系统 - 数据推送服务
 
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Set
+import os
+import time
+from typing import Dict, List, Any, Optional, Set, Tuple
 from datetime import datetime, timedelta
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import json
 
 from .websocket_models import (
     WebSocketMessage, MessageType, DataType, TickData, 
     QuoteData, KLineData, TradeData, DepthData, OrderBookData,
-    ErrorMessage, SubscriptionStatus
+    ErrorMessage, SubscriptionStatus, Subscription
 )
 from .subscription_manager import SubscriptionManager
+from .subscription_filters import SubscriptionFilterEngine
+from .quote_delta import QuoteDeltaTracker
+from .order_book import OrderBookManager
+from .replay_buffer import ChannelReplayBuffer, channel_key, parse_channel
+from .market_data_broker import BROKER_ROLES, Update, create_broker
 from .websocket_connection_manager import WebSocketConnectionManager
+from .streaming_bar_builder import StreamingBarBuilder, LiveBar, to_exchange_time
+from .cache.historical_data_cache import HistoricalDataCache, get_historical_cache
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +33,19 @@ logger = logging.getLogger(__name__)
 @dataclass
 class DataSourceConfig:
     """数据源配置"""
-    source_type: str  # "mock", "qmt", "tdx", "yahoo"
+    source_type: str  # "mock", "qmt", "tdx", "yahoo"（qmt 在 XTQUANT_BACKEND=simulated 时使用模拟后端）
     update_interval: float = 1.0  # 秒
     batch_size: int = 100
     retry_attempts: int = 3
     retry_delay: float = 1.0
+    delta_data_types: Tuple[str, ...] = ("quote",)  # 按字段增量推送的数据类型，空元组关闭
+    keyframe_interval: float = 30.0  # 增量推送的完整关键帧间隔（秒）
+    replay_ring_size: int = 64  # 每个频道保留的最近推送条数（断线重连补发）
+    replay_max_age: float = 60.0  # 可补发推送的最长保留时间（秒）
+    # 跨进程行情分发："standalone" 自行拉取；"producer" 按所有worker订阅并集拉取并发布；
+    # "consumer" 不拉取，只把broker收到的行情推送给本进程客户端
+    broker_role: str = field(default_factory=lambda: os.getenv("ARGUS_MD_BROKER_ROLE", "standalone"))
+    broker_path: Optional[str] = field(default_factory=lambda: os.getenv("ARGUS_MD_BROKER_PATH"))  # Unix域套接字路径
 
 
 class DataPublisher:
@@ -38,12 +55,20 @@ class DataPublisher:
         self,
         subscription_manager: SubscriptionManager,
         connection_manager: WebSocketConnectionManager,
-        config: DataSourceConfig = None
+        config: DataSourceConfig = None,
+        bar_builder: Optional[StreamingBarBuilder] = None,
+        bar_cache: Optional[HistoricalDataCache] = None,
+        broker: Optional[Any] = None
     ):
         self.subscription_manager = subscription_manager
         self.connection_manager = connection_manager
         self.config = config or DataSourceConfig()
         
+        # 实时K线合成：tick增量更新，收盘K线写入缓存并推送给KLINE订阅者
+        self.bar_builder = bar_builder or StreamingBarBuilder()
+        self._bar_cache = bar_cache
+        self._last_tick_time: Dict[str, datetime] = {}  # symbol -> 最近喂给合成器的行情时间
+        
         # 运行状态
         self.is_running = False
         self._tasks: List[asyncio.Task] = []
@@ -57,6 +82,33 @@ class DataPublisher:
         self._active_symbols: Set[str] = set()
         self._symbol_subscribers: Dict[str, int] = {}  # symbol -> subscriber_count
         
+        # 服务端订阅过滤、限频与最新值合并
+        self.filter_engine = SubscriptionFilterEngine()
+        
+        # 行情增量推送（每个客户端记录上次推送的快照）
+        self.delta_tracker = QuoteDeltaTracker(self.config.keyframe_interval)
+        
+        # 深度行情：每只股票一份规范订单簿，快照 + 逐档增量
+        self.order_books = OrderBookManager()
+        self._depth_synced: Dict[str, Dict[str, str]] = {}  # symbol -> client_id -> subscription_id
+        
+        # 频道序号与重放缓冲：重连客户端只补发缺口
+        self.replay_buffer = ChannelReplayBuffer(self.config.replay_ring_size, self.config.replay_max_age)
+        # 新到达、尚未推送的数据的频道序号 (symbol, data_type) -> seq；
+        # 序号在取到数据时分配，consumer 沿用 producer 分配的序号，各worker的序号一致
+        self._pending_seq: Dict[Tuple[str, str], int] = {}
+        
+        # 跨进程行情分发（未传入broker时按配置创建Unix套接字broker）
+        if self.config.broker_role not in BROKER_ROLES:
+            raise ValueError(f"未知的broker角色: {self.config.broker_role}")
+        self.broker = broker if broker is not None else create_broker(self.config.broker_role, self.config.broker_path)
+        if self.config.broker_role != "standalone" and self.broker is None:
+            raise ValueError(f"broker角色 {self.config.broker_role} 需要broker")
+        self._broker_channels: Dict[str, List[str]] = {}
+        
+        # 推送周期的统一时间戳（周期外为None，取当前时间）
+        self._cycle_stamp: Optional[Tuple[datetime, str]] = None
+        
     async def start(self):
         """启动数据推送服务"""
         if self.is_running:
@@ -66,6 +118,12 @@ class DataPublisher:
         self.is_running = True
         logger.info("Starting DataPublisher...")
         
+        if self.broker is not None:
+            await self.broker.start()
+        if self.config.broker_role == "consumer":
+            receive_task = asyncio.create_task(self._broker_receive_loop())
+            self._tasks.append(receive_task)
+        
         # 启动数据更新任务
         update_task = asyncio.create_task(self._data_update_loop())
         self._tasks.append(update_task)
@@ -92,6 +150,9 @@ class DataPublisher:
         await asyncio.gather(*self._tasks, return_exceptions=True)
         self._tasks.clear()
         
+        if self.broker is not None:
+            await self.broker.stop()
+        
         logger.info("DataPublisher stopped")
     
     async def _data_update_loop(self):
@@ -100,15 +161,7 @@ class DataPublisher:
         
         while self.is_running:
             try:
-                # 获取当前活跃的股票列表
-                active_symbols = await self._get_active_symbols()
-                
-                if active_symbols:
-                    # 更新数据
-                    await self._update_symbol_data(active_symbols)
-                    
-                    # 推送数据给订阅者
-                    await self._push_data_to_subscribers(active_symbols)
+                await self._run_update_cycle()
                 
                 # 等待下一次更新
                 await asyncio.sleep(self.config.update_interval)
@@ -118,8 +171,54 @@ class DataPublisher:
                 break
             except Exception as e:
                 logger.error(f"Error in data update loop: {e}")
+                self._cycle_stamp = None
                 await asyncio.sleep(self.config.retry_delay)
     
+    async def _run_update_cycle(self):
+        """执行一个数据更新周期"""
+        self._begin_cycle()
+        
+        # 获取当前活跃的股票列表
+        active_symbols = await self._get_active_symbols()
+        
+        if self.config.broker_role == "consumer":
+            # 行情由broker推送，这里只上报本进程需要的频道
+            await self._report_broker_interest(active_symbols)
+        else:
+            # 更新数据（producer 还包含其他worker关注的频道）
+            channels = await self._collect_channels(active_symbols)
+            if channels:
+                updates = await self._update_symbol_data(channels)
+                if self.config.broker_role == "producer" and updates:
+                    await self.broker.publish(updates)
+            
+            # 推送数据给订阅者
+            if active_symbols:
+                await self._push_data_to_subscribers(active_symbols)
+        
+        # 限频期间合并的最新值到期推送
+        await self._flush_conflated_updates()
+        
+        # 收盘已到结束时间但没有后续tick的K线
+        await self._flush_closed_bars()
+        self._cycle_stamp = None
+    
+    def _begin_cycle(self):
+        """记录本推送周期的时间戳，周期内的所有推送消息共用"""
+        now = datetime.now()
+        self._cycle_stamp = (now, now.isoformat())
+    
+    def _message_time(self) -> Tuple[datetime, str]:
+        """推送消息的时间戳（周期内复用，周期外取当前时间）"""
+        if self._cycle_stamp is not None:
+            return self._cycle_stamp
+        now = datetime.now()
+        return now, now.isoformat()
+    
+    def _stream_message(self, message_type: MessageType, data: Any) -> WebSocketMessage:
+        """服务端生成的推送消息，跳过校验并使用周期时间戳"""
+        return WebSocketMessage.trusted(message_type, data, self._message_time()[0])
+    
     async def _subscription_monitor_loop(self):
         """订阅监控循环"""
         logger.info("Starting subscription monitor loop...")
@@ -145,20 +244,45 @@ class DataPublisher:
     async def _get_active_symbols(self) -> Set[str]:
         """获取当前有订阅的股票列表"""
         try:
-            stats = await self.subscription_manager.get_subscription_stats()
-            subscribed_symbols = stats.get("subscriptions_per_symbol", {})
-            return set(subscribed_symbols.keys())
+            # 包含板块/指数/通配分组订阅展开后的成分股
+            return await self.subscription_manager.get_active_symbols()
         except Exception as e:
             logger.error(f"Error getting active symbols: {e}")
             return set()
     
-    async def _update_symbol_data(self, symbols: Set[str]):
-        """更新股票数据"""
+    async def _collect_channels(self, symbols: Set[str]) -> Dict[str, Set[DataType]]:
+        """本周期需要拉取的频道：本进程订阅，producer 再并上各consumer上报的频道"""
+        channels: Dict[str, Set[DataType]] = {}
+        for symbol in symbols:
+            channels[symbol] = self._fetch_types(await self._get_symbol_data_types(symbol))
+        
+        if self.config.broker_role == "producer":
+            for symbol, data_types in self.broker.get_interest().items():
+                for value in data_types:
+                    try:
+                        channels.setdefault(symbol, set()).add(DataType(value))
+                    except ValueError:
+                        logger.warning(f"忽略未知的数据类型: {symbol} {value}")
+        return channels
+    
+    @staticmethod
+    def _fetch_types(data_types: List[DataType]) -> Set[DataType]:
+        """订阅类型对应需要拉取的类型：实时K线由行情tick合成，KLINE订阅同时需要行情"""
+        fetch = set(data_types)
+        if DataType.KLINE in fetch:
+            fetch.add(DataType.QUOTE)
+        return fetch
+    
+    async def _update_symbol_data(self, channels: Dict[str, Set[DataType]]) -> List[Update]:
+        """
+        更新股票数据
+        
+        Returns:
+            本周期取到的数据 [(symbol, data_type, data, seq), ...]，producer 发布给consumer
+        """
+        updates: List[Update] = []
         try:
-            for symbol in symbols:
-                # 获取该股票的所有订阅数据类型
-                data_types = await self._get_symbol_data_types(symbol)
-                
+            for symbol, data_types in channels.items():
                 for data_type in data_types:
                     # 获取最新数据
                     data = await self._fetch_data(symbol, data_type)
@@ -170,23 +294,87 @@ class DataPublisher:
                         if symbol not in self._last_update:
                             self._last_update[symbol] = {}
                         self._last_update[symbol][data_type.value] = datetime.now()
+                        seq = self._stamp_update(symbol, data_type)
+                        updates.append((symbol, data_type.value, data, seq))
+                        
+                        if data_type == DataType.QUOTE:
+                            await self._feed_quote_tick(symbol, data)
                         
         except Exception as e:
             logger.error(f"Error updating symbol data: {e}")
+        return updates
+    
+    async def _report_broker_interest(self, symbols: Set[str]):
+        """consumer：订阅频道变化时上报给broker"""
+        channels: Dict[str, List[str]] = {}
+        for symbol in symbols:
+            data_types = self._fetch_types(await self._get_symbol_data_types(symbol))
+            if data_types:
+                channels[symbol] = sorted(data_type.value for data_type in data_types)
+        if channels != self._broker_channels:
+            await self.broker.set_interest(channels)
+            self._broker_channels = channels
+    
+    async def _broker_receive_loop(self):
+        """consumer：接收broker发布的行情并推送给本进程的订阅者"""
+        logger.info("Starting broker receive loop...")
+        
+        while self.is_running:
+            try:
+                updates = await self.broker.receive()
+                await self._apply_broker_updates(updates)
+            except asyncio.CancelledError:
+                logger.info("Broker receive loop cancelled")
+                break
+            except Exception as e:
+                logger.error(f"Error in broker receive loop: {e}")
+                await asyncio.sleep(self.config.retry_delay)
+    
+    async def _apply_broker_updates(self, updates: List[Update]):
+        """写入缓存后按与本地拉取相同的路径推送"""
+        self._begin_cycle()
+        now = self._cycle_stamp[0]
+        symbols: Set[str] = set()
+        for update in updates:
+            symbol, value, data = update[:3]
+            try:
+                data_type = DataType(value)
+            except ValueError:
+                continue
+            await self._update_cache(symbol, data_type, data)
+            self._stamp_update(symbol, data_type, update[3] if len(update) > 3 else None)
+            self._last_update.setdefault(symbol, {})[value] = now
+            symbols.add(symbol)
+            if data_type == DataType.QUOTE:
+                await self._feed_quote_tick(symbol, data)
+        try:
+            if symbols:
+                await self._push_data_to_subscribers(symbols)
+        finally:
+            self._cycle_stamp = None
+    
+    def _stamp_update(self, symbol: str, data_type: DataType, seq: Optional[int] = None) -> Optional[int]:
+        """
+        为新到达的数据分配频道序号，推送时使用
+
+        Args:
+            seq: producer 分配的序号（consumer 沿用），None 时本进程分配
+
+        Returns:
+            频道序号；深度频道使用订单簿序号，返回None
+        """
+        if data_type == DataType.DEPTH:
+            return None
+        if seq is None:
+            seq = self.replay_buffer.next_seq(channel_key(symbol, data_type.value))
+        self._pending_seq[(symbol, data_type.value)] = seq
+        return seq
     
     async def _get_symbol_data_types(self, symbol: str) -> List[DataType]:
         """获取股票的所有订阅数据类型"""
         try:
-            # 获取该股票的所有订阅
-            stats = await self.subscription_manager.get_subscription_stats()
-            subscriptions = await self.subscription_manager.subscriptions.values()
-            
-            data_types = set()
-            for subscription in subscriptions:
-                if subscription.symbol.upper() == symbol.upper():
-                    data_types.add(subscription.data_type)
-            
-            return list(data_types)
+            # 走订阅索引，而不是遍历全部订阅
+            return list(self.subscription_manager.get_symbol_data_types(symbol))
         except Exception as e:
             logger.error(f"Error getting symbol data types: {e}")
             return []
@@ -215,18 +403,7 @@ class DataPublisher:
         
         timestamp = int(time.time() * 1000)
         
-        if data_type == DataType.TICK:
-            return {
-                "symbol": symbol,
-                "timestamp": timestamp,
-                "price": round(random.uniform(10.0, 100.0), 2),
-                "volume": random.randint(100, 10000),
-                "turnover": round(random.uniform(1000.0, 100000.0), 2),
-                "change": round(random.uniform(-5.0, 5.0), 2),
-                "change_percent": round(random.uniform(-10.0, 10.0), 2)
-            }
-        
-        elif data_type == DataType.QUOTE:
+        if data_type == DataType.QUOTE:
             return {
                 "symbol": symbol,
                 "timestamp": timestamp,
@@ -262,7 +439,7 @@ class DataPublisher:
                 "trade_type": random.choice(["normal", "block"])
             }
         
-        elif data_type == DataType.ORDERBOOK:
+        elif data_type == DataType.DEPTH:
             bids = [[round(random.uniform(10.0, 100.0), 2), random.randint(100, 10000)] 
                    for _ in range(5)]
             asks = [[round(random.uniform(10.0, 100.0), 2), random.randint(100, 10000)] 
@@ -280,10 +457,79 @@ class DataPublisher:
         return None
     
     async def _fetch_from_qmt(self, symbol: str, data_type: DataType) -> Optional[Dict[str, Any]]:
-        """从QMT获取数据"""
-        # TODO: 实现QMT数据获取
-        logger.info(f"Fetching {data_type} data for {symbol} from QMT")
-        return await self._generate_mock_data(symbol, data_type)
+        """从QMT获取数据（XTQUANT_BACKEND=simulated 时为模拟xtdata后端）"""
+        try:
+            from xtquant import xtdata
+        except ImportError:
+            logger.warning("xtquant不可用，使用模拟数据")
+            return await self._generate_mock_data(symbol, data_type)
+        
+        loop = asyncio.get_running_loop()
+        if data_type == DataType.KLINE:
+            frames = await loop.run_in_executor(
+                None, lambda: xtdata.get_market_data_ex([], [symbol], period="1m", count=1)
+            )
+            frame = frames.get(symbol)
+            if frame is None or frame.empty:
+                return None
+            bar = frame.iloc[-1]
+            return {
+                "symbol": symbol,
+                "timestamp": int(bar["time"]),
+                "open": float(bar["open"]),
+                "high": float(bar["high"]),
+                "low": float(bar["low"]),
+                "close": float(bar["close"]),
+                "volume": int(bar["volume"]),
+                "turnover": float(bar["amount"]),
+                "frequency": "1m"
+            }
+        
+        ticks = await loop.run_in_executor(None, xtdata.get_full_tick, [symbol])
+        tick = ticks.get(symbol)
+        if not tick:
+            return None
+        
+        price = tick["lastPrice"]
+        last_close = tick.get("lastClose") or price
+        change = price - last_close
+        
+        if data_type == DataType.QUOTE:
+            return {
+                "symbol": symbol,
+                "timestamp": tick["time"],
+                "open": tick["open"],
+                "high": tick["high"],
+                "low": tick["low"],
+                "close": price,
+                "volume": tick["volume"],
+                "turnover": tick["amount"],
+                "change": round(change, 2),
+                "change_percent": round(change / last_close * 100, 2) if last_close else 0.0
+            }
+        elif data_type == DataType.TRADE:
+            return {
+                "symbol": symbol,
+                "timestamp": tick["time"],
+                "price": price,
+                "volume": tick["volume"],
+                "amount": tick["amount"],
+                "direction": "buy" if change >= 0 else "sell",
+                "trade_type": "normal"
+            }
+        elif data_type == DataType.DEPTH:
+            bids = [[p, v] for p, v in zip(tick["bidPrice"], tick["bidVol"]) if p > 0]
+            asks = [[p, v] for p, v in zip(tick["askPrice"], tick["askVol"]) if p > 0]
+            return {
+                "symbol": symbol,
+                "timestamp": tick["time"],
+                "bids": bids,
+                "asks": asks,
+                "total_bid_volume": sum(bid[1] for bid in bids),
+                "total_ask_volume": sum(ask[1] for ask in asks)
+            }
+        
+        return None
     
     async def _fetch_from_tdx(self, symbol: str, data_type: DataType) -> Optional[Dict[str, Any]]:
         """从TDX获取数据"""
@@ -310,32 +556,379 @@ class DataPublisher:
                     if not data:
                         continue
                     
-                    # 获取订阅者
-                    subscribers = await self.subscription_manager.get_subscribers(symbol, data_type)
+                    # 获取订阅
+                    subscriptions = await self.subscription_manager.get_subscriptions_for(symbol, data_type)
                     
-                    if subscribers:
-                        # 创建WebSocket消息
-                        message = WebSocketMessage(
-                            type=MessageType.DATA,
-                            data={
-                                "symbol": symbol,
-                                "data_type": data_type.value,
-                                "data": data,
-                                "timestamp": datetime.now().isoformat()
-                            }
-                        )
-                        
-                        # 推送数据
-                        await self._broadcast_to_subscribers(subscribers, message)
+                    if not subscriptions:
+                        continue
+                    if data_type == DataType.DEPTH:
+                        await self._publish_depth(symbol, data, subscriptions)
+                    else:
+                        # 只推送新到达的数据，序号随数据分配
+                        seq = self._pending_seq.pop((symbol, data_type.value), None)
+                        if seq is None:
+                            continue
+                        self.replay_buffer.record(channel_key(symbol, data_type.value), seq, data)
+                        await self._dispatch_market_data(symbol, data_type, data, subscriptions, seq)
                         
         except Exception as e:
             logger.error(f"Error pushing data to subscribers: {e}")
     
+    async def _dispatch_market_data(
+        self,
+        symbol: str,
+        data_type: DataType,
+        data: Dict[str, Any],
+        subscriptions: List[Subscription],
+        seq: Optional[int] = None
+    ):
+        """按订阅过滤条件推送一条行情：无过滤的订阅共用一条消息，相同字段掩码的订阅共用裁剪结果"""
+        now = time.monotonic()
+        batches: Dict[Optional[tuple], List[Tuple[str, str]]] = {}
+        projectors: Dict[Optional[tuple], Any] = {}
+        seen_clients: Set[str] = set()
+        
+        for subscription in subscriptions:
+            client_id = subscription.client_id
+            if client_id in seen_clients:
+                continue
+            compiled = self.filter_engine.get_filter(subscription) if subscription.filters else None
+            if compiled is not None and not self.filter_engine.should_send(
+                    subscription, compiled, symbol, data_type, data, now):
+                continue
+            seen_clients.add(client_id)
+            fields = compiled.fields if compiled else None
+            projectors.setdefault(fields, compiled)
+            batches.setdefault(fields, []).append((client_id, subscription.subscription_id))
+        
+        for fields, recipients in batches.items():
+            payload = data if fields is None else projectors[fields].project(data)
+            await self._send_market_data(symbol, data_type, payload, recipients, now, seq)
+    
+    async def _publish_depth(self, symbol: str, data: Dict[str, Any], subscriptions: List[Subscription]):
+        """更新规范订单簿：已同步的客户端共用一条增量消息，新订阅者收到快照"""
+        channel = channel_key(symbol, DataType.DEPTH.value)
+        update = self.order_books.update(symbol, data.get("bids"), data.get("asks"), data.get("timestamp"),
+                                         initial_seq=self.replay_buffer.current_seq(channel))
+        now = time.monotonic()
+        if update is not None:
+            # 深度频道的序号即订单簿序号
+            self.replay_buffer.record(channel, update.seq, update.to_dict(), now)
+        synced = self._depth_synced.setdefault(symbol, {})
+        live: List[str] = []
+        need_snapshot: List[Tuple[str, str]] = []
+        seen_clients: Set[str] = set()
+        
+        for subscription in subscriptions:
+            client_id = subscription.client_id
+            if client_id in seen_clients:
+                continue
+            compiled = self.filter_engine.get_filter(subscription) if subscription.filters else None
+            if compiled is not None and not self.filter_engine.should_send(
+                    subscription, compiled, symbol, DataType.DEPTH, data, now):
+                # 跳过的增量无法补齐，限频结束后重新下发快照
+                synced.pop(client_id, None)
+                continue
+            seen_clients.add(client_id)
+            if synced.get(client_id) == subscription.subscription_id:
+                live.append(client_id)
+            else:
+                need_snapshot.append((client_id, subscription.subscription_id))
+        
+        if update is not None and live:
+            await self._broadcast_to_subscribers(
+                live, self._stream_message(MessageType.DEPTH_UPDATE, update.to_dict())
+            )
+        if need_snapshot:
+            await self._send_depth_snapshot(symbol, need_snapshot)
+    
+    async def _send_depth_snapshot(self, symbol: str, recipients: List[Tuple[str, str]]) -> bool:
+        """下发订单簿快照并标记为已同步"""
+        snapshot = self.order_books.snapshot(symbol)
+        if snapshot is None:
+            return False
+        synced = self._depth_synced.setdefault(symbol, {})
+        client_ids = []
+        for client_id, subscription_id in recipients:
+            synced[client_id] = subscription_id
+            client_ids.append(client_id)
+        await self._broadcast_to_subscribers(
+            client_ids, self._stream_message(MessageType.DEPTH_SNAPSHOT, snapshot)
+        )
+        return True
+    
+    async def resync_depth(self, client_id: str, symbol: str) -> bool:
+        """
+        客户端检测到序号缺口或校验失败时重新下发快照
+        
+        Args:
+            client_id: 客户端ID
+            symbol: 股票代码
+            
+        Returns:
+            bool: 是否已下发快照
+        """
+        symbol = symbol.upper()
+        for subscription in await self.subscription_manager.get_subscriptions_for(symbol, DataType.DEPTH):
+            if subscription.client_id == client_id:
+                return await self._send_depth_snapshot(symbol, [(client_id, subscription.subscription_id)])
+        return False
+    
+    async def _flush_conflated_updates(self):
+        """推送限频期间合并的最新值"""
+        try:
+            due = self.filter_engine.drain_due(time.monotonic())
+            if not due:
+                return
+            
+            now = time.monotonic()
+            batches: Dict[tuple, List[Tuple[str, str]]] = {}
+            payloads: Dict[tuple, Dict[str, Any]] = {}
+            for subscription_id, symbol, data_type, data in due:
+                subscription = self.subscription_manager.subscriptions.get(subscription_id)
+                if subscription is None:
+                    continue
+                compiled = self.filter_engine.get_filter(subscription)
+                fields = compiled.fields if compiled else None
+                key = (symbol, data_type, fields, id(data))
+                if key not in payloads:
+                    payloads[key] = compiled.project(data) if compiled else data
+                batches.setdefault(key, []).append((subscription.client_id, subscription_id))
+            
+            for key, recipients in batches.items():
+                symbol, data_type = key[0], key[1]
+                seq = self.replay_buffer.current_seq(channel_key(symbol, data_type.value))
+                await self._send_market_data(symbol, data_type, payloads[key], recipients, now, seq or None)
+        except Exception as e:
+            logger.error(f"Error flushing conflated updates: {e}")
+    
+    async def _send_market_data(
+        self,
+        symbol: str,
+        data_type: DataType,
+        payload: Dict[str, Any],
+        recipients: List[Tuple[str, str]],
+        now: float,
+        seq: Optional[int] = None
+    ):
+        """推送行情给一组 (client_id, subscription_id)，配置了增量推送的数据类型只发送变化字段"""
+        if data_type == DataType.DEPTH:
+            # 限频合并后的深度以快照形式补发
+            await self._send_depth_snapshot(symbol, recipients)
+            return
+        
+        if data_type.value not in self.config.delta_data_types:
+            await self._broadcast_to_subscribers(
+                list(dict.fromkeys(client_id for client_id, _ in recipients)),
+                self._market_data_message(symbol, data_type, payload, seq=seq)
+            )
+            return
+        
+        for data, is_delta, client_ids in self.delta_tracker.plan(
+                recipients, symbol, data_type.value, payload, now):
+            await self._broadcast_to_subscribers(
+                client_ids, self._market_data_message(symbol, data_type, data, is_delta, seq)
+            )
+    
+    def _market_data_message(
+        self,
+        symbol: str,
+        data_type: DataType,
+        data: Dict[str, Any],
+        delta: bool = False,
+        seq: Optional[int] = None
+    ) -> WebSocketMessage:
+        """创建行情推送消息（增量消息带 delta 标记，seq 为频道序号）"""
+        timestamp, iso_timestamp = self._message_time()
+        envelope = {
+            "symbol": symbol,
+            "data_type": data_type.value,
+            "data": data,
+            "timestamp": iso_timestamp
+        }
+        if delta:
+            envelope["delta"] = True
+        if seq is not None:
+            envelope["seq"] = seq
+        return WebSocketMessage.trusted(MessageType.MARKET_DATA, envelope, timestamp)
+    
+    async def resume_client(self, client_id: str, positions: Dict[str, int]) -> Dict[str, Any]:
+        """
+        断线重连后按频道补发缺失的推送
+        
+        客户端需先重新订阅，再发送各频道最后收到的序号。缺口仍在重放缓冲内时
+        只补发缺口，否则回退为当前快照。
+        
+        Args:
+            client_id: 客户端ID
+            positions: {频道名: 最后收到的序号}
+            
+        Returns:
+            Dict[str, Any]: 各频道的处理结果统计
+        """
+        result = {"replayed": 0, "snapshots": 0, "up_to_date": 0, "skipped": []}
+        now = time.monotonic()
+        
+        for channel, last_seq in positions.items():
+            parsed = parse_channel(channel)
+            try:
+                data_type = DataType(parsed[1]) if parsed else None
+                last_seq = int(last_seq)
+            except (ValueError, TypeError):
+                data_type = None
+            if data_type is None:
+                result["skipped"].append(channel)
+                continue
+            symbol = parsed[0]
+            channel = channel_key(symbol, data_type.value)
+            
+            subscription = None
+            for candidate in await self.subscription_manager.get_subscriptions_for(symbol, data_type):
+                if candidate.client_id == client_id:
+                    subscription = candidate
+                    break
+            if subscription is None:
+                result["skipped"].append(channel)
+                continue
+            recipient = [(client_id, subscription.subscription_id)]
+            
+            # 重新订阅后已经收到过快照/关键帧的频道无需补发
+            if data_type == DataType.DEPTH:
+                if self._depth_synced.get(symbol, {}).get(client_id) == subscription.subscription_id:
+                    result["up_to_date"] += 1
+                    continue
+            elif self.delta_tracker.has_snapshot(client_id, symbol, data_type.value, subscription.subscription_id):
+                result["up_to_date"] += 1
+                continue
+            
+            entries = self.replay_buffer.since(channel, last_seq, now)
+            if entries == []:
+                result["up_to_date"] += 1
+                if data_type == DataType.DEPTH:
+                    self._depth_synced.setdefault(symbol, {})[client_id] = subscription.subscription_id
+                continue
+            
+            if entries is None:
+                # 缺口已超出重放缓冲：下发当前快照
+                if data_type == DataType.DEPTH:
+                    sent = await self._send_depth_snapshot(symbol, recipient)
+                else:
+                    data = self._data_cache.get(symbol, {}).get(data_type.value)
+                    sent = data is not None
+                    if sent:
+                        entries = [(self.replay_buffer.current_seq(channel) or None, data)]
+                if not entries:
+                    if sent:
+                        result["snapshots"] += 1
+                    else:
+                        result["skipped"].append(channel)
+                    continue
+                result["snapshots"] += 1
+            else:
+                result["replayed"] += len(entries)
+            
+            if data_type == DataType.DEPTH:
+                for _, update in entries:
+                    await self.connection_manager.send_message(
+                        client_id, self._stream_message(MessageType.DEPTH_UPDATE, update)
+                    )
+                self._depth_synced.setdefault(symbol, {})[client_id] = subscription.subscription_id
+                continue
+            
+            compiled = self.filter_engine.get_filter(subscription) if subscription.filters else None
+            payload = None
+            for seq, data in entries:
+                payload = compiled.project(data) if compiled else data
+                await self.connection_manager.send_message(
+                    client_id, self._market_data_message(symbol, data_type, payload, seq=seq)
+                )
+            if data_type.value in self.config.delta_data_types and payload is not None:
+                self.delta_tracker.seed(client_id, symbol, data_type.value, subscription.subscription_id, payload, now)
+        
+        return result
+    
+    async def publish_tick(
+        self,
+        symbol: str,
+        timestamp: datetime,
+        price: float,
+        volume: float = 0.0,
+        amount: float = 0.0,
+        cumulative: bool = False
+    ) -> int:
+        """
+        接收一个实时tick，增量更新所有周期的K线
+        
+        Args:
+            symbol: 股票代码
+            timestamp: 成交时间（交易所本地时间）
+            price: 最新价
+            volume: 成交量
+            amount: 成交额
+            cumulative: volume/amount 是否为当日累计值
+            
+        Returns:
+            int: 因本tick收盘并推送的K线数量
+        """
+        closed_bars = self.bar_builder.on_tick(
+            symbol, timestamp, price, volume, amount, cumulative=cumulative
+        )
+        if closed_bars:
+            await self._publish_closed_bars(closed_bars)
+        return len(closed_bars)
+    
+    async def _feed_quote_tick(self, symbol: str, data: Dict[str, Any]):
+        """将拉取到的行情快照作为tick喂给K线合成器（成交量/额为当日累计值）
+        
+        轮询间隔内没有新成交时数据源返回同一快照，按交易所时间戳去重。
+        """
+        try:
+            timestamp = to_exchange_time(data["timestamp"], self.bar_builder.config.timezone)
+            last = self._last_tick_time.get(symbol)
+            if last is not None and timestamp <= last:
+                return
+            self._last_tick_time[symbol] = timestamp
+            await self.publish_tick(
+                symbol, timestamp, data["close"],
+                data.get("volume", 0.0), data.get("turnover", 0.0),
+                cumulative=True
+            )
+        except Exception as e:
+            logger.error(f"Error feeding tick to bar builder {symbol}: {e}")
+    
+    async def _flush_closed_bars(self):
+        """按交易所时间收盘K线并推送"""
+        try:
+            closed_bars = self.bar_builder.flush()
+            if closed_bars:
+                await self._publish_closed_bars(closed_bars)
+        except Exception as e:
+            logger.error(f"Error flushing closed bars: {e}")
+    
+    async def _publish_closed_bars(self, bars: List[LiveBar]):
+        """将收盘K线写入缓存并推送给对应周期的KLINE订阅者"""
+        if self._bar_cache is None:
+            self._bar_cache = get_historical_cache()
+        
+        for bar in bars:
+            try:
+                await self._bar_cache.append_live_bar(bar.symbol, bar.period, bar.to_standard())
+                
+                subscribers = await self.subscription_manager.get_kline_subscribers(
+                    bar.symbol, bar.period
+                )
+                if subscribers:
+                    message = self._stream_message(MessageType.KLINE_DATA, bar.to_dict())
+                    await self._broadcast_to_subscribers(subscribers, message)
+            except Exception as e:
+                logger.error(f"Error publishing closed bar {bar.symbol} {bar.period}: {e}")
+        
+        await self.bar_builder.dispatch(bars)
+    
     async def _broadcast_to_subscribers(self, subscribers: List[str], message: WebSocketMessage):
-        """向订阅者广播消息"""
+        """向订阅者广播消息（由连接管理器按编码缓存序列化结果）"""
         try:
-            for client_id in subscribers:
-                await self.connection_manager.send_message(client_id, message)
+            await self.connection_manager.broadcast_message(message, subscribers)
         except Exception as e:
             logger.error(f"Error broadcasting to subscribers: {e}")
     
@@ -357,7 +950,15 @@ class DataPublisher:
                 self._active_symbols.difference_update(removed_symbols)
                 
                 # 清理相关缓存
+                self.order_books.discard(removed_symbols)
+                self.replay_buffer.discard(
+                    channel_key(symbol, data_type.value)
+                    for symbol in removed_symbols for data_type in DataType
+                )
                 for symbol in removed_symbols:
+                    self._depth_synced.pop(symbol, None)
+                    for data_type in DataType:
+                        self._pending_seq.pop((symbol, data_type.value), None)
                     if symbol in self._data_cache:
                         del self._data_cache[symbol]
                     if symbol in self._last_update:
@@ -371,7 +972,17 @@ class DataPublisher:
         try:
             current_time = datetime.now()
             
+            # 清理已取消订阅的过滤状态
+            self.filter_engine.prune(self.subscription_manager.subscriptions.keys())
+            active_clients = self.subscription_manager.client_subscriptions.keys()
+            self.delta_tracker.prune(active_clients)
+            for synced in self._depth_synced.values():
+                for client_id in [c for c in synced if c not in active_clients]:
+                    del synced[client_id]
+            
             # 清理过期缓存数据（超过10分钟未更新）
+            for symbol in [s for s in self._last_tick_time if s not in self._active_symbols]:
+                del self._last_tick_time[symbol]
             for symbol in list(self._data_cache.keys()):
                 if symbol not in self._active_symbols:
                     del self._data_cache[symbol]
@@ -400,6 +1011,13 @@ class DataPublisher:
             "data_source": self.config.source_type,
             "update_interval": self.config.update_interval,
             "cache_size": len(self._data_cache),
+            "bar_builder": self.bar_builder.get_stats(),
+            "filters": self.filter_engine.get_stats(),
+            "delta": self.delta_tracker.get_stats(),
+            "order_books": len(self.order_books.books),
+            "replay": self.replay_buffer.get_stats(),
+            "broker_role": self.config.broker_role,
+            "broker": self.broker.get_stats() if self.broker is not None else None,
             "last_update_times": {
                 symbol: {
                     data_type: last_update.isoformat() if isinstance(last_update, datetime) else str(last_update)
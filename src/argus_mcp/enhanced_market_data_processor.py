@@ -527,10 +527,22 @@ class EnhancedMarketDataProcessor:
         successful = 0
         failed = 0
         
-        # 并行获取数据
+        # 批量查缓存（一次Redis往返），未命中的再并行获取
+        cached = {}
+        batched = bool(use_cache and self.cache_optimizer and hasattr(self.cache_optimizer, "get_many"))
+        if batched:
+            cached = await self.cache_optimizer.get_many(
+                [self._latest_cache_key(symbol) for symbol in symbols]
+            )
+        
         fetch_tasks = []
         for symbol in symbols:
-            task = self._fetch_single_latest_data(symbol, fields, use_cache)
+            cached_data = cached.get(self._latest_cache_key(symbol))
+            if cached_data:
+                self.stats['cache_hits'] += 1
+                fetch_tasks.append(self._from_cached(cached_data))
+                continue
+            task = self._fetch_single_latest_data(symbol, fields, use_cache, check_cache=not batched)
             fetch_tasks.append(task)
         
         # 等待所有任务完成
@@ -577,14 +589,23 @@ class EnhancedMarketDataProcessor:
             errors=errors
         )
     
+    @staticmethod
+    def _latest_cache_key(symbol: str) -> str:
+        return f"latest_market_data:{symbol}"
+    
+    @staticmethod
+    async def _from_cached(cached_data: Dict[str, Any]) -> MarketDataPoint:
+        return MarketDataPoint.from_dict(cached_data)
+    
     async def _fetch_single_latest_data(self, symbol: str, 
                                       fields: Optional[List[str]],
-                                      use_cache: bool) -> Optional[MarketDataPoint]:
-        """获取单个股票的最新数据"""
-        cache_key = f"latest_market_data:{symbol}"
+                                      use_cache: bool,
+                                      check_cache: bool = True) -> Optional[MarketDataPoint]:
+        """获取单个股票的最新数据（check_cache=False 表示调用方已批量查过缓存）"""
+        cache_key = self._latest_cache_key(symbol)
         
         # 尝试从缓存获取
-        if use_cache and self.cache_optimizer:
+        if use_cache and check_cache and self.cache_optimizer:
             cached_data = await self.cache_optimizer.get(cache_key)
             if cached_data:
                 self.stats['cache_hits'] += 1
@@ -25,6 +25,7 @@ from .data_publisher import DataPublisher, DataSourceConfig
 from .message_router import MessageRouter
 from .websocket_monitor import WebSocketMonitor
 from .websocket_heartbeat import WebSocketHeartbeatManager, HeartbeatConfig
+from .websocket_codec import incoming_to_text, supported_encodings
 
 logger = logging.getLogger(__name__)
 
@@ -58,6 +59,7 @@ class EnhancedWebSocketEndpoints:
             config=DataSourceConfig(source_type="mock")
         )
         self.message_router = MessageRouter(self.websocket_config)
+        self.connection_manager.set_message_batcher(self.message_router)
         # Import AlertConfig locally to avoid circular imports
         from .websocket_monitor import AlertConfig
         self.monitor = WebSocketMonitor(AlertConfig())
@@ -89,6 +91,8 @@ class EnhancedWebSocketEndpoints:
         self.message_router.register_handler(MessageType.HEARTBEAT, self._handle_heartbeat)
         self.message_router.register_handler(MessageType.PING, self._handle_ping)
         self.message_router.register_handler(MessageType.GET_STATS, self._handle_get_stats)
+        self.message_router.register_handler(MessageType.DEPTH_RESYNC, self._handle_depth_resync)
+        self.message_router.register_handler(MessageType.RESUME, self._handle_resume)
         logger.info("WebSocket message handlers registered")
     
     def _setup_routes(self):
@@ -96,27 +100,43 @@ class EnhancedWebSocketEndpoints:
         @self.router.websocket("/ws/realtime")
         async def websocket_realtime_endpoint(
             websocket: WebSocket,
-            token: Optional[str] = None
+            token: Optional[str] = None,
+            encoding: Optional[str] = None,
+            compression: Optional[str] = None,
+            zstd_dict: Optional[str] = None,
+            batch: Optional[str] = None
         ):
             """实时数据 WebSocket 端点"""
-            await self._handle_websocket_connection(websocket, token)
+            await self._handle_websocket_connection(
+                websocket, token, encoding=encoding, compression=compression, zstd_dict=zstd_dict, batch=batch
+            )
         
         @self.router.websocket("/ws/market/{symbol}")
         async def websocket_symbol_endpoint(
             websocket: WebSocket,
             symbol: str,
-            token: Optional[str] = None
+            token: Optional[str] = None,
+            encoding: Optional[str] = None,
+            compression: Optional[str] = None,
+            zstd_dict: Optional[str] = None,
+            batch: Optional[str] = None
         ):
             """特定股票的 WebSocket 端点"""
-            await self._handle_websocket_connection(websocket, token, symbol)
+            await self._handle_websocket_connection(websocket, token, symbol, encoding, compression, zstd_dict, batch)
         
         @self.router.websocket("/ws/market_data")
         async def websocket_market_data_endpoint(
             websocket: WebSocket,
-            token: Optional[str] = None
+            token: Optional[str] = None,
+            encoding: Optional[str] = None,
+            compression: Optional[str] = None,
+            zstd_dict: Optional[str] = None,
+            batch: Optional[str] = None
         ):
             """兼容现有市场数据 WebSocket 端点"""
-            await self._handle_websocket_connection(websocket, token)
+            await self._handle_websocket_connection(
+                websocket, token, encoding=encoding, compression=compression, zstd_dict=zstd_dict, batch=batch
+            )
         
         @self.router.get("/ws/status")
         async def websocket_status():
@@ -190,15 +210,21 @@ class EnhancedWebSocketEndpoints:
         self,
         websocket: WebSocket,
         token: Optional[str] = None,
-        symbol: Optional[str] = None
+        symbol: Optional[str] = None,
+        encoding: Optional[str] = None,
+        compression: Optional[str] = None,
+        zstd_dict: Optional[str] = None,
+        batch: Optional[str] = None
     ):
         """处理 WebSocket 连接"""
         client_id = str(uuid.uuid4())
         
         try:
-            # 建立连接
+            # 建立连接（encoding 查询参数协商行情帧编码：json/msgpack/compact；
+            # compression=zstd 使用字典压缩，zstd_dict 为客户端已持有的字典ID；
+            # batch=1 表示客户端能展开批量帧）
             connection_result = await self.connection_manager.connect(
-                websocket, client_id, token
+                websocket, client_id, token, encoding=encoding, compression=compression, batch=batch
             )
             
             if not connection_result.success:
@@ -211,7 +237,7 @@ class EnhancedWebSocketEndpoints:
             await self.heartbeat_manager.register_connection(client_id, websocket)
             
             # 发送欢迎消息
-            await self._send_welcome_message(websocket, client_id, symbol)
+            await self._send_welcome_message(websocket, client_id, symbol, zstd_dict)
             
             # 如果指定了股票代码，自动订阅
             if symbol:
@@ -234,7 +260,8 @@ class EnhancedWebSocketEndpoints:
         self,
         websocket: WebSocket,
         client_id: str,
-        symbol: Optional[str] = None
+        symbol: Optional[str] = None,
+        known_dictionary_id: Optional[str] = None
     ):
         """发送欢迎消息"""
         welcome_data = {
@@ -243,6 +270,10 @@ class EnhancedWebSocketEndpoints:
             "supported_data_types": [dt.value for dt in DataType],
             "max_subscriptions": self.websocket_config.max_subscriptions_per_client,
             "heartbeat_interval": self.websocket_config.heartbeat_interval,
+            "encoding": self.connection_manager.get_encoding(client_id).value,
+            "supported_encodings": supported_encodings(),
+            "batch": self.connection_manager.batching_for(client_id),
+            **self.connection_manager.get_compression_info(client_id, known_dictionary_id),
             "timestamp": datetime.now().isoformat()
         }
         
@@ -254,7 +285,9 @@ class EnhancedWebSocketEndpoints:
             data=welcome_data
         )
         
+        # 欢迎消息不压缩，之后的帧按协商的方式压缩
         await websocket.send_text(welcome_msg.model_dump_json())
+        self.connection_manager.activate_compression(client_id)
     
     async def _auto_subscribe_symbol(
         self,
@@ -290,8 +323,14 @@ class EnhancedWebSocketEndpoints:
         """消息处理循环"""
         try:
             while True:
-                # 接收消息
-                raw_message = await websocket.receive_text()
+                # 接收消息（二进制上行帧转换为JSON文本）
+                frame = await websocket.receive()
+                if frame["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(frame.get("code", 1000))
+                if frame.get("text") is not None:
+                    raw_message = frame["text"]
+                else:
+                    raw_message = incoming_to_text(frame.get("bytes") or b"")
                 
                 # 更新连接活跃时间
                 await self.connection_manager.update_heartbeat(client_id)
@@ -574,6 +613,56 @@ class EnhancedWebSocketEndpoints:
                 "message_id": message.message_id
             }
     
+    async def _handle_depth_resync(self, client_id: str, message: WebSocketMessage, websocket):
+        """处理深度重新同步请求（快照由数据发布器直接下发）"""
+        try:
+            symbol = (message.data or {}).get("symbol")
+            if not symbol or not await self.data_publisher.resync_depth(client_id, symbol):
+                return {
+                    "success": False,
+                    "error": f"无法重新同步深度: {symbol}",
+                    "message_id": message.message_id
+                }
+            
+            return {
+                "success": True,
+                "message_id": message.message_id
+            }
+            
+        except Exception as e:
+            logger.error(f"Depth resync error for {client_id}: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "message_id": message.message_id
+            }
+    
+    async def _handle_resume(self, client_id: str, message: WebSocketMessage, websocket):
+        """处理断线续传请求（按频道补发缺失的推送）"""
+        try:
+            channels = (message.data or {}).get("channels")
+            if not isinstance(channels, dict):
+                return {
+                    "success": False,
+                    "error": "resume 需要 channels: {频道: 最后序号}",
+                    "message_id": message.message_id
+                }
+            
+            result = await self.data_publisher.resume_client(client_id, channels)
+            return {
+                "success": True,
+                "response_data": {"resume": result},
+                "message_id": message.message_id
+            }
+            
+        except Exception as e:
+            logger.error(f"Resume error for {client_id}: {e}")
+            return {
+                "success": False,
+                "error": str(e),
+                "message_id": message.message_id
+            }
+    
     # HTTP 端点处理器
     async def _get_service_status(self):
         """获取服务状态"""
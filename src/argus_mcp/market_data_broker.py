@@ -0,0 +1,466 @@
+"""
+WebSocket 实时数据系统 - 跨进程行情分发
+单生产者、多消费者：一个 producer 进程按所有 worker 的订阅并集每周期只拉取一次行情，
+发布到本机 broker；各 WebSocket worker 进程（consumer）只把收到的行情扇出给自己的客户端。
+
+- InProcessBroker: 生产者与消费者在同一事件循环（单进程部署与测试）
+- UnixSocketBrokerServer / UnixSocketBrokerClient: 通过 Unix 域套接字的本机发布/订阅
+
+协议帧为 4 字节大端长度 + 1 字节格式标记（m=msgpack, j=JSON）+ 内容:
+    consumer -> producer: {"op": "interest", "channels": {symbol: [data_type, ...]}}
+    producer -> consumer: {"op": "data", "updates": [[symbol, data_type, data, seq], ...]}
+
+seq 是 producer 分配的频道序号（深度频道为 null，使用订单簿序号），各 consumer 原样沿用，
+客户端重连到另一个 worker 时断点续传的位置仍然有效。
+
+producer 只向关注对应频道的 consumer 发送；consumer 消费过慢（发送缓冲超过上限）时
+跳过该周期，下一周期的完整最新值会覆盖它，不会无限堆积。
+
+单独运行 producer:
+    python -m src.argus_mcp.market_data_broker --path /tmp/argus-md.sock --source qmt
+worker 进程设置 ARGUS_MD_BROKER_ROLE=consumer 与 ARGUS_MD_BROKER_PATH=/tmp/argus-md.sock。
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import struct
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .websocket_codec import _wire_default
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+Update = Tuple[str, str, Dict[str, Any], Optional[int]]  # (symbol, data_type, data, seq)
+Interest = Dict[str, Set[str]]  # symbol -> {data_type}
+
+BROKER_ROLES = ("standalone", "producer", "consumer")
+_HEADER = struct.Struct(">I")
+_FORMAT_MSGPACK = b"m"
+_FORMAT_JSON = b"j"
+DEFAULT_MAX_PENDING = 8
+DEFAULT_MAX_BUFFER = 8 * 1024 * 1024
+
+
+def encode_broker_message(message: Dict[str, Any]) -> bytes:
+    """编码一条 broker 协议消息（含长度前缀）"""
+    if MSGPACK_AVAILABLE:
+        body = _FORMAT_MSGPACK + msgpack.packb(message, default=_wire_default, use_bin_type=True)
+    else:
+        body = _FORMAT_JSON + json.dumps(message, default=_wire_default, separators=(",", ":")).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+def decode_broker_message(body: bytes) -> Dict[str, Any]:
+    """解码去掉长度前缀后的消息内容"""
+    marker, payload = body[:1], body[1:]
+    if marker == _FORMAT_MSGPACK:
+        if not MSGPACK_AVAILABLE:
+            raise ValueError("收到msgpack格式的broker消息，但未安装msgpack")
+        return msgpack.unpackb(payload, raw=False)
+    if marker == _FORMAT_JSON:
+        return json.loads(payload)
+    raise ValueError(f"未知的broker消息格式: {marker!r}")
+
+
+async def read_broker_message(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    """读取一条消息，连接关闭时抛出 asyncio.IncompleteReadError"""
+    header = await reader.readexactly(_HEADER.size)
+    (length,) = _HEADER.unpack(header)
+    return decode_broker_message(await reader.readexactly(length))
+
+
+def normalize_interest(channels: Dict[str, Iterable[str]]) -> Interest:
+    """{symbol: [data_type, ...]} 转为 {symbol: {data_type}}，忽略空项"""
+    return {symbol: set(types) for symbol, types in (channels or {}).items() if types}
+
+
+def merge_interest(interests: Iterable[Interest]) -> Interest:
+    """多个 consumer 关注频道的并集"""
+    merged: Interest = {}
+    for interest in interests:
+        for symbol, types in interest.items():
+            merged.setdefault(symbol, set()).update(types)
+    return merged
+
+
+def filter_updates(updates: List[Update], interest: Interest) -> List[Update]:
+    """只保留 consumer 关注的频道"""
+    return [update for update in updates if update[1] in interest.get(update[0], ())]
+
+
+class InProcessBrokerConsumer:
+    """同进程 broker 的消费端，每周期的行情放入有界队列"""
+
+    def __init__(self, broker: "InProcessBroker", max_pending: int = DEFAULT_MAX_PENDING):
+        self._broker = broker
+        self._queue: asyncio.Queue = asyncio.Queue(max_pending)
+        self.interest: Interest = {}
+        self.stats: Dict[str, int] = {
+            "received_cycles": 0,
+            "received_updates": 0,
+            "dropped_cycles": 0,
+        }
+
+    async def start(self):
+        self._broker._consumers.add(self)
+
+    async def stop(self):
+        self._broker._consumers.discard(self)
+
+    async def set_interest(self, channels: Dict[str, Iterable[str]]):
+        """上报需要的频道"""
+        self.interest = normalize_interest(channels)
+
+    async def receive(self) -> List[Update]:
+        """等待下一批行情"""
+        updates = await self._queue.get()
+        self.stats["received_cycles"] += 1
+        self.stats["received_updates"] += len(updates)
+        return updates
+
+    def _deliver(self, updates: List[Update]):
+        if self._queue.full():
+            # 消费过慢：丢弃最旧的一批，保留最新值
+            self._queue.get_nowait()
+            self.stats["dropped_cycles"] += 1
+        self._queue.put_nowait(updates)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "transport": "inprocess",
+            **self.stats,
+            "pending": self._queue.qsize(),
+            "channels": sum(len(types) for types in self.interest.values()),
+        }
+
+
+class InProcessBroker:
+    """同进程 broker（生产端）"""
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING):
+        self.max_pending = max_pending
+        self._consumers: Set[InProcessBrokerConsumer] = set()
+        self.stats: Dict[str, int] = {
+            "published_cycles": 0,
+            "published_updates": 0,
+            "deliveries": 0,
+        }
+
+    def connect(self) -> InProcessBrokerConsumer:
+        """创建消费端（start() 后开始接收）"""
+        return InProcessBrokerConsumer(self, self.max_pending)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        self._consumers.clear()
+
+    def get_interest(self) -> Interest:
+        """所有消费端关注频道的并集"""
+        return merge_interest(consumer.interest for consumer in self._consumers)
+
+    async def publish(self, updates: List[Update]) -> int:
+        """
+        发布一周期的行情
+
+        Returns:
+            收到数据的消费端数量
+        """
+        self.stats["published_cycles"] += 1
+        self.stats["published_updates"] += len(updates)
+        delivered = 0
+        for consumer in list(self._consumers):
+            selected = filter_updates(updates, consumer.interest)
+            if selected:
+                consumer._deliver(selected)
+                delivered += 1
+        self.stats["deliveries"] += delivered
+        return delivered
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "transport": "inprocess",
+            **self.stats,
+            "consumers": len(self._consumers),
+        }
+
+
+class _ConsumerConnection:
+    """Unix 套接字 broker 上的一个 consumer 连接"""
+
+    __slots__ = ("writer", "interest")
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.interest: Interest = {}
+
+
+class UnixSocketBrokerServer:
+    """Unix 域套接字 broker（生产端），consumer 进程连接后上报关注的频道"""
+
+    def __init__(self, path: str, max_buffer: int = DEFAULT_MAX_BUFFER):
+        self.path = path
+        self.max_buffer = max_buffer
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Set[_ConsumerConnection] = set()
+        self.stats: Dict[str, int] = {
+            "published_cycles": 0,
+            "published_updates": 0,
+            "deliveries": 0,
+            "skipped_slow": 0,
+            "consumers_connected": 0,
+        }
+
+    async def start(self):
+        if self._server is not None:
+            return
+        if os.path.exists(self.path):
+            # 上次进程遗留的套接字文件
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle_consumer, path=self.path)
+        logger.info(f"行情broker已监听 {self.path}")
+
+    async def stop(self):
+        if self._server is None:
+            return
+        self._server.close()
+        for conn in list(self._connections):
+            conn.writer.close()
+        self._connections.clear()
+        await self._server.wait_closed()
+        self._server = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    async def _handle_consumer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        conn = _ConsumerConnection(writer)
+        self._connections.add(conn)
+        self.stats["consumers_connected"] += 1
+        logger.info(f"行情consumer已连接，当前 {len(self._connections)} 个")
+        try:
+            while True:
+                message = await read_broker_message(reader)
+                if message.get("op") == "interest":
+                    conn.interest = normalize_interest(message.get("channels"))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"处理行情consumer消息失败: {e}")
+        finally:
+            self._connections.discard(conn)
+            writer.close()
+            logger.info(f"行情consumer已断开，当前 {len(self._connections)} 个")
+
+    def get_interest(self) -> Interest:
+        """所有 consumer 关注频道的并集"""
+        return merge_interest(conn.interest for conn in self._connections)
+
+    async def publish(self, updates: List[Update]) -> int:
+        """
+        发布一周期的行情
+
+        Returns:
+            收到数据的 consumer 数量
+        """
+        self.stats["published_cycles"] += 1
+        self.stats["published_updates"] += len(updates)
+        delivered = 0
+        for conn in list(self._connections):
+            selected = filter_updates(updates, conn.interest)
+            if not selected:
+                continue
+            transport = conn.writer.transport
+            if transport.is_closing():
+                continue
+            if transport.get_write_buffer_size() > self.max_buffer:
+                self.stats["skipped_slow"] += 1
+                continue
+            conn.writer.write(encode_broker_message({"op": "data", "updates": selected}))
+            delivered += 1
+        self.stats["deliveries"] += delivered
+        return delivered
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "transport": "unix",
+            "path": self.path,
+            **self.stats,
+            "consumers": len(self._connections),
+        }
+
+
+class UnixSocketBrokerClient:
+    """Unix 域套接字 broker 的消费端，断线后自动重连并重新上报关注的频道"""
+
+    def __init__(self, path: str, reconnect_delay: float = 1.0):
+        self.path = path
+        self.reconnect_delay = reconnect_delay
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._channels: Dict[str, List[str]] = {}
+        self.stats: Dict[str, int] = {
+            "received_cycles": 0,
+            "received_updates": 0,
+            "reconnects": 0,
+        }
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def start(self):
+        await self._connect()
+
+    async def stop(self):
+        self._disconnect()
+
+    async def _connect(self) -> bool:
+        try:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+        except OSError as e:
+            logger.warning(f"连接行情broker失败 {self.path}: {e}")
+            self._reader = self._writer = None
+            return False
+        logger.info(f"已连接行情broker {self.path}")
+        if self._channels:
+            await self._send_interest()
+        return True
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def _send_interest(self):
+        self._writer.write(encode_broker_message({"op": "interest", "channels": self._channels}))
+        await self._writer.drain()
+
+    async def set_interest(self, channels: Dict[str, Iterable[str]]):
+        """上报需要的频道（未连接时在重连后发送）"""
+        self._channels = {symbol: sorted(types) for symbol, types in normalize_interest(channels).items()}
+        if self.connected:
+            try:
+                await self._send_interest()
+            except ConnectionError as e:
+                logger.warning(f"上报关注频道失败: {e}")
+                self._disconnect()
+
+    async def receive(self) -> List[Update]:
+        """等待下一批行情，断线时持续重连"""
+        while True:
+            if not self.connected:
+                if not await self._connect():
+                    await asyncio.sleep(self.reconnect_delay)
+                    continue
+                self.stats["reconnects"] += 1
+            try:
+                message = await read_broker_message(self._reader)
+            except (asyncio.IncompleteReadError, ConnectionError):
+                logger.warning("行情broker连接断开，准备重连")
+                self._disconnect()
+                continue
+            if message.get("op") != "data":
+                continue
+            updates = [tuple(update) for update in message.get("updates") or ()]
+            self.stats["received_cycles"] += 1
+            self.stats["received_updates"] += len(updates)
+            return updates
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "transport": "unix",
+            "path": self.path,
+            "connected": self.connected,
+            **self.stats,
+            "channels": sum(len(types) for types in self._channels.values()),
+        }
+
+
+def create_broker(role: str, path: Optional[str]):
+    """
+    按角色创建 Unix 套接字 broker
+
+    Returns:
+        producer 返回服务端，consumer 返回客户端，standalone 返回None
+    """
+    if role not in BROKER_ROLES:
+        raise ValueError(f"未知的broker角色: {role}")
+    if role == "standalone":
+        return None
+    if not path:
+        raise ValueError(f"broker角色 {role} 需要配置 broker_path")
+    if role == "producer":
+        return UnixSocketBrokerServer(path)
+    return UnixSocketBrokerClient(path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """单独运行行情 producer 进程"""
+    parser = argparse.ArgumentParser(description="行情producer：拉取所有worker订阅的行情并通过Unix套接字分发")
+    parser.add_argument("--path", default=os.getenv("ARGUS_MD_BROKER_PATH", "/tmp/argus-md.sock"),
+                        help="Unix域套接字路径")
+    parser.add_argument("--source", default="qmt", choices=["mock", "qmt", "tdx"], help="数据源")
+    parser.add_argument("--interval", type=float, default=1.0, help="拉取间隔（秒）")
+    args = parser.parse_args(argv)
+
+    from .data_publisher import DataPublisher, DataSourceConfig
+    from .subscription_manager import SubscriptionManager
+    from .websocket_connection_manager import WebSocketConnectionManager
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    async def run():
+        publisher = DataPublisher(
+            SubscriptionManager(),
+            WebSocketConnectionManager(),
+            DataSourceConfig(
+                source_type=args.source,
+                update_interval=args.interval,
+                broker_role="producer",
+                broker_path=args.path,
+            ),
+        )
+        await publisher.start()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await publisher.stop()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+__all__ = [
+    "InProcessBroker",
+    "InProcessBrokerConsumer",
+    "UnixSocketBrokerServer",
+    "UnixSocketBrokerClient",
+    "BROKER_ROLES",
+    "create_broker",
+    "encode_broker_message",
+    "decode_broker_message",
+    "read_broker_message",
+    "merge_interest",
+    "filter_updates",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
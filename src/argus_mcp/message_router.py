@@ -7,9 +7,10 @@ import asyncio
 import json
 import gzip
 import logging
-from typing import Dict, Any, Optional, List, Callable, Union
+from typing import Dict, Any, Optional, List, Callable, Union, Awaitable
 from datetime import datetime
 from enum import Enum
+import time
 import uuid
 
 from .websocket_models import (
@@ -17,9 +18,13 @@ from .websocket_models import (
     ErrorMessage, ValidationResult, MessageHandleResult, BroadcastResult,
     WebSocketConfig
 )
+from .websocket_codec import EncodedFrame, combine_frames
 
 logger = logging.getLogger(__name__)
 
+# 批量帧发送函数: sender(client_id, frames, message_count) -> 是否发送成功
+BatchSender = Callable[[str, List[EncodedFrame], int], Awaitable[bool]]
+
 
 class CompressionType(str, Enum):
     """压缩类型枚举"""
@@ -35,6 +40,20 @@ class MessagePriority(str, Enum):
     CRITICAL = "critical"
 
 
+class _PendingBatch:
+    """单个客户端排队中的帧"""
+    
+    __slots__ = ("frames", "message_count", "size", "first_at", "lock")
+    
+    def __init__(self):
+        self.frames: List[EncodedFrame] = []
+        self.message_count = 0
+        self.size = 0
+        self.first_at = 0.0
+        # 保证同一客户端的批量帧按顺序发送
+        self.lock = asyncio.Lock()
+
+
 class MessageRouter:
     """WebSocket消息路由器 - 处理消息路由、格式化、验证和压缩"""
     
@@ -58,9 +77,21 @@ class MessageRouter:
         # 消息确认跟踪
         self.pending_acknowledgments: Dict[str, Dict[str, Any]] = {}
         
-        # 批量消息缓冲区
-        self.message_batches: Dict[str, List[WebSocketMessage]] = {}
-        self.batch_timers: Dict[str, asyncio.Task] = {}
+        # 批量消息缓冲区（按客户端排队，达到消息数/字节上限或延迟上限时合并为一帧发送）
+        self.message_batches: Dict[str, _PendingBatch] = {}
+        self.batch_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._batch_sender: Optional[BatchSender] = None
+        self._flush_tasks: set = set()
+        self.batch_stats: Dict[str, Any] = {
+            "batches": 0,
+            "messages": 0,
+            "frames_sent": 0,
+            "bytes_sent": 0,
+            "send_failures": 0,
+            "flush_reasons": {"size": 0, "bytes": 0, "deadline": 0, "manual": 0},
+            "total_delay_ms": 0.0,
+            "max_delay_ms": 0.0
+        }
         
         # 消息压缩缓存
         self.compression_cache: Dict[str, bytes] = {}
@@ -164,10 +195,12 @@ class MessageRouter:
             # 序列化消息
             message_json = message.model_dump_json()
             
-            # 检查是否需要压缩
+            # 检查是否需要压缩（启用传输压缩时由 permessage-deflate 在帧层压缩，不再逐条gzip）
             should_compress = (
                 compression if compression is not None 
-                else (self.config.enable_compression and len(message_json) > self.config.compression_threshold)
+                else (self.config.enable_compression and
+                      self.config.transport_compression == "none" and
+                      len(message_json) > self.config.compression_threshold)
             )
             
             if should_compress:
@@ -191,17 +224,17 @@ class MessageRouter:
     async def compress_message(self, message: str) -> bytes:
         """压缩消息"""
         try:
-            # 检查压缩缓存
-            cache_key = hash(message)
-            if str(cache_key) in self.compression_cache:
-                return self.compression_cache[str(cache_key)]
+            # 检查压缩缓存（以消息文本为键，hash()冲突时会返回其他消息的压缩结果）
+            cached = self.compression_cache.get(message)
+            if cached is not None:
+                return cached
             
             # 压缩消息
             compressed = gzip.compress(message.encode('utf-8'))
             
             # 更新缓存
             if len(self.compression_cache) < self.cache_max_size:
-                self.compression_cache[str(cache_key)] = compressed
+                self.compression_cache[message] = compressed
             
             # 更新统计信息
             self.message_stats["total_compressed"] += 1
@@ -348,38 +381,166 @@ class MessageRouter:
         
         return batches
     
-    async def add_to_batch(self, client_id: str, message: WebSocketMessage):
-        """添加消息到批处理队列"""
-        if not self.config.enable_batching:
-            return False
+    def set_batch_sender(self, sender: BatchSender):
+        """设置批量帧的发送函数（通常为连接管理器的帧发送方法）"""
+        self._batch_sender = sender
+    
+    @property
+    def batching_enabled(self) -> bool:
+        """是否启用批量推送（需要配置开启并设置发送函数）"""
+        return self.config.enable_batching and self._batch_sender is not None
+    
+    async def add_to_batch(
+        self,
+        client_id: str,
+        message: Union[WebSocketMessage, List[EncodedFrame]]
+    ) -> bool:
+        """
+        将消息加入客户端的批量队列
         
-        if client_id not in self.message_batches:
-            self.message_batches[client_id] = []
+        达到 batch_max_messages 条或 batch_max_bytes 字节时立即发送；
+        否则在第一条消息排队 batch_max_delay_ms 毫秒后发送。
         
-        self.message_batches[client_id].append(message)
+        Args:
+            client_id: 客户端ID
+            message: 消息，或已按连接编码好的帧（compact 字段表帧与行情帧一起传入）
+            
+        Returns:
+            False 表示未启用批量推送，调用方应直接发送
+        """
+        if not self.batching_enabled:
+            return False
         
-        # 设置批处理定时器
-        if client_id not in self.batch_timers:
-            self.batch_timers[client_id] = asyncio.create_task(
-                self._flush_batch_after_delay(client_id)
+        if isinstance(message, WebSocketMessage):
+            frames = [EncodedFrame(message.model_dump_json())]
+        else:
+            frames = message
+        size = sum(frame.size for frame in frames)
+        
+        batch = self.message_batches.get(client_id)
+        if batch is None:
+            batch = self.message_batches[client_id] = _PendingBatch()
+        elif batch.frames and batch.size + size > self.config.batch_max_bytes:
+            await self.flush_batch(client_id, "bytes")
+        
+        if not batch.frames:
+            batch.first_at = time.monotonic()
+            self.batch_timers[client_id] = asyncio.get_running_loop().call_later(
+                self.config.batch_max_delay_ms / 1000.0, self._on_batch_deadline, client_id
             )
-        
+        batch.frames.extend(frames)
+        batch.message_count += 1
+        batch.size += size
+        
+        if batch.message_count >= self.config.batch_max_messages:
+            await self.flush_batch(client_id, "size")
+        elif batch.size >= self.config.batch_max_bytes:
+            await self.flush_batch(client_id, "bytes")
         return True
     
-    async def _flush_batch_after_delay(self, client_id: str):
-        """延迟刷新批处理队列"""
-        await asyncio.sleep(self.config.flush_interval)
-        
-        if client_id in self.message_batches and self.message_batches[client_id]:
-            # 这里应该调用实际的发送函数，但由于这是路由器，我们只是清空队列
-            batch = self.message_batches[client_id].copy()
-            self.message_batches[client_id].clear()
+    def _on_batch_deadline(self, client_id: str):
+        """延迟上限到期，发送客户端排队的消息"""
+        self.batch_timers.pop(client_id, None)
+        task = asyncio.ensure_future(self.flush_batch(client_id, "deadline"))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+    
+    async def flush_batch(self, client_id: str, reason: str = "manual") -> int:
+        """
+        立即发送客户端排队的消息
+        
+        直接发送给该客户端的消息应先调用本方法，保证不会越过已排队的消息。
+        
+        Returns:
+            int: 发送的消息数
+        """
+        batch = self.message_batches.get(client_id)
+        if batch is None:
+            return 0
+        
+        async with batch.lock:
+            if not batch.frames:
+                return 0
+            frames, message_count, first_at = batch.frames, batch.message_count, batch.first_at
+            batch.frames, batch.message_count, batch.size = [], 0, 0
+            timer = self.batch_timers.pop(client_id, None)
+            if timer is not None:
+                timer.cancel()
             
-            logger.debug(f"Flushed batch for client {client_id}: {len(batch)} messages")
-        
-        # 清理定时器
-        if client_id in self.batch_timers:
-            del self.batch_timers[client_id]
+            combined = combine_frames(frames)
+            delay_ms = (time.monotonic() - first_at) * 1000
+            try:
+                sent = await self._batch_sender(client_id, combined, message_count)
+            except Exception as e:
+                logger.error(f"Error sending batch to {client_id}: {e}")
+                sent = False
+            
+            self._record_batch(reason, message_count, combined, delay_ms, sent)
+            logger.debug(
+                f"Flushed batch for client {client_id} ({reason}): "
+                f"{message_count} messages in {len(combined)} frames, {delay_ms:.1f}ms"
+            )
+            return message_count if sent else 0
+    
+    async def flush_all_batches(self, reason: str = "manual") -> int:
+        """发送所有客户端排队的消息"""
+        sent = 0
+        for client_id in list(self.message_batches):
+            sent += await self.flush_batch(client_id, reason)
+        return sent
+    
+    def discard_batch(self, client_id: str):
+        """丢弃已断开客户端的队列"""
+        timer = self.batch_timers.pop(client_id, None)
+        if timer is not None:
+            timer.cancel()
+        self.message_batches.pop(client_id, None)
+    
+    def _record_batch(
+        self,
+        reason: str,
+        message_count: int,
+        frames: List[EncodedFrame],
+        delay_ms: float,
+        sent: bool
+    ):
+        stats = self.batch_stats
+        stats["flush_reasons"][reason] = stats["flush_reasons"].get(reason, 0) + 1
+        if not sent:
+            stats["send_failures"] += 1
+            return
+        stats["batches"] += 1
+        stats["messages"] += message_count
+        stats["frames_sent"] += len(frames)
+        stats["bytes_sent"] += sum(frame.size for frame in frames)
+        stats["total_delay_ms"] += delay_ms
+        stats["max_delay_ms"] = max(stats["max_delay_ms"], delay_ms)
+        self.message_stats["total_batched"] += 1
+    
+    def get_batch_stats(self) -> Dict[str, Any]:
+        """
+        获取批量推送统计
+        
+        coalescing_ratio 为平均每个WebSocket帧承载的消息数。
+        """
+        stats = self.batch_stats
+        batches = stats["batches"]
+        return {
+            "enabled": self.batching_enabled,
+            "batches": batches,
+            "messages": stats["messages"],
+            "frames_sent": stats["frames_sent"],
+            "bytes_sent": stats["bytes_sent"],
+            "send_failures": stats["send_failures"],
+            "flush_reasons": dict(stats["flush_reasons"]),
+            "coalescing_ratio": stats["messages"] / stats["frames_sent"] if stats["frames_sent"] else 0.0,
+            "average_delay_ms": stats["total_delay_ms"] / batches if batches else 0.0,
+            "max_delay_ms": stats["max_delay_ms"],
+            "pending_messages": sum(b.message_count for b in self.message_batches.values()),
+            "max_messages": self.config.batch_max_messages,
+            "max_bytes": self.config.batch_max_bytes,
+            "deadline_ms": self.config.batch_max_delay_ms
+        }
     
     async def request_acknowledgment(
         self,
@@ -458,7 +619,8 @@ class MessageRouter:
         return {
             "message_stats": self.message_stats.copy(),
             "pending_acknowledgments": len(self.pending_acknowledgments),
-            "active_batches": len(self.message_batches),
+            "active_batches": sum(1 for b in self.message_batches.values() if b.frames),
+            "batching": self.get_batch_stats(),
             "cache_size": len(self.compression_cache),
             "registered_handlers": list(self.message_handlers.keys()),
             "timestamp": datetime.now().isoformat()
@@ -473,8 +635,9 @@ class MessageRouter:
         """清理资源"""
         # 取消所有批处理定时器
         for timer in self.batch_timers.values():
-            if not timer.done():
-                timer.cancel()
+            timer.cancel()
+        for task in list(self._flush_tasks):
+            task.cancel()
         
         self.batch_timers.clear()
         self.message_batches.clear()
@@ -561,15 +724,18 @@ class MessageFormatter:
             "depth": MessageType.DEPTH_DATA
         }
         
-        return WebSocketMessage(
-            type=message_type_map.get(data_type, MessageType.MARKET_DATA),
-            data={
+        # 行情推送为服务端生成的消息，走免校验的快速构造
+        now = datetime.now()
+        return WebSocketMessage.trusted(
+            message_type_map.get(data_type, MessageType.MARKET_DATA),
+            {
                 "symbol": symbol,
                 "data_type": data_type,
                 "subscription_id": subscription_id,
                 "data": data,
-                "timestamp": datetime.now().isoformat()
-            }
+                "timestamp": now.isoformat()
+            },
+            now
         )
 
 
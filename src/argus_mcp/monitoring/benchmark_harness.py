@@ -0,0 +1,973 @@
+"""
+统一性能基准测试框架
+
+覆盖热点路径：数据标准化、重采样、缓存读写、WebSocket扇出、编码与压缩、数据库写入和HTTP接口。
+所有用例基于固定种子的模拟行情数据，先预热再计时，记录p50/p99/吞吐量/内存分配，
+结果追加到JSON历史文件，并与基线对比，超过回归阈值时以非零退出码结束，便于在部署前拦截性能回退。
+
+用法:
+    python -m src.argus_mcp.monitoring.benchmark_harness
+    python -m src.argus_mcp.monitoring.benchmark_harness --cases resample,cache --threshold 0.15
+    python -m src.argus_mcp.monitoring.benchmark_harness --update-baseline
+"""
+
+import argparse
+import asyncio
+import gc
+import inspect
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass, field, asdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_HISTORY_FILE = PROJECT_ROOT / "benchmark_results" / "benchmark_history.json"
+
+# 固定数据集参数：修改这些值会使历史结果不可比，需同时更新基线
+DATASET_SEED = 20240101
+DATASET_SYMBOLS = ["600000.SH", "000001.SZ", "300001.SZ", "688001.SH", "002001.SZ",
+                   "601000.SH", "600001.SH", "000002.SZ", "300002.SZ", "688002.SH"]
+DATASET_START = "20240102"
+DATASET_END = "20240108"
+FANOUT_CLIENTS = 500
+
+SyncOrAsync = Union[Any, Awaitable[Any]]
+
+
+@dataclass
+class BenchmarkCase:
+    """基准测试用例"""
+    name: str
+    group: str
+    setup: Callable[[], SyncOrAsync]
+    run: Callable[[Any], SyncOrAsync]  # 返回本次迭代处理的操作数
+    teardown: Optional[Callable[[Any], SyncOrAsync]] = None
+    iterations: int = 30
+    warmup: int = 3
+    alloc_iterations: int = 3
+    description: str = ""
+    metrics: Optional[Callable[[Any], SyncOrAsync]] = None  # 返回附加指标（如压缩率），不参与回归判断
+
+
+@dataclass
+class BenchmarkMeasurement:
+    """单个用例的测量结果"""
+    name: str
+    group: str
+    iterations: int
+    ops_per_iteration: float
+    p50_ms: float
+    p99_ms: float
+    mean_ms: float
+    min_ms: float
+    max_ms: float
+    throughput_ops: float
+    alloc_peak_kb: float
+    alloc_blocks: int
+    metrics: Dict[str, float] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return asdict(self)
+
+
+@dataclass
+class BenchmarkRun:
+    """一次完整的基准测试运行"""
+    run_id: str
+    timestamp: str
+    git_commit: Optional[str]
+    python_version: str
+    platform: str
+    results: Dict[str, BenchmarkMeasurement] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'run_id': self.run_id,
+            'timestamp': self.timestamp,
+            'git_commit': self.git_commit,
+            'python_version': self.python_version,
+            'platform': self.platform,
+            'results': {name: m.to_dict() for name, m in self.results.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "BenchmarkRun":
+        """从字典恢复"""
+        return cls(
+            run_id=data['run_id'],
+            timestamp=data['timestamp'],
+            git_commit=data.get('git_commit'),
+            python_version=data.get('python_version', ''),
+            platform=data.get('platform', ''),
+            results={name: BenchmarkMeasurement(**m) for name, m in data.get('results', {}).items()},
+        )
+
+
+@dataclass
+class RegressionPolicy:
+    """回归判定策略（阈值为相对变化比例）"""
+    threshold: float = 0.10
+    p99_threshold: float = 0.25
+    alloc_threshold: float = 0.20
+    min_delta_ms: float = 0.05  # 绝对变化低于该值时忽略，避免微秒级用例的抖动误报
+
+
+@dataclass
+class Regression:
+    """回归项"""
+    case: str
+    metric: str
+    baseline: float
+    current: float
+    change: float
+
+    def describe(self) -> str:
+        return (f"{self.case}.{self.metric}: {self.baseline:.4f} -> {self.current:.4f} "
+                f"({self.change:+.1%})")
+
+
+class BenchmarkHistory:
+    """基准测试历史记录（JSON文件）"""
+
+    def __init__(self, path: Union[str, Path] = DEFAULT_HISTORY_FILE, max_runs: int = 200):
+        self.path = Path(path)
+        self.max_runs = max_runs
+        self.baseline: Optional[BenchmarkRun] = None
+        self.runs: List[BenchmarkRun] = []
+        self._load()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取基准历史失败，将重新创建: {e}")
+            return
+        if data.get('baseline'):
+            self.baseline = BenchmarkRun.from_dict(data['baseline'])
+        self.runs = [BenchmarkRun.from_dict(r) for r in data.get('runs', [])]
+
+    def append(self, run: BenchmarkRun):
+        """追加一次运行，超出上限时丢弃最旧的记录"""
+        self.runs.append(run)
+        if len(self.runs) > self.max_runs:
+            self.runs = self.runs[-self.max_runs:]
+
+    def set_baseline(self, run: BenchmarkRun):
+        """将指定运行设为基线"""
+        self.baseline = run
+
+    def save(self):
+        """写回历史文件（先写临时文件再替换，避免中断时损坏）"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        payload = {
+            'version': 1,
+            'baseline': self.baseline.to_dict() if self.baseline else None,
+            'runs': [r.to_dict() for r in self.runs],
+        }
+        tmp_path = self.path.with_suffix(self.path.suffix + '.tmp')
+        tmp_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp_path, self.path)
+
+
+def compare_runs(baseline: BenchmarkRun, current: BenchmarkRun,
+                 policy: Optional[RegressionPolicy] = None) -> List[Regression]:
+    """
+    对比当前运行与基线
+
+    p50/p99延迟和内存分配峰值升高视为回退（吞吐量由p50推导，不重复判定）；
+    仅比较两次运行都包含的用例。
+    """
+    policy = policy or RegressionPolicy()
+    regressions = []
+
+    def relative(base: float, cur: float) -> float:
+        return (cur - base) / base if base > 0 else 0.0
+
+    for name, cur in current.results.items():
+        base = baseline.results.get(name)
+        if base is None:
+            continue
+
+        for metric, threshold in (('p50_ms', policy.threshold), ('p99_ms', policy.p99_threshold)):
+            b, c = getattr(base, metric), getattr(cur, metric)
+            change = relative(b, c)
+            if change > threshold and c - b > policy.min_delta_ms:
+                regressions.append(Regression(name, metric, b, c, change))
+
+        change = relative(base.alloc_peak_kb, cur.alloc_peak_kb)
+        if change > policy.alloc_threshold and cur.alloc_peak_kb - base.alloc_peak_kb > 16:
+            regressions.append(Regression(name, 'alloc_peak_kb', base.alloc_peak_kb,
+                                          cur.alloc_peak_kb, change))
+
+    return regressions
+
+
+async def _maybe_await(value: SyncOrAsync) -> Any:
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """最近秩百分位（样本量小时比插值更保守）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+async def run_case(case: BenchmarkCase) -> BenchmarkMeasurement:
+    """执行单个用例：预热、计时、再单独做一轮内存分配统计"""
+    state = await _maybe_await(case.setup())
+    try:
+        for _ in range(case.warmup):
+            await _maybe_await(case.run(state))
+
+        durations = []
+        total_ops = 0.0
+        # 与timeit一致，计时期间关闭分代GC，避免偶发的全量回收把p99抬高成噪声
+        gc.collect()
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(case.iterations):
+                start = time.perf_counter_ns()
+                ops = await _maybe_await(case.run(state))
+                durations.append((time.perf_counter_ns() - start) / 1e6)
+                total_ops += ops or 1
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        # 内存分配单独测量：tracemalloc会显著拖慢执行，不能与计时混在一起
+        peak_kb = 0.0
+        blocks = 0
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        try:
+            for _ in range(case.alloc_iterations):
+                baseline_size, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                before = tracemalloc.take_snapshot()
+                await _maybe_await(case.run(state))
+                _, peak = tracemalloc.get_traced_memory()
+                after = tracemalloc.take_snapshot()
+                peak_kb = max(peak_kb, (peak - baseline_size) / 1024)
+                blocks = max(blocks, sum(s.count_diff for s in after.compare_to(before, 'filename')
+                                         if s.count_diff > 0))
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+
+        metrics = await _maybe_await(case.metrics(state)) if case.metrics is not None else {}
+    finally:
+        if case.teardown is not None:
+            await _maybe_await(case.teardown(state))
+
+    durations.sort()
+    p50_ms = statistics.median(durations)
+    ops_per_iteration = total_ops / case.iterations
+    return BenchmarkMeasurement(
+        name=case.name,
+        group=case.group,
+        iterations=case.iterations,
+        ops_per_iteration=ops_per_iteration,
+        p50_ms=p50_ms,
+        p99_ms=_percentile(durations, 99),
+        mean_ms=statistics.fmean(durations),
+        min_ms=durations[0],
+        max_ms=durations[-1],
+        # 吞吐量按中位耗时计算，比总耗时/总次数更不易受个别慢迭代影响
+        throughput_ops=ops_per_iteration / (p50_ms / 1000) if p50_ms > 0 else 0.0,
+        alloc_peak_kb=round(peak_kb, 2),
+        alloc_blocks=blocks,
+        metrics=metrics,
+    )
+
+
+# ---------------------------------------------------------------------------
+# 固定数据集
+# ---------------------------------------------------------------------------
+
+_dataset_simulator = None
+
+
+def _simulator():
+    """基准专用的模拟数据源：固定种子、零延迟、无故障注入"""
+    global _dataset_simulator
+    if _dataset_simulator is None:
+        from data_agent_service.xtdata_simulator import SimulatedXtData, SimulationConfig
+        _dataset_simulator = SimulatedXtData(SimulationConfig(
+            seed=DATASET_SEED, symbol_count=200, latency_median_ms=0.0,
+            stall_probability=0.0, error_rate=0.0
+        ))
+    return _dataset_simulator
+
+
+def _minute_frames(symbols: List[str]) -> Dict[str, Any]:
+    return _simulator().get_market_data_ex(
+        [], symbols, period='1m', start_time=DATASET_START, end_time=DATASET_END
+    )
+
+
+def _raw_records(symbol: str) -> List[Dict[str, Any]]:
+    """与EnhancedHistoricalDataAPI._fetch_raw_data输出结构一致的原始记录"""
+    from src.argus_mcp.api.enhanced_historical_api import EnhancedHistoricalDataAPI
+
+    frame = _minute_frames([symbol])[symbol]
+    records = []
+    for label, row in zip(frame.index, frame.itertuples(index=False)):
+        dt = EnhancedHistoricalDataAPI._parse_xt_timestamp(label).replace(tzinfo=timezone.utc)
+        records.append({
+            "datetime": dt, "timestamp": dt,
+            "open": float(row.open), "high": float(row.high), "low": float(row.low),
+            "close": float(row.close), "volume": int(row.volume), "amount": float(row.amount),
+            "code": symbol,
+        })
+    return records
+
+
+# ---------------------------------------------------------------------------
+# 用例定义
+# ---------------------------------------------------------------------------
+
+def _normalize_case() -> BenchmarkCase:
+    from src.argus_mcp.processors.data_normalizer import DataNormalizer
+
+    def setup():
+        return DataNormalizer(), _raw_records(DATASET_SYMBOLS[0])
+
+    def run(state):
+        normalizer, records = state
+        return len(normalizer.normalize_kline_data(records, symbol=DATASET_SYMBOLS[0], period='1m'))
+
+    return BenchmarkCase('normalize.kline_1m', 'normalize', setup, run, iterations=20,
+                         description='单只股票5个交易日1分钟K线标准化')
+
+
+def _resample_cases() -> List[BenchmarkCase]:
+    from src.argus_mcp.processors.session_resampler import SessionResampler
+    from src.argus_mcp.processors.multi_period_processor import MultiPeriodProcessor, PeriodType
+    from src.argus_mcp.processors.data_normalizer import DataNormalizer
+
+    def session_setup():
+        frames = _minute_frames(DATASET_SYMBOLS)
+        arrays = {name: [] for name in ('timestamps', 'open', 'high', 'low', 'close',
+                                        'volume', 'amount', 'keys')}
+        for key, symbol in enumerate(DATASET_SYMBOLS):
+            frame = frames[symbol]
+            arrays['timestamps'].append(
+                np.array(frame.index.map(lambda s: f"{s[:4]}-{s[4:6]}-{s[6:8]}T{s[8:10]}:{s[10:12]}"),
+                         dtype='datetime64[ns]')
+            )
+            for column in ('open', 'high', 'low', 'close', 'volume', 'amount'):
+                arrays[column].append(frame[column].to_numpy(dtype=np.float64))
+            arrays['keys'].append(np.full(len(frame), key))
+        return SessionResampler(), {k: np.concatenate(v) for k, v in arrays.items()}
+
+    def session_run(period):
+        def run(state):
+            resampler, a = state
+            resampler.resample(a['timestamps'], a['open'], a['high'], a['low'], a['close'],
+                               a['volume'], a['amount'], period, keys=a['keys'])
+            return len(a['timestamps'])
+        return run
+
+    def processor_setup():
+        symbol = DATASET_SYMBOLS[0]
+        bars = DataNormalizer().normalize_kline_data(_raw_records(symbol), symbol=symbol, period='1m')
+        return MultiPeriodProcessor(), bars
+
+    def processor_run(state):
+        processor, bars = state
+        processor.resample_data(bars, PeriodType.MINUTE_5, DATASET_SYMBOLS[0])
+        return len(bars)
+
+    return [
+        BenchmarkCase('resample.session_1m_to_5m', 'resample', session_setup, session_run('5m'),
+                      description=f'{len(DATASET_SYMBOLS)}只股票1分钟→5分钟批量重采样'),
+        BenchmarkCase('resample.session_1m_to_1h', 'resample', session_setup, session_run('1h'),
+                      description=f'{len(DATASET_SYMBOLS)}只股票1分钟→1小时批量重采样'),
+        BenchmarkCase('resample.processor_1m_to_5m', 'resample', processor_setup, processor_run,
+                      description='MultiPeriodProcessor单只股票1分钟→5分钟'),
+    ]
+
+
+def _cache_cases() -> List[BenchmarkCase]:
+    from src.argus_mcp.cache.historical_data_cache import HistoricalDataCache
+    from src.argus_mcp.data_models.historical_data import SupportedPeriod
+    from src.argus_mcp.processors.data_normalizer import DataNormalizer
+
+    start = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    end = datetime(2024, 1, 8, tzinfo=timezone.utc)
+
+    def setup():
+        symbol = DATASET_SYMBOLS[0]
+        bars = DataNormalizer().normalize_kline_data(_raw_records(symbol), symbol=symbol, period='1m')
+        return HistoricalDataCache(max_memory_mb=256), bars
+
+    async def set_run(state):
+        cache, bars = state
+        for symbol in DATASET_SYMBOLS:
+            await cache.set_kline_data(symbol, SupportedPeriod.MINUTE_1, start, end, bars)
+        return len(DATASET_SYMBOLS)
+
+    async def get_setup():
+        state = setup()
+        await set_run(state)
+        return state
+
+    async def get_run(state):
+        cache, _ = state
+        for symbol in DATASET_SYMBOLS:
+            await cache.get_kline_data(symbol, SupportedPeriod.MINUTE_1, start, end)
+        return len(DATASET_SYMBOLS)
+
+    return [
+        BenchmarkCase('cache.set_kline', 'cache', setup, set_run, iterations=50,
+                      description='写入10个键，每个1200根1分钟K线'),
+        BenchmarkCase('cache.get_kline', 'cache', get_setup, get_run, iterations=50,
+                      description='读取10个已缓存的键'),
+    ]
+
+
+class _BenchmarkSocket:
+    """只计数不发送的WebSocket替身，用于测量扇出本身的开销"""
+
+    __slots__ = ('bytes_sent', 'messages_sent')
+
+    def __init__(self):
+        self.bytes_sent = 0
+        self.messages_sent = 0
+
+    async def send_text(self, text: str):
+        self.bytes_sent += len(text)
+        self.messages_sent += 1
+
+
+def _fanout_case() -> BenchmarkCase:
+    from src.argus_mcp.websocket_connection_manager import WebSocketConnectionManager
+    from src.argus_mcp.websocket_models import WebSocketConfig, WebSocketMessage, MessageType
+
+    async def setup():
+        manager = WebSocketConnectionManager(WebSocketConfig(max_connections=FANOUT_CLIENTS * 2))
+        for i in range(FANOUT_CLIENTS):
+            await manager.register_connection(f"bench-{i}", _BenchmarkSocket(), {})
+        tick = _simulator().get_full_tick([DATASET_SYMBOLS[0]])[DATASET_SYMBOLS[0]]
+        message = WebSocketMessage(type=MessageType.MARKET_DATA,
+                                   data={'symbol': DATASET_SYMBOLS[0], 'quote': tick})
+        return manager, message
+
+    async def run(state):
+        manager, message = state
+        result = await manager.broadcast_message(message)
+        return result['success_count']
+
+    return BenchmarkCase('websocket.fanout_quote', 'websocket', setup, run, iterations=30,
+                         description=f'单条行情广播到{FANOUT_CLIENTS}个连接')
+
+
+def _codec_cases() -> List[BenchmarkCase]:
+    from src.argus_mcp.websocket_codec import WireEncoding, encode_message, MSGPACK_AVAILABLE
+    from src.argus_mcp.websocket_models import WebSocketMessage, MessageType
+
+    def setup():
+        ticks = _simulator().get_full_tick(DATASET_SYMBOLS)
+        return [
+            WebSocketMessage(type=MessageType.MARKET_DATA, data={
+                'symbol': symbol, 'data_type': 'depth', 'data': tick,
+                'timestamp': datetime(2024, 1, 2, 10, 0).isoformat()
+            })
+            for symbol, tick in ticks.items()
+        ]
+
+    def run(encoding):
+        def _run(messages):
+            for message in messages:
+                encode_message(message, encoding)
+            return len(messages)
+        return _run
+
+    encodings = [WireEncoding.JSON, WireEncoding.COMPACT]
+    if MSGPACK_AVAILABLE:
+        encodings.append(WireEncoding.MSGPACK)
+    return [
+        BenchmarkCase(f'codec.depth_{encoding.value}', 'codec', setup, run(encoding), iterations=50,
+                      description=f'{len(DATASET_SYMBOLS)}条深度行情按{encoding.value}编码')
+        for encoding in encodings
+    ]
+
+
+COMPRESSION_ROUNDS = 20
+
+
+def _quote_stream(rounds: int, first_round: int = 0) -> List[str]:
+    """
+    固定的行情推送序列（JSON帧），结构与DataPublisher推送的quote一致
+
+    每轮所有股票各推送一次，价格/成交量随机游走；first_round 不同的序列互不重叠，
+    用于区分字典训练集和评测集。
+    """
+    from src.argus_mcp.websocket_codec import WireEncoding, encode_message
+    from src.argus_mcp.websocket_models import WebSocketMessage, MessageType
+
+    rng = np.random.default_rng(DATASET_SEED + first_round)
+    base = datetime(2024, 1, 2, 9, 30)
+    prices = {symbol: round(float(rng.uniform(5, 80)), 2) for symbol in DATASET_SYMBOLS}
+    volumes = {symbol: int(rng.integers(10_000, 500_000)) for symbol in DATASET_SYMBOLS}
+    frames = []
+    for r in range(first_round, first_round + rounds):
+        timestamp = base.timestamp() + r * 3
+        for seq, symbol in enumerate(DATASET_SYMBOLS):
+            price = prices[symbol] = round(max(0.01, prices[symbol] + float(rng.normal(0, 0.02))), 2)
+            volumes[symbol] += int(rng.integers(0, 2_000))
+            quote = {
+                'symbol': symbol, 'time': int(timestamp * 1000), 'lastPrice': price,
+                'open': round(price * 0.99, 2), 'high': round(price * 1.02, 2),
+                'low': round(price * 0.97, 2), 'lastClose': round(price * 0.995, 2),
+                'volume': volumes[symbol], 'amount': round(volumes[symbol] * price * 100, 2),
+                'askPrice': [round(price + 0.01 * i, 2) for i in range(1, 6)],
+                'bidPrice': [round(price - 0.01 * i, 2) for i in range(5)],
+                'askVol': [int(v) for v in rng.integers(1, 800, 5)],
+                'bidVol': [int(v) for v in rng.integers(1, 800, 5)],
+            }
+            message = WebSocketMessage(type=MessageType.MARKET_DATA, data={
+                'symbol': symbol, 'data_type': 'quote', 'data': quote,
+                'timestamp': datetime.fromtimestamp(timestamp).isoformat(), 'seq': r + 1
+            })
+            frames.append(encode_message(message, WireEncoding.JSON).payload)
+    return frames
+
+
+def _compression_metrics(compress: Callable[[Any, bytes], bytes]) -> Callable[[Any], Dict[str, float]]:
+    """对评测集完整压缩一遍，统计压缩率（压缩后/原始字节）"""
+    def _metrics(state):
+        raw = compressed = 0
+        for payload in state['payloads']:
+            raw += len(payload)
+            compressed += len(compress(state, payload))
+        return {'ratio': compressed / raw, 'bytes_per_message': compressed / len(state['payloads'])}
+    return _metrics
+
+
+def _compression_cases() -> List[BenchmarkCase]:
+    from websockets.extensions.permessage_deflate import PerMessageDeflate
+    from websockets.frames import Frame, Opcode
+    from src.argus_mcp.message_router import MessageRouter
+    from src.argus_mcp.websocket_compression import (
+        ZSTD_AVAILABLE, ZstdDictionary, deflate_compress_settings, train_zstd_dictionary
+    )
+    from src.argus_mcp.websocket_models import WebSocketConfig
+
+    config = WebSocketConfig()
+    description = f'{len(DATASET_SYMBOLS)}只股票×{COMPRESSION_ROUNDS}轮quote推送'
+
+    def payloads():
+        return [text.encode('utf-8') for text in _quote_stream(COMPRESSION_ROUNDS)]
+
+    # 现有路径：逐条gzip + 按消息缓存（实时行情每条都不同，缓存不会命中，每轮清空以反映真实情况）
+    def gzip_setup():
+        return {'router': MessageRouter(WebSocketConfig(transport_compression='none')),
+                'texts': _quote_stream(COMPRESSION_ROUNDS), 'payloads': payloads()}
+
+    async def gzip_run(state):
+        router = state['router']
+        router.compression_cache.clear()
+        for text in state['texts']:
+            await router.compress_message(text)
+        return len(state['texts'])
+
+    def gzip_compress(state, payload):
+        import gzip
+        return gzip.compress(payload)
+
+    # permessage-deflate：单个连接上的连续帧共享压缩上下文（与websockets库发送路径相同）
+    def deflate_extension():
+        return PerMessageDeflate(False, False, config.deflate_window_bits, config.deflate_window_bits,
+                                 deflate_compress_settings(config))
+
+    def deflate_setup():
+        return {'extension': deflate_extension(), 'payloads': payloads()}
+
+    def deflate_run(state):
+        extension = state['extension']
+        for payload in state['payloads']:
+            extension.encode(Frame(Opcode.TEXT, payload))
+        return len(state['payloads'])
+
+    def deflate_metrics(state):
+        state['extension'] = deflate_extension()
+        return _compression_metrics(
+            lambda s, payload: s['extension'].encode(Frame(Opcode.TEXT, payload)).data
+        )(state)
+
+    cases = [
+        BenchmarkCase('compression.gzip_per_message', 'compression', gzip_setup, gzip_run,
+                      iterations=30, description=f'{description}，逐条gzip（现有路径）',
+                      metrics=_compression_metrics(gzip_compress)),
+        BenchmarkCase('compression.permessage_deflate', 'compression', deflate_setup, deflate_run,
+                      iterations=30, description=f'{description}，permessage-deflate上下文复用',
+                      metrics=deflate_metrics),
+    ]
+
+    if ZSTD_AVAILABLE:
+        # 字典用不重叠的另一段推送训练，模拟离线录制
+        def zstd_setup():
+            samples = [text.encode('utf-8') for text in
+                       _quote_stream(COMPRESSION_ROUNDS * 5, first_round=10_000)]
+            dictionary = ZstdDictionary(train_zstd_dictionary(samples), config.zstd_level)
+            return {'dictionary': dictionary, 'payloads': payloads()}
+
+        def zstd_run(state):
+            dictionary = state['dictionary']
+            for payload in state['payloads']:
+                dictionary.compress(payload)
+            return len(state['payloads'])
+
+        cases.append(BenchmarkCase(
+            'compression.zstd_dictionary', 'compression', zstd_setup, zstd_run, iterations=30,
+            description=f'{description}，zstd字典逐帧压缩',
+            metrics=_compression_metrics(lambda s, payload: s['dictionary'].compress(payload))
+        ))
+    else:
+        logger.warning("未安装zstandard，跳过zstd字典压缩基准")
+    return cases
+
+
+MESSAGE_ROUNDS = 50
+
+
+def _message_cases() -> List[BenchmarkCase]:
+    """行情推送消息构造：pydantic 完整校验 vs 免校验快速构造（周期时间戳 + 计数ID）"""
+    from src.argus_mcp.websocket_codec import WireEncoding, encode_message
+    from src.argus_mcp.websocket_models import WebSocketMessage, MessageType
+
+    def setup():
+        ticks = _simulator().get_full_tick(DATASET_SYMBOLS)
+        quotes = [
+            {'symbol': symbol, 'time': tick['time'], 'lastPrice': tick['lastPrice'],
+             'volume': tick['volume'], 'amount': tick['amount']}
+            for symbol, tick in ticks.items()
+        ]
+        return [quotes] * MESSAGE_ROUNDS
+
+    def build_validated(quote):
+        # 原推送路径：每条消息 uuid4 + datetime.now() + 校验
+        return WebSocketMessage(type=MessageType.MARKET_DATA, data={
+            'symbol': quote['symbol'], 'data_type': 'quote', 'data': quote,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    def run(trusted: bool, encode: bool):
+        def _run(rounds):
+            count = 0
+            for quotes in rounds:
+                if trusted:
+                    now = datetime.now()
+                    iso = now.isoformat()
+                for quote in quotes:
+                    if trusted:
+                        message = WebSocketMessage.trusted(MessageType.MARKET_DATA, {
+                            'symbol': quote['symbol'], 'data_type': 'quote', 'data': quote,
+                            'timestamp': iso
+                        }, now)
+                    else:
+                        message = build_validated(quote)
+                    if encode:
+                        encode_message(message, WireEncoding.JSON)
+                    count += 1
+            return count
+        return _run
+
+    total = MESSAGE_ROUNDS * len(DATASET_SYMBOLS)
+    return [
+        BenchmarkCase('message.construct_validated', 'message', setup, run(False, False), iterations=50,
+                      description=f'{total}条quote消息，pydantic校验构造'),
+        BenchmarkCase('message.construct_trusted', 'message', setup, run(True, False), iterations=50,
+                      description=f'{total}条quote消息，免校验快速构造'),
+        BenchmarkCase('message.quote_push_validated', 'message', setup, run(False, True), iterations=50,
+                      description=f'{total}条quote消息，校验构造 + JSON编码'),
+        BenchmarkCase('message.quote_push_trusted', 'message', setup, run(True, True), iterations=50,
+                      description=f'{total}条quote消息，快速构造 + JSON编码'),
+    ]
+
+
+REDIS_BATCH_KEYS = 200
+REDIS_RTT = 0.0002  # 模拟的本机 Redis 往返延迟（秒）
+
+
+def _redis_cases() -> List[BenchmarkCase]:
+    from src.argus_mcp.testing.inprocess_redis import InProcessRedis
+    from src.argus_mcp.redis_cache_tier import AsyncRedisTier
+
+    keys = [f"latest_market_data:{i:06d}.SH" for i in range(REDIS_BATCH_KEYS)]
+
+    def setup():
+        redis = InProcessRedis(REDIS_RTT)
+        for key in keys:
+            redis._cmd_set(key, json.dumps({'symbol': key, 'close': 10.0}), ex=3600)
+        return {'redis': redis, 'tier': AsyncRedisTier(redis)}
+
+    async def threaded_run(state):
+        # 原实现：同步客户端 + asyncio.to_thread，每个键一次往返、一次线程切换
+        redis = state['redis']
+
+        def sync_get(key):
+            redis.round_trips += 1
+            time.sleep(redis.rtt)
+            return redis._execute('get', key)
+
+        values = await asyncio.gather(*(asyncio.to_thread(sync_get, key) for key in keys))
+        return len(values)
+
+    async def pipelined_run(state):
+        return len(await state['tier'].mget(keys))
+
+    def round_trips(run):
+        async def _metrics(state):
+            redis = state['redis']
+            before = redis.round_trips
+            await run(state)
+            return {'round_trips': redis.round_trips - before}
+        return _metrics
+
+    description = f'{REDIS_BATCH_KEYS}个键批量读取（模拟往返{REDIS_RTT * 1000:.1f}ms）'
+    return [
+        BenchmarkCase('redis.batch_get_threaded', 'redis', setup, threaded_run, iterations=20,
+                      description=f'{description}，逐键to_thread', metrics=round_trips(threaded_run)),
+        BenchmarkCase('redis.batch_get_pipelined', 'redis', setup, pipelined_run, iterations=20,
+                      description=f'{description}，异步流水线MGET', metrics=round_trips(pipelined_run)),
+    ]
+
+
+def _db_ingest_case() -> BenchmarkCase:
+    from sqlalchemy import create_engine
+    from data_agent_service.database_models import KlineData, validate_data_integrity
+    from data_agent_service.data_storage_service import DataStorageService
+
+    def setup():
+        # 生产库为PostgreSQL；基准使用内存SQLite，衡量的是校验、预处理和ORM批量写入路径本身
+        engine = create_engine("sqlite://")
+        KlineData.__table__.create(engine)
+        frame = _minute_frames([DATASET_SYMBOLS[0]])[DATASET_SYMBOLS[0]]
+        rows = []
+        for label, row in zip(frame.index, frame.itertuples(index=False)):
+            rows.append({
+                'symbol': DATASET_SYMBOLS[0],
+                'trade_date': f"{label[:4]}-{label[4:6]}-{label[6:8]}",
+                'period': '1m',
+                'timestamp': f"{label[:4]}-{label[4:6]}-{label[6:8]}T{label[8:10]}:{label[10:12]}:00",
+                'open_price': float(row.open), 'high_price': float(row.high),
+                'low_price': float(row.low), 'close_price': float(row.close),
+                'volume': float(row.volume), 'amount': float(row.amount),
+                'data_source': 'benchmark',
+            })
+        return engine, rows
+
+    def run(state):
+        engine, rows = state
+        processed = []
+        for item in rows:
+            if not validate_data_integrity(item, 'kline_data')['is_valid']:
+                continue
+            processed.append(DataStorageService._preprocess_data(None, item, KlineData))
+        with engine.connect() as conn:
+            trans = conn.begin()
+            conn.execute(KlineData.__table__.insert(), processed)
+            trans.rollback()
+        return len(processed)
+
+    def teardown(state):
+        state[0].dispose()
+
+    return BenchmarkCase('db.ingest_kline_1m', 'db', setup, run, teardown=teardown, iterations=15,
+                         description='1200根1分钟K线校验、预处理并批量写入')
+
+
+def _http_cases() -> List[BenchmarkCase]:
+    import httpx
+    from data_agent_service.xtdata_simulator import SimulationConfig, install_simulated_xtquant
+    from src.argus_mcp.api.enhanced_historical_api import (
+        EnhancedHistoricalDataAPI, create_enhanced_api_router
+    )
+
+    params = {'symbol': DATASET_SYMBOLS[0], 'start_date': '2024-01-02',
+              'end_date': '2024-01-08', 'period': '1d'}
+
+    async def setup():
+        install_simulated_xtquant(SimulationConfig(seed=DATASET_SEED, symbol_count=200,
+                                                   latency_median_ms=0.0))
+        app = create_enhanced_api_router(EnhancedHistoricalDataAPI())
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app),
+                                   base_url="http://benchmark")
+        return client
+
+    def run(use_cache: bool):
+        async def _run(client):
+            response = await client.get('/historical-data',
+                                        params={**params, 'use_cache': str(use_cache).lower()})
+            if response.status_code != 200 or not response.json().get('success'):
+                raise RuntimeError(f"HTTP基准请求失败: {response.status_code} {response.text[:200]}")
+            return 1
+        return _run
+
+    async def teardown(client):
+        await client.aclose()
+
+    return [
+        BenchmarkCase('http.historical_data_uncached', 'http', setup, run(False), teardown=teardown,
+                      iterations=30, description='/historical-data 不走缓存'),
+        BenchmarkCase('http.historical_data_cached', 'http', setup, run(True), teardown=teardown,
+                      iterations=50, description='/historical-data 缓存命中'),
+    ]
+
+
+CASE_FACTORIES: Dict[str, Callable[[], Union[BenchmarkCase, List[BenchmarkCase]]]] = {
+    'normalize': _normalize_case,
+    'resample': _resample_cases,
+    'cache': _cache_cases,
+    'websocket': _fanout_case,
+    'codec': _codec_cases,
+    'compression': _compression_cases,
+    'message': _message_cases,
+    'redis': _redis_cases,
+    'db': _db_ingest_case,
+    'http': _http_cases,
+}
+
+
+def build_cases(groups: Optional[List[str]] = None) -> List[BenchmarkCase]:
+    """按分组构建用例；依赖缺失的分组会被跳过并记录警告"""
+    cases = []
+    for group in groups or list(CASE_FACTORIES):
+        factory = CASE_FACTORIES.get(group)
+        if factory is None:
+            raise ValueError(f"未知的基准分组: {group}，可选: {', '.join(CASE_FACTORIES)}")
+        try:
+            built = factory()
+        except ImportError as e:
+            logger.warning(f"跳过基准分组 {group}: 依赖缺失 ({e})")
+            continue
+        cases.extend(built if isinstance(built, list) else [built])
+    return cases
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+async def run_benchmarks(cases: List[BenchmarkCase], scale: float = 1.0) -> BenchmarkRun:
+    """依次执行全部用例（串行，避免相互干扰）"""
+    run = BenchmarkRun(
+        run_id=str(uuid.uuid4()),
+        timestamp=datetime.now(timezone.utc).isoformat(),
+        git_commit=_git_commit(),
+        python_version=platform.python_version(),
+        platform=platform.platform(),
+    )
+    for case in cases:
+        if scale != 1.0:
+            case.iterations = max(3, int(case.iterations * scale))
+        logger.info(f"运行基准: {case.name} ({case.iterations}次, 预热{case.warmup}次)")
+        run.results[case.name] = await run_case(case)
+    return run
+
+
+def format_report(run: BenchmarkRun, baseline: Optional[BenchmarkRun] = None) -> str:
+    """生成文本报告"""
+    header = f"{'case':<36}{'p50 ms':>10}{'p99 ms':>10}{'ops/s':>14}{'alloc KB':>11}{'vs base':>10}"
+    lines = [header, '-' * len(header)]
+    for name, m in run.results.items():
+        delta = ''
+        if baseline and name in baseline.results and baseline.results[name].p50_ms > 0:
+            delta = f"{(m.p50_ms / baseline.results[name].p50_ms - 1):+.1%}"
+        lines.append(f"{name:<36}{m.p50_ms:>10.3f}{m.p99_ms:>10.3f}{m.throughput_ops:>14,.0f}"
+                     f"{m.alloc_peak_kb:>11.1f}{delta:>10}")
+    for name, m in run.results.items():
+        if m.metrics:
+            lines.append(f"  {name}: " + ', '.join(f"{k}={v:.4g}" for k, v in m.metrics.items()))
+    return '\n'.join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口：运行基准、写入历史并与基线对比"""
+    parser = argparse.ArgumentParser(description="Argus 热点路径性能基准测试")
+    parser.add_argument('--cases', help=f"逗号分隔的分组，可选: {', '.join(CASE_FACTORIES)}")
+    parser.add_argument('--history', default=os.getenv('BENCHMARK_HISTORY_FILE', str(DEFAULT_HISTORY_FILE)),
+                        help="JSON历史文件路径")
+    parser.add_argument('--baseline', help="使用另一个历史文件中的基线进行对比")
+    parser.add_argument('--update-baseline', action='store_true', help="将本次运行设为新基线")
+    parser.add_argument('--threshold', type=float, default=0.10, help="p50回归阈值（比例）")
+    parser.add_argument('--p99-threshold', type=float, default=0.25, help="p99回归阈值（比例）")
+    parser.add_argument('--alloc-threshold', type=float, default=0.20, help="内存分配回归阈值（比例）")
+    parser.add_argument('--scale', type=float, default=1.0, help="迭代次数缩放系数")
+    parser.add_argument('--no-save', action='store_true', help="不写入历史文件")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    # 被测模块的INFO日志会淹没报告并影响计时
+    logging.getLogger('src').setLevel(logging.WARNING)
+    logging.getLogger('data_agent_service').setLevel(logging.WARNING)
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    groups = [g.strip() for g in args.cases.split(',')] if args.cases else None
+    cases = build_cases(groups)
+    run = asyncio.run(run_benchmarks(cases, scale=args.scale))
+
+    history = BenchmarkHistory(args.history)
+    baseline = BenchmarkHistory(args.baseline).baseline if args.baseline else history.baseline
+
+    print(format_report(run, baseline))
+
+    regressions: List[Regression] = []
+    if baseline is None:
+        print("\n未找到基线，本次运行将作为基线")
+        history.set_baseline(run)
+    else:
+        policy = RegressionPolicy(threshold=args.threshold, p99_threshold=args.p99_threshold,
+                                  alloc_threshold=args.alloc_threshold)
+        regressions = compare_runs(baseline, run, policy)
+        if regressions:
+            print(f"\n检测到 {len(regressions)} 项性能回退 (基线 {baseline.git_commit or baseline.run_id}):")
+            for r in regressions:
+                print(f"  {r.describe()}")
+        else:
+            print(f"\n未检测到性能回退 (基线 {baseline.git_commit or baseline.run_id})")
+        if args.update_baseline:
+            history.set_baseline(run)
+
+    if not args.no_save:
+        history.append(run)
+        history.save()
+        print(f"结果已写入 {history.path}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
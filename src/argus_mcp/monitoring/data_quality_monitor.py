@@ -461,7 +461,7 @@ class DataQualityMonitor:
             '5m': '5min',
             '15m': '15min',
             '30m': '30min',
-            '1h': '1H',
+            '1h': '1h',
             '1d': '1D',
             '1w': '1W',
             '1M': '1M'
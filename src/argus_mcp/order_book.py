@@ -0,0 +1,235 @@
+"""
+WebSocket 实时数据系统 - 深度行情订单簿
+服务端为每只股票维护一份规范订单簿，每次深度更新只计算一次逐档增量，
+所有深度订阅者共用同一条快照/增量消息。
+
+消息格式（data 字段）:
+    depth_snapshot: {"symbol", "seq", "bids": [[价格, 数量], ...], "asks": [...], "checksum", "timestamp"}
+    depth_update:   {"symbol", "seq", "prev_seq", "events": [[side, op, 价格, 数量], ...], "checksum", "timestamp"}
+
+side: "b" 买盘 / "a" 卖盘；op: "i" 新增档位 / "u" 修改数量 / "d" 删除档位。
+checksum 为更新后前 CHECKSUM_LEVELS 档的 CRC32，客户端校验失败或 seq 不连续时
+发送 depth_resync 请求重新下发快照。
+"""
+
+import logging
+import zlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+CHECKSUM_LEVELS = 10
+
+SIDE_BID = "b"
+SIDE_ASK = "a"
+OP_INSERT = "i"
+OP_UPDATE = "u"
+OP_DELETE = "d"
+
+
+def _normalize_levels(levels: Optional[Iterable[Sequence[Any]]]) -> Dict[float, float]:
+    """[[价格, 数量], ...] 转为 {价格: 数量}，忽略价格或数量为0的档位"""
+    book: Dict[float, float] = {}
+    for level in levels or ():
+        price, volume = float(level[0]), float(level[1])
+        if price > 0 and volume > 0:
+            book[price] = volume
+    return book
+
+
+def _sorted_levels(book: Dict[float, float], descending: bool) -> List[List[float]]:
+    return [[p, book[p]] for p in sorted(book, reverse=descending)]
+
+
+def book_checksum(bids: Sequence[Sequence[float]], asks: Sequence[Sequence[float]]) -> int:
+    """
+    订单簿校验和：买盘（价格降序）和卖盘（价格升序）前 CHECKSUM_LEVELS 档的 CRC32
+
+    服务端与客户端必须使用同一实现。
+    """
+    parts = [f"{float(p):.4f}:{float(v):.2f}" for p, v in bids[:CHECKSUM_LEVELS]]
+    parts.append("|")
+    parts.extend(f"{float(p):.4f}:{float(v):.2f}" for p, v in asks[:CHECKSUM_LEVELS])
+    return zlib.crc32(",".join(parts).encode("ascii"))
+
+
+def _diff_side(side: str, old: Dict[float, float], new: Dict[float, float]) -> List[list]:
+    events = []
+    for price, volume in new.items():
+        previous = old.get(price)
+        if previous is None:
+            events.append([side, OP_INSERT, price, volume])
+        elif previous != volume:
+            events.append([side, OP_UPDATE, price, volume])
+    for price in old:
+        if price not in new:
+            events.append([side, OP_DELETE, price, 0])
+    return events
+
+
+@dataclass
+class DepthUpdate:
+    """一次深度变化（逐档增量）"""
+    symbol: str
+    seq: int
+    prev_seq: int
+    events: List[list]
+    checksum: int
+    timestamp: Any = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "seq": self.seq,
+            "prev_seq": self.prev_seq,
+            "events": self.events,
+            "checksum": self.checksum,
+            "timestamp": self.timestamp,
+        }
+
+
+@dataclass
+class OrderBook:
+    """单只股票的规范订单簿"""
+    symbol: str
+    bids: Dict[float, float] = field(default_factory=dict)
+    asks: Dict[float, float] = field(default_factory=dict)
+    seq: int = 0
+    timestamp: Any = None
+    checksum: int = 0
+
+    def replace(self, bids: Iterable[Sequence[Any]], asks: Iterable[Sequence[Any]],
+                timestamp: Any = None) -> Optional[DepthUpdate]:
+        """
+        用最新的完整档位替换订单簿
+
+        Returns:
+            DepthUpdate；档位没有变化时返回None
+        """
+        new_bids = _normalize_levels(bids)
+        new_asks = _normalize_levels(asks)
+        events = _diff_side(SIDE_BID, self.bids, new_bids) + _diff_side(SIDE_ASK, self.asks, new_asks)
+        self.timestamp = timestamp
+        if not events and self.seq:
+            return None
+
+        prev_seq = self.seq
+        self.bids, self.asks = new_bids, new_asks
+        self.seq += 1
+        self.checksum = book_checksum(_sorted_levels(new_bids, True), _sorted_levels(new_asks, False))
+        return DepthUpdate(self.symbol, self.seq, prev_seq, events, self.checksum, timestamp)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前订单簿快照"""
+        return {
+            "symbol": self.symbol,
+            "seq": self.seq,
+            "bids": _sorted_levels(self.bids, True),
+            "asks": _sorted_levels(self.asks, False),
+            "checksum": self.checksum,
+            "timestamp": self.timestamp,
+        }
+
+
+class OrderBookManager:
+    """规范订单簿集合（每只股票一份）"""
+
+    def __init__(self):
+        self.books: Dict[str, OrderBook] = {}
+        # 快照在下一次变化前复用
+        self._snapshots: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+    def update(self, symbol: str, bids: Iterable[Sequence[Any]], asks: Iterable[Sequence[Any]],
+               timestamp: Any = None, initial_seq: int = 0) -> Optional[DepthUpdate]:
+        """
+        应用最新深度，返回增量（无变化时为None）
+
+        Args:
+            initial_seq: 新建订单簿的起始序号，移除后重新订阅时沿用之前的序号
+        """
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol, seq=initial_seq)
+        return book.replace(bids, asks, timestamp)
+
+    def snapshot(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """获取快照，订单簿不存在时返回None"""
+        book = self.books.get(symbol)
+        if book is None or not book.seq:
+            return None
+        cached = self._snapshots.get(symbol)
+        if cached is None or cached[0] != book.seq:
+            cached = (book.seq, book.snapshot())
+            self._snapshots[symbol] = cached
+        return cached[1]
+
+    def discard(self, symbols: Iterable[str]):
+        """移除不再订阅的股票"""
+        for symbol in symbols:
+            self.books.pop(symbol, None)
+            self._snapshots.pop(symbol, None)
+
+
+class OrderBookReplica:
+    """客户端订单簿副本：应用快照与增量并校验"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self.seq: Optional[int] = None
+
+    @property
+    def synced(self) -> bool:
+        return self.seq is not None
+
+    def apply_snapshot(self, snapshot: Dict[str, Any]) -> bool:
+        """应用快照，返回校验是否通过"""
+        self.bids = _normalize_levels(snapshot.get("bids"))
+        self.asks = _normalize_levels(snapshot.get("asks"))
+        self.seq = snapshot.get("seq")
+        return self._verify(snapshot.get("checksum"))
+
+    def apply_update(self, update: Dict[str, Any]) -> bool:
+        """
+        应用增量
+
+        Returns:
+            False 表示序号不连续或校验失败，需要重新同步
+        """
+        if self.seq is None or update.get("prev_seq") != self.seq:
+            self.seq = None
+            return False
+
+        for side, op, price, volume in update.get("events") or ():
+            book = self.bids if side == SIDE_BID else self.asks
+            if op == OP_DELETE:
+                book.pop(float(price), None)
+            else:
+                book[float(price)] = float(volume)
+        self.seq = update.get("seq")
+        return self._verify(update.get("checksum"))
+
+    def levels(self) -> Dict[str, List[List[float]]]:
+        """排序后的档位"""
+        return {"bids": _sorted_levels(self.bids, True), "asks": _sorted_levels(self.asks, False)}
+
+    def _verify(self, checksum: Optional[int]) -> bool:
+        if checksum is None:
+            return True
+        levels = self.levels()
+        if book_checksum(levels["bids"], levels["asks"]) != checksum:
+            logger.warning(f"订单簿校验失败，需要重新同步: {self.symbol}")
+            self.seq = None
+            return False
+        return True
+
+
+__all__ = [
+    "DepthUpdate",
+    "OrderBook",
+    "OrderBookManager",
+    "OrderBookReplica",
+    "book_checksum",
+]
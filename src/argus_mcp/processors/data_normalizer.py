@@ -439,12 +439,23 @@ class DataNormalizer:
         df = df.copy()
         
         if not isinstance(df.index, pd.DatetimeIndex):
+            time_columns = ['time', 'timestamp', 'date', 'datetime']
+            if isinstance(df.index, pd.RangeIndex):
+                # Records built from a list of dicts carry time in a column; converting
+                # the positional index would silently yield 1970-01-01 timestamps
+                for col in time_columns:
+                    if col in df.columns:
+                        try:
+                            df.index = pd.DatetimeIndex(pd.to_datetime(df[col]))
+                            df = df.drop(columns=[c for c in time_columns if c in df.columns])
+                            return df
+                        except Exception:
+                            continue
             try:
                 df.index = pd.to_datetime(df.index)
             except Exception as e:
                 self.logger.warning(f"无法转换索引为日期时间格式: {str(e)}")
                 # If index conversion fails, try to find a time column
-                time_columns = ['time', 'timestamp', 'date', 'datetime']
                 for col in time_columns:
                     if col in df.columns:
                         try:
@@ -18,6 +18,11 @@ from src.argus_mcp.data_models.historical_data import (
     SupportedPeriod,
     DataQualityMetrics
 )
+from src.argus_mcp.processors.session_resampler import (
+    ResampledBars,
+    SessionResampler,
+    TradingSessionCalendar
+)
 
 
 class PeriodType(Enum):
@@ -27,6 +32,7 @@ class PeriodType(Enum):
     MINUTE_15 = "15m"
     MINUTE_30 = "30m"
     HOUR_1 = "1h"
+    HOUR_2 = "2h"
     HOUR_4 = "4h"
     DAILY = "1d"
     WEEKLY = "1w"
@@ -36,9 +42,15 @@ class PeriodType(Enum):
 class MultiPeriodProcessor:
     """多周期数据处理器"""
     
-    def __init__(self):
-        """初始化多周期处理器"""
+    def __init__(self, calendar: Optional[TradingSessionCalendar] = None):
+        """
+        初始化多周期处理器
+        
+        Args:
+            calendar: 交易时段日历，默认使用A股交易时段
+        """
         self.logger = logging.getLogger(__name__)
+        self.resampler = SessionResampler(calendar)
         
     def resample_data(self, 
                      data: List[StandardKLineData], 
@@ -58,20 +70,53 @@ class MultiPeriodProcessor:
         if not data:
             return []
             
-        # 转换为DataFrame
-        df = self._convert_to_dataframe(data)
+        timestamps, columns, tzinfo = self._to_arrays(data)
+        bars = self.resampler.resample(timestamps, *columns, period=target_period.value)
         
-        # 设置时间索引
-        df.set_index('timestamp', inplace=True)
+        return self._convert_back_to_standard(bars, symbol, tzinfo)
+    
+    def resample_batch(self,
+                       data_by_symbol: Dict[str, List[StandardKLineData]],
+                       target_period: PeriodType) -> Dict[str, List[StandardKLineData]]:
+        """
+        在一次向量化计算中重采样多只股票的数据
         
-        # 获取重采样频率
-        freq = self._get_resample_freq(target_period)
+        Args:
+            data_by_symbol: 股票代码到K线数据列表的映射
+            target_period: 目标周期
+            
+        Returns:
+            股票代码到重采样后K线数据列表的映射
+        """
+        symbols = [symbol for symbol, data in data_by_symbol.items() if data]
+        if not symbols:
+            return {symbol: [] for symbol in data_by_symbol}
         
-        # 重采样数据
-        resampled = self._perform_resampling(df, freq)
+        timestamp_parts, column_parts, key_parts = [], [], []
+        tzinfo = None
+        for index, symbol in enumerate(symbols):
+            timestamps, columns, symbol_tz = self._to_arrays(data_by_symbol[symbol])
+            tzinfo = tzinfo or symbol_tz
+            timestamp_parts.append(timestamps)
+            column_parts.append(columns)
+            key_parts.append(np.full(len(timestamps), index, dtype=np.int64))
         
-        # 转换回StandardKLineData
-        return self._convert_back_to_standard(resampled, symbol, target_period)
+        columns = [np.concatenate(parts) for parts in zip(*column_parts)]
+        bars = self.resampler.resample(
+            np.concatenate(timestamp_parts), *columns,
+            period=target_period.value,
+            keys=np.concatenate(key_parts)
+        )
+        
+        # 结果按分组键有序，按边界切分回各只股票
+        result = {symbol: [] for symbol in data_by_symbol}
+        splits = np.searchsorted(bars.keys, np.arange(len(symbols) + 1))
+        for index, symbol in enumerate(symbols):
+            start, end = splits[index], splits[index + 1]
+            result[symbol] = self._convert_back_to_standard(
+                self._slice_bars(bars, start, end), symbol, tzinfo
+            )
+        return result
     
     def align_data(self, 
                   data: List[StandardKLineData],
@@ -191,6 +236,37 @@ class MultiPeriodProcessor:
                 
         return True
     
+    def _to_arrays(self, data: List[StandardKLineData]):
+        """将StandardKLineData列表转换为时间戳数组和OHLCV列数组"""
+        tzinfo = data[0].timestamp.tzinfo
+        count = len(data)
+        # 时段日历基于本地时钟，去掉时区后按原始时刻分桶
+        index = pd.DatetimeIndex([item.timestamp for item in data])
+        if index.tz is not None:
+            index = index.tz_localize(None)
+        timestamps = index.values.astype('datetime64[ns]')
+        columns = [
+            np.fromiter((float(item.open) for item in data), dtype=np.float64, count=count),
+            np.fromiter((float(item.high) for item in data), dtype=np.float64, count=count),
+            np.fromiter((float(item.low) for item in data), dtype=np.float64, count=count),
+            np.fromiter((float(item.close) for item in data), dtype=np.float64, count=count),
+            np.fromiter((item.volume for item in data), dtype=np.float64, count=count),
+            np.fromiter((float(item.amount) for item in data), dtype=np.float64, count=count),
+        ]
+        return timestamps, columns, tzinfo
+    
+    def _slice_bars(self, bars: ResampledBars, start: int, end: int) -> ResampledBars:
+        """截取重采样结果的一段"""
+        return ResampledBars(
+            timestamps=bars.timestamps[start:end],
+            open=bars.open[start:end],
+            high=bars.high[start:end],
+            low=bars.low[start:end],
+            close=bars.close[start:end],
+            volume=bars.volume[start:end],
+            amount=bars.amount[start:end]
+        )
+    
     def _convert_to_dataframe(self, data: List[StandardKLineData]) -> pd.DataFrame:
         """将StandardKLineData转换为DataFrame"""
         records = []
@@ -207,63 +283,37 @@ class MultiPeriodProcessor:
         
         return pd.DataFrame(records)
     
-    def _get_resample_freq(self, period: PeriodType) -> str:
-        """获取pandas重采样频率"""
-        freq_map = {
-            PeriodType.MINUTE_1: '1T',
-            PeriodType.MINUTE_5: '5T',
-            PeriodType.MINUTE_15: '15T',
-            PeriodType.MINUTE_30: '30T',
-            PeriodType.HOUR_1: '1H',
-            PeriodType.HOUR_4: '4H',
-            PeriodType.DAILY: '1D',
-            PeriodType.WEEKLY: '1W',
-            PeriodType.MONTHLY: '1M'
-        }
-        return freq_map[period]
-    
-    def _perform_resampling(self, df: pd.DataFrame, freq: str) -> pd.DataFrame:
-        """执行数据重采样"""
-        # 重采样规则
-        resample_rules = {
-            'open': 'first',
-            'high': 'max',
-            'low': 'min',
-            'close': 'last',
-            'volume': 'sum',
-            'amount': 'sum'
-        }
-        
-        # 执行重采样
-        resampled = df.resample(freq).agg(resample_rules)
-        
-        # 删除空值
-        resampled.dropna(inplace=True)
-        
-        return resampled
-    
     def _convert_back_to_standard(self, 
-                                df: pd.DataFrame,
+                                bars: ResampledBars,
                                 symbol: str,
-                                period: PeriodType) -> List[StandardKLineData]:
-        """将DataFrame转换回StandardKLineData"""
-        result = []
+                                tzinfo=None) -> List[StandardKLineData]:
+        """将重采样结果转换回StandardKLineData"""
+        if not len(bars):
+            return []
         
-        for timestamp, row in df.iterrows():
-            kline_data = StandardKLineData(
-                timestamp=timestamp.to_pydatetime().replace(tzinfo=None),
-                open=Decimal(str(row['open'])).quantize(Decimal('0.0001')),
-                high=Decimal(str(row['high'])).quantize(Decimal('0.0001')),
-                low=Decimal(str(row['low'])).quantize(Decimal('0.0001')),
-                close=Decimal(str(row['close'])).quantize(Decimal('0.0001')),
-                volume=int(row['volume']),
-                amount=Decimal(str(row['amount'])).quantize(Decimal('0.01')),
-                symbol=symbol,
-                period=SupportedPeriod(period.value)
-            )
-            result.append(kline_data)
+        # 批量格式化为定点字符串，构造的Decimal已满足模型精度，无需逐条校验
+        timestamps = bars.timestamps.astype('datetime64[us]').tolist()
+        opens = np.char.mod('%.4f', bars.open).tolist()
+        highs = np.char.mod('%.4f', bars.high).tolist()
+        lows = np.char.mod('%.4f', bars.low).tolist()
+        closes = np.char.mod('%.4f', bars.close).tolist()
+        amounts = np.char.mod('%.2f', bars.amount).tolist()
+        volumes = np.rint(bars.volume).astype(np.int64).tolist()
         
-        return result
+        return [
+            StandardKLineData.model_construct(
+                timestamp=timestamps[i].replace(tzinfo=tzinfo) if tzinfo else timestamps[i],
+                open=Decimal(opens[i]),
+                high=Decimal(highs[i]),
+                low=Decimal(lows[i]),
+                close=Decimal(closes[i]),
+                volume=volumes[i],
+                amount=Decimal(amounts[i]),
+                quality_score=1.0,
+                code=symbol
+            )
+            for i in range(len(timestamps))
+        ]
     
     def _get_alignment_function(self, period: PeriodType):
         """获取对齐函数"""
@@ -273,6 +323,7 @@ class MultiPeriodProcessor:
             PeriodType.MINUTE_15: self._align_minute_data,
             PeriodType.MINUTE_30: self._align_minute_data,
             PeriodType.HOUR_1: self._align_hour_data,
+            PeriodType.HOUR_2: self._align_hour_data,
             PeriodType.HOUR_4: self._align_hour_data,
             PeriodType.DAILY: self._align_daily_data,
             PeriodType.WEEKLY: self._align_weekly_data,
@@ -336,11 +387,12 @@ class MultiPeriodProcessor:
         """检查是否可以直接聚合"""
         # 定义聚合关系
         aggregation_map = {
-            PeriodType.MINUTE_1: [PeriodType.MINUTE_5, PeriodType.MINUTE_15, PeriodType.MINUTE_30, PeriodType.HOUR_1, PeriodType.DAILY],
-            PeriodType.MINUTE_5: [PeriodType.MINUTE_15, PeriodType.MINUTE_30, PeriodType.HOUR_1, PeriodType.DAILY],
-            PeriodType.MINUTE_15: [PeriodType.MINUTE_30, PeriodType.HOUR_1, PeriodType.DAILY],
-            PeriodType.MINUTE_30: [PeriodType.HOUR_1, PeriodType.DAILY],
-            PeriodType.HOUR_1: [PeriodType.HOUR_4, PeriodType.DAILY],
+            PeriodType.MINUTE_1: [PeriodType.MINUTE_5, PeriodType.MINUTE_15, PeriodType.MINUTE_30, PeriodType.HOUR_1, PeriodType.HOUR_2, PeriodType.HOUR_4, PeriodType.DAILY],
+            PeriodType.MINUTE_5: [PeriodType.MINUTE_15, PeriodType.MINUTE_30, PeriodType.HOUR_1, PeriodType.HOUR_2, PeriodType.HOUR_4, PeriodType.DAILY],
+            PeriodType.MINUTE_15: [PeriodType.MINUTE_30, PeriodType.HOUR_1, PeriodType.HOUR_2, PeriodType.HOUR_4, PeriodType.DAILY],
+            PeriodType.MINUTE_30: [PeriodType.HOUR_1, PeriodType.HOUR_2, PeriodType.HOUR_4, PeriodType.DAILY],
+            PeriodType.HOUR_1: [PeriodType.HOUR_2, PeriodType.HOUR_4, PeriodType.DAILY],
+            PeriodType.HOUR_2: [PeriodType.HOUR_4, PeriodType.DAILY],
             PeriodType.HOUR_4: [PeriodType.DAILY],
             PeriodType.DAILY: [PeriodType.WEEKLY, PeriodType.MONTHLY],
             PeriodType.WEEKLY: [PeriodType.MONTHLY]
@@ -397,6 +449,7 @@ class MultiPeriodProcessor:
             PeriodType.MINUTE_15: timedelta(minutes=15),
             PeriodType.MINUTE_30: timedelta(minutes=30),
             PeriodType.HOUR_1: timedelta(hours=1),
+            PeriodType.HOUR_2: timedelta(hours=2),
             PeriodType.HOUR_4: timedelta(hours=4),
             PeriodType.DAILY: timedelta(days=1),
             PeriodType.WEEKLY: timedelta(weeks=1),
@@ -427,6 +480,7 @@ class MultiPeriodProcessor:
             PeriodType.MINUTE_15: timedelta(minutes=15),
             PeriodType.MINUTE_30: timedelta(minutes=30),
             PeriodType.HOUR_1: timedelta(hours=1),
+            PeriodType.HOUR_2: timedelta(hours=2),
             PeriodType.HOUR_4: timedelta(hours=4),
             PeriodType.DAILY: timedelta(days=1),
             PeriodType.WEEKLY: timedelta(weeks=1),
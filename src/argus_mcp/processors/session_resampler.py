@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+交易时段感知的向量化重采样引擎
+
+基于预先计算的交易时段日历，将K线时间戳映射为时段内分钟序号，再用
+``np.maximum.reduceat`` 等归约按bar边界一次性完成OHLCV聚合。午休与隔夜
+不会产生空桶，多只股票可以在同一次调用中完成重采样。
+"""
+
+from dataclasses import dataclass
+from datetime import time
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+_MINUTES_PER_DAY = 24 * 60
+_NS_PER_MINUTE = 60 * 1_000_000_000
+
+# 日内周期对应的时段分钟数
+INTRADAY_PERIOD_MINUTES: Dict[str, int] = {
+    "1m": 1,
+    "5m": 5,
+    "15m": 15,
+    "30m": 30,
+    "1h": 60,
+    "2h": 120,
+    "4h": 240,
+}
+
+# 按自然日历分桶的周期
+CALENDAR_PERIODS = ("1d", "1w", "1M")
+
+
+class TradingSessionCalendar:
+    """
+    交易时段日历
+
+    K线时间戳按bar结束时间标注（如A股1分钟线 09:31 表示 09:30-09:31）。
+    日历预先生成一天内每分钟到时段分钟序号（1..N）的查找表，以及序号到
+    bar结束时间的反查表。开盘前的集合竞价并入第一根bar，午休期间的时间戳
+    并入上午最后一根bar，收盘后的时间戳并入最后一根bar。
+    """
+
+    def __init__(self, sessions: Sequence[Tuple[time, time]]):
+        if not sessions:
+            raise ValueError("交易时段不能为空")
+
+        self.sessions = tuple(sessions)
+        bounds = [(s.hour * 60 + s.minute, e.hour * 60 + e.minute) for s, e in self.sessions]
+        for (start, end), (next_start, _) in zip(bounds, bounds[1:] + [(_MINUTES_PER_DAY, 0)]):
+            if not start < end <= next_start:
+                raise ValueError(f"交易时段必须有序且不重叠: {self.sessions}")
+
+        self.total_minutes = sum(end - start for start, end in bounds)
+
+        ordinal_of_minute = np.empty(_MINUTES_PER_DAY + 1, dtype=np.int64)
+        label_of_ordinal = np.zeros(self.total_minutes + 1, dtype=np.int64)
+        elapsed = 0
+        previous_end = -1
+        for start, end in bounds:
+            # 上一时段收盘到本时段开盘之间的时间戳归入上一时段最后一根bar
+            ordinal_of_minute[previous_end + 1:start + 1] = max(elapsed, 1)
+            ordinal_of_minute[start + 1:end + 1] = np.arange(elapsed + 1, elapsed + end - start + 1)
+            label_of_ordinal[elapsed + 1:elapsed + end - start + 1] = np.arange(start + 1, end + 1)
+            elapsed += end - start
+            previous_end = end
+        ordinal_of_minute[previous_end + 1:] = self.total_minutes
+
+        self._ordinal_of_minute = ordinal_of_minute
+        self._label_of_ordinal = label_of_ordinal
+        # 逐条（tick）查询使用的Python列表，避免标量访问numpy数组的开销
+        self._ordinal_list = ordinal_of_minute.tolist()
+        self._label_list = label_of_ordinal.tolist()
+        self.close_minute = bounds[-1][1]
+
+    def session_ordinal(self, minute_of_day: int) -> int:
+        """单个bar结束时间（日内分钟数）对应的时段分钟序号"""
+        return self._ordinal_list[min(max(minute_of_day, 0), _MINUTES_PER_DAY)]
+
+    def label_minute(self, ordinal: int) -> int:
+        """单个时段分钟序号对应的bar结束时间（日内分钟数）"""
+        return self._label_list[min(max(ordinal, 1), self.total_minutes)]
+
+    def session_ordinals(self, minute_of_day: np.ndarray) -> np.ndarray:
+        """将bar结束时间（日内分钟数）映射为时段分钟序号"""
+        return self._ordinal_of_minute[np.clip(minute_of_day, 0, _MINUTES_PER_DAY)]
+
+    def label_minutes(self, ordinals: np.ndarray) -> np.ndarray:
+        """将时段分钟序号映射为bar结束时间（日内分钟数）"""
+        return self._label_of_ordinal[np.clip(ordinals, 1, self.total_minutes)]
+
+
+# A股交易时段：09:30-11:30, 13:00-15:00
+ASHARE_CALENDAR = TradingSessionCalendar((
+    (time(9, 30), time(11, 30)),
+    (time(13, 0), time(15, 0)),
+))
+
+
+@dataclass
+class ResampledBars:
+    """重采样结果（列式数组）"""
+    timestamps: np.ndarray      # datetime64[ns]
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    amount: np.ndarray
+    keys: Optional[np.ndarray] = None   # 每根bar所属的分组键（多股票时）
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+
+class SessionResampler:
+    """交易时段感知的OHLCV重采样器"""
+
+    def __init__(self, calendar: Optional[TradingSessionCalendar] = None):
+        self.calendar = calendar or ASHARE_CALENDAR
+
+    @staticmethod
+    def is_supported(period: str) -> bool:
+        """是否支持该目标周期"""
+        return period in INTRADAY_PERIOD_MINUTES or period in CALENDAR_PERIODS
+
+    def resample(self,
+                 timestamps: np.ndarray,
+                 open_: np.ndarray,
+                 high: np.ndarray,
+                 low: np.ndarray,
+                 close: np.ndarray,
+                 volume: np.ndarray,
+                 amount: np.ndarray,
+                 period: str,
+                 keys: Optional[np.ndarray] = None) -> ResampledBars:
+        """
+        一次性重采样一组或多组K线
+
+        Args:
+            timestamps: bar结束时间（本地时钟，无时区）
+            open_/high/low/close/volume/amount: 对应的行情数组
+            period: 目标周期，如 "5m"、"1h"、"1d"、"1w"
+            keys: 分组键（如股票代码编号），为None时视为单只股票
+
+        Returns:
+            ResampledBars: 按 (分组键, 时间) 排序的重采样结果
+        """
+        if not self.is_supported(period):
+            raise ValueError(f"不支持的重采样周期: {period}")
+
+        timestamps = np.asarray(timestamps, dtype="datetime64[ns]")
+        columns = [np.asarray(c, dtype=np.float64) for c in (open_, high, low, close, volume, amount)]
+        if keys is not None:
+            keys = np.asarray(keys)
+
+        if len(timestamps) == 0:
+            empty = np.empty(0, dtype=np.float64)
+            return ResampledBars(timestamps, empty, empty, empty, empty, empty, empty,
+                                 None if keys is None else keys[:0])
+
+        # reduceat要求同一分组连续：按 (分组键, 时间) 排序
+        order = np.lexsort((timestamps,) if keys is None else (timestamps, keys))
+        if not np.array_equal(order, np.arange(len(order))):
+            timestamps = timestamps[order]
+            columns = [c[order] for c in columns]
+            if keys is not None:
+                keys = keys[order]
+        open_, high, low, close, volume, amount = columns
+
+        days = timestamps.astype("datetime64[D]")
+        bucket_ids, labels = self._assign_buckets(timestamps, days, period)
+
+        # bar边界：分组键或桶编号发生变化的位置
+        boundary = bucket_ids[1:] != bucket_ids[:-1]
+        if keys is not None:
+            boundary |= keys[1:] != keys[:-1]
+        starts = np.concatenate(([0], np.flatnonzero(boundary) + 1))
+        ends = np.concatenate((starts[1:], [len(timestamps)])) - 1
+
+        if labels is None:
+            # 日历周期以桶内最后一根bar的时间标注
+            bar_timestamps = timestamps[ends]
+        else:
+            bar_timestamps = labels[starts]
+
+        return ResampledBars(
+            timestamps=bar_timestamps,
+            open=open_[starts],
+            high=np.maximum.reduceat(high, starts),
+            low=np.minimum.reduceat(low, starts),
+            close=close[ends],
+            volume=np.add.reduceat(volume, starts),
+            amount=np.add.reduceat(amount, starts),
+            keys=None if keys is None else keys[starts],
+        )
+
+    def _assign_buckets(self, timestamps: np.ndarray, days: np.ndarray,
+                        period: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """计算每根bar所属的桶编号，日内周期同时返回桶的结束时间"""
+        day_numbers = days.astype(np.int64)
+
+        if period in INTRADAY_PERIOD_MINUTES:
+            span = INTRADAY_PERIOD_MINUTES[period]
+            # 带秒的时间戳（如tick）向上取整到所在分钟bar的结束时间
+            offset_ns = (timestamps - days).astype(np.int64)
+            minute_of_day = -(-offset_ns // _NS_PER_MINUTE)
+            ordinals = self.calendar.session_ordinals(minute_of_day)
+            buckets = (ordinals - 1) // span
+            bucket_ids = day_numbers * (self.calendar.total_minutes + 1) + buckets
+            end_ordinals = np.minimum((buckets + 1) * span, self.calendar.total_minutes)
+            labels = days + self.calendar.label_minutes(end_ordinals).astype("timedelta64[m]")
+            return bucket_ids, labels.astype("datetime64[ns]")
+
+        if period == "1d":
+            return day_numbers, days.astype("datetime64[ns]")
+        if period == "1w":
+            # 1970-01-01 为周四，+3 后按周一对齐
+            return (day_numbers + 3) // 7, None
+        return timestamps.astype("datetime64[M]").astype(np.int64), None
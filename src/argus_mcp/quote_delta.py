@@ -0,0 +1,189 @@
+"""
+WebSocket 实时数据系统 - 行情增量推送
+服务端按 (客户端, 股票, 数据类型) 记录上次推送的快照，只推送变化的字段；
+按配置的间隔、重新订阅或字段集合变化时推送完整关键帧。
+
+增量消息在行情信封上带 "delta": true，data 中只有变化的字段；
+不带该标记的行情消息即为关键帧（与原有格式一致）。
+客户端用 DeltaStateBuilder 以关键帧 + 增量还原完整行情。
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+SnapshotKey = Tuple[str, str, str]  # (client_id, symbol, data_type)
+
+
+def compute_delta(previous: Dict[str, Any], current: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    计算两次快照之间变化的字段
+
+    Returns:
+        变化字段字典；有字段被删除时返回None（需要关键帧）
+    """
+    if len(previous) > len(current) or not previous.keys() <= current.keys():
+        return None
+    return {k: v for k, v in current.items() if previous.get(k, _MISSING) != v}
+
+
+class _ClientSnapshot:
+    """客户端最近一次收到的快照"""
+
+    __slots__ = ("snapshot", "subscription_id", "keyframe_at")
+
+    def __init__(self, snapshot: Dict[str, Any], subscription_id: str, keyframe_at: float):
+        self.snapshot = snapshot
+        self.subscription_id = subscription_id
+        self.keyframe_at = keyframe_at
+
+
+class QuoteDeltaTracker:
+    """
+    增量推送跟踪器
+
+    快照只保存推送对象的引用：同步接收的客户端共享同一个快照对象，
+    因此每组客户端只计算一次增量、序列化一次消息。
+    """
+
+    def __init__(self, keyframe_interval: float = 30.0):
+        self.keyframe_interval = keyframe_interval
+        self._snapshots: Dict[SnapshotKey, _ClientSnapshot] = {}
+        self.stats: Dict[str, int] = {
+            "keyframes": 0,
+            "deltas": 0,
+            "unchanged": 0,
+        }
+
+    def plan(
+        self,
+        recipients: Iterable[Tuple[str, str]],
+        symbol: str,
+        data_type: str,
+        payload: Dict[str, Any],
+        now: float
+    ) -> List[Tuple[Dict[str, Any], bool, List[str]]]:
+        """
+        为一次推送分组
+
+        Args:
+            recipients: [(client_id, subscription_id), ...]
+            symbol: 股票代码
+            data_type: 数据类型
+            payload: 本次完整数据（推送后作为这些客户端的新快照）
+            now: 单调时钟时间
+
+        Returns:
+            [(data, is_delta, client_ids), ...]，没有变化的客户端不出现在结果中
+        """
+        keyframe_clients: List[str] = []
+        delta_groups: Dict[int, Tuple[Dict[str, Any], List[str]]] = {}
+
+        for client_id, subscription_id in recipients:
+            key = (client_id, symbol, data_type)
+            state = self._snapshots.get(key)
+            if (state is None or state.subscription_id != subscription_id or
+                    now - state.keyframe_at >= self.keyframe_interval):
+                keyframe_clients.append(client_id)
+                self._snapshots[key] = _ClientSnapshot(payload, subscription_id, now)
+                continue
+
+            group = delta_groups.get(id(state.snapshot))
+            if group is None:
+                group = delta_groups[id(state.snapshot)] = (state.snapshot, [])
+            group[1].append(client_id)
+
+        plans: List[Tuple[Dict[str, Any], bool, List[str]]] = []
+        for previous, client_ids in delta_groups.values():
+            delta = compute_delta(previous, payload)
+            if delta is None:
+                keyframe_clients.extend(client_ids)
+                for client_id in client_ids:
+                    self._snapshots[(client_id, symbol, data_type)].keyframe_at = now
+            elif not delta:
+                self.stats["unchanged"] += len(client_ids)
+                continue
+            else:
+                plans.append((delta, True, client_ids))
+                self.stats["deltas"] += len(client_ids)
+            for client_id in client_ids:
+                self._snapshots[(client_id, symbol, data_type)].snapshot = payload
+
+        if keyframe_clients:
+            plans.insert(0, (payload, False, keyframe_clients))
+            self.stats["keyframes"] += len(keyframe_clients)
+        return plans
+
+    def has_snapshot(self, client_id: str, symbol: str, data_type: str, subscription_id: str) -> bool:
+        """客户端在该订阅下是否已收到过关键帧"""
+        state = self._snapshots.get((client_id, symbol, data_type))
+        return state is not None and state.subscription_id == subscription_id
+
+    def seed(self, client_id: str, symbol: str, data_type: str, subscription_id: str,
+             snapshot: Dict[str, Any], now: float):
+        """记录在增量通道之外下发的完整数据（如断线补发），之后继续推送增量"""
+        self._snapshots[(client_id, symbol, data_type)] = _ClientSnapshot(snapshot, subscription_id, now)
+
+    def reset(self, client_id: str, symbol: Optional[str] = None):
+        """丢弃客户端快照，下次推送关键帧"""
+        for key in [k for k in self._snapshots
+                    if k[0] == client_id and (symbol is None or k[1] == symbol)]:
+            del self._snapshots[key]
+
+    def prune(self, active_client_ids: Iterable[str]):
+        """清理已断开客户端的快照"""
+        active = set(active_client_ids)
+        for key in [k for k in self._snapshots if k[0] not in active]:
+            del self._snapshots[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取增量推送统计"""
+        return {**self.stats, "snapshots": len(self._snapshots)}
+
+
+class DeltaStateBuilder:
+    """客户端：以关键帧 + 增量还原完整行情"""
+
+    def __init__(self):
+        self._state: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self.missing_keyframes = 0
+
+    def apply(self, envelope: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        合并一条行情信封
+
+        Returns:
+            data 为完整行情的信封；缺少关键帧的增量返回None
+        """
+        key = (envelope.get("symbol"), envelope.get("data_type"))
+        data = envelope.get("data")
+        if not isinstance(data, dict):
+            return envelope
+
+        if not envelope.get("delta"):
+            self._state[key] = dict(data)
+            return envelope
+
+        base = self._state.get(key)
+        if base is None:
+            self.missing_keyframes += 1
+            logger.warning(f"收到增量行情但没有关键帧，等待下一次关键帧: {key[0]} {key[1]}")
+            return None
+        base.update(data)
+        full = {k: v for k, v in envelope.items() if k != "delta"}
+        full["data"] = dict(base)
+        return full
+
+    def reset(self):
+        """连接重建后清空状态"""
+        self._state.clear()
+
+
+__all__ = [
+    "QuoteDeltaTracker",
+    "DeltaStateBuilder",
+    "compute_delta",
+]
@@ -0,0 +1,333 @@
+"""
+高级缓存 - 异步 Redis 层
+AdvancedCacheOptimizer 的 Redis 访问层，使用 redis.asyncio 原生异步客户端：
+
+- 批量读取：一次流水线内的分块 MGET，N 个键一次往返
+- 批量写入：流水线 SET EX（MSET 不支持TTL），N 个键一次往返
+- 按模式清除：SCAN 迭代 + 分批 UNLINK，不使用阻塞服务端的 KEYS
+- 可选客户端缓存：进程内 LRU 保存最近读取的值，写入/删除时在同一流水线内
+  PUBLISH 失效消息，其他进程订阅后丢弃对应的本地副本
+
+失效消息（JSON）: {"origin": 实例ID, "keys": [...]} 或 {"origin": 实例ID, "pattern": "..."}
+"""
+
+import asyncio
+import fnmatch
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+
+try:
+    from redis import asyncio as redis_asyncio
+    REDIS_ASYNC_AVAILABLE = True
+except ImportError:
+    redis_asyncio = None
+    REDIS_ASYNC_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+@dataclass
+class RedisTierConfig:
+    """异步 Redis 层配置"""
+    client_side_cache: bool = False  # 进程内缓存 + 失效消息
+    local_cache_size: int = 10000  # 本地缓存最多条目
+    local_ttl: float = 5.0  # 本地副本最长保留时间（秒），兜底其他系统直接写 Redis 的情况
+    batch_size: int = 500  # 单条 MGET / UNLINK 的键数
+    scan_count: int = 500  # SCAN 每次迭代的 COUNT 提示
+    invalidation_channel: str = "argus:cache:invalidate"
+    reconnect_delay: float = 1.0  # 失效订阅断开后的重连间隔（秒）
+
+
+def create_async_redis(host: str = "localhost", port: int = 6379, db: int = 0, **kwargs) -> Any:
+    """创建 redis.asyncio 客户端（返回字符串）"""
+    if not REDIS_ASYNC_AVAILABLE:
+        raise RuntimeError("当前redis版本不支持redis.asyncio，需要 redis>=4.2")
+    return redis_asyncio.Redis(host=host, port=port, db=db, decode_responses=True, **kwargs)
+
+
+def _chunks(items: Sequence[Any], size: int) -> Iterable[Sequence[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class _LocalCache:
+    """进程内 LRU，条目带过期时间"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def discard(self, keys: Iterable[str]) -> int:
+        removed = 0
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                removed += 1
+        return removed
+
+    def discard_pattern(self, pattern: str) -> int:
+        return self.discard([key for key in self._entries if fnmatch.fnmatchcase(key, pattern)])
+
+    def clear(self):
+        self._entries.clear()
+
+
+class AsyncRedisTier:
+    """异步 Redis 访问层（批量流水线、SCAN 清除、可选客户端缓存）"""
+
+    def __init__(self, client: Any, config: Optional[RedisTierConfig] = None):
+        self.client = client
+        self.config = config or RedisTierConfig()
+        self.instance_id = uuid.uuid4().hex
+        self._local = _LocalCache(self.config.local_cache_size, self.config.local_ttl)
+        # 只有失效订阅在线时才使用本地副本，否则可能读到其他进程已改写的值
+        self._listening = False
+        self._listener: Optional[asyncio.Task] = None
+        self.stats: Dict[str, int] = {
+            "round_trips": 0,
+            "keys_read": 0,
+            "keys_written": 0,
+            "keys_deleted": 0,
+            "keys_scanned": 0,
+            "local_hits": 0,
+            "invalidations_received": 0,
+        }
+
+    @property
+    def local_cache_active(self) -> bool:
+        return self.config.client_side_cache and self._listening
+
+    async def start(self):
+        """启动失效消息订阅（未开启客户端缓存时不做任何事）"""
+        if self.config.client_side_cache and self._listener is None:
+            self._listener = asyncio.create_task(self._invalidation_loop())
+
+    async def close(self):
+        """停止订阅并关闭客户端连接"""
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        self._local.clear()
+        closer = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if closer is not None:
+            result = closer()
+            if asyncio.iscoroutine(result):
+                await result
+
+    # 读取
+    async def get(self, key: str) -> Optional[str]:
+        """读取单个键"""
+        return (await self.mget([key]))[0]
+
+    async def mget(self, keys: Sequence[str]) -> List[Optional[str]]:
+        """
+        批量读取，本地缓存未命中的键在一次流水线内分块 MGET
+
+        Returns:
+            与 keys 顺序一致的值列表，不存在的键为None
+        """
+        values: List[Optional[str]] = [None] * len(keys)
+        pending: List[int] = []
+        use_local = self.local_cache_active
+        for index, key in enumerate(keys):
+            if use_local:
+                value = self._local.get(key)
+                if value is not _MISSING:
+                    values[index] = value
+                    self.stats["local_hits"] += 1
+                    continue
+            pending.append(index)
+
+        if not pending:
+            return values
+
+        pending_keys = [keys[index] for index in pending]
+        async with self.client.pipeline(transaction=False) as pipe:
+            for chunk in _chunks(pending_keys, self.config.batch_size):
+                pipe.mget(*chunk)
+            results = await pipe.execute()
+        self.stats["round_trips"] += 1
+        self.stats["keys_read"] += len(pending_keys)
+
+        fetched = [value for chunk in results for value in chunk]
+        for index, value in zip(pending, fetched):
+            values[index] = value
+            if use_local and value is not None:
+                self._local.put(keys[index], value)
+        return values
+
+    # 写入
+    async def set(self, key: str, value: str, ttl: int) -> bool:
+        """写入单个键"""
+        return await self.set_many([(key, value, ttl)]) == 1
+
+    async def set_many(self, items: Sequence[Tuple[str, str, int]]) -> int:
+        """
+        批量写入 [(key, value, ttl秒), ...]，一次流水线往返
+
+        Returns:
+            写入成功的键数
+        """
+        if not items:
+            return 0
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value, ttl in items:
+                pipe.set(key, value, ex=ttl)
+            self._queue_invalidation(pipe, keys=[key for key, _, _ in items])
+            results = await pipe.execute()
+        self.stats["round_trips"] += 1
+
+        written = sum(1 for result in results[:len(items)] if result)
+        self.stats["keys_written"] += written
+        if self.local_cache_active:
+            for (key, value, ttl), result in zip(items, results):
+                if result:
+                    self._local.put(key, value, ttl)
+        return written
+
+    # 删除
+    async def delete(self, keys: Sequence[str]) -> int:
+        """批量删除（UNLINK，服务端异步释放内存），返回删除的键数"""
+        if not keys:
+            return 0
+        self._local.discard(keys)
+        async with self.client.pipeline(transaction=False) as pipe:
+            for chunk in _chunks(list(keys), self.config.batch_size):
+                pipe.unlink(*chunk)
+            self._queue_invalidation(pipe, keys=list(keys))
+            results = await pipe.execute()
+        self.stats["round_trips"] += 1
+
+        deleted = sum(results[:-1] if self.config.client_side_cache else results)
+        self.stats["keys_deleted"] += deleted
+        return deleted
+
+    async def scan_keys(self, pattern: str) -> AsyncIterator[str]:
+        """按模式迭代键（SCAN，不阻塞服务端）"""
+        async for key in self.client.scan_iter(match=pattern, count=self.config.scan_count):
+            self.stats["keys_scanned"] += 1
+            yield key
+
+    async def delete_pattern(self, pattern: str) -> int:
+        """按模式清除：SCAN 迭代，每 batch_size 个键一次 UNLINK"""
+        self._local.discard_pattern(pattern)
+        deleted = 0
+        batch: List[str] = []
+        async for key in self.scan_keys(pattern):
+            batch.append(key)
+            if len(batch) >= self.config.batch_size:
+                deleted += await self._unlink(batch)
+                batch = []
+        if batch:
+            deleted += await self._unlink(batch)
+
+        if self.config.client_side_cache:
+            await self.client.publish(self.config.invalidation_channel, self._invalidation_message(pattern=pattern))
+            self.stats["round_trips"] += 1
+        self.stats["keys_deleted"] += deleted
+        return deleted
+
+    async def _unlink(self, keys: List[str]) -> int:
+        self.stats["round_trips"] += 1
+        return await self.client.unlink(*keys)
+
+    # 客户端缓存失效
+    def _invalidation_message(self, keys: Optional[List[str]] = None, pattern: Optional[str] = None) -> str:
+        message: Dict[str, Any] = {"origin": self.instance_id}
+        if pattern is not None:
+            message["pattern"] = pattern
+        else:
+            message["keys"] = keys
+        return json.dumps(message, separators=(",", ":"))
+
+    def _queue_invalidation(self, pipe: Any, keys: List[str]):
+        """失效消息与写操作在同一流水线内发出，不额外增加往返"""
+        if self.config.client_side_cache:
+            pipe.publish(self.config.invalidation_channel, self._invalidation_message(keys=keys))
+
+    def _apply_invalidation(self, data: Any):
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            logger.warning(f"无法解析缓存失效消息: {data!r}")
+            return
+        if message.get("origin") == self.instance_id:
+            return
+        self.stats["invalidations_received"] += 1
+        if "pattern" in message:
+            self._local.discard_pattern(message["pattern"])
+        else:
+            self._local.discard(message.get("keys") or ())
+
+    async def _invalidation_loop(self):
+        """订阅失效消息；订阅断开期间不使用本地副本"""
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(self.config.invalidation_channel)
+                # 订阅建立之前可能漏掉了失效消息
+                self._local.clear()
+                self._listening = True
+                logger.info(f"已订阅缓存失效消息 {self.config.invalidation_channel}")
+                async for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._apply_invalidation(message.get("data"))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"缓存失效订阅中断，{self.config.reconnect_delay}秒后重连: {e}")
+            finally:
+                self._listening = False
+                self._local.clear()
+                closer = getattr(pubsub, "aclose", None) or pubsub.reset
+                try:
+                    await closer()
+                except Exception:
+                    pass
+            await asyncio.sleep(self.config.reconnect_delay)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取 Redis 层统计"""
+        return {
+            **self.stats,
+            "client_side_cache": self.config.client_side_cache,
+            "local_cache_active": self.local_cache_active,
+            "local_entries": len(self._local),
+        }
+
+
+__all__ = [
+    "AsyncRedisTier",
+    "RedisTierConfig",
+    "REDIS_ASYNC_AVAILABLE",
+    "create_async_redis",
+]
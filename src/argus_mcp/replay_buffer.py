@@ -0,0 +1,131 @@
+"""
+WebSocket 实时数据系统 - 频道序号与重放缓冲
+每个行情频道（股票 + 数据类型）的推送带单调递增序号，最近的推送保存在
+有界环形缓冲中。客户端重连后发送各频道最后收到的序号（resume 消息），
+服务端只补发缺口；缺口已超出缓冲范围时才回退为快照。
+"""
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+
+CHANNEL_SEPARATOR = "|"
+
+
+def channel_key(symbol: str, data_type: str) -> str:
+    """频道名，如 600000.SH|quote"""
+    return f"{symbol}{CHANNEL_SEPARATOR}{data_type}"
+
+
+def parse_channel(channel: str) -> Optional[Tuple[str, str]]:
+    """频道名拆分为 (symbol, data_type)，格式错误返回None"""
+    symbol, sep, data_type = channel.rpartition(CHANNEL_SEPARATOR)
+    if not sep or not symbol or not data_type:
+        return None
+    return symbol.upper(), data_type
+
+
+class ChannelReplayBuffer:
+    """按频道维护序号和最近推送的环形缓冲"""
+
+    def __init__(self, ring_size: int = 64, max_age: float = 60.0):
+        self.ring_size = ring_size
+        self.max_age = max_age
+        self._seq: Dict[str, int] = {}
+        # channel -> deque[(seq, monotonic_time, payload)]
+        self._rings: Dict[str, Deque[Tuple[int, float, Any]]] = {}
+        self.stats: Dict[str, int] = {
+            "recorded": 0,
+            "replayed": 0,
+            "gaps_served": 0,
+            "gaps_expired": 0,
+        }
+
+    def next_seq(self, channel: str) -> int:
+        """分配频道的下一个序号"""
+        seq = self._seq.get(channel, 0) + 1
+        self._seq[channel] = seq
+        return seq
+
+    def current_seq(self, channel: str) -> int:
+        """频道当前序号（未推送过为0）"""
+        return self._seq.get(channel, 0)
+
+    def record(self, channel: str, seq: int, payload: Any, now: Optional[float] = None):
+        """
+        记录一次推送
+
+        Args:
+            channel: 频道名
+            seq: 该推送的序号（深度频道使用订单簿序号）
+            payload: 重放时用于重建消息的数据（只保存引用）
+        """
+        ring = self._rings.get(channel)
+        if ring is None:
+            ring = self._rings[channel] = deque(maxlen=self.ring_size)
+        ring.append((seq, time.monotonic() if now is None else now, payload))
+        if seq > self._seq.get(channel, 0):
+            self._seq[channel] = seq
+        self.stats["recorded"] += 1
+
+    def since(self, channel: str, last_seq: int, now: Optional[float] = None) -> Optional[List[Tuple[int, Any]]]:
+        """
+        获取 last_seq 之后的推送
+
+        Returns:
+            [(seq, payload), ...]；缺口已超出缓冲（或频道不存在）返回None，调用方应下发快照
+        """
+        current = self._seq.get(channel)
+        if current is None:
+            return None
+        if last_seq == current:
+            return []
+        if last_seq > current:
+            # 客户端序号超前于服务端（如服务端重启），无法判断缺口
+            self.stats["gaps_expired"] += 1
+            return None
+
+        ring = self._rings.get(channel)
+        if not ring:
+            self.stats["gaps_expired"] += 1
+            return None
+
+        now = time.monotonic() if now is None else now
+        oldest_seq, _, _ = ring[0]
+        if oldest_seq > last_seq + 1:
+            self.stats["gaps_expired"] += 1
+            return None
+
+        entries = [(seq, payload) for seq, ts, payload in ring
+                   if seq > last_seq and now - ts <= self.max_age]
+        if not entries or entries[0][0] != last_seq + 1:
+            self.stats["gaps_expired"] += 1
+            return None
+
+        self.stats["gaps_served"] += 1
+        self.stats["replayed"] += len(entries)
+        return entries
+
+    def discard(self, channels: Iterable[str]):
+        """
+        移除频道的缓冲
+
+        序号保留，重新订阅后继续递增：旧序号不会被复用，之后的 resume 回退为快照
+        """
+        for channel in channels:
+            self._rings.pop(channel, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取重放统计"""
+        return {
+            **self.stats,
+            "channels": len(self._rings),
+            "buffered": sum(len(r) for r in self._rings.values()),
+        }
+
+
+__all__ = [
+    "ChannelReplayBuffer",
+    "channel_key",
+    "parse_channel",
+]
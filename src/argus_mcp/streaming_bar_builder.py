@@ -0,0 +1,353 @@
+"""
+WebSocket 实时数据系统 - 流式K线合成器
+由实时tick增量维护各 (股票, 周期) 的未完成K线，每个tick的更新为O(1)；
+K线收盘后交给监听者（数据推送服务写入 HistoricalDataCache 并推送给KLINE订阅者），
+合成器本身不保留已收盘K线
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from .data_models.historical_data import StandardKLineData, SupportedPeriod
+from .processors.session_resampler import (
+    ASHARE_CALENDAR, INTRADAY_PERIOD_MINUTES, TradingSessionCalendar
+)
+
+logger = logging.getLogger(__name__)
+
+# 全部周期（去除别名）
+ALL_PERIODS: Tuple[str, ...] = tuple(dict.fromkeys(period.value for period in SupportedPeriod))
+
+# 交易所时区（A股，无夏令时；固定偏移避免依赖系统tz数据库）
+EXCHANGE_TZ = timezone(timedelta(hours=8), "Asia/Shanghai")
+
+
+def to_exchange_time(value: Any, tz: tzinfo = EXCHANGE_TZ) -> datetime:
+    """
+    将行情时间戳转换为交易所本地时间（不带时区）
+
+    Args:
+        value: 毫秒/秒级Unix时间戳、datetime 或 ISO 8601 字符串；
+            不带时区的datetime/字符串视为交易所本地时间
+        tz: 交易所时区
+    """
+    if isinstance(value, (int, float)):
+        seconds = value / 1000 if value > 1e11 else value
+        return datetime.fromtimestamp(seconds, tz).replace(tzinfo=None)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(tz).replace(tzinfo=None)
+    return value
+
+
+class LiveBar:
+    """未完成/已收盘的K线"""
+
+    __slots__ = (
+        "symbol", "period", "bucket", "timestamp", "close_time",
+        "open", "high", "low", "close", "volume", "amount", "tick_count"
+    )
+
+    def __init__(self, symbol: str, period: str, bucket: int, timestamp: datetime,
+                 close_time: Optional[datetime], price: float, volume: float, amount: float):
+        self.symbol = symbol
+        self.period = period
+        self.bucket = bucket
+        self.timestamp = timestamp          # bar结束时间（日/周/月线为交易日日期）
+        self.close_time = close_time        # 按时间收盘的截止时刻，未知时为None
+        self.open = price
+        self.high = price
+        self.low = price
+        self.close = price
+        self.volume = volume
+        self.amount = amount
+        self.tick_count = 1
+
+    def update(self, price: float, volume: float, amount: float) -> None:
+        """用一个tick更新K线"""
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.amount += amount
+        self.tick_count += 1
+
+    def to_standard(self) -> StandardKLineData:
+        """转换为标准K线数据"""
+        return StandardKLineData(
+            timestamp=self.timestamp,
+            open=self.open,
+            high=self.high,
+            low=self.low,
+            close=self.close,
+            volume=int(round(self.volume)),
+            amount=self.amount,
+            code=self.symbol
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典（KLineData字段）"""
+        return {
+            "symbol": self.symbol,
+            "timestamp": self.timestamp.isoformat(),
+            "period": self.period,
+            "open": round(self.open, 4),
+            "high": round(self.high, 4),
+            "low": round(self.low, 4),
+            "close": round(self.close, 4),
+            "volume": int(round(self.volume)),
+            "amount": round(self.amount, 2),
+            "tick_count": self.tick_count
+        }
+
+
+BarListener = Callable[[LiveBar], Union[None, Awaitable[None]]]
+
+
+@dataclass
+class BarBuilderConfig:
+    """流式K线合成配置"""
+    periods: Tuple[str, ...] = ALL_PERIODS
+    close_grace_seconds: float = 3.0       # bar结束后等待迟到tick的时间
+    calendar: TradingSessionCalendar = field(default=ASHARE_CALENDAR)
+    timezone: tzinfo = EXCHANGE_TZ         # 交易所时区，flush 默认按交易所当前时间收盘
+
+
+class StreamingBarBuilder:
+    """
+    流式K线合成器
+
+    每个tick只计算一次日内分钟序号与日期，再按周期O(1)定位所属bar：
+    同一bar内原地更新OHLCV，跨bar时收盘旧bar并开启新bar。没有后续tick的
+    bar（如收盘前最后一根）由 ``flush`` 按时间收盘。
+    """
+
+    def __init__(self, config: Optional[BarBuilderConfig] = None):
+        self.config = config or BarBuilderConfig()
+        self.calendar = self.config.calendar
+        unknown = [p for p in self.config.periods if p not in ALL_PERIODS]
+        if unknown:
+            raise ValueError(f"不支持的K线周期: {unknown}")
+
+        self.periods = tuple(self.config.periods)
+        self._intraday = [(p, INTRADAY_PERIOD_MINUTES[p]) for p in self.periods
+                          if p in INTRADAY_PERIOD_MINUTES]
+        self._calendar_periods = [p for p in self.periods if p not in INTRADAY_PERIOD_MINUTES]
+        self._session_close = time(self.calendar.close_minute // 60, self.calendar.close_minute % 60)
+
+        self._open_bars: Dict[Tuple[str, str], LiveBar] = {}
+        self._last_closed: Dict[Tuple[str, str], int] = {}
+        # 累计成交量/额 -> 增量换算: symbol -> (交易日, 累计量, 累计额)
+        self._cumulative: Dict[str, Tuple[int, float, float]] = {}
+        self._listeners: List[BarListener] = []
+
+        self.stats = {
+            "ticks_processed": 0,
+            "late_ticks": 0,
+            "bars_closed": 0,
+        }
+
+    def add_listener(self, listener: BarListener) -> None:
+        """注册K线收盘回调（同步或异步函数）"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: BarListener) -> None:
+        """移除K线收盘回调"""
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def on_tick(self, symbol: str, timestamp: datetime, price: float,
+                volume: float = 0.0, amount: float = 0.0,
+                cumulative: bool = False) -> List[LiveBar]:
+        """
+        处理一个tick
+
+        Args:
+            symbol: 股票代码
+            timestamp: 成交时间（交易所本地时间）
+            price: 最新价
+            volume: 成交量
+            amount: 成交额
+            cumulative: volume/amount 是否为当日累计值（如xtquant全推行情）
+
+        Returns:
+            List[LiveBar]: 因本tick而收盘的K线
+        """
+        self.stats["ticks_processed"] += 1
+        price = float(price)
+        day = timestamp.date()
+        day_number = day.toordinal()
+
+        if cumulative:
+            volume, amount = self._to_increment(symbol, day_number, float(volume), float(amount))
+        else:
+            volume, amount = float(volume), float(amount)
+
+        # 每个tick只做一次时段映射，带秒的时间戳归入所在分钟bar
+        seconds = timestamp.hour * 3600 + timestamp.minute * 60 + timestamp.second
+        minute_of_day = -(-(seconds * 1_000_000 + timestamp.microsecond) // 60_000_000)
+        ordinal = self.calendar.session_ordinal(minute_of_day)
+
+        closed: List[LiveBar] = []
+        for period, span in self._intraday:
+            index = (ordinal - 1) // span
+            bucket = day_number * 10000 + index
+            if self._apply(symbol, period, bucket, price, volume, amount, closed):
+                label = self._intraday_label(day, index, span, timestamp.tzinfo)
+                self._open_bars[(symbol, period)] = LiveBar(
+                    symbol, period, bucket, label, label, price, volume, amount
+                )
+
+        for period in self._calendar_periods:
+            if period == "1d":
+                bucket = day_number
+            elif period == "1w":
+                bucket = (day_number - 1) // 7     # date.toordinal() 从周一开始计数
+            else:
+                bucket = day.year * 12 + day.month - 1
+            if self._apply(symbol, period, bucket, price, volume, amount, closed):
+                label, close_time = self._calendar_label(day, period, timestamp.tzinfo)
+                self._open_bars[(symbol, period)] = LiveBar(
+                    symbol, period, bucket, label, close_time, price, volume, amount
+                )
+            elif period != "1d":
+                # 周/月线以最近交易日标注
+                bar = self._open_bars.get((symbol, period))
+                if bar is not None and bar.bucket == bucket and bar.timestamp.date() != day:
+                    bar.timestamp = datetime.combine(day, time(), timestamp.tzinfo)
+
+        if closed:
+            self._record_closed(closed)
+        return closed
+
+    def flush(self, now: Optional[datetime] = None) -> List[LiveBar]:
+        """
+        按时间收盘已过结束时间的K线
+
+        Args:
+            now: 当前时间（交易所本地时间），默认取交易所时区的当前时间
+
+        Returns:
+            List[LiveBar]: 本次收盘的K线
+        """
+        now = now or self.exchange_now()
+        grace = timedelta(seconds=self.config.close_grace_seconds)
+        closed = []
+        for key, bar in list(self._open_bars.items()):
+            if bar.close_time is None:
+                continue
+            deadline = bar.close_time.replace(tzinfo=None) + grace
+            if now.replace(tzinfo=None) >= deadline:
+                del self._open_bars[key]
+                self._last_closed[key] = bar.bucket
+                closed.append(bar)
+        if closed:
+            self._record_closed(closed)
+        return closed
+
+    def close_all(self) -> List[LiveBar]:
+        """收盘全部未完成K线（如服务停止时）"""
+        closed = list(self._open_bars.values())
+        for key, bar in self._open_bars.items():
+            self._last_closed[key] = bar.bucket
+        self._open_bars.clear()
+        if closed:
+            self._record_closed(closed)
+        return closed
+
+    async def dispatch(self, bars: List[LiveBar]) -> None:
+        """将收盘K线分发给监听者"""
+        for bar in bars:
+            for listener in list(self._listeners):
+                try:
+                    result = listener(bar)
+                    if asyncio.iscoroutine(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"K线收盘回调执行失败 {bar.symbol} {bar.period}: {e}")
+
+    def get_open_bar(self, symbol: str, period: str) -> Optional[LiveBar]:
+        """获取当前未完成的K线"""
+        return self._open_bars.get((symbol, period))
+
+    def exchange_now(self) -> datetime:
+        """交易所本地当前时间（不带时区，与tick时间戳一致）"""
+        return datetime.now(self.config.timezone).replace(tzinfo=None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取运行统计"""
+        return {
+            **self.stats,
+            "open_bars": len(self._open_bars),
+            "periods": list(self.periods),
+            "listeners": len(self._listeners),
+        }
+
+    def _apply(self, symbol: str, period: str, bucket: int, price: float,
+               volume: float, amount: float, closed: List[LiveBar]) -> bool:
+        """将tick应用到某一周期的bar，需要开启新bar时返回True"""
+        key = (symbol, period)
+        bar = self._open_bars.get(key)
+        if bar is not None and bar.bucket == bucket:
+            bar.update(price, volume, amount)
+            return False
+
+        last_closed = self._last_closed.get(key)
+        if (bar is not None and bucket < bar.bucket) or (last_closed is not None and bucket <= last_closed):
+            # 迟到tick：所属bar已收盘，丢弃以免重复推送
+            self.stats["late_ticks"] += 1
+            return False
+
+        if bar is not None:
+            self._last_closed[key] = bar.bucket
+            closed.append(bar)
+        return True
+
+    def _intraday_label(self, day: date, bucket_index: int, span: int, tzinfo) -> datetime:
+        """日内bar的结束时间（同时作为收盘时刻）"""
+        end_ordinal = min((bucket_index + 1) * span, self.calendar.total_minutes)
+        minute = self.calendar.label_minute(end_ordinal)
+        return datetime.combine(day, time(minute // 60, minute % 60), tzinfo)
+
+    def _calendar_label(self, day: date, period: str, tzinfo) -> Tuple[datetime, datetime]:
+        """日/周/月bar的标签与收盘时刻"""
+        label = datetime.combine(day, time(), tzinfo)
+        if period == "1d":
+            last_day = day
+        elif period == "1w":
+            last_day = day + timedelta(days=max(4 - day.weekday(), 0))
+        else:
+            next_month = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+            last_day = next_month - timedelta(days=1)
+        return label, datetime.combine(last_day, self._session_close, tzinfo)
+
+    def _to_increment(self, symbol: str, day_number: int,
+                      volume: float, amount: float) -> Tuple[float, float]:
+        """将当日累计成交量/额换算为增量"""
+        last_day, last_volume, last_amount = self._cumulative.get(symbol, (day_number, 0.0, 0.0))
+        if last_day != day_number:
+            last_volume, last_amount = 0.0, 0.0
+        self._cumulative[symbol] = (day_number, max(volume, last_volume), max(amount, last_amount))
+        return max(volume - last_volume, 0.0), max(amount - last_amount, 0.0)
+
+    def _record_closed(self, bars: List[LiveBar]) -> None:
+        """统计已收盘K线（K线本身由调用方交给监听者/缓存保存）"""
+        self.stats["bars_closed"] += len(bars)
+
+
+# 全局实例
+_bar_builder: Optional[StreamingBarBuilder] = None
+
+
+def get_bar_builder() -> StreamingBarBuilder:
+    """获取流式K线合成器实例"""
+    global _bar_builder
+    if _bar_builder is None:
+        _bar_builder = StreamingBarBuilder()
+    return _bar_builder
@@ -0,0 +1,263 @@
+"""
+WebSocket 实时数据系统 - 订阅过滤与限频
+把订阅上的 filters 编译为服务端过滤器，推送前逐订阅判断：
+
+    fields              字段掩码，只推送列出的字段（symbol/timestamp 总是保留）
+    min_change          相对上次推送价格的最小绝对变动
+    min_change_percent  相对上次推送价格的最小变动百分比
+    min_volume          成交量下限
+    max_rate            每秒最多推送次数（或 throttle_ms 指定最小间隔）
+    conflate            限频期间是否合并为最新值延后推送（默认 True）
+
+未设置任何条件的订阅不经过过滤器，保持原有逐条推送。
+"""
+
+import logging
+import math
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .websocket_models import DataType, Subscription
+
+logger = logging.getLogger(__name__)
+
+# 依次尝试的价格字段（行情/K线为 close，成交为 price）
+PRICE_FIELDS = ("close", "price", "last_price")
+ALWAYS_FIELDS = ("symbol", "timestamp")
+
+_KNOWN_KEYS = frozenset((
+    "fields", "min_change", "min_change_percent", "min_volume",
+    "max_rate", "throttle_ms", "conflate"
+))
+
+
+@dataclass(frozen=True)
+class SubscriptionFilter:
+    """编译后的订阅过滤器"""
+    fields: Optional[Tuple[str, ...]] = None
+    min_change: float = 0.0
+    min_change_percent: float = 0.0
+    min_volume: float = 0.0
+    min_interval: float = 0.0  # 秒
+    conflate: bool = True
+
+    def project(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """按字段掩码裁剪数据"""
+        if self.fields is None:
+            return data
+        return {k: data[k] for k in self.fields if k in data}
+
+
+def _non_negative(filters: Dict[str, Any], key: str) -> float:
+    value = filters.get(key)
+    if value is None:
+        return 0.0
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} 必须是数字: {value!r}")
+    if number < 0 or math.isnan(number):
+        raise ValueError(f"{key} 不能为负数: {value!r}")
+    return number
+
+
+def compile_filter(filters: Optional[Dict[str, Any]]) -> Optional[SubscriptionFilter]:
+    """
+    编译订阅过滤条件
+
+    Returns:
+        SubscriptionFilter；没有任何有效条件时返回None
+
+    Raises:
+        ValueError: 条件格式错误
+    """
+    if not filters:
+        return None
+    if not isinstance(filters, dict):
+        raise ValueError("filters 必须是对象")
+
+    unknown = set(filters) - _KNOWN_KEYS
+    if unknown:
+        logger.debug(f"忽略未知的过滤条件: {sorted(unknown)}")
+
+    fields = filters.get("fields")
+    if fields is not None:
+        if isinstance(fields, str) or not all(isinstance(f, str) for f in fields):
+            raise ValueError("fields 必须是字段名列表")
+        fields = tuple(dict.fromkeys((*ALWAYS_FIELDS, *fields)))
+
+    min_interval = _non_negative(filters, "throttle_ms") / 1000.0
+    max_rate = _non_negative(filters, "max_rate")
+    if max_rate:
+        min_interval = max(min_interval, 1.0 / max_rate)
+
+    compiled = SubscriptionFilter(
+        fields=fields,
+        min_change=_non_negative(filters, "min_change"),
+        min_change_percent=_non_negative(filters, "min_change_percent"),
+        min_volume=_non_negative(filters, "min_volume"),
+        min_interval=min_interval,
+        conflate=bool(filters.get("conflate", True))
+    )
+    if compiled == SubscriptionFilter(conflate=compiled.conflate):
+        return None
+    return compiled
+
+
+def _price_of(data: Dict[str, Any]) -> Optional[float]:
+    for key in PRICE_FIELDS:
+        value = data.get(key)
+        if value is not None:
+            return float(value)
+    return None
+
+
+class _DeliveryState:
+    """单个订阅在单只股票上的推送状态"""
+
+    __slots__ = ("last_price", "last_sent", "pending")
+
+    def __init__(self):
+        self.last_price: Optional[float] = None
+        self.last_sent: float = -math.inf
+        self.pending: Optional[Dict[str, Any]] = None
+
+
+StateKey = Tuple[str, str, DataType]  # (subscription_id, symbol, data_type)
+
+
+class SubscriptionFilterEngine:
+    """订阅过滤引擎：缓存编译结果并维护逐订阅的限频/合并状态"""
+
+    def __init__(self):
+        self._compiled: Dict[str, Optional[SubscriptionFilter]] = {}
+        self._states: Dict[StateKey, _DeliveryState] = {}
+        self._pending: set = set()
+        self.stats: Dict[str, int] = {
+            "passed": 0,
+            "suppressed_volume": 0,
+            "suppressed_change": 0,
+            "conflated": 0,
+            "dropped": 0,
+            "flushed": 0,
+        }
+
+    def get_filter(self, subscription: Subscription) -> Optional[SubscriptionFilter]:
+        """获取订阅的编译过滤器（按订阅ID缓存）"""
+        subscription_id = subscription.subscription_id
+        try:
+            return self._compiled[subscription_id]
+        except KeyError:
+            pass
+        try:
+            compiled = compile_filter(subscription.filters)
+        except ValueError as e:
+            # 订阅时已校验，这里只可能是绕过校验直接写入的订阅
+            logger.warning(f"订阅过滤条件无效，按无过滤处理 {subscription_id}: {e}")
+            compiled = None
+        self._compiled[subscription_id] = compiled
+        return compiled
+
+    def should_send(
+        self,
+        subscription: Subscription,
+        compiled: SubscriptionFilter,
+        symbol: str,
+        data_type: DataType,
+        data: Dict[str, Any],
+        now: float
+    ) -> bool:
+        """
+        判断本次更新是否立即推送给该订阅
+
+        限频期间的更新在 conflate 开启时保存为待推送的最新值，由 drain_due 取出。
+        """
+        if compiled.min_volume:
+            volume = data.get("volume")
+            if volume is not None and volume < compiled.min_volume:
+                self.stats["suppressed_volume"] += 1
+                return False
+
+        key = (subscription.subscription_id, symbol, data_type)
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _DeliveryState()
+
+        if (compiled.min_change or compiled.min_change_percent) and state.last_price is not None:
+            price = _price_of(data)
+            if price is not None:
+                delta = abs(price - state.last_price)
+                if delta < compiled.min_change or (
+                        state.last_price and
+                        delta / abs(state.last_price) * 100 < compiled.min_change_percent):
+                    self.stats["suppressed_change"] += 1
+                    return False
+
+        if now - state.last_sent < compiled.min_interval:
+            if compiled.conflate:
+                state.pending = data
+                self._pending.add(key)
+                self.stats["conflated"] += 1
+            else:
+                self.stats["dropped"] += 1
+            return False
+
+        self._mark_sent(key, state, data, now)
+        self.stats["passed"] += 1
+        return True
+
+    def drain_due(self, now: float) -> List[Tuple[str, str, DataType, Dict[str, Any]]]:
+        """
+        取出已到推送时间的合并更新
+
+        Returns:
+            [(subscription_id, symbol, data_type, data), ...]
+        """
+        due = []
+        for key in list(self._pending):
+            state = self._states.get(key)
+            if state is None or state.pending is None:
+                self._pending.discard(key)
+                continue
+            compiled = self._compiled.get(key[0])
+            interval = compiled.min_interval if compiled else 0.0
+            if now - state.last_sent < interval:
+                continue
+            data = state.pending
+            self._mark_sent(key, state, data, now)
+            due.append((key[0], key[1], key[2], data))
+        self.stats["flushed"] += len(due)
+        return due
+
+    def _mark_sent(self, key: StateKey, state: _DeliveryState, data: Dict[str, Any], now: float):
+        state.last_sent = now
+        state.pending = None
+        self._pending.discard(key)
+        price = _price_of(data)
+        if price is not None:
+            state.last_price = price
+
+    def prune(self, active_subscription_ids: Iterable[str]):
+        """清理已取消订阅的编译结果和推送状态"""
+        active = set(active_subscription_ids)
+        for subscription_id in [s for s in self._compiled if s not in active]:
+            del self._compiled[subscription_id]
+        for key in [k for k in self._states if k[0] not in active]:
+            del self._states[key]
+            self._pending.discard(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取过滤统计"""
+        return {
+            **self.stats,
+            "filtered_subscriptions": sum(1 for f in self._compiled.values() if f is not None),
+            "delivery_states": len(self._states),
+            "pending_conflated": len(self._pending),
+        }
+
+
+__all__ = [
+    "SubscriptionFilter",
+    "SubscriptionFilterEngine",
+    "compile_filter",
+]
@@ -5,13 +5,17 @@ WebSocket 实时数据系统 - 订阅管理器
 
 import asyncio
 import logging
-from typing import Dict, List, Optional, Any, Set
+from typing import Dict, List, Optional, Any, Set, Tuple
 from datetime import datetime, timedelta
 from .websocket_models import (
     Subscription, SubscriptionRequest, SubscriptionResponse, 
     SubscriptionStatus, DataType, ErrorMessage, WebSocketMessage,
     MessageType
 )
+from .subscription_filters import compile_filter
+from .symbol_groups import (
+    GroupType, SymbolGroup, SymbolGroupResolver, get_symbol_group_resolver, parse_group
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +23,11 @@ logger = logging.getLogger(__name__)
 class SubscriptionManager:
     """订阅管理器 - 管理客户端的数据订阅和推送配置"""
     
-    def __init__(self, max_subscriptions_per_client: int = 100):
+    def __init__(
+        self,
+        max_subscriptions_per_client: int = 100,
+        group_resolver: Optional[SymbolGroupResolver] = None
+    ):
         self.max_subscriptions_per_client = max_subscriptions_per_client
         
         # 存储结构
@@ -28,6 +36,14 @@ class SubscriptionManager:
         self.symbol_subscribers: Dict[str, Dict[DataType, Set[str]]] = {}  # symbol -> data_type -> set of subscription_ids
         self.symbol_data_types: Dict[str, Set[DataType]] = {}  # symbol -> set of data_types
         
+        # 分组订阅：一个分组只存一条订阅，推送时按成分表惰性展开
+        self.group_resolver = group_resolver or get_symbol_group_resolver()
+        self.group_subscribers: Dict[str, Dict[DataType, Set[str]]] = {}  # group_key -> data_type -> set of subscription_ids
+        self.groups: Dict[str, SymbolGroup] = {}  # group_key -> SymbolGroup
+        self._groups_version = 0
+        self._membership_cache: Dict[str, Tuple[str, ...]] = {}  # symbol -> 命中的 group_key
+        self._membership_version: Tuple[int, int] = (-1, -1)
+        
         # 限制和验证
         self.subscription_limits: Dict[str, int] = {}  # client_id -> current subscription count
         self._lock = asyncio.Lock()
@@ -82,10 +98,40 @@ class SubscriptionManager:
                     client_id=client_id
                 )
             
+            # 验证过滤条件
+            try:
+                compile_filter(subscription_request.filters)
+            except ValueError as e:
+                return SubscriptionResponse(
+                    subscription_id="",
+                    status=SubscriptionStatus.ERROR,
+                    message=f"无效的过滤条件: {e}",
+                    symbol=subscription_request.symbol,
+                    data_type=subscription_request.data_type,
+                    client_id=client_id
+                )
+            
+            # 分组订阅：成分表在锁外解析（可能访问数据源）
+            group = parse_group(subscription_request.symbol)
+            group_size = None
+            symbol = group.key if group else subscription_request.symbol.upper()
+            if group:
+                members = await self._resolve_group(group)
+                if not members:
+                    return SubscriptionResponse(
+                        subscription_id="",
+                        status=SubscriptionStatus.ERROR,
+                        message=f"未找到板块/指数成分: {subscription_request.symbol}",
+                        symbol=subscription_request.symbol,
+                        data_type=subscription_request.data_type,
+                        client_id=client_id
+                    )
+                group_size = len(members)
+            
             # 检查是否已经订阅
             existing_subscription = await self._find_existing_subscription(
                 client_id, 
-                subscription_request.symbol, 
+                symbol, 
                 subscription_request.data_type,
                 subscription_request.frequency
             )
@@ -97,18 +143,20 @@ class SubscriptionManager:
                     message="该订阅已存在",
                     symbol=subscription_request.symbol,
                     data_type=subscription_request.data_type,
-                    client_id=client_id
+                    client_id=client_id,
+                    group_size=group_size
                 )
             
             # 创建新的订阅
             subscription = Subscription(
                 subscription_id=self._generate_subscription_id(),
                 client_id=client_id,
-                symbol=subscription_request.symbol.upper(),
+                symbol=symbol,
                 data_type=subscription_request.data_type,
                 frequency=subscription_request.frequency,
                 filters=subscription_request.filters,
-                status=SubscriptionStatus.ACTIVE
+                status=SubscriptionStatus.ACTIVE,
+                group_type=group.group_type.value if group else None
             )
             
             async with self._lock:
@@ -119,18 +167,26 @@ class SubscriptionManager:
                     self.client_subscriptions[client_id] = set()
                 self.client_subscriptions[client_id].add(subscription.subscription_id)
                 
-                symbol = subscription.symbol
-                if symbol not in self.symbol_subscribers:
-                    self.symbol_subscribers[symbol] = {}
-                    self.symbol_data_types[symbol] = set()
-                
-                if subscription.data_type not in self.symbol_subscribers[symbol]:
-                    self.symbol_subscribers[symbol][subscription.data_type] = set()
-                
-                self.symbol_subscribers[symbol][subscription.data_type].add(subscription.subscription_id)
-                self.symbol_data_types[symbol].add(subscription.data_type)
+                if group:
+                    if symbol not in self.group_subscribers:
+                        self.group_subscribers[symbol] = {}
+                        self.groups[symbol] = group
+                        self._groups_version += 1
+                    self.group_subscribers[symbol].setdefault(
+                        subscription.data_type, set()
+                    ).add(subscription.subscription_id)
+                else:
+                    if symbol not in self.symbol_subscribers:
+                        self.symbol_subscribers[symbol] = {}
+                        self.symbol_data_types[symbol] = set()
+                    
+                    if subscription.data_type not in self.symbol_subscribers[symbol]:
+                        self.symbol_subscribers[symbol][subscription.data_type] = set()
+                    
+                    self.symbol_subscribers[symbol][subscription.data_type].add(subscription.subscription_id)
+                    self.symbol_data_types[symbol].add(subscription.data_type)
                 
-                # 更新客户端订阅计数
+                # 更新客户端订阅计数（分组订阅只计一次）
                 self.subscription_limits[client_id] = current_count + 1
             
             logger.info(f"Client {client_id} subscribed to {subscription.symbol} {subscription.data_type}")
@@ -141,7 +197,8 @@ class SubscriptionManager:
                 message="订阅成功",
                 symbol=subscription.symbol,
                 data_type=subscription.data_type,
-                client_id=client_id
+                client_id=client_id,
+                group_size=group_size
             )
             
         except Exception as e:
@@ -197,8 +254,20 @@ class SubscriptionManager:
                     if not self.client_subscriptions[client_id]:
                         del self.client_subscriptions[client_id]
                 
+                # 从分组订阅者中移除
+                if subscription.group_type:
+                    group_entry = self.group_subscribers.get(symbol)
+                    if group_entry and data_type in group_entry:
+                        group_entry[data_type].discard(subscription_id)
+                        if not group_entry[data_type]:
+                            del group_entry[data_type]
+                        if not group_entry:
+                            del self.group_subscribers[symbol]
+                            self.groups.pop(symbol, None)
+                            self._groups_version += 1
+                
                 # 从股票订阅者中移除
-                if symbol in self.symbol_subscribers and data_type in self.symbol_subscribers[symbol]:
+                elif symbol in self.symbol_subscribers and data_type in self.symbol_subscribers[symbol]:
                     self.symbol_subscribers[symbol][data_type].discard(subscription_id)
                     
                     # 清理空的集合
@@ -273,24 +342,127 @@ class SubscriptionManager:
             symbol = symbol.upper()
             
             async with self._lock:
-                if symbol not in self.symbol_subscribers or data_type not in self.symbol_subscribers[symbol]:
-                    return []
+                client_ids = set()
+                for subscription_ids in self._iter_subscription_sets(symbol, data_type):
+                    for subscription_id in subscription_ids:
+                        subscription = self.subscriptions.get(subscription_id)
+                        if subscription and subscription.status == SubscriptionStatus.ACTIVE:
+                            client_ids.add(subscription.client_id)
                 
-                subscription_ids = self.symbol_subscribers[symbol][data_type]
-                client_ids = []
+                return list(client_ids)  # 去重
                 
-                for subscription_id in subscription_ids:
-                    if subscription_id in self.subscriptions:
-                        subscription = self.subscriptions[subscription_id]
-                        if subscription.status == SubscriptionStatus.ACTIVE:
-                            client_ids.append(subscription.client_id)
+        except Exception as e:
+            logger.error(f"Error getting subscribers for {symbol} {data_type}: {e}")
+            return []
+    
+    async def get_subscriptions_for(
+        self,
+        symbol: str,
+        data_type: DataType
+    ) -> List[Subscription]:
+        """
+        获取指定股票和数据类型的有效订阅（含分组订阅），供按订阅过滤推送
+        
+        Args:
+            symbol: 股票代码
+            data_type: 数据类型
+            
+        Returns:
+            List[Subscription]: 订阅列表
+        """
+        try:
+            symbol = symbol.upper()
+            
+            async with self._lock:
+                subscriptions = []
+                for subscription_ids in self._iter_subscription_sets(symbol, data_type):
+                    for subscription_id in subscription_ids:
+                        subscription = self.subscriptions.get(subscription_id)
+                        if subscription and subscription.status == SubscriptionStatus.ACTIVE:
+                            subscriptions.append(subscription)
+                return subscriptions
                 
-                return list(set(client_ids))  # 去重
+        except Exception as e:
+            logger.error(f"Error getting subscriptions for {symbol} {data_type}: {e}")
+            return []
+    
+    async def get_kline_subscribers(
+        self,
+        symbol: str,
+        frequency: str,
+        default_frequency: str = "1m"
+    ) -> List[str]:
+        """
+        获取订阅了指定股票某一K线周期的客户端列表
+        
+        Args:
+            symbol: 股票代码
+            frequency: K线周期
+            default_frequency: 未指定周期的KLINE订阅视为该周期
+        
+        Returns:
+            List[str]: 客户端ID列表
+        """
+        try:
+            symbol = symbol.upper()
+            
+            async with self._lock:
+                client_ids = set()
+                for subscription_ids in self._iter_subscription_sets(symbol, DataType.KLINE):
+                    for subscription_id in subscription_ids:
+                        subscription = self.subscriptions.get(subscription_id)
+                        if (subscription and subscription.status == SubscriptionStatus.ACTIVE and
+                                (subscription.frequency or default_frequency) == frequency):
+                            client_ids.add(subscription.client_id)
                 
+                return list(client_ids)
+        
         except Exception as e:
-            logger.error(f"Error getting subscribers for {symbol} {data_type}: {e}")
+            logger.error(f"Error getting kline subscribers for {symbol} {frequency}: {e}")
             return []
     
+    async def get_active_symbols(self) -> Set[str]:
+        """
+        获取需要推送的全部股票代码（直接订阅 + 分组成分展开）
+        
+        Returns:
+            Set[str]: 股票代码集合
+        """
+        await self.refresh_groups()
+        async with self._lock:
+            symbols = set(self.symbol_subscribers)
+            for group in self.groups.values():
+                symbols.update(self.group_resolver.cached(group))
+            return symbols
+    
+    def get_symbol_data_types(self, symbol: str) -> Set[DataType]:
+        """
+        获取股票被订阅的数据类型（含分组订阅）
+        
+        Args:
+            symbol: 股票代码
+            
+        Returns:
+            Set[DataType]: 数据类型集合
+        """
+        symbol = symbol.upper()
+        data_types = set(self.symbol_data_types.get(symbol, ()))
+        for group_key in self._matching_groups(symbol):
+            data_types.update(self.group_subscribers.get(group_key, ()))
+        return data_types
+    
+    async def refresh_groups(self, force: bool = False):
+        """
+        刷新已订阅分组中过期的成分表
+        
+        Args:
+            force: 忽略缓存有效期全部重新加载
+        """
+        groups = [g for g in list(self.groups.values())
+                  if force or self.group_resolver.is_stale(g)]
+        for group in groups:
+            await self._resolve_group(group, force)
+
     async def get_client_subscriptions(
         self,
         client_id: str
@@ -345,8 +517,10 @@ class SubscriptionManager:
                     "total_subscriptions": len(self.subscriptions),
                     "active_clients": len(self.client_subscriptions),
                     "subscribed_symbols": len(self.symbol_subscribers),
+                    "subscribed_groups": len(self.groups),
                     "subscriptions_per_data_type": {},
                     "subscriptions_per_symbol": {},
+                    "group_subscriptions": {},
                     "client_subscription_counts": {}
                 }
                 
@@ -364,6 +538,13 @@ class SubscriptionManager:
                             total_subscriptions += len(self.symbol_subscribers[symbol][data_type])
                     stats["subscriptions_per_symbol"][symbol] = total_subscriptions
                 
+                # 按分组统计
+                for group_key, by_type in self.group_subscribers.items():
+                    stats["group_subscriptions"][group_key] = {
+                        "subscriptions": sum(len(ids) for ids in by_type.values()),
+                        "constituents": len(self.group_resolver.cached(self.groups[group_key]))
+                    }
+                
                 # 客户端订阅数量
                 for client_id, count in self.subscription_limits.items():
                     stats["client_subscription_counts"][client_id] = count
@@ -400,12 +581,19 @@ class SubscriptionManager:
         
         # 验证频率
         if subscription_request.data_type == DataType.KLINE and subscription_request.frequency:
-            valid_frequencies = ["1m", "5m", "15m", "30m", "1h", "1d", "1w", "1M"]
+            valid_frequencies = ["1m", "5m", "15m", "30m", "1h", "2h", "4h", "1d", "1w", "1M"]
             if subscription_request.frequency not in valid_frequencies:
                 errors.append(f"无效的K线周期: {subscription_request.frequency}")
         
-        # 检查警告
-        if subscription_request.symbol.upper() not in await self._get_available_symbols():
+        # 验证过滤条件
+        try:
+            compile_filter(subscription_request.filters)
+        except ValueError as e:
+            errors.append(f"无效的过滤条件: {e}")
+        
+        # 检查警告（分组在订阅时解析成分，这里不检查）
+        if (parse_group(subscription_request.symbol) is None and
+                subscription_request.symbol.upper() not in await self._get_available_symbols()):
             warnings.append(f"股票代码可能不存在: {subscription_request.symbol}")
         
         return {
@@ -424,14 +612,18 @@ class SubscriptionManager:
         if not symbol:
             return False
         
+        # 板块/指数/通配分组
+        if parse_group(symbol) is not None:
+            return True
+        
         symbol = symbol.upper()
         
         # 基本的股票代码格式验证
         # 支持A股、港股、美股等格式
         import re
         
-        # A股: 6位数字，以0、3、6开头
-        a_share_pattern = r'^(0|3|6)\d{5}$'
+        # A股: 6位数字，以0、3、6开头，可带交易所后缀（xtquant格式，如 000001.SZ）
+        a_share_pattern = r'^(0|3|6)\d{5}(\.(SH|SZ))?$'
         
         # 港股: 1-5位数字
         hk_pattern = r'^\d{1,5}$'
@@ -443,6 +635,45 @@ class SubscriptionManager:
                    re.match(hk_pattern, symbol) or 
                    re.match(us_pattern, symbol))
     
+    async def _resolve_group(self, group: SymbolGroup, force_refresh: bool = False):
+        """在线程池中解析分组成分，避免阻塞事件循环"""
+        if not force_refresh and not self.group_resolver.is_stale(group):
+            return self.group_resolver.cached(group)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.group_resolver.resolve, group, force_refresh)
+    
+    def _matching_groups(self, symbol: str) -> Tuple[str, ...]:
+        """股票命中的已订阅分组（按订阅分组版本和成分表版本缓存）"""
+        version = (self._groups_version, self.group_resolver.version)
+        if version != self._membership_version:
+            self._membership_cache.clear()
+            self._membership_version = version
+        
+        matched = self._membership_cache.get(symbol)
+        if matched is None:
+            keys = []
+            for group_key, group in self.groups.items():
+                if group.group_type == GroupType.WILDCARD:
+                    hit = group.matches(symbol)
+                else:
+                    hit = symbol in self.group_resolver.cached(group)
+                if hit:
+                    keys.append(group_key)
+            matched = tuple(keys)
+            self._membership_cache[symbol] = matched
+        return matched
+    
+    def _iter_subscription_sets(self, symbol: str, data_type: DataType):
+        """直接订阅与命中分组的订阅ID集合"""
+        direct = self.symbol_subscribers.get(symbol)
+        if direct and data_type in direct:
+            yield direct[data_type]
+        if self.groups:
+            for group_key in self._matching_groups(symbol):
+                subscription_ids = self.group_subscribers[group_key].get(data_type)
+                if subscription_ids:
+                    yield subscription_ids
+    
     async def _find_existing_subscription(
         self,
         client_id: str,
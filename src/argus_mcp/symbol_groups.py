@@ -0,0 +1,202 @@
+"""
+WebSocket 实时数据系统 - 股票分组解析
+支持按板块、指数成分和交易所前缀通配符订阅一组股票：
+
+    sector:沪深300      板块成分（xtdata.get_stock_list_in_sector）
+    index:000300.SH     指数成分（优先 xtdata.get_index_weight，其次按指数名称查板块）
+    *.SZ / 300*.SZ      交易所后缀 + 代码前缀通配
+
+成分表在本地缓存（默认24小时），数据源失败时继续使用上一份成分表。
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 常用指数代码 -> 板块名称（xtquant 板块数据中的指数成分板块）
+INDEX_SECTORS: Dict[str, str] = {
+    "000016.SH": "上证50",
+    "000300.SH": "沪深300",
+    "000905.SH": "中证500",
+    "000852.SH": "中证1000",
+    "399006.SZ": "创业板指",
+    "000688.SH": "科创50",
+}
+
+# 通配符展开时使用的全市场板块
+UNIVERSE_SECTOR = "沪深A股"
+
+
+class GroupType(str, Enum):
+    """分组类型"""
+    SECTOR = "sector"
+    INDEX = "index"
+    WILDCARD = "wildcard"
+
+
+@dataclass(frozen=True)
+class SymbolGroup:
+    """解析后的分组订阅目标"""
+    group_type: GroupType
+    name: str  # 板块名 / 指数代码 / 通配表达式
+
+    @property
+    def key(self) -> str:
+        """规范化的分组键，作为订阅的 symbol 存储"""
+        if self.group_type == GroupType.WILDCARD:
+            return self.name
+        return f"{self.group_type.value.upper()}:{self.name}"
+
+    def wildcard_parts(self) -> Tuple[str, str]:
+        """通配表达式拆分为 (代码前缀, 交易所后缀)"""
+        code, _, exchange = self.name.partition(".")
+        return code.rstrip("*"), exchange
+
+    def matches(self, symbol: str) -> bool:
+        """通配分组直接按代码判断是否匹配（无需展开）"""
+        prefix, exchange = self.wildcard_parts()
+        code, _, symbol_exchange = symbol.partition(".")
+        return symbol_exchange == exchange and code.startswith(prefix)
+
+
+def parse_group(expression: str) -> Optional[SymbolGroup]:
+    """
+    解析分组表达式
+
+    Returns:
+        SymbolGroup，普通股票代码返回None
+    """
+    if not expression:
+        return None
+    text = expression.strip()
+    head, sep, tail = text.partition(":")
+    if sep:
+        kind = head.strip().lower()
+        tail = tail.strip()
+        if not tail:
+            return None
+        if kind == GroupType.SECTOR.value:
+            return SymbolGroup(GroupType.SECTOR, tail)
+        if kind == GroupType.INDEX.value:
+            return SymbolGroup(GroupType.INDEX, tail.upper())
+        return None
+
+    if "*" in text:
+        code, dot, exchange = text.upper().partition(".")
+        # 只支持“代码前缀*.交易所”形式，如 *.SZ、600*.SH
+        if (dot and exchange in ("SH", "SZ", "BJ") and code.endswith("*")
+                and code.count("*") == 1 and (code == "*" or code[:-1].isdigit())):
+            return SymbolGroup(GroupType.WILDCARD, f"{code}.{exchange}")
+    return None
+
+
+def _default_loader(group: SymbolGroup) -> List[str]:
+    """从 xtquant（或已安装的模拟后端）获取分组成分"""
+    from xtquant import xtdata
+
+    if group.group_type == GroupType.SECTOR:
+        return list(xtdata.get_stock_list_in_sector(group.name) or [])
+
+    if group.group_type == GroupType.INDEX:
+        get_index_weight = getattr(xtdata, "get_index_weight", None)
+        if get_index_weight is not None:
+            try:
+                weights = get_index_weight(group.name)
+                if weights:
+                    return list(weights)
+            except Exception as e:
+                logger.debug(f"获取指数权重失败 {group.name}: {e}")
+        sector = INDEX_SECTORS.get(group.name)
+        if sector:
+            return list(xtdata.get_stock_list_in_sector(sector) or [])
+        return []
+
+    prefix, exchange = group.wildcard_parts()
+    universe = xtdata.get_stock_list_in_sector(UNIVERSE_SECTOR) or []
+    return [s for s in universe if s.endswith(f".{exchange}") and s.startswith(prefix)]
+
+
+class SymbolGroupResolver:
+    """分组成分解析器（带本地缓存的成分表）"""
+
+    def __init__(
+        self,
+        loader: Optional[Callable[[SymbolGroup], List[str]]] = None,
+        ttl_seconds: float = 24 * 3600
+    ):
+        self.loader = loader or _default_loader
+        self.ttl_seconds = ttl_seconds
+        self._table: Dict[str, Tuple[FrozenSet[str], float]] = {}
+        self._lock = threading.Lock()
+        # 成分表任何变化都会递增版本号，订阅索引据此失效成员缓存
+        self.version = 0
+
+    def resolve(self, group: SymbolGroup, force_refresh: bool = False) -> FrozenSet[str]:
+        """
+        获取分组成分（阻塞调用，异步代码中应放入线程池）
+
+        Args:
+            group: 分组
+            force_refresh: 忽略缓存重新加载
+        """
+        now = time.monotonic()
+        cached = self._table.get(group.key)
+        if cached and not force_refresh and now - cached[1] < self.ttl_seconds:
+            return cached[0]
+
+        try:
+            members = frozenset(s.upper() for s in self.loader(group))
+        except Exception as e:
+            if cached:
+                logger.warning(f"刷新分组成分失败，继续使用缓存 {group.key}: {e}")
+                return cached[0]
+            logger.error(f"获取分组成分失败 {group.key}: {e}")
+            return frozenset()
+
+        with self._lock:
+            previous = self._table.get(group.key)
+            self._table[group.key] = (members, now)
+            if previous is None or previous[0] != members:
+                self.version += 1
+        return members
+
+    def is_stale(self, group: SymbolGroup) -> bool:
+        """缓存是否缺失或过期"""
+        cached = self._table.get(group.key)
+        return cached is None or time.monotonic() - cached[1] >= self.ttl_seconds
+
+    def cached(self, group: SymbolGroup) -> FrozenSet[str]:
+        """只读缓存中的成分（不触发加载）"""
+        entry = self._table.get(group.key)
+        return entry[0] if entry else frozenset()
+
+    def set_constituents(self, group: SymbolGroup, symbols: List[str]):
+        """手工写入成分表（离线数据或测试使用）"""
+        with self._lock:
+            self._table[group.key] = (frozenset(s.upper() for s in symbols), time.monotonic())
+            self.version += 1
+
+    def invalidate(self, group: Optional[SymbolGroup] = None):
+        """使缓存失效，下次 resolve 时重新加载"""
+        with self._lock:
+            if group is None:
+                self._table.clear()
+            else:
+                self._table.pop(group.key, None)
+            self.version += 1
+
+
+_symbol_group_resolver: Optional[SymbolGroupResolver] = None
+
+
+def get_symbol_group_resolver() -> SymbolGroupResolver:
+    """获取全局分组解析器"""
+    global _symbol_group_resolver
+    if _symbol_group_resolver is None:
+        _symbol_group_resolver = SymbolGroupResolver()
+    return _symbol_group_resolver
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+历史数据API测试：实时合成K线与数据源历史K线按交易所时间合并
+"""
+
+import asyncio
+from datetime import datetime
+from decimal import Decimal
+from types import SimpleNamespace
+
+import pandas as pd
+
+from .api.enhanced_historical_api import EnhancedHistoricalDataAPI, HistoricalDataRequest
+from .cache.historical_data_cache import HistoricalDataCache
+from .data_models.historical_data import StandardKLineData, SupportedPeriod
+from .streaming_bar_builder import EXCHANGE_TZ
+
+SYMBOL = "600000.SH"
+
+
+def _source_frame(labels):
+    """xtquant 风格的返回值：索引为交易所本地时间字符串"""
+    rows = [{"open": 10.0, "high": 10.2, "low": 9.9, "close": 10.1, "volume": 1000, "amount": 10100.0}
+            for _ in labels]
+    return {SYMBOL: pd.DataFrame(rows, index=labels)}
+
+
+def _live_bar(timestamp: datetime) -> StandardKLineData:
+    # 实时K线以交易所本地时间（无时区）保存
+    return StandardKLineData(
+        timestamp=timestamp, open=Decimal("10.1"), high=Decimal("10.3"), low=Decimal("10.0"),
+        close=Decimal("10.2"), volume=500, amount=Decimal("5100"), code=SYMBOL
+    )
+
+
+def _api(source_labels, live_timestamps) -> EnhancedHistoricalDataAPI:
+    api = EnhancedHistoricalDataAPI()
+    api.cache = HistoricalDataCache()
+    xtdata = SimpleNamespace(get_market_data_ex=lambda **kwargs: _source_frame(source_labels))
+    api._import_xtdata = lambda: xtdata
+
+    async def seed():
+        for timestamp in live_timestamps:
+            await api.cache.append_live_bar(SYMBOL, SupportedPeriod.MINUTE_1.value, _live_bar(timestamp))
+    asyncio.run(seed())
+    return api
+
+
+def _request() -> HistoricalDataRequest:
+    return HistoricalDataRequest(
+        symbol=SYMBOL, start_date="2024-01-02", end_date="2024-01-03",
+        period=SupportedPeriod.MINUTE_1, include_quality_metrics=False, use_cache=False
+    )
+
+
+def _timestamps(response):
+    return [datetime.fromisoformat(item["timestamp"]) for item in response.data]
+
+
+def test_live_bars_merge_onto_prior_day_tail():
+    api = _api(
+        ["20240102145900", "20240102150000"],
+        [datetime(2024, 1, 2, 15, 0), datetime(2024, 1, 3, 9, 31), datetime(2024, 1, 3, 9, 32)]
+    )
+
+    response = asyncio.run(api.get_historical_data(_request()))
+
+    assert response.success
+    assert _timestamps(response) == [
+        datetime(2024, 1, 2, 14, 59, tzinfo=EXCHANGE_TZ),
+        datetime(2024, 1, 2, 15, 0, tzinfo=EXCHANGE_TZ),
+        datetime(2024, 1, 3, 9, 31, tzinfo=EXCHANGE_TZ),
+        datetime(2024, 1, 3, 9, 32, tzinfo=EXCHANGE_TZ),
+    ]
+
+
+def test_live_bar_right_after_intraday_tail_is_kept():
+    api = _api(
+        ["20240103102900", "20240103103000"],
+        [datetime(2024, 1, 3, 10, 30), datetime(2024, 1, 3, 10, 31)]
+    )
+
+    response = asyncio.run(api.get_historical_data(_request()))
+
+    assert _timestamps(response)[-2:] == [
+        datetime(2024, 1, 3, 10, 30, tzinfo=EXCHANGE_TZ),
+        datetime(2024, 1, 3, 10, 31, tzinfo=EXCHANGE_TZ),
+    ]
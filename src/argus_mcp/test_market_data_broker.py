@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+跨进程行情分发测试：按关注频道过滤、producer 每周期只拉取一次、慢消费者丢弃、
+重连后重新上报关注频道，以及 consumer 沿用 producer 分配的频道序号
+"""
+
+import asyncio
+import os
+import tempfile
+
+from .data_publisher import DataPublisher, DataSourceConfig
+from .market_data_broker import InProcessBroker, UnixSocketBrokerClient, UnixSocketBrokerServer
+from .replay_buffer import channel_key
+from .subscription_manager import SubscriptionManager
+from .websocket_models import DataType, SubscriptionRequest
+
+
+async def _wait_for(condition, timeout: float = 2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(0.005)
+
+
+def _updates(*channels, seq=None):
+    return [(symbol, data_type, {"symbol": symbol, "data_type": data_type}, seq)
+            for symbol, data_type in channels]
+
+
+class _RecordingConnections:
+    """记录推送消息的连接管理器替身"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def broadcast_message(self, message, client_ids):
+        self.messages.append((message.data, list(client_ids)))
+
+
+class _CountingPublisher(DataPublisher):
+    """统计每个频道拉取次数的数据推送服务"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetches = {}
+
+    async def _fetch_data(self, symbol, data_type):
+        key = (symbol, data_type.value)
+        self.fetches[key] = self.fetches.get(key, 0) + 1
+        return {"symbol": symbol, "price": 10.0 + self.fetches[key]}
+
+
+async def _publisher(role, broker, subscriptions):
+    manager = SubscriptionManager()
+    for client_id, symbol, data_type in subscriptions:
+        await manager.subscribe(client_id, SubscriptionRequest(symbol=symbol, data_type=data_type))
+    config = DataSourceConfig(source_type="mock", broker_role=role, delta_data_types=())
+    return _CountingPublisher(manager, _RecordingConnections(), config, broker=broker)
+
+
+def test_inprocess_broker_delivers_only_each_consumers_channels():
+    async def run():
+        broker = InProcessBroker()
+        first, second = broker.connect(), broker.connect()
+        for consumer in (first, second):
+            await consumer.start()
+        await first.set_interest({"600000.SH": ["quote"], "000001.SZ": ["trade"]})
+        await second.set_interest({"600000.SH": ["quote", "depth"]})
+
+        assert broker.get_interest() == {
+            "600000.SH": {"quote", "depth"}, "000001.SZ": {"trade"}
+        }
+        delivered = await broker.publish(_updates(
+            ("600000.SH", "quote"), ("600000.SH", "depth"), ("000001.SZ", "trade"), ("000002.SZ", "quote")
+        ))
+
+        assert delivered == 2
+        assert [update[:2] for update in await first.receive()] == [("600000.SH", "quote"), ("000001.SZ", "trade")]
+        assert [update[:2] for update in await second.receive()] == [("600000.SH", "quote"), ("600000.SH", "depth")]
+
+        # 没有关注频道的周期不投递
+        assert await broker.publish(_updates(("000002.SZ", "quote"))) == 0
+        assert first.get_stats()["pending"] == second.get_stats()["pending"] == 0
+
+    asyncio.run(run())
+
+
+def test_unix_socket_broker_filters_by_interest():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            server = UnixSocketBrokerServer(os.path.join(tmp, "md.sock"))
+            await server.start()
+            first, second = UnixSocketBrokerClient(server.path), UnixSocketBrokerClient(server.path)
+            for client in (first, second):
+                await client.start()
+            await first.set_interest({"600000.SH": ["quote"]})
+            await second.set_interest({"000001.SZ": ["trade"]})
+            await _wait_for(lambda: server.get_interest() == {"600000.SH": {"quote"}, "000001.SZ": {"trade"}})
+
+            assert await server.publish(_updates(("600000.SH", "quote"), ("000001.SZ", "trade"), seq=7)) == 2
+            assert await first.receive() == _updates(("600000.SH", "quote"), seq=7)
+            assert await second.receive() == _updates(("000001.SZ", "trade"), seq=7)
+
+            for client in (first, second):
+                await client.stop()
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_producer_fetches_each_channel_once_per_cycle():
+    async def run():
+        broker = InProcessBroker()
+        consumers = [broker.connect(), broker.connect()]
+        for consumer in consumers:
+            await consumer.start()
+        # 两个 worker 的订阅重叠，producer 本身也有订阅
+        await consumers[0].set_interest({"600000.SH": ["trade"], "000001.SZ": ["trade"]})
+        await consumers[1].set_interest({"600000.SH": ["trade"]})
+        producer = await _publisher("producer", broker, [("local", "600000.SH", DataType.TRADE)])
+
+        for _ in range(3):
+            await producer._run_update_cycle()
+
+        assert producer.fetches == {("600000.SH", "trade"): 3, ("000001.SZ", "trade"): 3}
+        assert broker.stats["published_cycles"] == 3
+        assert consumers[0].stats["dropped_cycles"] == 0
+        assert [len(await consumers[0].receive()) for _ in range(3)] == [2, 2, 2]
+        assert [len(await consumers[1].receive()) for _ in range(3)] == [1, 1, 1]
+
+    asyncio.run(run())
+
+
+def test_slow_consumer_drops_oldest_cycles():
+    async def run():
+        broker = InProcessBroker(max_pending=2)
+        slow, fast = broker.connect(), broker.connect()
+        for consumer in (slow, fast):
+            await consumer.start()
+            await consumer.set_interest({"600000.SH": ["trade"]})
+
+        for seq in range(1, 6):
+            await broker.publish(_updates(("600000.SH", "trade"), seq=seq))
+            await fast.receive()
+
+        # 积压有界，只保留最新的两个周期
+        assert slow.stats["dropped_cycles"] == 3
+        assert [(await slow.receive())[0][3] for _ in range(2)] == [4, 5]
+        assert fast.stats["dropped_cycles"] == 0
+        assert fast.stats["received_cycles"] == 5
+
+    asyncio.run(run())
+
+
+def test_unix_socket_broker_skips_consumer_with_full_send_buffer():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            server = UnixSocketBrokerServer(os.path.join(tmp, "md.sock"), max_buffer=1024)
+            await server.start()
+            client = UnixSocketBrokerClient(server.path)
+            await client.start()
+            await client.set_interest({"600000.SH": ["trade"]})
+            await _wait_for(lambda: server.get_interest() == {"600000.SH": {"trade"}})
+
+            # consumer 不读取，发送缓冲很快超过上限
+            payload = [("600000.SH", "trade", {"blob": "x" * 1_000_000}, 1)]
+            for _ in range(5):
+                await server.publish(payload)
+
+            assert server.stats["skipped_slow"] > 0
+            assert server.stats["deliveries"] + server.stats["skipped_slow"] == 5
+            await client.stop()
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_client_reports_interest_again_after_reconnect():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "md.sock")
+            server = UnixSocketBrokerServer(path)
+            await server.start()
+            client = UnixSocketBrokerClient(path, reconnect_delay=0.01)
+            await client.start()
+            await client.set_interest({"600000.SH": ["quote", "trade"]})
+            await _wait_for(lambda: server.get_interest() == {"600000.SH": {"quote", "trade"}})
+            receiving = asyncio.create_task(client.receive())
+
+            # producer 重启：新进程不知道任何 consumer 的关注频道
+            await server.stop()
+            server = UnixSocketBrokerServer(path)
+            await server.start()
+            await _wait_for(lambda: server.get_interest() == {"600000.SH": {"quote", "trade"}})
+
+            await server.publish(_updates(("600000.SH", "trade"), seq=1))
+            assert await asyncio.wait_for(receiving, 2.0) == _updates(("600000.SH", "trade"), seq=1)
+            assert client.stats["reconnects"] >= 1
+            await client.stop()
+            await server.stop()
+
+    asyncio.run(run())
+
+
+def test_consumers_reuse_producer_sequence_numbers():
+    async def run():
+        broker = InProcessBroker()
+        producer = await _publisher("producer", broker, [])
+        workers = []
+        for client_id in ("a", "b"):
+            consumer = broker.connect()
+            await consumer.start()
+            worker = await _publisher("consumer", consumer, [(client_id, "600000.SH", DataType.TRADE)])
+            await worker._report_broker_interest(await worker._get_active_symbols())
+            workers.append(worker)
+
+        # 第二个 worker 晚加入：它的本地序号与 producer 不同步
+        for _ in range(3):
+            await producer._run_update_cycle()
+            update = await workers[0].broker.receive()
+            await workers[0]._apply_broker_updates(update)
+        await workers[1].broker.receive()
+        await workers[1].broker.receive()
+        await workers[1]._apply_broker_updates(await workers[1].broker.receive())
+
+        seqs = [[data["seq"] for data, _ in worker.connection_manager.messages] for worker in workers]
+        assert seqs == [[1, 2, 3], [3]]
+        assert all(worker.fetches == {} for worker in workers)
+        # 在 worker a 收到序号2的客户端换到 worker b 后只补发序号3
+        replay = workers[1].replay_buffer.since(channel_key("600000.SH", "trade"), 2)
+        assert [seq for seq, _ in replay] == [3]
+
+    asyncio.run(run())
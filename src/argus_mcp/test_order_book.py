@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+深度订单簿测试：OrderBook.replace -> DepthUpdate -> OrderBookReplica.apply_update 往返，
+校验和不一致与序号缺口时的重新同步
+"""
+
+import random
+
+from .order_book import OrderBook, OrderBookManager, OrderBookReplica, book_checksum
+
+SYMBOL = "000001.SZ"
+
+
+def _random_levels(rng, mid, descending):
+    step = -0.01 if descending else 0.01
+    prices = [round(mid + step * i, 2) for i in range(1, 11)]
+    return [[price, rng.randint(1, 50) * 100] for price in rng.sample(prices, rng.randint(3, 10))]
+
+
+def _synced_replica(book):
+    replica = OrderBookReplica(SYMBOL)
+    assert replica.apply_snapshot(book.snapshot())
+    return replica
+
+
+def test_replace_round_trips_through_replica():
+    rng = random.Random(7)
+    book = OrderBook(SYMBOL)
+    book.replace([[10.0, 500]], [[10.01, 300]])
+    replica = _synced_replica(book)
+
+    for _ in range(200):
+        mid = round(10 + rng.uniform(-0.05, 0.05), 2)
+        update = book.replace(_random_levels(rng, mid, True), _random_levels(rng, mid, False))
+        if update is None:
+            continue
+        assert replica.apply_update(update.to_dict())
+        assert replica.seq == book.seq
+        assert replica.levels() == {"bids": book.snapshot()["bids"], "asks": book.snapshot()["asks"]}
+
+
+def test_replace_emits_per_level_events():
+    book = OrderBook(SYMBOL)
+    first = book.replace([[10.0, 500], [9.99, 200]], [[10.01, 300]], timestamp=1)
+    assert (first.seq, first.prev_seq) == (1, 0)
+
+    update = book.replace([[10.0, 600], [9.98, 100]], [[10.01, 300], [0, 100]], timestamp=2)
+    assert (update.seq, update.prev_seq) == (2, 1)
+    assert sorted(update.events) == sorted([
+        ["b", "u", 10.0, 600.0],
+        ["b", "i", 9.98, 100.0],
+        ["b", "d", 9.99, 0],
+    ])
+    assert update.checksum == book_checksum([[10.0, 600], [9.98, 100]], [[10.01, 300]])
+
+    # 档位不变时不产生增量
+    assert book.replace([[9.98, 100], [10.0, 600]], [[10.01, 300]], timestamp=3) is None
+    assert book.seq == 2
+
+
+def test_checksum_mismatch_requires_resync():
+    book = OrderBook(SYMBOL)
+    book.replace([[10.0, 500]], [[10.01, 300]])
+    replica = _synced_replica(book)
+
+    update = book.replace([[10.0, 400]], [[10.01, 300]]).to_dict()
+    update["checksum"] ^= 1
+    assert not replica.apply_update(update)
+    assert not replica.synced
+
+    # 快照恢复同步后继续应用增量
+    assert replica.apply_snapshot(book.snapshot())
+    assert replica.apply_update(book.replace([[10.0, 300]], [[10.01, 300]]).to_dict())
+
+    snapshot = dict(book.snapshot(), checksum=book.checksum + 1)
+    assert not OrderBookReplica(SYMBOL).apply_snapshot(snapshot)
+
+
+def test_prev_seq_gap_requires_resync():
+    book = OrderBook(SYMBOL)
+    book.replace([[10.0, 500]], [[10.01, 300]])
+    replica = _synced_replica(book)
+
+    book.replace([[10.0, 400]], [[10.01, 300]])  # 客户端漏收
+    missed_next = book.replace([[10.0, 300]], [[10.01, 300]]).to_dict()
+    assert not replica.apply_update(missed_next)
+    assert not replica.synced
+
+    # 未同步时的增量一律拒绝，直到收到快照
+    assert not replica.apply_update(book.replace([[10.0, 200]], [[10.01, 300]]).to_dict())
+    assert replica.apply_snapshot(book.snapshot())
+    assert replica.seq == book.seq
+    assert replica.apply_update(book.replace([[10.0, 100]], [[10.01, 300]]).to_dict())
+
+
+def test_manager_reuses_snapshot_until_next_change():
+    manager = OrderBookManager()
+    assert manager.snapshot(SYMBOL) is None
+
+    manager.update(SYMBOL, [[10.0, 500]], [[10.01, 300]])
+    snapshot = manager.snapshot(SYMBOL)
+    assert manager.snapshot(SYMBOL) is snapshot
+    assert manager.update(SYMBOL, [[10.0, 500]], [[10.01, 300]]) is None
+    assert manager.snapshot(SYMBOL) is snapshot
+
+    manager.update(SYMBOL, [[10.0, 400]], [[10.01, 300]])
+    assert manager.snapshot(SYMBOL)["seq"] == 2
+
+    manager.discard([SYMBOL])
+    assert manager.snapshot(SYMBOL) is None
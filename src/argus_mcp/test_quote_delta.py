@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+行情增量推送测试：QuoteDeltaTracker.plan / DeltaStateBuilder 往返还原
+"""
+
+from .quote_delta import DeltaStateBuilder, QuoteDeltaTracker, compute_delta
+
+SYMBOL = "000001.SZ"
+
+
+def _envelope(data, is_delta):
+    envelope = {"symbol": SYMBOL, "data_type": "quote", "data": data}
+    if is_delta:
+        envelope["delta"] = True
+    return envelope
+
+
+def _deliver(tracker, builders, payload, now, subscription_id="sub-1"):
+    """按 plan 分组推送，返回每个客户端还原出的行情"""
+    recipients = [(client_id, subscription_id) for client_id in builders]
+    received = {}
+    for data, is_delta, client_ids in tracker.plan(recipients, SYMBOL, "quote", payload, now):
+        for client_id in client_ids:
+            received[client_id] = builders[client_id].apply(_envelope(data, is_delta))
+    return received
+
+
+def test_compute_delta():
+    assert compute_delta({"a": 1, "b": 2}, {"a": 1, "b": 3, "c": 4}) == {"b": 3, "c": 4}
+    assert compute_delta({"a": 1}, {"a": 1}) == {}
+    assert compute_delta({"a": 1, "b": 2}, {"a": 1}) is None
+
+
+def test_plan_round_trips_through_state_builder():
+    tracker = QuoteDeltaTracker(keyframe_interval=30.0)
+    builders = {"c1": DeltaStateBuilder(), "c2": DeltaStateBuilder()}
+    quotes = [
+        {"close": 10.0, "volume": 100, "high": 10.0},
+        {"close": 10.1, "volume": 150, "high": 10.1},
+        {"close": 10.1, "volume": 180, "high": 10.1},
+        {"close": 9.9, "volume": 200, "high": 10.1, "low": 9.9},
+    ]
+
+    for now, quote in enumerate(quotes):
+        received = _deliver(tracker, builders, quote, float(now))
+        for envelope in received.values():
+            assert envelope["data"] == quote
+            assert "delta" not in envelope
+
+    assert tracker.stats["keyframes"] == 2
+    assert tracker.stats["deltas"] == 6
+
+
+def test_plan_groups_clients_sharing_a_snapshot():
+    tracker = QuoteDeltaTracker()
+    recipients = [("c1", "sub-1"), ("c2", "sub-2")]
+    tracker.plan(recipients, SYMBOL, "quote", {"close": 10.0, "volume": 100}, 0.0)
+
+    plans = tracker.plan(recipients, SYMBOL, "quote", {"close": 10.2, "volume": 100}, 1.0)
+    assert plans == [({"close": 10.2}, True, ["c1", "c2"])]
+
+
+def test_plan_skips_unchanged_quotes():
+    tracker = QuoteDeltaTracker()
+    quote = {"close": 10.0, "volume": 100}
+    tracker.plan([("c1", "sub-1")], SYMBOL, "quote", quote, 0.0)
+
+    assert tracker.plan([("c1", "sub-1")], SYMBOL, "quote", dict(quote), 1.0) == []
+    assert tracker.stats["unchanged"] == 1
+
+
+def test_plan_sends_keyframe_on_interval_resubscribe_and_removed_field():
+    tracker = QuoteDeltaTracker(keyframe_interval=10.0)
+    tracker.plan([("c1", "sub-1")], SYMBOL, "quote", {"close": 10.0, "volume": 100}, 0.0)
+
+    # 关键帧间隔到期
+    quote = {"close": 10.1, "volume": 100}
+    assert tracker.plan([("c1", "sub-1")], SYMBOL, "quote", quote, 10.0) == [(quote, False, ["c1"])]
+
+    # 重新订阅（订阅ID变化）
+    quote = {"close": 10.2, "volume": 100}
+    assert tracker.plan([("c1", "sub-2")], SYMBOL, "quote", quote, 11.0) == [(quote, False, ["c1"])]
+
+    # 字段被删除无法用增量表达
+    quote = {"close": 10.3}
+    assert tracker.plan([("c1", "sub-2")], SYMBOL, "quote", quote, 12.0) == [(quote, False, ["c1"])]
+    assert tracker.has_snapshot("c1", SYMBOL, "quote", "sub-2")
+
+
+def test_seed_and_reset():
+    tracker = QuoteDeltaTracker()
+    tracker.seed("c1", SYMBOL, "quote", "sub-1", {"close": 10.0}, 0.0)
+    assert tracker.plan([("c1", "sub-1")], SYMBOL, "quote", {"close": 10.5}, 1.0) == \
+        [({"close": 10.5}, True, ["c1"])]
+
+    tracker.reset("c1")
+    assert not tracker.has_snapshot("c1", SYMBOL, "quote", "sub-1")
+    assert tracker.plan([("c1", "sub-1")], SYMBOL, "quote", {"close": 10.6}, 2.0) == \
+        [({"close": 10.6}, False, ["c1"])]
+
+    tracker.prune([])
+    assert tracker.get_stats()["snapshots"] == 0
+
+
+def test_state_builder_waits_for_keyframe_after_reset():
+    builder = DeltaStateBuilder()
+    assert builder.apply(_envelope({"close": 10.1}, True)) is None
+    assert builder.missing_keyframes == 1
+
+    builder.apply(_envelope({"close": 10.0, "volume": 100}, False))
+    assert builder.apply(_envelope({"close": 10.1}, True))["data"] == {"close": 10.1, "volume": 100}
+
+    builder.reset()
+    assert builder.apply(_envelope({"close": 10.2}, True)) is None
+    assert builder.missing_keyframes == 2
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+异步 Redis 层测试：批量写入TTL、SCAN/UNLINK 分批清除、删除计数、
+跨实例失效与订阅断开时停用本地缓存
+"""
+
+import asyncio
+
+import pytest
+
+from .redis_cache_tier import AsyncRedisTier, RedisTierConfig
+
+
+async def _wait_for(condition, timeout: float = 1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "等待超时"
+        await asyncio.sleep(0.001)
+
+
+def _cached_tier(redis, **overrides) -> AsyncRedisTier:
+    return AsyncRedisTier(redis, RedisTierConfig(client_side_cache=True, **overrides))
+
+
+def test_set_many_applies_per_key_ttl_in_one_round_trip(fake_redis):
+    tier = AsyncRedisTier(fake_redis)
+    items = [("quote:1", "a", 60), ("quote:2", "b", 3600), ("quote:3", "c", 5)]
+
+    written = asyncio.run(tier.set_many(items))
+
+    assert written == 3
+    assert fake_redis.round_trips == 1
+    assert fake_redis.commands == {"set": 3}
+    for key, _, ttl in items:
+        assert fake_redis.ttl_of(key) == pytest.approx(ttl, abs=1.0)
+    assert tier.stats["keys_written"] == 3
+    assert asyncio.run(tier.set_many([])) == 0
+
+
+def test_mget_batches_and_preserves_order(fake_redis):
+    tier = AsyncRedisTier(fake_redis, RedisTierConfig(batch_size=4))
+    keys = [f"k{i}" for i in range(10)]
+    for key in keys[::2]:
+        fake_redis._cmd_set(key, key.upper())
+
+    values = asyncio.run(tier.mget(keys))
+
+    assert values == [key.upper() if i % 2 == 0 else None for i, key in enumerate(keys)]
+    assert fake_redis.round_trips == 1
+    assert fake_redis.commands["mget"] == 3
+
+
+def test_delete_pattern_scans_and_unlinks_in_batches(fake_redis):
+    tier = AsyncRedisTier(fake_redis, RedisTierConfig(batch_size=10, scan_count=7))
+    for i in range(25):
+        fake_redis._cmd_set(f"market:{i:03d}", "x")
+    fake_redis._cmd_set("other:1", "y")
+
+    deleted = asyncio.run(tier.delete_pattern("market:*"))
+
+    assert deleted == 25
+    assert list(fake_redis.store) == ["other:1"]
+    assert fake_redis.commands["scan"] == 4
+    assert fake_redis.commands["unlink"] == 3
+    assert [len(args) for name, args in fake_redis.calls if name == "unlink"] == [10, 10, 5]
+    assert "keys" not in fake_redis.commands
+    assert tier.stats["keys_scanned"] == 25
+    assert tier.stats["keys_deleted"] == 25
+
+
+@pytest.mark.parametrize("client_side_cache", [False, True])
+def test_delete_counts_only_removed_keys(fake_redis, client_side_cache):
+    tier = AsyncRedisTier(fake_redis, RedisTierConfig(client_side_cache=client_side_cache, batch_size=2))
+    for key in ("a", "b", "c"):
+        fake_redis._cmd_set(key, key)
+    # 失效消息的订阅者数量不能计入删除数
+    listener = fake_redis.clone().pubsub()
+    asyncio.run(listener.subscribe(tier.config.invalidation_channel))
+
+    deleted = asyncio.run(tier.delete(["a", "b", "c", "missing", "gone"]))
+
+    assert deleted == 3
+    assert tier.stats["keys_deleted"] == 3
+    assert fake_redis.commands["unlink"] == 3
+    assert fake_redis.commands.get("publish", 0) == (1 if client_side_cache else 0)
+    assert asyncio.run(tier.delete([])) == 0
+
+
+def test_writes_invalidate_local_copies_in_other_instances(fake_redis):
+    async def run():
+        reader = _cached_tier(fake_redis)
+        writer = _cached_tier(fake_redis.clone())
+        await reader.start()
+        await writer.start()
+        await _wait_for(lambda: reader.local_cache_active and writer.local_cache_active)
+
+        await writer.set_many([("quote:1", "v1", 60), ("quote:2", "v1", 60)])
+        await _wait_for(lambda: reader.stats["invalidations_received"] == 1)
+        assert await reader.mget(["quote:1", "quote:2"]) == ["v1", "v1"]
+        assert await reader.get("quote:1") == "v1"
+        assert reader.stats["local_hits"] == 1
+
+        await writer.set("quote:1", "v2", 60)
+        await _wait_for(lambda: reader.stats["invalidations_received"] == 2)
+        assert await reader.get("quote:1") == "v2"
+
+        await writer.delete_pattern("quote:*")
+        await _wait_for(lambda: reader.stats["invalidations_received"] == 3)
+        assert await reader.mget(["quote:1", "quote:2"]) == [None, None]
+
+        # 自己发出的失效消息不处理
+        assert writer.stats["invalidations_received"] == 0
+        await reader.close()
+        await writer.close()
+
+    asyncio.run(run())
+
+
+def test_local_cache_disabled_while_subscription_is_down(fake_redis):
+    async def run():
+        tier = _cached_tier(fake_redis, reconnect_delay=0.05)
+        await tier.start()
+        await _wait_for(lambda: tier.local_cache_active)
+
+        fake_redis._cmd_set("quote:1", "v1")
+        assert await tier.get("quote:1") == "v1"
+        assert tier.get_stats()["local_entries"] == 1
+
+        fake_redis.disconnect_subscribers()
+        await _wait_for(lambda: not tier.local_cache_active)
+        assert tier.get_stats()["local_entries"] == 0
+
+        # 断开期间其他系统直接改写 Redis，必须读到新值
+        fake_redis._cmd_set("quote:1", "v2")
+        round_trips = fake_redis.round_trips
+        assert await tier.get("quote:1") == "v2"
+        assert fake_redis.round_trips == round_trips + 1
+        assert tier.get_stats()["local_entries"] == 0
+
+        # 重连后重新启用本地缓存
+        await _wait_for(lambda: tier.local_cache_active)
+        assert await tier.get("quote:1") == "v2"
+        assert await tier.get("quote:1") == "v2"
+        assert tier.stats["local_hits"] == 1
+        await tier.close()
+
+    asyncio.run(run())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+频道重放缓冲测试：缺口补发、过期回退与移除后的序号延续
+"""
+
+from .order_book import OrderBookManager
+from .replay_buffer import ChannelReplayBuffer, channel_key
+
+SYMBOL = "000001.SZ"
+CHANNEL = channel_key(SYMBOL, "trade")
+
+
+def _publish(buffer, count, now=0.0):
+    for _ in range(count):
+        seq = buffer.next_seq(CHANNEL)
+        buffer.record(CHANNEL, seq, {"seq": seq}, now)
+
+
+def test_since_replays_gap_and_reports_up_to_date():
+    buffer = ChannelReplayBuffer(ring_size=8)
+    _publish(buffer, 5)
+
+    assert buffer.since(CHANNEL, 2, 0.0) == [(3, {"seq": 3}), (4, {"seq": 4}), (5, {"seq": 5})]
+    assert buffer.since(CHANNEL, 5, 0.0) == []
+    assert buffer.since(channel_key(SYMBOL, "quote"), 0, 0.0) is None
+
+
+def test_since_expires_evicted_and_stale_entries():
+    buffer = ChannelReplayBuffer(ring_size=4, max_age=10.0)
+    _publish(buffer, 10)
+    assert buffer.since(CHANNEL, 2, 0.0) is None
+    assert buffer.since(CHANNEL, 8, 11.0) is None
+    assert buffer.stats["gaps_expired"] == 2
+
+
+def test_since_expires_positions_ahead_of_server():
+    buffer = ChannelReplayBuffer()
+    _publish(buffer, 3)
+    assert buffer.since(CHANNEL, 20, 0.0) is None
+    assert buffer.stats["gaps_expired"] == 1
+
+
+def test_discard_keeps_sequence_monotonic():
+    buffer = ChannelReplayBuffer()
+    _publish(buffer, 20)
+    buffer.discard([CHANNEL])
+
+    # 重新订阅后序号继续递增，缓冲已清除的旧位置回退为快照
+    _publish(buffer, 3)
+    assert buffer.current_seq(CHANNEL) == 23
+    assert buffer.since(CHANNEL, 18, 0.0) is None
+    assert [seq for seq, _ in buffer.since(CHANNEL, 20, 0.0)] == [21, 22, 23]
+    assert buffer.since(CHANNEL, 23, 0.0) == []
+
+
+def test_depth_sequence_continues_after_order_book_discard():
+    buffer = ChannelReplayBuffer()
+    books = OrderBookManager()
+    depth = channel_key(SYMBOL, "depth")
+    for volume in (100, 200, 300):
+        update = books.update(SYMBOL, [[10.0, volume]], [[10.01, 100]],
+                              initial_seq=buffer.current_seq(depth))
+        buffer.record(depth, update.seq, update.to_dict(), 0.0)
+
+    books.discard([SYMBOL])
+    buffer.discard([depth])
+    update = books.update(SYMBOL, [[10.0, 100]], [[10.01, 100]], initial_seq=buffer.current_seq(depth))
+    assert (update.seq, update.prev_seq) == (4, 3)
+    assert books.snapshot(SYMBOL)["seq"] == 4
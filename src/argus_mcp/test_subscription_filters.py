@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+订阅过滤与限频测试：compile_filter / should_send / drain_due
+"""
+
+import pytest
+
+from .subscription_filters import SubscriptionFilter, SubscriptionFilterEngine, compile_filter
+from .websocket_models import DataType, Subscription
+
+SYMBOL = "000001.SZ"
+
+
+def _subscription(filters, subscription_id="sub-1"):
+    return Subscription(
+        subscription_id=subscription_id, client_id="client-1",
+        symbol=SYMBOL, data_type=DataType.QUOTE, filters=filters
+    )
+
+
+def _quote(close, volume=1000):
+    return {"symbol": SYMBOL, "timestamp": 1, "close": close, "volume": volume, "open": 9.0}
+
+
+def test_compile_filter_without_conditions_returns_none():
+    assert compile_filter(None) is None
+    assert compile_filter({}) is None
+    assert compile_filter({"conflate": False, "unknown": 1}) is None
+
+
+def test_compile_filter_fields_and_rate():
+    compiled = compile_filter({"fields": ["close"], "max_rate": 4, "throttle_ms": 100})
+
+    assert compiled.fields == ("symbol", "timestamp", "close")
+    assert compiled.min_interval == pytest.approx(0.25)
+    assert compiled.project(_quote(10.0)) == {"symbol": SYMBOL, "timestamp": 1, "close": 10.0}
+
+
+@pytest.mark.parametrize("filters", [
+    {"fields": "close"},
+    {"fields": ["close", 1]},
+    {"min_change": -1},
+    {"min_volume": "many"},
+    {"max_rate": float("nan")},
+    ["close"],
+])
+def test_compile_filter_rejects_invalid_conditions(filters):
+    with pytest.raises(ValueError):
+        compile_filter(filters)
+
+
+def test_should_send_suppresses_small_volume_and_price_changes():
+    engine = SubscriptionFilterEngine()
+    subscription = _subscription({"min_volume": 500, "min_change": 0.1, "min_change_percent": 2})
+    compiled = engine.get_filter(subscription)
+
+    def send(close, volume=1000):
+        return engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(close, volume), 0.0)
+
+    assert send(10.0)                  # 第一次推送没有参考价格
+    assert not send(12.0, volume=100)  # 成交量不足
+    assert not send(10.05)             # 变动小于 min_change
+    assert not send(10.15)             # 变动小于 2%
+    assert send(10.3)
+    assert not send(10.4)              # 参考价格已更新为 10.3
+    assert engine.stats["suppressed_volume"] == 1
+    assert engine.stats["suppressed_change"] == 3
+
+
+def test_should_send_conflates_within_interval_and_drain_due_sends_latest():
+    engine = SubscriptionFilterEngine()
+    subscription = _subscription({"max_rate": 2})
+    compiled = engine.get_filter(subscription)
+
+    assert engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.0), 0.0)
+    assert not engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.1), 0.1)
+    assert not engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.2), 0.2)
+
+    assert engine.drain_due(0.4) == []
+    due = engine.drain_due(0.5)
+    assert due == [("sub-1", SYMBOL, DataType.QUOTE, _quote(10.2))]
+    assert engine.drain_due(2.0) == []
+
+    # 合并推送同样计入限频
+    assert not engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.3), 0.8)
+    assert engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.4), 1.0)
+    assert engine.drain_due(5.0) == []
+    assert engine.stats["conflated"] == 3
+    assert engine.stats["flushed"] == 1
+
+
+def test_should_send_drops_without_conflation():
+    engine = SubscriptionFilterEngine()
+    subscription = _subscription({"throttle_ms": 1000, "conflate": False})
+    compiled = engine.get_filter(subscription)
+
+    assert engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.0), 0.0)
+    assert not engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.1), 0.5)
+    assert engine.drain_due(2.0) == []
+    assert engine.stats["dropped"] == 1
+
+
+def test_get_filter_caches_and_prune_clears_state():
+    engine = SubscriptionFilterEngine()
+    subscription = _subscription({"max_rate": 1})
+    compiled = engine.get_filter(subscription)
+    assert isinstance(compiled, SubscriptionFilter)
+    assert engine.get_filter(subscription) is compiled
+    assert engine.get_filter(_subscription({"min_change": -1}, "sub-bad")) is None
+
+    engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.0), 0.0)
+    engine.should_send(subscription, compiled, SYMBOL, DataType.QUOTE, _quote(10.1), 0.1)
+    engine.prune([])
+
+    stats = engine.get_stats()
+    assert stats["filtered_subscriptions"] == 0
+    assert stats["delivery_states"] == 0
+    assert stats["pending_conflated"] == 0
+    assert engine.drain_due(10.0) == []
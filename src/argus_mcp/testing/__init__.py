@@ -0,0 +1,7 @@
+"""
+测试与基准共用的替身，不依赖 pytest
+"""
+
+from .inprocess_redis import InProcessRedis
+
+__all__ = ["InProcessRedis"]
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+进程内 Redis 替身（redis.asyncio 接口的子集）
+
+Redis 层测试和 monitoring.benchmark_harness 的 Redis 基准共用，不依赖 pytest。
+"""
+
+import asyncio
+import fnmatch
+import time
+from typing import Any, Dict, List, Optional
+
+# 放入订阅队列后 listen() 抛出连接错误，模拟订阅连接断开
+_DISCONNECT = object()
+
+
+class InProcessRedis:
+    """
+    进程内 Redis 替身（redis.asyncio 接口的子集），每次命令往返等待 rtt 模拟网络延迟
+
+    clone() 得到共享同一份数据和频道的另一个客户端（模拟另一个进程的连接）。
+    commands 按命令名统计执行次数（流水线内的命令逐条计入），round_trips 统计往返次数。
+    """
+
+    def __init__(self, rtt: float = 0.0, store: Optional[Dict[str, Any]] = None,
+                 channels: Optional[Dict[str, List[asyncio.Queue]]] = None):
+        self.rtt = rtt
+        self.store: Dict[str, Any] = {} if store is None else store  # key -> (value, expires_at)
+        self.channels: Dict[str, List[asyncio.Queue]] = {} if channels is None else channels
+        self.round_trips = 0
+        self.commands: Dict[str, int] = {}
+        self.calls: List[tuple] = []
+
+    def clone(self) -> "InProcessRedis":
+        return InProcessRedis(self.rtt, self.store, self.channels)
+
+    def ttl_of(self, key: str) -> Optional[float]:
+        """键的剩余过期时间（秒），不存在或未设置过期返回None"""
+        entry = self.store.get(key)
+        if entry is None or entry[1] is None:
+            return None
+        return entry[1] - time.monotonic()
+
+    def disconnect_subscribers(self):
+        """断开所有订阅连接"""
+        for queues in self.channels.values():
+            for queue in list(queues):
+                queue.put_nowait(_DISCONNECT)
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.rtt)
+
+    def _execute(self, name: str, *args, **kwargs) -> Any:
+        self.commands[name] = self.commands.get(name, 0) + 1
+        self.calls.append((name, args))
+        return getattr(self, f"_cmd_{name}")(*args, **kwargs)
+
+    def _live(self, key: str) -> Optional[str]:
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at < time.monotonic():
+            del self.store[key]
+            return None
+        return value
+
+    def _cmd_get(self, key):
+        return self._live(key)
+
+    def _cmd_mget(self, *keys):
+        return [self._live(key) for key in keys]
+
+    def _cmd_set(self, key, value, ex=None):
+        self.store[key] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def _cmd_unlink(self, *keys):
+        return sum(1 for key in keys if self.store.pop(key, None) is not None)
+
+    _cmd_delete = _cmd_unlink
+
+    def _cmd_keys(self, pattern):
+        return [key for key in list(self.store) if fnmatch.fnmatchcase(key, pattern)]
+
+    def _cmd_publish(self, channel, message):
+        queues = self.channels.get(channel, [])
+        for queue in queues:
+            queue.put_nowait({"type": "message", "channel": channel, "data": message})
+        return len(queues)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def command(*args, **kwargs):
+            await self._round_trip()
+            return self._execute(name, *args, **kwargs)
+        return command
+
+    async def scan_iter(self, match: Optional[str] = None, count: Optional[int] = None):
+        keys = self._cmd_keys(match or "*")
+        page = count or 10
+        for start in range(0, len(keys), page):
+            await self._round_trip()
+            self.commands["scan"] = self.commands.get("scan", 0) + 1
+            for key in keys[start:start + page]:
+                yield key
+
+    def pipeline(self, transaction: bool = True) -> "_InProcessPipeline":
+        return _InProcessPipeline(self)
+
+    def pubsub(self) -> "_InProcessPubSub":
+        return _InProcessPubSub(self)
+
+    async def aclose(self):
+        pass
+
+
+class _InProcessPipeline:
+    def __init__(self, redis: InProcessRedis):
+        self._redis = redis
+        self._queued: List[tuple] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self._queued.clear()
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self._queued.append((name, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self) -> List[Any]:
+        await self._redis._round_trip()
+        queued, self._queued = self._queued, []
+        return [self._redis._execute(name, *args, **kwargs) for name, args, kwargs in queued]
+
+
+class _InProcessPubSub:
+    def __init__(self, redis: InProcessRedis):
+        self._redis = redis
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._channels: List[str] = []
+
+    async def subscribe(self, *channels):
+        await self._redis._round_trip()
+        for channel in channels:
+            self._redis.channels.setdefault(channel, []).append(self._queue)
+            self._channels.append(channel)
+
+    async def listen(self):
+        while True:
+            message = await self._queue.get()
+            if message is _DISCONNECT:
+                raise ConnectionError("订阅连接已断开")
+            yield message
+
+    async def aclose(self):
+        for channel in self._channels:
+            queues = self._redis.channels.get(channel, [])
+            if self._queue in queues:
+                queues.remove(self._queue)
+        self._channels.clear()
+
+
+__all__ = ["InProcessRedis"]
@@ -13,6 +13,13 @@ from datetime import datetime, timedelta
 import uuid
 import time
 from enum import Enum
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from .websocket_codec import FrameDecoder
+from .websocket_compression import ZSTD_AVAILABLE, ZstdDictionary
+from .quote_delta import DeltaStateBuilder
+from .order_book import OrderBookReplica
+from .replay_buffer import channel_key
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +56,9 @@ class ConnectionConfig:
     heartbeat_interval: int = 30
     timeout: int = 10
     max_subscriptions: int = 100
+    encoding: str = "json"  # 行情帧编码：json / msgpack / compact
+    compression: str = "deflate"  # 传输压缩：deflate（permessage-deflate）/ zstd（字典压缩）/ none
+    batch: bool = True  # 请求批量帧（服务端开启批量推送时多条消息合并为一帧）
 
 
 class WebSocketClient:
@@ -66,6 +76,13 @@ class WebSocketClient:
         self._heartbeat_task = None
         self._message_queue = asyncio.Queue()
         self._running = False
+        self._decoder = FrameDecoder()
+        self._delta_state = DeltaStateBuilder()
+        self._order_books: Dict[str, OrderBookReplica] = {}
+        self._channel_seq: Dict[str, int] = {}  # 频道 -> 最后收到的序号，重连后用于续传
+        self.negotiated_encoding = "json"
+        self.negotiated_compression = "none"
+        self._zstd_dictionary: Optional[ZstdDictionary] = None  # 跨重连保留，服务端字典未变时不重复下发
         
         # 统计信息
         self.stats = {
@@ -86,11 +103,16 @@ class WebSocketClient:
             if self.config.api_key:
                 headers["Authorization"] = f"Bearer {self.config.api_key}"
             
+            # 每次连接都是新的编码会话，服务端会重新下发字段表；
+            # 行情状态保留到重连后由 resume 补齐
+            self._decoder = FrameDecoder()
             self.websocket = await websockets.connect(
-                self.config.url,
+                self._build_url(),
                 extra_headers=headers,
                 ping_interval=self.config.heartbeat_interval,
-                ping_timeout=self.config.timeout
+                ping_timeout=self.config.timeout,
+                # zstd 已按帧压缩，不再协商 permessage-deflate
+                compression="deflate" if self.config.compression == "deflate" else None
             )
             
             self.state = ConnectionState.CONNECTED
@@ -110,9 +132,34 @@ class WebSocketClient:
             self.state = ConnectionState.ERROR
             return False
     
+    def _build_url(self) -> str:
+        """在URL上附加编码、压缩与批量帧协商参数"""
+        params = []
+        if self.config.encoding and self.config.encoding != "json":
+            params.append(("encoding", self.config.encoding))
+        if self.config.batch:
+            params.append(("batch", "1"))
+        if self.config.compression == "zstd":
+            if ZSTD_AVAILABLE:
+                params.append(("compression", "zstd"))
+                if self._zstd_dictionary is not None:
+                    params.append(("zstd_dict", str(self._zstd_dictionary.dict_id)))
+            else:
+                logger.warning("未安装zstandard，不请求zstd压缩")
+        if not params:
+            return self.config.url
+        parts = urlsplit(self.config.url)
+        names = {name for name, _ in params} | {"zstd_dict"}
+        query = [(k, v) for k, v in parse_qsl(parts.query) if k not in names]
+        query.extend(params)
+        return urlunsplit(parts._replace(query=urlencode(query)))
+    
     async def disconnect(self):
         """断开连接"""
         self._running = False
+        self._delta_state.reset()
+        self._order_books.clear()
+        self._channel_seq.clear()
         
         if self._heartbeat_task:
             self._heartbeat_task.cancel()
@@ -242,26 +289,58 @@ class WebSocketClient:
                 logger.error(f"消息处理错误: {e}")
                 self.stats["errors"] += 1
     
-    async def _process_message(self, message: str):
-        """处理接收到的消息"""
+    async def _process_message(self, message: Union[str, bytes]):
+        """处理接收到的消息（JSON文本帧、msgpack或compact二进制帧）"""
+        try:
+            # 批量帧展开为多条消息；compact字段表帧只更新解码器状态
+            for data in self._decoder.decode_all(message):
+                self.stats["messages_received"] += 1
+                await self._dispatch_message(data)
+        except ValueError:  # 包含 json.JSONDecodeError 与 msgpack 解码错误
+            logger.error(f"无效的消息格式: {message[:200]!r}")
+        except Exception as e:
+            logger.error(f"处理消息时出错: {e}")
+    
+    async def _dispatch_message(self, data: Dict):
+        """按类型处理一条消息"""
         try:
-            data = json.loads(message)
-            self.stats["messages_received"] += 1
-            
             message_type = data.get("type")
             
             if message_type == "data":
                 await self._handle_data_message(data)
+            elif message_type == "market_data":
+                # 关键帧 + 增量还原为完整行情
+                envelope = self._delta_state.apply(data.get("data") or {})
+                self._track_seq(data.get("data") or {})
+                if envelope is not None:
+                    await self._handle_data_message(envelope)
+            elif message_type in ("depth_snapshot", "depth_update"):
+                await self._handle_depth_message(message_type, data.get("data") or {})
+            elif message_type == "welcome":
+                welcome = data.get("data") or {}
+                self.negotiated_encoding = welcome.get("encoding", "json")
+                self._apply_compression(welcome)
             elif message_type == "error":
                 await self._handle_error_message(data)
             elif message_type == "heartbeat_response":
                 self.last_heartbeat = datetime.now()
             
-        except json.JSONDecodeError:
-            logger.error(f"无效的消息格式: {message}")
         except Exception as e:
             logger.error(f"处理消息时出错: {e}")
     
+    def _apply_compression(self, welcome: Dict):
+        """按 welcome 中的压缩信息准备解码器（zstd 字典随 welcome 下发或沿用已持有的）"""
+        self.negotiated_compression = welcome.get("compression", "none")
+        if self.negotiated_compression != "zstd":
+            self._decoder.zstd_dictionary = None
+            return
+        if welcome.get("zstd_dictionary"):
+            self._zstd_dictionary = ZstdDictionary.from_base64(welcome["zstd_dictionary"])
+        elif self._zstd_dictionary is None or self._zstd_dictionary.dict_id != welcome.get("zstd_dictionary_id"):
+            logger.error("服务端使用zstd压缩但没有下发字典")
+            return
+        self._decoder.zstd_dictionary = self._zstd_dictionary
+    
     async def _handle_data_message(self, data: Dict):
         """处理数据消息"""
         data_type = data.get("data_type")
@@ -272,6 +351,68 @@ class WebSocketClient:
                 except Exception as e:
                     logger.error(f"消息处理器错误: {e}")
     
+    async def _handle_depth_message(self, message_type: str, payload: Dict):
+        """应用深度快照/增量，序号缺口或校验失败时请求重新同步"""
+        symbol = payload.get("symbol")
+        if not symbol:
+            return
+        self._track_seq({**payload, "data_type": "depth"})
+        book = self._order_books.get(symbol)
+        if book is None:
+            book = self._order_books[symbol] = OrderBookReplica(symbol)
+        
+        if message_type == "depth_snapshot":
+            ok = book.apply_snapshot(payload)
+        elif not book.synced:
+            # 等待重新同步的快照
+            return
+        else:
+            ok = book.apply_update(payload)
+        
+        if not ok:
+            await self._request_depth_resync(symbol)
+            return
+        
+        await self._handle_data_message({
+            "symbol": symbol,
+            "data_type": "depth",
+            "data": {**book.levels(), "seq": book.seq},
+            "timestamp": payload.get("timestamp")
+        })
+    
+    def _track_seq(self, envelope: Dict):
+        """记录频道最后收到的序号"""
+        seq = envelope.get("seq")
+        if seq is not None and envelope.get("symbol"):
+            self._channel_seq[channel_key(envelope["symbol"], envelope.get("data_type"))] = seq
+    
+    async def _resume_channels(self):
+        """重连并重新订阅后，请求补发断线期间缺失的推送"""
+        if not self._channel_seq:
+            return
+        try:
+            await self.websocket.send(json.dumps({
+                "type": "resume",
+                "timestamp": datetime.now().isoformat(),
+                "data": {"channels": dict(self._channel_seq)}
+            }))
+            self.stats["messages_sent"] += 1
+        except Exception as e:
+            logger.error(f"发送续传请求失败: {e}")
+    
+    async def _request_depth_resync(self, symbol: str):
+        """请求服务端重新下发深度快照"""
+        logger.warning(f"深度行情不同步，请求快照: {symbol}")
+        try:
+            await self.websocket.send(json.dumps({
+                "type": "depth_resync",
+                "timestamp": datetime.now().isoformat(),
+                "data": {"symbol": symbol}
+            }))
+            self.stats["messages_sent"] += 1
+        except Exception as e:
+            logger.error(f"发送深度重新同步请求失败: {e}")
+    
     async def _handle_error_message(self, data: Dict):
         """处理错误消息"""
         logger.error(f"收到服务器错误: {data}")
@@ -295,9 +436,10 @@ class WebSocketClient:
         await asyncio.sleep(delay)
         
         if await self.connect():
-            # 重连成功，重新订阅
+            # 重连成功，重新订阅，然后只补发断线期间的缺口
             for sub_id, config in self.subscriptions.items():
                 await self.subscribe(sub_id, config)
+            await self._resume_channels()
     
     async def wait_for_connection(self, timeout: int = 30) -> bool:
         """等待连接建立"""
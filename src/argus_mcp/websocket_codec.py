@@ -0,0 +1,442 @@
+"""
+WebSocket 消息编解码
+支持协商的三种线上编码：
+- json: 默认，与 WebSocketMessage.model_dump_json() 完全一致的文本帧
+- msgpack: 完整消息的 MessagePack 二进制帧（需要安装 msgpack）
+- compact: 行情消息按字段表位置编码，字段名只在 schema 帧中下发一次；
+  有 msgpack 时为二进制帧，否则退化为 JSON 数组文本帧
+
+compact 帧格式（数组）:
+    schema 帧: [0, schema_id, data_type, [字段名, ...]]
+    行情帧:   [1, schema_id, symbol, timestamp, seq, 值1, 值2, ...]
+    增量帧:   [2, schema_id, symbol, timestamp, seq, 值1, 值2, ...]（字段表为变化的字段）
+seq 为频道序号，没有序号时为 null。
+非行情消息在 compact 模式下按 msgpack（或 JSON）完整编码。
+
+协商 zstd 压缩的连接在 welcome 之后所有帧按字典压缩为二进制帧（见 websocket_compression）。
+
+批量帧把同一客户端排队的多条消息合并为一帧，messages 中每项是原消息按连接编码
+解码后的对象（完整消息或 compact 数组），顺序与发送顺序一致:
+    {"type": "batch", "timestamp": ..., "data": {"count": n, "messages": [...]}}
+只有握手时请求了 batch=1 的连接才会收到批量帧，其他连接逐条接收。
+"""
+
+import gzip
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from .websocket_models import WebSocketMessage, MessageType
+from .websocket_compression import ZSTD_MAGIC, ZstdDictionary, decompress_zstd_frame
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    msgpack = None
+    MSGPACK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPACT_SCHEMA_FRAME = 0
+COMPACT_DATA_FRAME = 1
+COMPACT_DELTA_FRAME = 2
+MAX_COMPACT_SCHEMAS = 4096
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_MARKET_DATA_KEYS = frozenset(("symbol", "data_type", "data", "timestamp", "delta", "seq"))
+
+
+class WireEncoding(str, Enum):
+    """WebSocket线上编码"""
+    JSON = "json"
+    MSGPACK = "msgpack"
+    COMPACT = "compact"
+
+
+def supported_encodings() -> List[str]:
+    """当前环境可用的编码列表"""
+    encodings = [WireEncoding.JSON.value, WireEncoding.COMPACT.value]
+    if MSGPACK_AVAILABLE:
+        encodings.insert(1, WireEncoding.MSGPACK.value)
+    return encodings
+
+
+def negotiate_encoding(requested: Optional[str]) -> WireEncoding:
+    """
+    根据客户端请求确定编码
+
+    未知编码或缺少 msgpack 时回退到 json，不拒绝连接。
+    """
+    if not requested:
+        return WireEncoding.JSON
+
+    try:
+        encoding = WireEncoding(requested.strip().lower())
+    except ValueError:
+        logger.warning(f"不支持的WebSocket编码: {requested}，使用json")
+        return WireEncoding.JSON
+
+    if encoding == WireEncoding.MSGPACK and not MSGPACK_AVAILABLE:
+        logger.warning("未安装msgpack，WebSocket编码回退为json")
+        return WireEncoding.JSON
+    return encoding
+
+
+def negotiate_batching(requested: Optional[str]) -> bool:
+    """客户端是否请求批量帧（batch=1/true/yes/on），未请求的连接逐条接收消息"""
+    if not requested:
+        return False
+    return str(requested).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _wire_default(value: Any) -> Any:
+    """msgpack/json 无法直接序列化的类型转换（仅在遇到非原生类型时调用）"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if hasattr(value, "item") and callable(value.item):  # numpy 标量
+        return value.item()
+    if hasattr(value, "tolist"):  # numpy 数组
+        return value.tolist()
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    return str(value)
+
+
+@dataclass
+class EncodedFrame:
+    """编码后的单个WebSocket帧"""
+    payload: Union[str, bytes]
+    schema_id: Optional[int] = None
+    # zstd 压缩结果（广播共享的帧只压缩一次）；b"" 表示压缩后不更小，按原样发送
+    compressed: Optional[bytes] = field(default=None, repr=False, compare=False)
+    # 批量帧内各 compact 帧的字段表ID（批量帧本身没有 schema_id）
+    batched_schema_ids: Tuple[int, ...] = field(default=(), repr=False, compare=False)
+
+    @property
+    def binary(self) -> bool:
+        return isinstance(self.payload, bytes)
+
+    @property
+    def size(self) -> int:
+        if isinstance(self.payload, bytes):
+            return len(self.payload)
+        return len(self.payload.encode("utf-8"))
+
+
+class CompactSchemaRegistry:
+    """全局 compact 字段表注册表：相同 (数据类型, 字段序列) 共用一个 schema_id"""
+
+    def __init__(self, max_schemas: int = MAX_COMPACT_SCHEMAS):
+        self.max_schemas = max_schemas
+        self._ids: Dict[Tuple[str, Tuple[str, ...]], int] = {}
+        self._schemas: List[Tuple[str, Tuple[str, ...]]] = []
+        self._frames: Dict[int, EncodedFrame] = {}
+
+    def get_or_create(self, data_type: str, fields: Tuple[str, ...]) -> Optional[int]:
+        """获取字段表ID，注册表已满时返回None（调用方回退完整编码）"""
+        key = (data_type, fields)
+        schema_id = self._ids.get(key)
+        if schema_id is None:
+            if len(self._schemas) >= self.max_schemas:
+                return None
+            schema_id = len(self._schemas)
+            self._ids[key] = schema_id
+            self._schemas.append(key)
+        return schema_id
+
+    def schema_frame(self, schema_id: int) -> EncodedFrame:
+        """字段表帧（编码结果缓存复用）"""
+        frame = self._frames.get(schema_id)
+        if frame is None:
+            data_type, fields = self._schemas[schema_id]
+            frame = EncodedFrame(
+                _pack_compact([COMPACT_SCHEMA_FRAME, schema_id, data_type, list(fields)])
+            )
+            self._frames[schema_id] = frame
+        return frame
+
+
+schema_registry = CompactSchemaRegistry()
+
+
+# 复用Packer：packb每次调用都会重新分配内部缓冲区（编码只在事件循环线程中进行）
+_packer = msgpack.Packer(default=_wire_default, use_bin_type=True, autoreset=True) if MSGPACK_AVAILABLE else None
+
+
+def _pack_compact(row: List[Any]) -> Union[str, bytes]:
+    if _packer is not None:
+        return _packer.pack(row)
+    return json.dumps(row, ensure_ascii=False, separators=(",", ":"), default=_wire_default)
+
+
+def _encode_full(message: WebSocketMessage, encoding: WireEncoding) -> EncodedFrame:
+    if encoding != WireEncoding.JSON and MSGPACK_AVAILABLE:
+        return EncodedFrame(_packer.pack(message.model_dump()))
+    return EncodedFrame(message.model_dump_json())
+
+
+def _encode_compact(message: WebSocketMessage) -> Optional[EncodedFrame]:
+    """按字段表编码行情消息，不适用时返回None"""
+    if message.type != MessageType.MARKET_DATA or message.metadata:
+        return None
+    envelope = message.data
+    if not isinstance(envelope, dict) or not _MARKET_DATA_KEYS.issuperset(envelope):
+        return None
+    payload = envelope.get("data")
+    if not isinstance(payload, dict):
+        return None
+
+    fields = tuple(payload)
+    schema_id = schema_registry.get_or_create(str(envelope.get("data_type", "")), fields)
+    if schema_id is None:
+        return None
+
+    # 值保持原样，Decimal/datetime/numpy 等由序列化器的 default 钩子按需转换
+    kind = COMPACT_DELTA_FRAME if envelope.get("delta") else COMPACT_DATA_FRAME
+    row = [kind, schema_id, envelope.get("symbol"),
+           envelope.get("timestamp") or message.timestamp, envelope.get("seq")]
+    row.extend(payload.values())
+    return EncodedFrame(_pack_compact(row), schema_id=schema_id)
+
+
+def encode_message(message: WebSocketMessage, encoding: WireEncoding) -> EncodedFrame:
+    """按指定编码序列化消息"""
+    if encoding == WireEncoding.COMPACT:
+        frame = _encode_compact(message)
+        if frame is not None:
+            return frame
+    return _encode_full(message, encoding)
+
+
+class CodecSession:
+    """单个连接的编码会话，记录已下发给该连接的字段表"""
+
+    __slots__ = ("encoding", "zstd", "batching", "compression_active", "_announced")
+
+    def __init__(self, encoding: WireEncoding = WireEncoding.JSON, zstd: Optional[ZstdDictionary] = None,
+                 batching: bool = False):
+        self.encoding = encoding
+        self.zstd = zstd
+        # 客户端在握手时声明能展开批量帧
+        self.batching = batching
+        # welcome 消息之后才开始压缩，客户端先从 welcome 中拿到字典
+        self.compression_active = False
+        self._announced: set = set()
+
+    def frames_for(
+        self,
+        message: WebSocketMessage,
+        cache: Optional[Dict[WireEncoding, EncodedFrame]] = None
+    ) -> List[EncodedFrame]:
+        """
+        生成发送该消息所需的帧
+
+        Args:
+            message: 要发送的消息
+            cache: 广播时共享的编码缓存，同一消息对每种编码只序列化一次
+        """
+        frame = cache.get(self.encoding) if cache is not None else None
+        if frame is None:
+            frame = encode_message(message, self.encoding)
+            if cache is not None:
+                cache[self.encoding] = frame
+
+        if frame.schema_id is None or frame.schema_id in self._announced:
+            return [frame]
+
+        # 发送成功（mark_sent）后才记为已下发：帧过大被丢弃或发送失败时，
+        # 下一条消息仍会先带上字段表帧
+        return [schema_registry.schema_frame(frame.schema_id), frame]
+
+    def mark_sent(self, frames: List[EncodedFrame]) -> None:
+        """记录已成功发送的帧所引用的字段表（字段表帧总在首个数据帧之前发送）"""
+        for frame in frames:
+            if frame.schema_id is not None:
+                self._announced.add(frame.schema_id)
+            self._announced.update(frame.batched_schema_ids)
+
+    def wire_frame(self, frame: EncodedFrame) -> EncodedFrame:
+        """按连接协商的压缩方式得到实际发送的帧"""
+        if self.zstd is None or not self.compression_active:
+            return frame
+        if frame.compressed is None:
+            payload = frame.payload if frame.binary else frame.payload.encode("utf-8")
+            compressed = self.zstd.compress(payload)
+            frame.compressed = compressed if len(compressed) < len(payload) else b""
+        return EncodedFrame(frame.compressed) if frame.compressed else frame
+
+
+def _batch_frame(frames: List[EncodedFrame]) -> EncodedFrame:
+    """把同类帧拼接为一个批量帧（直接拼接已编码的内容，不重新序列化）"""
+    timestamp = datetime.now().isoformat()
+    schema_ids = tuple(frame.schema_id for frame in frames if frame.schema_id is not None)
+    if frames[0].binary:
+        head = b"".join((
+            _packer.pack_map_header(3),
+            _packer.pack("type"), _packer.pack(MessageType.BATCH.value),
+            _packer.pack("timestamp"), _packer.pack(timestamp),
+            _packer.pack("data"), _packer.pack_map_header(2),
+            _packer.pack("count"), _packer.pack(len(frames)),
+            _packer.pack("messages"), _packer.pack_array_header(len(frames)),
+        ))
+        return EncodedFrame(head + b"".join(frame.payload for frame in frames),
+                            batched_schema_ids=schema_ids)
+    return EncodedFrame(
+        f'{{"type":"{MessageType.BATCH.value}","timestamp":"{timestamp}",'
+        f'"data":{{"count":{len(frames)},"messages":['
+        + ",".join(frame.payload for frame in frames)
+        + "]}}",
+        batched_schema_ids=schema_ids
+    )
+
+
+def combine_frames(frames: List[EncodedFrame]) -> List[EncodedFrame]:
+    """
+    合并排队的帧
+
+    连续的同类帧（文本/二进制）合并为一个批量帧，单独的一帧原样发送。
+    """
+    combined: List[EncodedFrame] = []
+    start = 0
+    for i in range(1, len(frames) + 1):
+        if i < len(frames) and frames[i].binary == frames[start].binary:
+            continue
+        run = frames[start:i]
+        combined.append(run[0] if len(run) == 1 else _batch_frame(run))
+        start = i
+    return combined
+
+
+async def send_frame(websocket: Any, frame: EncodedFrame):
+    """发送帧（兼容 FastAPI WebSocket 与 websockets 库连接）"""
+    if hasattr(websocket, "send_text"):
+        if frame.binary:
+            await websocket.send_bytes(frame.payload)
+        else:
+            await websocket.send_text(frame.payload)
+    else:
+        await websocket.send(frame.payload)
+
+
+def incoming_to_text(raw: Union[str, bytes]) -> str:
+    """将客户端上行帧统一为JSON文本，供 MessageRouter 解析"""
+    if isinstance(raw, str):
+        return raw
+    if raw.startswith(_GZIP_MAGIC):
+        return gzip.decompress(raw).decode("utf-8")
+    if MSGPACK_AVAILABLE:
+        try:
+            return json.dumps(msgpack.unpackb(raw, raw=False), ensure_ascii=False, default=str)
+        except Exception:
+            pass
+    return raw.decode("utf-8")
+
+
+class FrameDecoder:
+    """客户端解码器：把任意编码的帧还原为与JSON编码一致的消息字典"""
+
+    def __init__(self, zstd_dictionary: Optional[ZstdDictionary] = None):
+        self.schemas: Dict[int, Tuple[str, List[str]]] = {}
+        self.zstd_dictionary = zstd_dictionary
+
+    def decode(self, raw: Union[str, bytes]) -> Optional[Dict[str, Any]]:
+        """
+        解码一帧
+
+        Returns:
+            消息字典；字段表帧只更新内部状态，返回None
+        """
+        if isinstance(raw, bytes) and raw.startswith(ZSTD_MAGIC):
+            raw = decompress_zstd_frame(raw, self.zstd_dictionary)
+        if isinstance(raw, bytes):
+            if raw.startswith(_GZIP_MAGIC):
+                obj = json.loads(gzip.decompress(raw).decode("utf-8"))
+            elif MSGPACK_AVAILABLE:
+                obj = msgpack.unpackb(raw, raw=False)
+            else:
+                raise ValueError("收到二进制帧但未安装msgpack")
+        else:
+            obj = json.loads(raw)
+
+        return self._decode_object(obj)
+
+    def decode_all(self, raw: Union[str, bytes]) -> List[Dict[str, Any]]:
+        """
+        解码一帧并展开批量帧
+
+        Returns:
+            按发送顺序排列的消息字典（字段表帧不出现在结果中）
+        """
+        obj = self.decode(raw)
+        if obj is None:
+            return []
+        if obj.get("type") != MessageType.BATCH.value:
+            return [obj]
+        messages = []
+        for item in (obj.get("data") or {}).get("messages") or ():
+            decoded = self._decode_object(item)
+            if decoded is not None:
+                messages.append(decoded)
+        return messages
+
+    def _decode_object(self, obj: Any) -> Optional[Dict[str, Any]]:
+        if isinstance(obj, list):
+            return self._decode_compact(obj)
+        return obj
+
+    def _decode_compact(self, row: List[Any]) -> Optional[Dict[str, Any]]:
+        kind = row[0]
+        if kind == COMPACT_SCHEMA_FRAME:
+            _, schema_id, data_type, fields = row
+            self.schemas[schema_id] = (data_type, list(fields))
+            return None
+
+        if kind not in (COMPACT_DATA_FRAME, COMPACT_DELTA_FRAME):
+            raise ValueError(f"未知的compact帧类型: {kind}")
+
+        schema_id, symbol, timestamp = row[1], row[2], row[3]
+        schema = self.schemas.get(schema_id)
+        if schema is None:
+            raise ValueError(f"未收到字段表: {schema_id}")
+        data_type, fields = schema
+        envelope = {
+            "symbol": symbol,
+            "data_type": data_type,
+            "data": dict(zip(fields, row[5:])),
+            "timestamp": timestamp,
+        }
+        if kind == COMPACT_DELTA_FRAME:
+            envelope["delta"] = True
+        if row[4] is not None:
+            envelope["seq"] = row[4]
+        return {
+            "type": MessageType.MARKET_DATA.value,
+            "timestamp": timestamp,
+            "data": envelope,
+        }
+
+
+__all__ = [
+    "WireEncoding",
+    "EncodedFrame",
+    "CodecSession",
+    "CompactSchemaRegistry",
+    "FrameDecoder",
+    "MSGPACK_AVAILABLE",
+    "encode_message",
+    "combine_frames",
+    "negotiate_batching",
+    "negotiate_encoding",
+    "supported_encodings",
+    "incoming_to_text",
+    "send_frame",
+]
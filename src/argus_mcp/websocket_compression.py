@@ -0,0 +1,263 @@
+"""
+WebSocket 实时数据系统 - 传输压缩
+替代逐条 gzip 的两种压缩方式：
+
+- deflate: 握手时协商 permessage-deflate（RFC 7692），保留压缩上下文
+  （context takeover），后续帧可以引用之前帧中重复的字段名和数值，
+  小而重复的行情帧压缩率远高于逐条 gzip。由 websockets 库 / ASGI 服务器在帧层完成。
+- zstd: 可选（需要 zstandard），使用从录制的行情帧离线训练的字典按帧压缩。
+  客户端通过 ?compression=zstd 请求，字典随 welcome 消息下发（客户端已持有同一字典时省略）。
+  每帧独立压缩，广播时同一帧只压缩一次，所有连接共用压缩结果。
+
+zstd 帧为二进制帧，以 zstd 魔数开头；解压后以 "{" 或 "[" 开头的是 JSON 文本，否则为 msgpack。
+
+训练字典:
+    python -m src.argus_mcp.websocket_compression frames.ndjson -o config/market_data.zdict
+"""
+
+import argparse
+import asyncio
+import base64
+import importlib.util
+import json
+import logging
+import sys
+from enum import Enum
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from .websocket_models import WebSocketConfig
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    zstandard = None
+    ZSTD_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+DEFAULT_DICTIONARY_SIZE = 16 * 1024
+_JSON_LEADING_BYTES = frozenset(b"{[")
+
+
+class CompressionMode(str, Enum):
+    """WebSocket传输压缩方式"""
+    NONE = "none"
+    DEFLATE = "deflate"
+    ZSTD = "zstd"
+
+
+def deflate_compress_settings(config: WebSocketConfig) -> Dict[str, Any]:
+    """permessage-deflate 的 zlib 参数（窗口大小由协商参数决定，不能在这里设置）"""
+    return {"level": config.deflate_level, "memLevel": config.deflate_mem_level}
+
+
+def server_deflate_extensions(config: WebSocketConfig) -> Optional[List[Any]]:
+    """
+    websockets 服务器的 permessage-deflate 扩展
+
+    Returns:
+        扩展工厂列表；未启用 deflate 时返回None（不协商压缩）
+    """
+    if config.transport_compression != CompressionMode.DEFLATE.value:
+        return None
+    from websockets.extensions.permessage_deflate import ServerPerMessageDeflateFactory
+
+    return [ServerPerMessageDeflateFactory(
+        server_max_window_bits=config.deflate_window_bits,
+        client_max_window_bits=config.deflate_window_bits,
+        compress_settings=deflate_compress_settings(config),
+    )]
+
+
+def uvicorn_websocket_options(config: WebSocketConfig) -> Dict[str, Any]:
+    """
+    FastAPI 端点的 permessage-deflate 由 ASGI 服务器协商，启动 uvicorn 时传入这些参数
+
+        uvicorn.run(app, **uvicorn_websocket_options(config))
+
+    未安装 websockets 时由 uvicorn 自动选择实现（wsproto 同样支持该参数）
+    """
+    options: Dict[str, Any] = {
+        "ws_per_message_deflate": config.transport_compression == CompressionMode.DEFLATE.value,
+    }
+    if importlib.util.find_spec("websockets") is not None:
+        options["ws"] = "websockets"
+    return options
+
+
+def negotiated_deflate(websocket: Any) -> bool:
+    """websockets 库连接是否已协商 permessage-deflate"""
+    protocol = getattr(websocket, "protocol", websocket)
+    extensions = getattr(protocol, "extensions", None) or ()
+    return any(getattr(ext, "name", "") == "permessage-deflate" for ext in extensions)
+
+
+async def asgi_negotiated_deflate(websocket: Any, timeout: float = 5.0) -> bool:
+    """
+    FastAPI 连接（accept 之后）实际协商的 permessage-deflate
+
+    uvicorn 的 websockets 实现把协议对象的 asgi_send 交给应用，握手完成后协议对象上
+    保存着协商结果；无法取得协议对象（如 wsproto 实现）时视为未压缩。
+    """
+    protocol = getattr(getattr(websocket, "_send", None), "__self__", None)
+    if protocol is None:
+        return False
+    completed = getattr(protocol, "handshake_completed_event", None)
+    if completed is not None:
+        try:
+            await asyncio.wait_for(completed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+    return negotiated_deflate(protocol)
+
+
+class ZstdDictionary:
+    """zstd 压缩字典（服务端与客户端共用同一份字典内容）"""
+
+    def __init__(self, data: bytes, level: int = 3):
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("未安装zstandard，无法使用zstd压缩")
+        self.data = data
+        self.level = level
+        self._dict = zstandard.ZstdCompressionDict(data)
+        self.dict_id = self._dict.dict_id()
+        self._compressor = zstandard.ZstdCompressor(
+            level=level, dict_data=self._dict, write_checksum=False, write_dict_id=False
+        )
+        self._decompressor = zstandard.ZstdDecompressor(dict_data=self._dict)
+
+    @classmethod
+    def load(cls, path: Union[str, Path], level: int = 3) -> "ZstdDictionary":
+        """从文件加载训练好的字典"""
+        return cls(Path(path).read_bytes(), level)
+
+    @classmethod
+    def from_base64(cls, text: str) -> "ZstdDictionary":
+        return cls(base64.b64decode(text))
+
+    def to_base64(self) -> str:
+        return base64.b64encode(self.data).decode("ascii")
+
+    def compress(self, payload: bytes) -> bytes:
+        return self._compressor.compress(payload)
+
+    def decompress(self, payload: bytes) -> bytes:
+        return self._decompressor.decompress(payload)
+
+
+def train_zstd_dictionary(samples: Iterable[bytes], dict_size: int = DEFAULT_DICTIONARY_SIZE) -> bytes:
+    """
+    用录制的行情帧训练 zstd 字典
+
+    Args:
+        samples: 按线上编码序列化后的帧（训练与使用时的编码应一致）
+        dict_size: 字典字节数
+    """
+    if not ZSTD_AVAILABLE:
+        raise RuntimeError("未安装zstandard，无法训练字典")
+    samples = list(samples)
+    if not samples:
+        raise ValueError("没有训练样本")
+    return zstandard.train_dictionary(dict_size, samples).as_bytes()
+
+
+_dictionary: Optional[ZstdDictionary] = None
+_dictionary_path: Optional[str] = None
+
+
+def get_zstd_dictionary(config: WebSocketConfig) -> Optional[ZstdDictionary]:
+    """按配置加载 zstd 字典（进程内只加载一次），不可用时返回None"""
+    global _dictionary, _dictionary_path
+    path = config.zstd_dictionary_path
+    if not path or not ZSTD_AVAILABLE:
+        return None
+    if _dictionary is None or _dictionary_path != path:
+        try:
+            _dictionary = ZstdDictionary.load(path, config.zstd_level)
+            _dictionary_path = path
+            logger.info(f"已加载zstd字典 {path}（dict_id={_dictionary.dict_id}, {len(_dictionary.data)}字节）")
+        except (OSError, zstandard.ZstdError) as e:
+            logger.error(f"加载zstd字典失败 {path}: {e}")
+            return None
+    return _dictionary
+
+
+def negotiate_compression(requested: Optional[str], config: WebSocketConfig) -> Optional[ZstdDictionary]:
+    """
+    确定连接的帧压缩
+
+    Returns:
+        客户端请求 zstd 且服务端已配置字典时返回字典，否则None（仍可能有 deflate 传输压缩）
+    """
+    if not requested or requested.strip().lower() != CompressionMode.ZSTD.value:
+        return None
+    dictionary = get_zstd_dictionary(config)
+    if dictionary is None:
+        logger.warning("客户端请求zstd压缩，但服务端未配置字典或未安装zstandard")
+    return dictionary
+
+
+def decompress_zstd_frame(raw: bytes, dictionary: Optional[ZstdDictionary]) -> Union[str, bytes]:
+    """解压 zstd 帧，JSON 内容还原为文本，msgpack 内容保持二进制"""
+    if dictionary is None:
+        raise ValueError("收到zstd帧但没有字典")
+    payload = dictionary.decompress(raw)
+    if payload and payload[0] in _JSON_LEADING_BYTES:
+        return payload.decode("utf-8")
+    return payload
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """从录制的帧离线训练 zstd 字典"""
+    parser = argparse.ArgumentParser(description="训练WebSocket行情帧的zstd压缩字典")
+    parser.add_argument("inputs", nargs="+", help="录制文件，每行一条JSON消息")
+    parser.add_argument("-o", "--output", required=True, help="字典输出路径")
+    parser.add_argument("--encoding", default="json", choices=["json", "msgpack", "compact"],
+                        help="按哪种线上编码训练（与客户端协商的编码一致）")
+    parser.add_argument("--size", type=int, default=DEFAULT_DICTIONARY_SIZE, help="字典字节数")
+    args = parser.parse_args(argv)
+
+    from .websocket_codec import WireEncoding, encode_message
+    from .websocket_models import WebSocketMessage
+
+    encoding = WireEncoding(args.encoding)
+    samples = []
+    for name in args.inputs:
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                frame = encode_message(WebSocketMessage(**json.loads(line)), encoding)
+                payload = frame.payload
+                samples.append(payload if isinstance(payload, bytes) else payload.encode("utf-8"))
+
+    data = train_zstd_dictionary(samples, args.size)
+    Path(args.output).write_bytes(data)
+    print(f"已写入字典 {args.output}: {len(data)} 字节, {len(samples)} 条样本, "
+          f"dict_id={zstandard.ZstdCompressionDict(data).dict_id()}")
+    return 0
+
+
+__all__ = [
+    "CompressionMode",
+    "ZstdDictionary",
+    "ZSTD_AVAILABLE",
+    "ZSTD_MAGIC",
+    "server_deflate_extensions",
+    "uvicorn_websocket_options",
+    "deflate_compress_settings",
+    "negotiated_deflate",
+    "asgi_negotiated_deflate",
+    "train_zstd_dictionary",
+    "get_zstd_dictionary",
+    "negotiate_compression",
+    "decompress_zstd_frame",
+]
+
+
+if __name__ == "__main__":
+    sys.exit(main())
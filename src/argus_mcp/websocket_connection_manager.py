@@ -13,6 +13,12 @@ from .websocket_models import (
     ConnectionResult, WebSocketMessage, MessageType, StatusMessage,
     HeartbeatMessage, WebSocketConfig, ErrorMessage
 )
+from .websocket_codec import (
+    CodecSession, EncodedFrame, WireEncoding, negotiate_batching, negotiate_encoding, send_frame
+)
+from .websocket_compression import (
+    CompressionMode, asgi_negotiated_deflate, negotiate_compression, negotiated_deflate
+)
 
 logger = logging.getLogger(__name__)
 
@@ -24,10 +30,23 @@ class WebSocketConnectionManager:
         self.config = config or WebSocketConfig()
         self.active_connections: Dict[str, WebSocketConnection] = {}
         self.websocket_objects: Dict[str, WebSocket] = {}
+        self.codec_sessions: Dict[str, CodecSession] = {}
         self.connection_stats = ConnectionStats()
         self._cleanup_task: Optional[asyncio.Task] = None
         self._monitoring_task: Optional[asyncio.Task] = None
         self._lock = asyncio.Lock()
+        # 广播消息的批量队列（MessageRouter），未设置时逐条发送
+        self.message_batcher = None
+        
+    def set_message_batcher(self, router) -> None:
+        """
+        启用批量推送：广播消息进入路由器的按客户端队列，合并为一帧发送
+        
+        Args:
+            router: MessageRouter 实例
+        """
+        self.message_batcher = router
+        router.set_batch_sender(self.send_frames)
         
     async def start(self) -> None:
         """启动连接管理器"""
@@ -51,7 +70,10 @@ class WebSocketConnectionManager:
         self,
         websocket: WebSocket,
         client_id: str,
-        auth_token: Optional[str] = None
+        auth_token: Optional[str] = None,
+        encoding: Optional[str] = None,
+        compression: Optional[str] = None,
+        batch: Optional[str] = None
     ) -> ConnectionResult:
         """
         建立WebSocket连接
@@ -60,6 +82,9 @@ class WebSocketConnectionManager:
             websocket: WebSocket连接对象
             client_id: 客户端唯一标识
             auth_token: 认证令牌
+            encoding: 客户端请求的线上编码（json/msgpack/compact）
+            compression: 客户端请求的帧压缩（zstd），permessage-deflate 由ASGI服务器在握手时协商
+            batch: 客户端是否能展开批量帧（batch=1），未声明的连接逐条接收
             
         Returns:
             ConnectionResult: 连接结果
@@ -95,19 +120,26 @@ class WebSocketConnectionManager:
             await websocket.accept()
             
             # 创建连接信息
+            wire_encoding = negotiate_encoding(encoding)
+            zstd = negotiate_compression(compression, self.config)
+            # 以握手实际协商的扩展为准（客户端提供但服务器未启用时不算压缩）
+            deflate = await asgi_negotiated_deflate(websocket)
             connection = WebSocketConnection(
                 client_id=client_id,
                 connected_at=datetime.now(),
                 last_ping=datetime.now(),
                 auth_info=auth_info,
                 remote_address=self._get_remote_address(websocket),
-                status=ConnectionStatus.CONNECTED
+                status=ConnectionStatus.CONNECTED,
+                encoding=wire_encoding.value,
+                compression=self._compression_name(zstd is not None, deflate)
             )
             
             # 存储连接
             async with self._lock:
                 self.active_connections[client_id] = connection
                 self.websocket_objects[client_id] = websocket
+                self.codec_sessions[client_id] = CodecSession(wire_encoding, zstd, negotiate_batching(batch))
                 self.connection_stats.total_connections += 1
                 self.connection_stats.active_connections = len(self.active_connections)
                 
@@ -132,6 +164,72 @@ class WebSocketConnectionManager:
                 error="CONNECTION_FAILED"
             )
     
+    async def register_connection(
+        self,
+        client_id: str,
+        websocket: Any,
+        client_info: Optional[Dict[str, Any]] = None
+    ) -> ConnectionResult:
+        """
+        登记已完成握手的连接（独立websockets服务器使用）
+        
+        Args:
+            client_id: 客户端唯一标识
+            websocket: websockets库的连接对象
+            client_info: 客户端信息
+            
+        Returns:
+            ConnectionResult: 连接结果
+        """
+        if len(self.active_connections) >= self.config.max_connections:
+            return ConnectionResult(
+                success=False,
+                client_id=client_id,
+                message=f"连接数已达上限: {self.config.max_connections}",
+                error="MAX_CONNECTIONS_EXCEEDED"
+            )
+        
+        client_info = client_info or {}
+        wire_encoding = negotiate_encoding(client_info.get("encoding"))
+        zstd = negotiate_compression(client_info.get("compression"), self.config)
+        connection = WebSocketConnection(
+            client_id=client_id,
+            connected_at=datetime.now(),
+            last_ping=datetime.now(),
+            remote_address=client_info.get("remote_address", "unknown"),
+            status=ConnectionStatus.CONNECTED,
+            encoding=wire_encoding.value,
+            compression=self._compression_name(zstd is not None, negotiated_deflate(websocket))
+        )
+        
+        async with self._lock:
+            self.active_connections[client_id] = connection
+            self.websocket_objects[client_id] = websocket
+            self.codec_sessions[client_id] = CodecSession(
+                wire_encoding, zstd, negotiate_batching(client_info.get("batch"))
+            )
+            self.connection_stats.total_connections += 1
+            self.connection_stats.active_connections = len(self.active_connections)
+        
+        return ConnectionResult(
+            success=True,
+            client_id=client_id,
+            message="连接成功",
+            connection_info=connection
+        )
+    
+    async def unregister_connection(self, client_id: str) -> None:
+        """移除连接记录（连接由websockets服务器负责关闭）"""
+        async with self._lock:
+            connection = self.active_connections.pop(client_id, None)
+            self.websocket_objects.pop(client_id, None)
+            self.codec_sessions.pop(client_id, None)
+            if self.message_batcher is not None:
+                self.message_batcher.discard_batch(client_id)
+            if connection:
+                connection.status = ConnectionStatus.DISCONNECTED
+                self.connection_stats.active_connections = len(self.active_connections)
+    
     async def disconnect(self, client_id: str) -> None:
         """
         断开WebSocket连接
@@ -146,6 +244,9 @@ class WebSocketConnectionManager:
             async with self._lock:
                 connection = self.active_connections.pop(client_id, None)
                 websocket = self.websocket_objects.pop(client_id, None)
+                self.codec_sessions.pop(client_id, None)
+                if self.message_batcher is not None:
+                    self.message_batcher.discard_batch(client_id)
                 
                 if websocket:
                     try:
@@ -162,10 +263,52 @@ class WebSocketConnectionManager:
         except Exception as e:
             logger.error(f"Error disconnecting client {client_id}: {e}")
     
+    def get_encoding(self, client_id: str) -> WireEncoding:
+        """获取客户端协商的线上编码"""
+        session = self.codec_sessions.get(client_id)
+        return session.encoding if session else WireEncoding.JSON
+    
+    def batching_for(self, client_id: str) -> bool:
+        """客户端是否接收批量帧（需服务端开启批量推送且客户端在握手时声明）"""
+        if self.message_batcher is None or not self.message_batcher.batching_enabled:
+            return False
+        session = self.codec_sessions.get(client_id)
+        return session is not None and session.batching
+    
+    @staticmethod
+    def _compression_name(zstd: bool, deflate: bool) -> str:
+        if zstd:
+            return CompressionMode.ZSTD.value
+        return CompressionMode.DEFLATE.value if deflate else CompressionMode.NONE.value
+    
+    def get_compression_info(self, client_id: str, known_dictionary_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        welcome 消息中的压缩信息
+        
+        Args:
+            client_id: 客户端唯一标识
+            known_dictionary_id: 客户端已持有的zstd字典ID，与服务端一致时不重复下发字典
+        """
+        connection = self.active_connections.get(client_id)
+        info: Dict[str, Any] = {"compression": connection.compression if connection else CompressionMode.NONE.value}
+        session = self.codec_sessions.get(client_id)
+        if session is not None and session.zstd is not None:
+            info["zstd_dictionary_id"] = session.zstd.dict_id
+            if str(known_dictionary_id) != str(session.zstd.dict_id):
+                info["zstd_dictionary"] = session.zstd.to_base64()
+        return info
+    
+    def activate_compression(self, client_id: str) -> None:
+        """welcome 发送后开始按协商的方式压缩帧"""
+        session = self.codec_sessions.get(client_id)
+        if session is not None:
+            session.compression_active = True
+    
     async def send_message(
         self,
         client_id: str,
-        message: WebSocketMessage
+        message: WebSocketMessage,
+        encode_cache: Optional[Dict[WireEncoding, EncodedFrame]] = None
     ) -> bool:
         """
         向指定客户端发送消息
@@ -173,35 +316,89 @@ class WebSocketConnectionManager:
         Args:
             client_id: 客户端唯一标识
             message: 要发送的消息
+            encode_cache: 广播共享的编码缓存（同一消息每种编码只序列化一次）
+            
+        Returns:
+            bool: 发送是否成功
+        """
+        if client_id not in self.websocket_objects:
+            logger.warning(f"Client {client_id} not found")
+            return False
+        
+        # 先发送已排队的批量消息，保证直接发送的消息不越过它们
+        if self.message_batcher is not None:
+            await self.message_batcher.flush_batch(client_id)
+        
+        frames = self._prepare_frames(client_id, message, encode_cache)
+        if frames is None:
+            return False
+        return await self.send_frames(client_id, frames)
+    
+    def _prepare_frames(
+        self,
+        client_id: str,
+        message: WebSocketMessage,
+        encode_cache: Optional[Dict[WireEncoding, EncodedFrame]] = None
+    ) -> Optional[List[EncodedFrame]]:
+        """按连接协商的编码准备帧（compact编码首次遇到新字段表时会先发送schema帧）"""
+        session = self.codec_sessions.get(client_id)
+        if session is None:
+            session = self.codec_sessions[client_id] = CodecSession()
+        
+        try:
+            frames = session.frames_for(message, encode_cache)
+        except Exception as e:
+            logger.error(f"Error encoding message for {client_id}: {e}")
+            return None
+        
+        # 检查消息大小
+        if frames[-1].size > self.config.max_message_size:
+            logger.error(f"Message too large for client {client_id}")
+            return None
+        return frames
+    
+    async def send_frames(
+        self,
+        client_id: str,
+        frames: List[EncodedFrame],
+        message_count: int = 1
+    ) -> bool:
+        """
+        向指定客户端发送已编码的帧
+        
+        Args:
+            client_id: 客户端唯一标识
+            frames: 要发送的帧
+            message_count: 这些帧承载的消息数（批量帧包含多条消息）
             
         Returns:
             bool: 发送是否成功
         """
         try:
-            if client_id not in self.websocket_objects:
+            websocket = self.websocket_objects.get(client_id)
+            if websocket is None:
                 logger.warning(f"Client {client_id} not found")
                 return False
-                
-            websocket = self.websocket_objects[client_id]
             
-            # 准备消息
-            message_json = message.model_dump_json()
+            session = self.codec_sessions.get(client_id)
+            wire_frames = frames
+            if session is not None and session.compression_active:
+                wire_frames = [session.wire_frame(frame) for frame in frames]
             
-            # 检查消息大小
-            if len(message_json.encode('utf-8')) > self.config.max_message_size:
-                logger.error(f"Message too large for client {client_id}")
-                return False
-            
-            # 发送消息
-            await websocket.send_text(message_json)
+            # 发送消息（FastAPI WebSocket 与 websockets 库连接的发送接口不同）
+            for frame in wire_frames:
+                await send_frame(websocket, frame)
+            if session is not None:
+                session.mark_sent(frames)
             
             # 更新统计
+            frame_bytes = sum(frame.size for frame in wire_frames)
             async with self._lock:
                 if client_id in self.active_connections:
-                    self.active_connections[client_id].message_count += 1
-                    self.active_connections[client_id].bytes_sent += len(message_json.encode('utf-8'))
-                self.connection_stats.messages_sent += 1
-                self.connection_stats.bytes_sent += len(message_json.encode('utf-8'))
+                    self.active_connections[client_id].message_count += message_count
+                    self.active_connections[client_id].bytes_sent += frame_bytes
+                self.connection_stats.messages_sent += message_count
+                self.connection_stats.bytes_sent += frame_bytes
                 
             return True
             
@@ -213,6 +410,20 @@ class WebSocketConnectionManager:
             logger.error(f"Error sending message to {client_id}: {e}")
             return False
     
+    async def _queue_message(
+        self,
+        client_id: str,
+        message: WebSocketMessage,
+        encode_cache: Dict[WireEncoding, EncodedFrame]
+    ) -> bool:
+        """编码后加入客户端的批量队列"""
+        if client_id not in self.websocket_objects:
+            return False
+        frames = self._prepare_frames(client_id, message, encode_cache)
+        if frames is None:
+            return False
+        return await self.message_batcher.add_to_batch(client_id, frames)
+    
     async def broadcast_message(
         self,
         message: WebSocketMessage,
@@ -237,11 +448,14 @@ class WebSocketConnectionManager:
         
         start_time = asyncio.get_event_loop().time()
         
-        # 并发发送消息
+        # 并发发送消息（共享编码缓存，消息按编码各序列化一次）
+        # 声明支持批量帧的客户端进入各自的队列，由批量帧合并发送
+        encode_cache: Dict[WireEncoding, EncodedFrame] = {}
         tasks = []
         for client_id in target_clients:
             if client_id in self.active_connections:
-                tasks.append(self.send_message(client_id, message))
+                send = self._queue_message if self.batching_for(client_id) else self.send_message
+                tasks.append(send(client_id, message, encode_cache))
         
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
@@ -1,13 +1,17 @@
 """
 WebSocket 心跳检测和自动重连机制
 实现客户端和服务端的心跳检测、连接状态监控和自动重连功能
+
+心跳调度使用单个哈希时间轮：所有连接共享一个调度任务，每个刻度批量发送到期的心跳，
+并在同一次扫描中完成超时检测。心跳帧由预序列化模板拼接，只替换客户端ID、时间和序号。
 """
 
 import asyncio
+import json
 import logging
 import time
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Callable, Any
+from typing import Dict, List, Optional, Callable, Any, Set, Tuple
 from dataclasses import dataclass, field
 
 from .websocket_models import (
@@ -25,6 +29,9 @@ class HeartbeatConfig:
     max_missed_heartbeats: int = 3  # 最大丢失心跳次数
     reconnect_interval: float = 5.0  # 重连间隔（秒）
     max_reconnect_attempts: int = 5  # 最大重连尝试次数
+    wheel_resolution: float = 0.5  # 时间轮刻度（秒），即心跳调度精度
+    wheel_slots: int = 512  # 时间轮槽数
+    send_timeout: float = 5.0  # 单次心跳发送超时（秒）
 
 
 @dataclass
@@ -39,17 +46,160 @@ class ConnectionHealth:
     total_heartbeats_sent: int = 0
     total_heartbeats_received: int = 0
     average_latency_ms: float = 0.0
+    last_heartbeat_monotonic: float = field(default_factory=time.monotonic)
+
+
+class _HeartbeatSlot:
+    """时间轮中单个连接的调度状态"""
+    
+    __slots__ = ('websocket', 'client_fragment', 'deadline_tick', 'sending')
+    
+    def __init__(self, websocket, client_fragment: str, deadline_tick: int):
+        self.websocket = websocket
+        self.client_fragment = client_fragment  # 已JSON转义的client_id
+        self.deadline_tick = deadline_tick
+        self.sending = False
+
+
+class HeartbeatFrameTemplate:
+    """
+    预序列化的心跳帧模板
+    
+    用带标记值的 WebSocketMessage 序列化一次，切分出固定片段；
+    之后每帧只需拼接 client_id、server_time、sequence 和 message_id，
+    输出与 ``WebSocketMessage.model_dump_json()`` 的结构一致。
+    """
+    
+    _CLIENT = "__hb_client__"
+    _TIME = "__hb_time__"
+    _SEQUENCE = 918273645
+    _MESSAGE_ID = "__hb_message__"
+    
+    def __init__(self):
+        sample = WebSocketMessage(
+            type=MessageType.HEARTBEAT,
+            timestamp=datetime(2000, 1, 1),
+            data={
+                "client_id": self._CLIENT,
+                "server_time": self._TIME,
+                "sequence": self._SEQUENCE
+            },
+            message_id=self._MESSAGE_ID
+        ).model_dump_json()
+        
+        # 消息级timestamp与data.server_time使用同一个时间值
+        sample = sample.replace('"2000-01-01T00:00:00"', f'"{self._TIME}"', 1)
+        
+        parts: List[str] = []
+        fields: List[str] = []
+        rest = sample
+        markers = (self._CLIENT, self._TIME, str(self._SEQUENCE), self._MESSAGE_ID)
+        while True:
+            positions = [(rest.find(m), m) for m in markers if rest.find(m) >= 0]
+            if not positions:
+                break
+            index, marker = min(positions)
+            parts.append(rest[:index])
+            fields.append(marker)
+            rest = rest[index + len(marker):]
+        parts.append(rest)
+        
+        self._parts = parts
+        self._fields = fields
+    
+    @staticmethod
+    def escape_client_id(client_id: str) -> str:
+        """JSON转义客户端ID（注册时计算一次）"""
+        return json.dumps(client_id, ensure_ascii=False)[1:-1]
+    
+    def render(self, client_fragment: str, server_time: str, sequence: int) -> str:
+        """拼接一帧心跳消息"""
+        values = {
+            self._CLIENT: client_fragment,
+            self._TIME: server_time,
+            str(self._SEQUENCE): str(sequence),
+            self._MESSAGE_ID: f"hb-{client_fragment}-{sequence}",
+        }
+        parts = self._parts
+        out = [parts[0]]
+        for i, name in enumerate(self._fields):
+            out.append(values[name])
+            out.append(parts[i + 1])
+        return "".join(out)
+
+
+class HashedTimerWheel:
+    """
+    哈希时间轮
+    
+    每个槽保存 {key: 到期刻度}，注册/取消均为O(1)；
+    推进时只检查当前槽，到期刻度未到的条目（需要多转几圈）保留在槽内。
+    """
+    
+    def __init__(self, resolution: float, slots: int):
+        self.resolution = resolution
+        self.slots = slots
+        self._wheel: List[Dict[str, int]] = [dict() for _ in range(slots)]
+        self._slot_of: Dict[str, int] = {}
+        self.current_tick = self.tick_at(time.monotonic())
+    
+    def tick_at(self, monotonic_time: float) -> int:
+        """将单调时钟时间换算为刻度"""
+        return int(monotonic_time / self.resolution)
+    
+    def schedule(self, key: str, deadline_tick: int):
+        """安排（或重新安排）key 在指定刻度到期"""
+        self.cancel(key)
+        # 已经过去的刻度放到下一刻度，避免被永远跳过
+        deadline_tick = max(deadline_tick, self.current_tick + 1)
+        slot = deadline_tick % self.slots
+        self._wheel[slot][key] = deadline_tick
+        self._slot_of[key] = slot
+    
+    def cancel(self, key: str):
+        """取消调度"""
+        slot = self._slot_of.pop(key, None)
+        if slot is not None:
+            self._wheel[slot].pop(key, None)
+    
+    def advance(self, to_tick: int) -> List[str]:
+        """推进到指定刻度，返回期间到期的全部key"""
+        due: List[str] = []
+        # 落后超过一整圈时，每个槽只需检查一次
+        start = max(self.current_tick + 1, to_tick - self.slots + 1)
+        for tick in range(start, to_tick + 1):
+            bucket = self._wheel[tick % self.slots]
+            if not bucket:
+                continue
+            expired = [key for key, deadline in bucket.items() if deadline <= to_tick]
+            for key in expired:
+                del bucket[key]
+                del self._slot_of[key]
+            due.extend(expired)
+        self.current_tick = max(self.current_tick, to_tick)
+        return due
+    
+    def __len__(self) -> int:
+        return len(self._slot_of)
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self._slot_of
 
 
 class WebSocketHeartbeatManager:
-    """WebSocket 心跳管理器"""
+    """WebSocket 心跳管理器（单任务时间轮调度）"""
     
     def __init__(self, config: HeartbeatConfig = None):
         self.config = config or HeartbeatConfig()
         self.connection_health: Dict[str, ConnectionHealth] = {}
-        self.heartbeat_tasks: Dict[str, asyncio.Task] = {}
         self.is_running = False
-        self._cleanup_task: Optional[asyncio.Task] = None
+        
+        self._slots: Dict[str, _HeartbeatSlot] = {}
+        self._wheel = HashedTimerWheel(self.config.wheel_resolution, self.config.wheel_slots)
+        self._interval_ticks = max(1, round(self.config.interval / self.config.wheel_resolution))
+        self._frame_template = HeartbeatFrameTemplate()
+        self._wheel_task: Optional[asyncio.Task] = None
+        self._send_tasks: Set[asyncio.Task] = set()
         
         # 回调函数
         self.on_connection_lost: Optional[Callable[[str], None]] = None
@@ -63,7 +213,8 @@ class WebSocketHeartbeatManager:
             return
         
         self.is_running = True
-        self._cleanup_task = asyncio.create_task(self._cleanup_loop())
+        self._wheel.current_tick = self._wheel.tick_at(time.monotonic())
+        self._wheel_task = asyncio.create_task(self._wheel_loop())
         logger.info("WebSocket HeartbeatManager started")
     
     async def stop(self):
@@ -73,23 +224,24 @@ class WebSocketHeartbeatManager:
         
         self.is_running = False
         
-        # 停止所有心跳任务
-        for task in self.heartbeat_tasks.values():
-            task.cancel()
-        
-        # 等待任务完成
-        if self.heartbeat_tasks:
-            await asyncio.gather(*self.heartbeat_tasks.values(), return_exceptions=True)
-        
-        # 停止清理任务
-        if self._cleanup_task:
-            self._cleanup_task.cancel()
+        # 停止时间轮任务
+        if self._wheel_task:
+            self._wheel_task.cancel()
             try:
-                await self._cleanup_task
+                await self._wheel_task
             except asyncio.CancelledError:
                 pass
+            self._wheel_task = None
         
-        self.heartbeat_tasks.clear()
+        # 等待正在发送的心跳批次
+        if self._send_tasks:
+            for task in self._send_tasks:
+                task.cancel()
+            await asyncio.gather(*self._send_tasks, return_exceptions=True)
+        
+        for client_id in list(self._slots):
+            self._wheel.cancel(client_id)
+        self._slots.clear()
         self.connection_health.clear()
         logger.info("WebSocket HeartbeatManager stopped")
     
@@ -108,13 +260,16 @@ class WebSocketHeartbeatManager:
             
             self.connection_health[client_id] = health
             
-            # 启动心跳任务
-            heartbeat_task = asyncio.create_task(
-                self._heartbeat_loop(client_id, websocket)
+            # 放入时间轮：首个心跳在一个间隔之后
+            slot = _HeartbeatSlot(
+                websocket,
+                HeartbeatFrameTemplate.escape_client_id(client_id),
+                self._wheel.tick_at(health.last_heartbeat_monotonic) + self._interval_ticks
             )
-            self.heartbeat_tasks[client_id] = heartbeat_task
+            self._slots[client_id] = slot
+            self._wheel.schedule(client_id, slot.deadline_tick)
             
-            logger.info(f"Registered connection {client_id} for heartbeat monitoring")
+            logger.debug(f"Registered connection {client_id} for heartbeat monitoring")
             return True
             
         except Exception as e:
@@ -124,20 +279,14 @@ class WebSocketHeartbeatManager:
     async def unregister_connection(self, client_id: str):
         """取消注册连接"""
         try:
-            # 停止心跳任务
-            if client_id in self.heartbeat_tasks:
-                task = self.heartbeat_tasks.pop(client_id)
-                task.cancel()
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    pass
+            self._wheel.cancel(client_id)
+            self._slots.pop(client_id, None)
             
             # 移除健康状态
             if client_id in self.connection_health:
                 del self.connection_health[client_id]
             
-            logger.info(f"Unregistered connection {client_id} from heartbeat monitoring")
+            logger.debug(f"Unregistered connection {client_id} from heartbeat monitoring")
             
         except Exception as e:
             logger.error(f"Error unregistering connection {client_id}: {e}")
@@ -151,6 +300,7 @@ class WebSocketHeartbeatManager:
             
             health = self.connection_health[client_id]
             health.last_heartbeat = datetime.now()
+            health.last_heartbeat_monotonic = time.monotonic()
             health.missed_heartbeats = 0
             health.total_heartbeats_received += 1
             
@@ -168,6 +318,12 @@ class WebSocketHeartbeatManager:
                 health.reconnect_attempts = 0
                 logger.info(f"Connection {client_id} health restored")
                 
+                # 不健康期间只保留了清理调度，恢复时重新按心跳间隔调度
+                slot = self._slots.get(client_id)
+                if slot is not None:
+                    slot.deadline_tick = self._wheel.current_tick + self._interval_ticks
+                    self._wheel.schedule(client_id, slot.deadline_tick)
+                
                 if self.on_connection_restored:
                     try:
                         await self.on_connection_restored(client_id)
@@ -177,99 +333,137 @@ class WebSocketHeartbeatManager:
         except Exception as e:
             logger.error(f"Error updating heartbeat for {client_id}: {e}")
     
-    async def _heartbeat_loop(self, client_id: str, websocket):
-        """心跳循环"""
+    async def _wheel_loop(self):
+        """时间轮调度循环：按刻度推进，批量处理到期连接"""
+        resolution = self.config.wheel_resolution
         try:
-            while self.is_running and client_id in self.connection_health:
-                await asyncio.sleep(self.config.interval)
+            while self.is_running:
+                now = time.monotonic()
+                next_tick_time = (self._wheel.current_tick + 1) * resolution
+                if next_tick_time > now:
+                    await asyncio.sleep(next_tick_time - now)
                 
-                health = self.connection_health.get(client_id)
-                if not health:
-                    break
-                
-                try:
-                    # 发送心跳消息
-                    heartbeat_msg = WebSocketMessage(
-                        type=MessageType.HEARTBEAT,
-                        data={
-                            "client_id": client_id,
-                            "server_time": datetime.now().isoformat(),
-                            "sequence": health.total_heartbeats_sent + 1
-                        }
-                    )
-                    
-                    await websocket.send_text(heartbeat_msg.model_dump_json())
-                    health.total_heartbeats_sent += 1
-                    
-                    # 检查心跳超时
-                    time_since_last_heartbeat = datetime.now() - health.last_heartbeat
-                    
-                    if time_since_last_heartbeat.total_seconds() > self.config.timeout:
-                        health.missed_heartbeats += 1
-                        logger.warning(f"Missed heartbeat for {client_id}, count: {health.missed_heartbeats}")
-                        
-                        # 检查是否超过最大丢失次数
-                        if health.missed_heartbeats >= self.config.max_missed_heartbeats:
-                            health.is_healthy = False
-                            logger.error(f"Connection {client_id} unhealthy, missed {health.missed_heartbeats} heartbeats")
-                            
-                            if self.on_heartbeat_timeout:
-                                try:
-                                    await self.on_heartbeat_timeout(client_id)
-                                except Exception as e:
-                                    logger.error(f"Error in heartbeat timeout callback: {e}")
-                            
-                            # 触发连接丢失回调
-                            if self.on_connection_lost:
-                                try:
-                                    await self.on_connection_lost(client_id)
-                                except Exception as e:
-                                    logger.error(f"Error in connection lost callback: {e}")
-                            
-                            break
-                    
-                except Exception as e:
-                    logger.error(f"Error sending heartbeat to {client_id}: {e}")
-                    health.missed_heartbeats += 1
-                    
-                    if health.missed_heartbeats >= self.config.max_missed_heartbeats:
-                        health.is_healthy = False
-                        break
+                due = self._wheel.advance(self._wheel.tick_at(time.monotonic()))
+                if due:
+                    await self._sweep(due)
                 
         except asyncio.CancelledError:
-            logger.info(f"Heartbeat loop cancelled for {client_id}")
+            logger.info("Heartbeat wheel loop cancelled")
         except Exception as e:
-            logger.error(f"Heartbeat loop error for {client_id}: {e}")
-        finally:
-            # 清理
-            if client_id in self.heartbeat_tasks:
-                del self.heartbeat_tasks[client_id]
+            logger.error(f"Heartbeat wheel loop error: {e}")
     
-    async def _cleanup_loop(self):
-        """清理循环"""
-        try:
-            while self.is_running:
-                await asyncio.sleep(60)  # 每分钟清理一次
-                
-                current_time = datetime.now()
-                unhealthy_connections = []
-                
-                for client_id, health in self.connection_health.items():
-                    # 检查长时间未活跃的连接
-                    time_since_last_heartbeat = current_time - health.last_heartbeat
-                    
-                    if time_since_last_heartbeat.total_seconds() > (self.config.timeout * 2):
-                        unhealthy_connections.append(client_id)
-                
-                # 清理不健康的连接
-                for client_id in unhealthy_connections:
-                    logger.info(f"Cleaning up unhealthy connection: {client_id}")
-                    await self.unregister_connection(client_id)
+    async def _sweep(self, due: List[str]):
+        """处理一批到期连接：检测超时、重新调度并批量发送心跳"""
+        now = time.monotonic()
+        server_time = datetime.now().isoformat()
+        next_deadline = self._wheel.current_tick + self._interval_ticks
+        timeout = self.config.timeout
+        render = self._frame_template.render
+        
+        batch: List[Tuple[str, _HeartbeatSlot, ConnectionHealth, str]] = []
+        timed_out: List[str] = []
+        stale: List[str] = []
+        
+        for client_id in due:
+            slot = self._slots.get(client_id)
+            health = self.connection_health.get(client_id)
+            if slot is None or health is None:
+                continue
+            
+            silence = now - health.last_heartbeat_monotonic
+            
+            # 长时间未活跃的连接直接清理
+            if silence > timeout * 2:
+                stale.append(client_id)
+                continue
+            
+            # 已判定不健康的连接不再发送心跳，只等待恢复或到期清理
+            if not health.is_healthy:
+                self._schedule_cleanup(client_id, slot, health)
+                continue
+            
+            # 检查心跳超时
+            if silence > timeout:
+                health.missed_heartbeats += 1
+                logger.warning(f"Missed heartbeat for {client_id}, count: {health.missed_heartbeats}")
                 
-        except asyncio.CancelledError:
-            logger.info("Heartbeat cleanup loop cancelled")
-        except Exception as e:
-            logger.error(f"Heartbeat cleanup loop error: {e}")
+                # 检查是否超过最大丢失次数
+                if health.missed_heartbeats >= self.config.max_missed_heartbeats:
+                    health.is_healthy = False
+                    logger.error(f"Connection {client_id} unhealthy, missed {health.missed_heartbeats} heartbeats")
+                    timed_out.append(client_id)
+                    self._schedule_cleanup(client_id, slot, health)
+                    continue
+            
+            slot.deadline_tick = next_deadline
+            self._wheel.schedule(client_id, next_deadline)
+            
+            # 上一帧仍未发出（慢客户端），本轮跳过，计为一次丢失
+            if slot.sending:
+                health.missed_heartbeats += 1
+                continue
+            
+            health.total_heartbeats_sent += 1
+            batch.append((client_id, slot, health, render(slot.client_fragment, server_time, health.total_heartbeats_sent)))
+        
+        if batch:
+            task = asyncio.create_task(self._send_batch(batch))
+            self._send_tasks.add(task)
+            task.add_done_callback(self._send_tasks.discard)
+        
+        for client_id in timed_out:
+            await self._handle_timeout(client_id)
+        
+        for client_id in stale:
+            logger.info(f"Cleaning up unhealthy connection: {client_id}")
+            await self.unregister_connection(client_id)
+    
+    async def _send_batch(self, batch: List[Tuple[str, _HeartbeatSlot, ConnectionHealth, str]]):
+        """并发发送一批心跳帧"""
+        for _, slot, _, _ in batch:
+            slot.sending = True
+        try:
+            results = await asyncio.gather(
+                *(asyncio.wait_for(slot.websocket.send_text(frame), self.config.send_timeout)
+                  for _, slot, _, frame in batch),
+                return_exceptions=True
+            )
+        finally:
+            for _, slot, _, _ in batch:
+                slot.sending = False
+        
+        for (client_id, _, health, _), result in zip(batch, results):
+            if not isinstance(result, BaseException):
+                continue
+            if isinstance(result, asyncio.CancelledError):
+                continue
+            logger.error(f"Error sending heartbeat to {client_id}: {result!r}")
+            health.missed_heartbeats += 1
+            
+            if health.missed_heartbeats >= self.config.max_missed_heartbeats:
+                health.is_healthy = False
+    
+    def _schedule_cleanup(self, client_id: str, slot: _HeartbeatSlot, health: ConnectionHealth):
+        """不健康连接改为在静默满两倍超时后到期，届时清理"""
+        slot.deadline_tick = self._wheel.tick_at(
+            health.last_heartbeat_monotonic + self.config.timeout * 2
+        ) + 1
+        self._wheel.schedule(client_id, slot.deadline_tick)
+    
+    async def _handle_timeout(self, client_id: str):
+        """心跳超时：触发回调"""
+        if self.on_heartbeat_timeout:
+            try:
+                await self.on_heartbeat_timeout(client_id)
+            except Exception as e:
+                logger.error(f"Error in heartbeat timeout callback: {e}")
+        
+        # 触发连接丢失回调
+        if self.on_connection_lost:
+            try:
+                await self.on_connection_lost(client_id)
+            except Exception as e:
+                logger.error(f"Error in connection lost callback: {e}")
     
     def get_connection_health(self, client_id: str) -> Optional[ConnectionHealth]:
         """获取连接健康状态"""
@@ -313,6 +507,7 @@ class WebSocketHeartbeatManager:
             "total_heartbeats_sent": total_heartbeats_sent,
             "total_heartbeats_received": total_heartbeats_received,
             "average_latency_ms": round(average_latency, 2),
+            "scheduled_connections": len(self._wheel),
             "config": {
                 "interval": self.config.interval,
                 "timeout": self.config.timeout,
@@ -452,6 +647,8 @@ class WebSocketReconnectManager:
 __all__ = [
     "HeartbeatConfig",
     "ConnectionHealth", 
+    "HashedTimerWheel",
+    "HeartbeatFrameTemplate",
     "WebSocketHeartbeatManager",
     "WebSocketReconnectManager"
 ]
\ No newline at end of file
@@ -8,6 +8,7 @@ from decimal import Decimal
 from typing import Optional, List, Dict, Any, Union
 from pydantic import BaseModel, Field
 from enum import Enum
+import itertools
 import uuid
 
 
@@ -22,6 +23,11 @@ class MessageType(str, Enum):
     KLINE_DATA = "kline_data"
     TRADE_DATA = "trade_data"
     DEPTH_DATA = "depth_data"
+    DEPTH_SNAPSHOT = "depth_snapshot"
+    DEPTH_UPDATE = "depth_update"
+    DEPTH_RESYNC = "depth_resync"
+    RESUME = "resume"
+    BATCH = "batch"
     STATUS = "status"
     ERROR = "error"
     PING = "ping"
@@ -66,6 +72,52 @@ class WebSocketMessage(BaseModel):
     message_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     compression: bool = False
 
+    @classmethod
+    def trusted(
+        cls,
+        type: MessageType,
+        data: Any = None,
+        timestamp: Optional[datetime] = None,
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> "WebSocketMessage":
+        """
+        构造服务端内部生成的消息（结构已知合法），跳过 pydantic 校验
+        
+        消息ID取自进程内递增计数，不生成 uuid4；客户端发来的消息仍用
+        WebSocketMessage(**data) 完整校验。
+        
+        Args:
+            timestamp: 推送周期统一取的时间，省略时取当前时间
+        """
+        # 等同 model_construct 的结果，但不逐字段处理默认值（model_construct 比校验本身还慢）
+        message = cls.__new__(cls)
+        _object_setattr(message, "__dict__", {
+            "type": type,
+            "timestamp": timestamp or datetime.now(),
+            "data": data,
+            "metadata": metadata,
+            "message_id": next_message_id(),
+            "compression": False,
+        })
+        # 所有字段均已设置，后续赋值不会改变该集合，可以共用
+        _object_setattr(message, "__pydantic_fields_set__", _ALL_MESSAGE_FIELDS)
+        _object_setattr(message, "__pydantic_extra__", None)
+        _object_setattr(message, "__pydantic_private__", None)
+        return message
+
+
+_object_setattr = object.__setattr__
+_ALL_MESSAGE_FIELDS = set(WebSocketMessage.model_fields)
+
+# 服务端消息ID：进程前缀 + 递增计数，进程内唯一，跨进程由前缀区分
+_MESSAGE_ID_PREFIX = uuid.uuid4().hex[:12]
+_message_counter = itertools.count(1)
+
+
+def next_message_id() -> str:
+    """分配服务端消息ID"""
+    return f"{_MESSAGE_ID_PREFIX}-{next(_message_counter)}"
+
 
 class SubscriptionRequest(BaseModel):
     """订阅请求模型"""
@@ -85,6 +137,7 @@ class SubscriptionResponse(BaseModel):
     data_type: DataType
     client_id: str
     created_at: datetime = Field(default_factory=datetime.now)
+    group_size: Optional[int] = Field(None, description="分组订阅解析出的股票数量")
 
 
 class QuoteData(BaseModel):
@@ -176,6 +229,7 @@ class Subscription(BaseModel):
     status: SubscriptionStatus = SubscriptionStatus.ACTIVE
     message_count: int = 0
     last_message_at: Optional[datetime] = None
+    group_type: Optional[str] = Field(None, description="分组订阅类型: sector/index/wildcard，单只股票为None")
 
 
 class WebSocketConnection(BaseModel):
@@ -191,6 +245,8 @@ class WebSocketConnection(BaseModel):
     status: ConnectionStatus = ConnectionStatus.CONNECTED
     remote_address: Optional[str] = None
     user_agent: Optional[str] = None
+    encoding: str = "json"
+    compression: str = "none"
 
 
 class PerformanceMetrics(BaseModel):
@@ -288,7 +344,16 @@ class WebSocketConfig(BaseModel):
     compression_threshold: int = Field(default=1024, description="压缩阈值字节")
     max_message_size: int = Field(default=1024*1024, description="最大消息大小字节")
     enable_compression: bool = Field(default=True, description="启用压缩")
-    enable_batching: bool = Field(default=True, description="启用批量推送")
+    enable_batching: bool = Field(default=True, description="启用批量推送（仅对握手时声明 batch=1 的连接）")
+    batch_max_messages: int = Field(default=64, description="批量帧最多合并的消息数")
+    batch_max_bytes: int = Field(default=64*1024, description="批量帧字节上限")
+    batch_max_delay_ms: float = Field(default=10.0, description="消息排队的最长延迟毫秒")
+    transport_compression: str = Field(default="deflate", description="传输压缩: deflate(permessage-deflate) / none（none时回退为逐条gzip）")
+    deflate_level: int = Field(default=3, description="permessage-deflate压缩级别（行情帧小，3以上压缩率提升有限）")
+    deflate_mem_level: int = Field(default=5, description="permessage-deflate内存级别")
+    deflate_window_bits: int = Field(default=13, description="permessage-deflate窗口位数（每连接约48KB压缩状态，15可再降约10%字节但需约144KB）")
+    zstd_dictionary_path: Optional[str] = Field(default=None, description="zstd字典文件，配置后客户端可请求zstd压缩")
+    zstd_level: int = Field(default=3, description="zstd压缩级别")
 
 
 class ValidationResult(BaseModel):
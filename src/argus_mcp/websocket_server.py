@@ -6,8 +6,9 @@ WebSocket 实时数据系统 - 主服务器
 import asyncio
 import logging
 import json
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Union
 from datetime import datetime
+from urllib.parse import urlsplit, parse_qs
 import websockets
 from websockets.server import WebSocketServerProtocol
 from websockets.exceptions import ConnectionClosed, WebSocketException
@@ -21,6 +22,8 @@ from .websocket_connection_manager import WebSocketConnectionManager
 from .subscription_manager import SubscriptionManager
 from .data_publisher import DataPublisher, DataSourceConfig
 from .message_router import MessageRouter, MessageFormatter
+from .websocket_codec import incoming_to_text, supported_encodings
+from .websocket_compression import server_deflate_extensions
 
 logger = logging.getLogger(__name__)
 
@@ -48,9 +51,7 @@ class WebSocketServer:
         )
         
         # 核心组件
-        self.connection_manager = WebSocketConnectionManager(
-            max_connections=max_connections
-        )
+        self.connection_manager = WebSocketConnectionManager(self.websocket_config)
         self.subscription_manager = SubscriptionManager(
             max_subscriptions_per_client=max_subscriptions_per_client
         )
@@ -62,6 +63,7 @@ class WebSocketServer:
         
         # 消息路由器
         self.message_router = MessageRouter(self.websocket_config)
+        self.connection_manager.set_message_batcher(self.message_router)
         self._register_message_handlers()
         
         # 服务器状态
@@ -85,6 +87,8 @@ class WebSocketServer:
         self.message_router.register_handler(MessageType.HEARTBEAT, self._handle_heartbeat_message)
         self.message_router.register_handler(MessageType.GET_STATS, self._handle_get_stats_message)
         self.message_router.register_handler(MessageType.PING, self._handle_ping_message)
+        self.message_router.register_handler(MessageType.DEPTH_RESYNC, self._handle_depth_resync_message)
+        self.message_router.register_handler(MessageType.RESUME, self._handle_resume_message)
         logger.info("Message handlers registered")
     
     async def start(self):
@@ -106,6 +110,9 @@ class WebSocketServer:
                 self.port,
                 max_size=2**20,  # 1MB
                 max_queue=2**5,  # 32
+                # permessage-deflate（保留压缩上下文），参数由 WebSocketConfig 配置
+                compression=None,
+                extensions=server_deflate_extensions(self.websocket_config),
                 ping_interval=20,
                 ping_timeout=20,
                 close_timeout=10
@@ -153,13 +160,13 @@ class WebSocketServer:
         except Exception as e:
             logger.error(f"Error stopping WebSocketServer: {e}")
     
-    async def _handle_connection(self, websocket: WebSocketServerProtocol, path: str):
-        """处理WebSocket连接"""
+    async def _handle_connection(self, websocket: WebSocketServerProtocol, path: Optional[str] = None):
+        """处理WebSocket连接（websockets>=13 的处理函数不再传入path）"""
         client_id = None
         
         try:
             # 获取客户端信息
-            client_info = self._get_client_info(websocket)
+            client_info = self._get_client_info(websocket, path)
             client_id = client_info["client_id"]
             
             logger.info(f"New connection from {client_id} - {client_info}")
@@ -172,7 +179,7 @@ class WebSocketServer:
             self.server_stats["total_connections"] += 1
             
             # 发送欢迎消息
-            await self._send_welcome_message(websocket, client_id)
+            await self._send_welcome_message(websocket, client_id, client_info.get("zstd_dict"))
             
             # 处理消息
             async for message in websocket:
@@ -191,18 +198,33 @@ class WebSocketServer:
                 # 清理该客户端的所有订阅
                 await self.subscription_manager.unsubscribe_all(client_id)
     
-    def _get_client_info(self, websocket: WebSocketServerProtocol) -> Dict[str, Any]:
+    def _get_client_info(self, websocket: WebSocketServerProtocol, path: Optional[str] = None) -> Dict[str, Any]:
         """获取客户端信息"""
         remote_addr = websocket.remote_address
+        # 新版websockets将握手信息放在 websocket.request 上
+        request = getattr(websocket, "request", None)
+        headers = getattr(websocket, "request_headers", None) or getattr(request, "headers", {})
+        path = path or getattr(websocket, "path", None) or getattr(request, "path", "/")
+        # 线上编码、zstd压缩与批量帧通过查询参数协商，如 ws://host:8765/?encoding=msgpack&compression=zstd&batch=1
+        query = parse_qs(urlsplit(path).query)
         return {
             "client_id": f"{remote_addr[0]}:{remote_addr[1]}",
             "remote_address": f"{remote_addr[0]}:{remote_addr[1]}",
-            "user_agent": websocket.request_headers.get("User-Agent", "Unknown"),
+            "user_agent": headers.get("User-Agent", "Unknown"),
             "connected_at": datetime.now().isoformat(),
-            "path": websocket.path
+            "path": path,
+            "encoding": (query.get("encoding") or [None])[0],
+            "compression": (query.get("compression") or [None])[0],
+            "zstd_dict": (query.get("zstd_dict") or [None])[0],
+            "batch": (query.get("batch") or [None])[0]
         }
     
-    async def _send_welcome_message(self, websocket: WebSocketServerProtocol, client_id: str):
+    async def _send_welcome_message(
+        self,
+        websocket: WebSocketServerProtocol,
+        client_id: str,
+        known_dictionary_id: Optional[str] = None
+    ):
         """发送欢迎消息"""
         welcome_msg = WebSocketMessage(
             type=MessageType.WELCOME,
@@ -211,20 +233,26 @@ class WebSocketServer:
                 "server_version": "1.0.0",
                 "supported_data_types": [dt.value for dt in DataType],
                 "max_subscriptions": self.subscription_manager.max_subscriptions_per_client,
+                "encoding": self.connection_manager.get_encoding(client_id).value,
+                "supported_encodings": supported_encodings(),
+                "batch": self.connection_manager.batching_for(client_id),
+                **self.connection_manager.get_compression_info(client_id, known_dictionary_id),
                 "timestamp": datetime.now().isoformat()
             }
         )
         
+        # 欢迎消息始终为未压缩的JSON文本帧，客户端据此确认后续帧的编码并加载zstd字典
         await websocket.send(welcome_msg.model_dump_json())
+        self.connection_manager.activate_compression(client_id)
     
-    async def _handle_message(self, websocket: WebSocketServerProtocol, client_id: str, raw_message: str):
+    async def _handle_message(self, websocket: WebSocketServerProtocol, client_id: str, raw_message: Union[str, bytes]):
         """处理接收到的消息 - 使用MessageRouter"""
         try:
             self.server_stats["total_messages"] += 1
             
-            # 使用MessageRouter路由消息
+            # 使用MessageRouter路由消息（二进制上行帧先转换为JSON文本）
             result = await self.message_router.route_incoming_message(
-                client_id, raw_message, websocket
+                client_id, incoming_to_text(raw_message), websocket
             )
             
             # 如果处理成功且有响应数据，发送响应
@@ -666,6 +694,72 @@ class WebSocketServer:
                 error=str(e)
             )
 
+    async def _handle_depth_resync_message(self, client_id: str, message: WebSocketMessage, websocket) -> MessageHandleResult:
+        """处理深度重新同步请求 - 快照由数据发布器直接下发"""
+        try:
+            symbol = (message.data or {}).get("symbol")
+            if not symbol:
+                return MessageHandleResult(
+                    success=False,
+                    message="Missing symbol",
+                    message_id=message.message_id,
+                    error="depth_resync requires symbol"
+                )
+            
+            if not await self.data_publisher.resync_depth(client_id, symbol):
+                return MessageHandleResult(
+                    success=False,
+                    message="Depth resync failed",
+                    message_id=message.message_id,
+                    error=f"No depth subscription or order book for {symbol}"
+                )
+            
+            return MessageHandleResult(
+                success=True,
+                message="Depth snapshot sent",
+                message_id=message.message_id
+            )
+            
+        except Exception as e:
+            logger.error(f"Error handling depth resync for {client_id}: {e}")
+            return MessageHandleResult(
+                success=False,
+                message="Depth resync error",
+                message_id=message.message_id,
+                error=str(e)
+            )
+
+    
+    async def _handle_resume_message(self, client_id: str, message: WebSocketMessage, websocket) -> MessageHandleResult:
+        """处理断线续传请求 - 按频道补发缺失的推送"""
+        try:
+            channels = (message.data or {}).get("channels")
+            if not isinstance(channels, dict):
+                return MessageHandleResult(
+                    success=False,
+                    message="Invalid resume request",
+                    message_id=message.message_id,
+                    error="resume requires channels: {channel: last_seq}"
+                )
+            
+            result = await self.data_publisher.resume_client(client_id, channels)
+            
+            return MessageHandleResult(
+                success=True,
+                message="Resume processed",
+                message_id=message.message_id,
+                response_data={"resume": result}
+            )
+            
+        except Exception as e:
+            logger.error(f"Error handling resume for {client_id}: {e}")
+            return MessageHandleResult(
+                success=False,
+                message="Resume error",
+                message_id=message.message_id,
+                error=str(e)
+            )
+
 
 # 服务器启动脚本
 async def main():
@@ -36,7 +36,9 @@ def set_request_id(request_id: str):
 from src.argus_mcp.api.enhanced_historical_api import (
     EnhancedHistoricalDataAPI, 
     HistoricalDataRequest,
-    MultiPeriodRequest
+    MultiPeriodRequest,
+    get_enhanced_api,
+    get_enhanced_api_startup_info
 )
 from src.argus_mcp.data_models.historical_data import SupportedPeriod
 from src.argus_mcp.exceptions.historical_data_exceptions import (
@@ -49,9 +51,14 @@ from src.argus_mcp.exceptions.historical_data_exceptions import (
 class EnhancedXTQuantHandler:
     """增强的XTQuant处理器，集成新的历史数据API功能"""
     
-    def __init__(self):
-        """初始化增强处理器"""
-        self.api = EnhancedHistoricalDataAPI()
+    def __init__(self, api: Optional[EnhancedHistoricalDataAPI] = None):
+        """
+        初始化增强处理器
+        
+        Args:
+            api: 历史数据API实例，默认使用进程内共享实例（与server.py共用缓存）
+        """
+        self.api = api or get_enhanced_api()
         
     def _parse_date(self, date_str: str) -> datetime:
         """解析日期字符串为datetime对象"""
@@ -551,12 +558,14 @@ class EnhancedXTQuantHandler:
                     "cache_hits": cache_stats.get("cache_hits", 0),
                     "cache_misses": cache_stats.get("cache_misses", 0),
                     "hit_ratio": cache_stats.get("hit_ratio", 0.0),
+                    "api_startup": get_enhanced_api_startup_info(),
                     "last_updated": datetime.now().isoformat()
                 }
             else:
                 return {
                     "cache_enabled": True,
                     "message": "缓存统计功能暂不可用",
+                    "api_startup": get_enhanced_api_startup_info(),
                     "last_updated": datetime.now().isoformat()
                 }
         except Exception as e:
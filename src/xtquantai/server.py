@@ -41,6 +41,13 @@ from pydantic import AnyUrl, BaseModel, Field, ValidationError
 # from xtquant import xtdata # 延迟导入或包装导入
 # from xtquant import xttrader # 延迟导入或包装导入
 
+# 配置 XTQUANT_BACKEND=simulated 时以模拟后端替代miniQMT（用于CI和压测）
+try:
+    from data_agent_service.xtdata_simulator import install_simulated_xtquant_if_configured
+    install_simulated_xtquant_if_configured()
+except ImportError:
+    pass
+
 # 尝试导入xtquant，如果失败则使用模拟对象
 try:
     from xtquant import xtdata
@@ -57,6 +64,35 @@ except ImportError as e:
         f"原始错误: {str(e)}"
     ) from e
 
+def init_enhanced_api() -> Dict[str, Any]:
+    """
+    应用启动时创建共享的增强历史数据API实例
+    
+    所有请求复用同一个实例及其标准化器、质量监控器和缓存，
+    初始化耗时会记录到日志并通过 /enhanced_api_status 返回。
+    
+    Returns:
+        Dict: 初始化信息
+    """
+    from src.argus_mcp.api.enhanced_historical_api import (
+        get_enhanced_api,
+        get_enhanced_api_startup_info
+    )
+    
+    started = time.perf_counter()
+    get_enhanced_api()
+    startup_info = get_enhanced_api_startup_info()
+    logger.info(
+        f"共享增强API已就绪，启动耗时 {(time.perf_counter() - started) * 1000:.1f}ms",
+        extra={"init_time_ms": startup_info.get("init_time_ms")}
+    )
+    return startup_info
+
+def get_shared_enhanced_api():
+    """获取共享的增强历史数据API实例"""
+    from src.argus_mcp.api.enhanced_historical_api import get_enhanced_api
+    return get_enhanced_api()
+
 def ensure_xtdc_initialized():  
     # ... 保持不变 ...  
     pass  
@@ -208,17 +244,8 @@ class XTQuantAIHandler:
             # 如果使用增强API
             if enhanced:
                 try:
-                    # 修复导入路径 - 使用正确的相对路径
-                    import sys
-                    import os
-                    
-                    # 添加src目录到路径
-                    src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'src')
-                    if src_path not in sys.path:
-                        sys.path.insert(0, src_path)
-                    
-                    from argus_mcp.api.enhanced_historical_api import EnhancedHistoricalDataAPI, HistoricalDataRequest
-                    from argus_mcp.data_models.historical_data import SupportedPeriod
+                    from src.argus_mcp.api.enhanced_historical_api import HistoricalDataRequest
+                    from src.argus_mcp.data_models.historical_data import SupportedPeriod
                     
                     # 频率映射
                     frequency_map = {
@@ -232,7 +259,7 @@ class XTQuantAIHandler:
                         '1M': SupportedPeriod.MONTH_1
                     }
                     
-                    api = EnhancedHistoricalDataAPI()
+                    api = get_shared_enhanced_api()
                     
                     # 转换日期格式
                     formatted_start = f"{start_date[:4]}-{start_date[4:6]}-{start_date[6:8]}"
@@ -716,17 +743,8 @@ class XTQuantAIHandler:
             Dict: 多周期数据响应
         """
         try:
-            # 修复导入路径
-            import sys
-            import os
-            
-            # 添加src目录到路径
-            src_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'src')
-            if src_path not in sys.path:
-                sys.path.insert(0, src_path)
-            
-            from argus_mcp.api.enhanced_historical_api import EnhancedHistoricalDataAPI, MultiPeriodRequest
-            from argus_mcp.data_models.historical_data import SupportedPeriod
+            from src.argus_mcp.api.enhanced_historical_api import MultiPeriodRequest
+            from src.argus_mcp.data_models.historical_data import SupportedPeriod
             
             # 参数验证
             if not symbol:
@@ -765,8 +783,8 @@ class XTQuantAIHandler:
             formatted_start = f"{start_date[:4]}-{start_date[4:6]}-{start_date[6:8]}"
             formatted_end = f"{end_date[:4]}-{end_date[4:6]}-{end_date[6:8]}"
             
-            # 创建API实例并获取数据
-            api = EnhancedHistoricalDataAPI()
+            # 使用共享API实例获取数据
+            api = get_shared_enhanced_api()
             request = MultiPeriodRequest(
                 symbol=symbol,
                 start_date=formatted_start,
@@ -799,8 +817,40 @@ class XTQuantAIHandler:
                 "status": 500
             }
 
+    @staticmethod
+    async def get_enhanced_api_status():
+        """
+        获取共享增强API的状态
+        
+        Returns:
+            Dict: 初始化耗时及缓存统计
+        """
+        try:
+            from src.argus_mcp.api.enhanced_historical_api import get_enhanced_api_startup_info
+            
+            startup_info = get_enhanced_api_startup_info()
+            cache_stats = None
+            if startup_info.get("initialized"):
+                cache_stats = await get_shared_enhanced_api().cache.get_cache_stats()
+            
+            return {
+                "success": True,
+                "data": {
+                    "startup": startup_info,
+                    "cache": cache_stats
+                },
+                "status": 200
+            }
+        except ImportError as e:
+            return {
+                "success": False,
+                "message": f"增强API不可用: {str(e)}",
+                "status": 503
+            }
+
 # 注册API路由
 router = APIRouter()
+router.add_event_handler("startup", init_enhanced_api)
 router.get("/trading_dates")(XTQuantAIHandler.get_trading_dates)
 router.get("/hist_kline")(XTQuantAIHandler.get_hist_kline)
 router.get("/instrument_detail")(XTQuantAIHandler.get_instrument_detail)
@@ -808,5 +858,6 @@ router.get("/stock_list")(XTQuantAIHandler.get_stock_list)
 router.get("/latest_market")(XTQuantAIHandler.get_latest_market)
 router.get("/full_market")(XTQuantAIHandler.get_full_market)
 router.get("/multi_period_data")(XTQuantAIHandler.get_multi_period_data)
+router.get("/enhanced_api_status")(XTQuantAIHandler.get_enhanced_api_status)
 
 # (文件末尾空行)